@@ -2436,7 +2436,7 @@ if x11_ENABLED:
     ace("xpra.x11.bindings.randr", "x11,xrandr")
     ace("xpra.x11.bindings.record", "x11,xtst")
     ace("xpra.x11.bindings.keyboard", "x11,xtst,xfixes,xkbfile")
-    ace("xpra.x11.bindings.window", "x11,xtst,xfixes,xcomposite,xdamage,xext")
+    ace("xpra.x11.bindings.window", "x11,x11-xcb,xcb,xtst,xfixes,xcomposite,xdamage,xext")
     ace("xpra.x11.bindings.ximage", "x11,xext,xcomposite")
     ace("xpra.x11.bindings.res", "x11,xres")
     tace(xinput_ENABLED, "xpra.x11.bindings.xi2", "x11,xi")
@@ -2643,6 +2643,7 @@ toggle_packages(quic_ENABLED, "xpra.net.quic")
 toggle_packages(ssh_ENABLED, "xpra.net.ssh")
 toggle_packages(http_ENABLED or quic_ENABLED, "xpra.net.http")
 toggle_packages(rfb_ENABLED, "xpra.net.rfb")
+tace(rfb_ENABLED, "xpra.net.rfb.zrle", optimize=3)
 toggle_packages(qrencode_ENABLED, "xpra.net.qrcode")
 tace(qrencode_ENABLED, "xpra.net.qrcode.qrencode", extra_link_args="-lqrencode", extra_compile_args=ECA_WIN32SIGN)
 tace(netdev_ENABLED, "xpra.platform.posix.netdev_query")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+
+from xpra.buffers.membuf import get_membuf, get_membuf_pool_info, clear_membuf_pool  # @UnresolvedImport
+
+
+class TestMemBufPool(unittest.TestCase):
+
+    def setUp(self):
+        clear_membuf_pool()
+
+    def test_reuse(self):
+        info = get_membuf_pool_info()
+        if not info["budget"]:
+            return
+        buf = get_membuf(1000)
+        assert len(buf) == 1000
+        ptr = buf.get_mem_ptr()
+        del buf
+        info = get_membuf_pool_info()
+        assert info["buffers"] == 1
+        assert info["retained"] == 1024
+        # same size class, so we should get the same buffer back:
+        buf = get_membuf(900)
+        assert len(buf) == 900
+        assert buf.get_mem_ptr() == ptr
+        after = get_membuf_pool_info()
+        assert after["hits"] == info["hits"] + 1
+        assert after["buffers"] == 0
+        # a different size class is a miss:
+        other = get_membuf(100_000)
+        assert other.get_mem_ptr() != ptr
+        assert get_membuf_pool_info()["misses"] == after["misses"] + 1
+        del buf, other
+        assert get_membuf_pool_info()["buffers"] == 2
+
+    def test_writable(self):
+        buf = get_membuf(256, 0)
+        mv = memoryview(buf)
+        assert not mv.readonly
+        mv[:4] = b"1234"
+        assert bytes(mv[:4]) == b"1234"
+
+    def test_bounded(self):
+        info = get_membuf_pool_info()
+        max_buffer = info["max-buffer"]
+        if not info["budget"] or not max_buffer:
+            return
+        # oversized buffers are never retained:
+        del info
+        buf = get_membuf(max_buffer + 1)
+        del buf
+        assert get_membuf_pool_info()["buffers"] == 0
+        # each size class only retains a few buffers:
+        bufs = [get_membuf(4096) for _ in range(100)]
+        del bufs
+        info = get_membuf_pool_info()
+        assert 0 < info["buffers"] < 100
+        assert info["released"] > 0
+        assert info["retained"] <= info["budget"]
+        clear_membuf_pool()
+        info = get_membuf_pool_info()
+        assert info["buffers"] == info["retained"] == 0
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
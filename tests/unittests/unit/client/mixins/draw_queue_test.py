@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+
+from xpra.util.objects import AdHocStruct
+
+
+class DrawQueueTest(unittest.TestCase):
+
+    def make_client(self, threads: int):
+        from xpra.client.mixins import windows
+        saved = windows.DRAW_THREADS
+        windows.DRAW_THREADS = threads
+        try:
+            return windows.WindowClient()
+        finally:
+            windows.DRAW_THREADS = saved
+
+    def test_same_queue(self):
+        wc = self.make_client(3)
+        for i in range(10):
+            for wid in (1, 2, 3, 4, 5):
+                wc._process_eos(("eos", wid, i))
+        queued = {}
+        for index, dq in enumerate(wc._draw_queues):
+            queued[index] = []
+            while not dq.empty():
+                queued[index].append(dq.get())
+        for wid in (1, 2, 3, 4, 5):
+            index = wc._draw_queue_index[wid]
+            assert wc.get_draw_queue(wid) is wc._draw_queues[index]
+            # all the packets of this window are in its queue, in order:
+            assert [packet[2] for packet in queued[index] if packet[1] == wid] == list(range(10))
+            for other, packets in queued.items():
+                if other != index:
+                    assert not any(packet[1] == wid for packet in packets)
+        # the windows are spread over all the queues:
+        assert len(set(wc._draw_queue_index.values())) == 3
+
+    def test_release(self):
+        wc = self.make_client(2)
+        q1 = wc.get_draw_queue(1)
+        q2 = wc.get_draw_queue(2)
+        assert q1 is not q2
+        window = AdHocStruct()
+        window.destroy = lambda: None
+        wc.destroy_window(1, window)
+        assert 1 not in wc._draw_queue_index
+        assert 2 in wc._draw_queue_index
+        # the queue that was released is re-used for the next window:
+        assert wc.get_draw_queue(3) is q1
+
+    def test_single_queue(self):
+        wc = self.make_client(1)
+        assert wc.get_draw_queue(1) is wc.get_draw_queue(2) is wc._draw_queue
+        assert not wc._draw_queue_index
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,8 @@
 # later version. See the file COPYING for details.
 
 import unittest
+from time import sleep
+from concurrent.futures import ThreadPoolExecutor
 
 from xpra.util.objects import typedict
 from xpra.util.str_fn import hexstr, memoryview_to_bytes, repr_ellipsized
@@ -148,6 +150,73 @@ class Test_CSC_Colorspace(unittest.TestCase):
             self.do_test_RGB_to_YUV(found[0], found[1], "BGRX")
             self.do_test_RGB_to_YUV(found[1], found[0], "BGRX")
 
+    def test_csc_cython_bands(self):
+        csc_mod = loader.load_codec("csc_cython")
+        if not csc_mod:
+            return
+        from xpra.codecs.image import ImageWrapper
+        width, height = 64, 1024
+        pixels = bytes((x * 4 + y + i) % 256 for y in range(height) for x in range(width) for i in range(4))
+        image = ImageWrapper(0, 0, width, height, pixels, "BGRX", 32, width * 4,
+                             planes=ImageWrapper.PACKED, thread_safe=True)
+
+        def convert(in_image, in_csc: str, out_csc: str, threads: int):
+            csc = csc_mod.Converter()
+            csc.init_context(width, height, in_csc, width, height, out_csc, typedict({"threads": threads}))
+            assert csc.get_info()["threads"] == threads
+            out_image = csc.convert_image(in_image)
+            csc.clean()
+            return out_image
+
+        # the output must not depend on the number of bands:
+        yuv = convert(image, "BGRX", "YUV420P", 1)
+        yuv_bands = convert(image, "BGRX", "YUV420P", 4)
+        for plane, plane_bands in zip(yuv.get_pixels(), yuv_bands.get_pixels()):
+            assert memoryview_to_bytes(plane) == memoryview_to_bytes(plane_bands)
+        rgb = convert(yuv, "YUV420P", "BGRX", 1)
+        rgb_bands = convert(yuv, "YUV420P", "BGRX", 4)
+        assert memoryview_to_bytes(rgb.get_pixels()) == memoryview_to_bytes(rgb_bands.get_pixels())
+
+    def test_csc_cython_bands_error(self):
+        csc_mod = loader.load_codec("csc_cython")
+        if not csc_mod:
+            return
+        from xpra.codecs.image import ImageWrapper
+        width, height = 64, 1024
+        image = ImageWrapper(0, 0, width, height, b"\0" * width * height * 4, "BGRX", 32, width * 4,
+                             planes=ImageWrapper.PACKED, thread_safe=True)
+
+        class FailingPool(ThreadPoolExecutor):
+            # the first band is slow and the second one cannot be submitted:
+            def __init__(self):
+                super().__init__(2)
+                self.futures = []
+
+            def submit(self, fn, /, *args, **kwargs):
+                if self.futures:
+                    raise RuntimeError("cannot schedule new futures after shutdown")
+
+                def slow_band():
+                    sleep(0.2)
+                    return fn()
+                future = super().submit(slow_band)
+                self.futures.append(future)
+                return future
+        pool = FailingPool()
+        saved = csc_mod.get_band_pool
+        csc_mod.get_band_pool = lambda: pool
+        try:
+            csc = csc_mod.Converter()
+            csc.init_context(width, height, "BGRX", width, height, "YUV420P", typedict({"threads": 4}))
+            with self.assertRaises(RuntimeError):
+                csc.convert_image(image)
+            # the band that was submitted must be done before the error is raised:
+            assert pool.futures and all(future.done() for future in pool.futures)
+            csc.clean()
+        finally:
+            csc_mod.get_band_pool = saved
+            pool.shutdown()
+
 
 def main():
     unittest.main()
@@ -109,6 +109,29 @@ class TestCompression(unittest.TestCase):
                 d2 = block.decompress(c2)
                 assert d1 == d2 == t
 
+    def test_dictionary(self):
+        from xpra.util.objects import typedict
+        from xpra.net.protocol.header import DICTIONARY_FLAG
+        compression.init_all()
+        if not compression.use("lz4"):
+            return
+        caps = typedict(compression.get_compression_caps())
+        assert compression.use_dictionary("lz4", caps)
+        assert not compression.use_dictionary("lz4", typedict({"lz4": True}))
+        assert not compression.use_dictionary("lz4", typedict({"lz4": {"": True, "dictionary": 1}}))
+        data = b"window-metadata\x00title\x00focused\x00pointer-position"
+        cl, cdata = compression.get_compressor("lz4", True)(data, 1)
+        assert cl & DICTIONARY_FLAG
+        assert len(cdata) < len(compression.get_compressor("lz4")(data, 1)[1])
+        assert bytes(compression.decompress(cdata, cl)) == data
+        # without the dictionary, we can't decompress it:
+        try:
+            d = compression.decompress(cdata, cl & ~DICTIONARY_FLAG)
+        except ValueError:
+            pass
+        else:
+            assert bytes(d) != data
+
 
 def main():
     unittest.main()
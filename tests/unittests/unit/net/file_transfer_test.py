@@ -5,6 +5,7 @@
 # later version. See the file COPYING for details.
 
 import os
+import tempfile
 import unittest
 
 from xpra.util.objects import typedict
@@ -15,6 +16,45 @@ from xpra.net.file_transfer import (
 )
 
 
+class LoopbackHandler(FileTransferHandler):
+
+    def __init__(self):
+        super().__init__()
+        self.init_attributes("yes")
+        self.remote_file_transfer = True
+        self.remote_file_size_limit = self.file_size_limit
+        self.remote_file_chunks = 1024
+        self.remote_file_chunks_window = 4
+        self.file_chunks = 1024
+        self.file_chunks_window = 4
+        self.peer = None
+        self.packets = []
+        self.downloaded = []
+
+    def send(self, packet_type, *parts):
+        self.peer.packets.append((packet_type, *parts))
+
+    def compressed_wrapper(self, datatype, data, level=5):
+        return data
+
+    def process_downloaded_file(self, filename, mimetype, printit, openit, filesize, options):
+        self.downloaded.append(filename)
+
+    def process(self, drop=None):
+        packets = self.packets
+        self.packets = []
+        for packet in packets:
+            if drop and drop(packet):
+                continue
+            handler = {
+                "send-file": self._process_send_file,
+                "send-file-chunk": self._process_send_file_chunk,
+                "ack-file-chunk": self._process_ack_file_chunk,
+            }[packet[0]]
+            handler(packet)
+        return len(packets)
+
+
 class TestVersionUtilModule(unittest.TestCase):
 
     def test_basename(self):
@@ -52,6 +92,60 @@ class TestVersionUtilModule(unittest.TestCase):
         assert fth.get_info()
         fth.cleanup()
 
+    def _test_send_file(self, streamed=True, window=4, drop=None):
+        sender = LoopbackHandler()
+        receiver = LoopbackHandler()
+        sender.peer = receiver
+        receiver.peer = sender
+        sender.remote_file_chunks_window = receiver.remote_file_chunks_window = window
+        data = os.urandom(1024 * 20 + 100)
+        with tempfile.NamedTemporaryFile(prefix="xpra-file-transfer-", suffix=".bin") as f:
+            f.write(data)
+            f.flush()
+            assert sender.send_file(f.name, "", None if streamed else data, len(data))
+            try:
+                for _ in range(100):
+                    if not receiver.process(drop) + sender.process():
+                        if not receiver.receive_chunks_in_progress:
+                            break
+                        # the transfer has stalled, fire the receiver's timer:
+                        for chunk_id, state in tuple(receiver.receive_chunks_in_progress.items()):
+                            receiver._check_chunk_receiving(chunk_id, state.chunk)
+                    # chunks in flight never exceed the window:
+                    for state in sender.send_chunks_in_progress.values():
+                        assert state.sent - state.acked <= max(1, window)
+                assert not sender.send_chunks_in_progress
+                assert len(receiver.downloaded) == 1
+                with open(receiver.downloaded[0], "rb") as download:
+                    assert download.read() == data
+            finally:
+                for filename in receiver.downloaded:
+                    os.unlink(filename)
+                sender.cleanup()
+                receiver.cleanup()
+
+    def test_send_file_streamed(self):
+        self._test_send_file()
+
+    def test_send_file_buffer(self):
+        self._test_send_file(streamed=False)
+
+    def test_send_file_no_window(self):
+        # peers without a window get one chunk at a time, and the digest upfront:
+        self._test_send_file(window=0)
+
+    def test_send_file_resume(self):
+        dropped = set()
+
+        def drop_once(packet):
+            # lose chunk 5 the first time it is sent:
+            if packet[0] == "send-file-chunk" and packet[2] == 5 and 5 not in dropped:
+                dropped.add(5)
+                return True
+            return False
+        self._test_send_file(drop=drop_once)
+        assert dropped
+
 
 def main():
     unittest.main()
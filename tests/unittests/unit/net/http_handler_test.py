@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import gzip
+import unittest
+import tempfile
+
+from xpra.net.http import handler
+from xpra.net.http.handler import load_path, etag_matches, ContentCache
+
+
+class TestHTTPHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.saved_cache = handler.content_cache
+        handler.content_cache = ContentCache(1024 * 1024, 64 * 1024)
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        handler.content_cache = self.saved_cache
+        self.tmpdir.cleanup()
+
+    def make_file(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_cache(self):
+        data = b"var foo = 'bar';\n" * 100
+        path = self.make_file("test.js", data)
+        code, headers, content = load_path(["gzip"], path)
+        assert code == 200
+        assert headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(content) == data
+        etag = headers["ETag"]
+        cache = handler.content_cache
+        assert cache.get_info()["misses"] == 1
+        # modifying the headers we get back must not affect the cache:
+        headers["Last-Modified"] = "modified"
+        code, headers, cached = load_path(["gzip"], path)
+        assert cached is content
+        assert headers["ETag"] == etag
+        assert headers["Last-Modified"] != "modified"
+        assert cache.get_info()["hits"] == 1
+        # without gzip, we get a different response:
+        code, headers, content = load_path(["br"], path)
+        assert content == data
+        assert headers["ETag"] != etag
+        assert len(cache.entries) == 2
+        # modifying the file invalidates the cache entry:
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000 * 1000 * 1000))
+        code, headers, content = load_path(["gzip"], path)
+        assert headers["ETag"] != etag
+
+    def test_precompressed(self):
+        data = b"<html></html>" * 100
+        path = self.make_file("index.html", data)
+        self.make_file("index.html.br", b"brotli data")
+        code, headers, content = load_path(["br", "gzip"], path)
+        assert headers["Content-Encoding"] == "br"
+        assert content == b"brotli data"
+        st = os.stat(path + ".br")
+        os.utime(path + ".br", ns=(st.st_atime_ns, st.st_mtime_ns + 1000 * 1000 * 1000))
+        self.make_file("index.html.br", b"new brotli data")
+        code, headers, content = load_path(["br", "gzip"], path)
+        assert content == b"new brotli data"
+
+    def test_sendfile(self):
+        data = os.urandom(128 * 1024)
+        path = self.make_file("large.bin", data)
+        code, headers, content = load_path(["gzip"], path, True)
+        with content:
+            assert content.read() == data
+        assert headers["Content-Length"] == len(data)
+        assert "Content-Encoding" not in headers
+        assert not handler.content_cache.entries
+        # without sendfile, we get the contents:
+        code, headers, content = load_path(["gzip"], path)
+        assert isinstance(content, bytes)
+
+    def test_eviction(self):
+        cache = handler.content_cache
+        for i in range(40):
+            path = self.make_file(f"file{i}.png", os.urandom(32 * 1024))
+            load_path([], path)
+        info = cache.get_info()
+        assert info["size"] <= info["max-size"]
+        assert info["evictions"] > 0
+
+    def test_etag_matches(self):
+        assert etag_matches('"a"', '"a"')
+        assert etag_matches('"b", W/"a"', '"a"')
+        assert etag_matches("*", '"a"')
+        assert not etag_matches("", '"a"')
+        assert not etag_matches('"b"', '"a"')
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import mmap
+import unittest
+
+from xpra.net.mmap import SlotAllocator, RingAllocator, mmap_read, mmap_read_rows, mmap_free
+
+SLOT_SIZE = 64 * 1024
+MMAP_SIZE = 8 * 1024 * 1024
+
+
+class TestMmap(unittest.TestCase):
+
+    def setUp(self):
+        self.area = mmap.mmap(-1, MMAP_SIZE)
+
+    def read(self, chunks) -> bytes:
+        data, free_cb = mmap_read(self.area, *chunks)
+        v = bytes(data)
+        del data
+        free_cb()
+        return v
+
+    def test_ring(self):
+        ring = RingAllocator(self.area, MMAP_SIZE)
+        for size in (1000, 100000, 1024 * 1024):
+            data = os.urandom(size)
+            chunks, free_size = ring.write(data)
+            assert chunks and free_size > 0
+            assert self.read(chunks) == data
+
+    def test_slots(self):
+        slots = SlotAllocator(self.area, MMAP_SIZE, SLOT_SIZE)
+        assert slots.data_offset + slots.slot_count * SLOT_SIZE <= MMAP_SIZE
+        data1 = os.urandom(SLOT_SIZE * 2 + 1)
+        chunks1 = slots.write(data1)[0]
+        assert len(chunks1) == 1 and chunks1[0][3] == 3
+        data2 = os.urandom(100)
+        chunks2 = slots.write(data2)[0]
+        assert slots.get_info()["used"] == 4
+        # release out of order:
+        assert self.read(chunks2) == data2
+        assert slots.get_info()["used"] == 3
+        assert self.read(chunks1) == data1
+        assert slots.get_info()["used"] == 0
+
+    def test_slots_full_and_split(self):
+        slots = SlotAllocator(self.area, MMAP_SIZE, SLOT_SIZE)
+        allocated = [slots.write(b"0" * SLOT_SIZE)[0] for _ in range(slots.slot_count)]
+        assert all(allocated)
+        chunks, free_size = slots.write(b"1")
+        assert not chunks and free_size < 0
+        assert slots.get_info()["full"] == 1
+        # free every other slot, so there are no contiguous free slots left:
+        for chunks in allocated[::2]:
+            mmap_free(self.area, *chunks)
+        data = os.urandom(SLOT_SIZE * 3)
+        chunks = slots.write(data)[0]
+        assert len(chunks) == 3
+        assert self.read(chunks) == data
+        info = slots.get_info()
+        assert info["split"] == 1
+        assert info["fragmentation"] > 0
+
+    def test_read_rows(self):
+        rowstride = 100
+        data = os.urandom(rowstride * 10)
+        self.area[1000:1250] = data[:250]
+        self.area[5000:5020] = data[250:270]
+        self.area[9000:9730] = data[270:]
+        chunks = ((1000, 250), (5000, 20), (9000, 730))
+        segments, free_cb = mmap_read_rows(self.area, rowstride, *chunks)
+        # rows 0-1, row 2 (split across 3 chunks), rows 3-9:
+        assert [(row, rows) for row, rows, _ in segments] == [(0, 2), (2, 1), (3, 7)]
+        assert b"".join(bytes(seg[2]) for seg in segments) == data
+        # the straddling row is copied, the others are not:
+        assert isinstance(segments[0][2], memoryview) and isinstance(segments[2][2], memoryview)
+        del segments
+        free_cb()
+        assert int.from_bytes(self.area[0:4], "little") == 9730
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
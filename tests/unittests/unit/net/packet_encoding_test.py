@@ -36,6 +36,27 @@ class TestPacketEncoding(unittest.TestCase):
         packet = ("hello", {})
         assert packet_encoding.pack_one_packet(packet)
 
+    def test_peek_packet_type(self):
+        packet_encoding.init_all()
+        e = packet_encoding.ENCODERS.get("rencodeplus")
+        if not e:
+            return
+        for packet in (
+            ["draw", 1, 2, b"pixels"],
+            ["x" * 63, 1],
+            [10, {"foo": 1}],
+            ["ping"] + list(range(100)),
+        ):
+            data, flags = e.encode(packet)
+            assert packet_encoding.peek_packet_type(data, flags) == packet[0]
+            assert packet_encoding.peek_packet_type(memoryview(data), flags) == packet[0]
+        # long packet types are not supported:
+        data, flags = e.encode(["x" * 64, 1])
+        assert packet_encoding.peek_packet_type(data, flags) is None
+        for data in (b"", b"\xc1", b"\xc2\x84dr", b"\x01\x02", b"\xc2\xc1\x01"):
+            assert packet_encoding.peek_packet_type(data, flags) is None
+        assert packet_encoding.peek_packet_type(b"\xc1\x01", 0) is None
+
 def main():
     unittest.main()
 
@@ -167,6 +167,97 @@ class ProtocolTest(unittest.TestCase):
                 items = p.encode(packet)
                 assert items
 
+    def test_compress_pool(self) -> None:
+        from concurrent.futures import ThreadPoolExecutor
+        from xpra.net.compression import Compressible, compressed_wrapper
+
+        class TestCompressible(Compressible):
+            def compress(self):
+                return compressed_wrapper(self.datatype, self.data, level=1, lz4=True, can_inline=False)
+
+        p = self.make_memory_protocol()
+        p.enable_compressor("lz4")
+        p.set_compression_level(1)
+        data = b"0123456789" * 10000
+        packet = ("test", TestCompressible("a", data), TestCompressible("b", data[::-1]), 1)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            pooled = p.encode(packet, pool)
+        # the chunks and their indexes must be identical:
+        expected = p.encode(packet)
+        assert [(c[:3], bytes(c[3])) for c in pooled] == [(c[:3], bytes(c[3])) for c in expected]
+
+    def test_send_now_compress_pool(self) -> None:
+        from concurrent.futures import ThreadPoolExecutor
+        p = self.make_memory_protocol()
+        errors = []
+        p._internal_error = lambda message="", *_args, **_kwargs: errors.append(message)
+        saved = socket_handler.get_compress_pool
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            socket_handler.get_compress_pool = lambda create=True: pool
+            try:
+                # `send_now` callbacks must only be called once:
+                p.send_now(("hello", {"foo": "bar"}))
+                conn = p._conn
+                start = time.monotonic()
+                while not conn.write_data and not errors and time.monotonic() - start < TIMEOUT:
+                    time.sleep(0.01)
+            finally:
+                socket_handler.get_compress_pool = saved
+                p.close()
+        assert not errors, csv(errors)
+        assert conn.write_data, "no data written"
+        assert p.output_stats.get("hello") == 1
+
+    def parse_chunks(self, proto, chunks) -> list:
+        from xpra.net.protocol.header import pack_header
+        packets = []
+        proto._process_packet_cb = lambda _proto, packet: packets.append(packet)
+        proto.idle_add = noop
+        for proto_flags, index, level, data in chunks:
+            proto._read_queue.put(pack_header(proto_flags, level, index, len(data)) + bytes(data))
+        proto._read_queue.put(b"")
+        proto.do_read_parse_thread_loop()
+        return packets
+
+    def test_raw_packets(self) -> None:
+        from xpra.net.compression import compressed_wrapper
+        from xpra.net.common import RawPacket
+        sender = self.make_memory_protocol()
+        sender.enable_compressor("lz4")
+        sender.set_compression_level(1)
+        pixels = b"0123456789" * 10000
+        cursor = compressed_wrapper("cursor", pixels, level=1, lz4=True, can_inline=False)
+        packets = (
+            ("draw", 1, 0, 0, 100, 100, "png", Compressed("png", pixels, can_inline=False), 1, 0, {}),
+            ("cursor", "png", 0, 0, 10, 10, 0, 0, 1, cursor, "name"),
+            ("configure-window", 1, "x" * 10000),
+        )
+        chunks = []
+        for packet in packets:
+            chunks += sender.encode(packet)
+        proxy = self.make_memory_protocol()
+        proxy.set_raw_packets(("draw", "cursor"), {"lz4": False})
+        received = self.parse_chunks(proxy, chunks)
+        assert [type(packet) for packet in received] == [RawPacket, RawPacket, tuple]
+        assert [packet[0] for packet in received] == ["draw", "cursor", "configure-window"]
+        # the compressed cursor data is forwarded as-is:
+        assert any(level > 0 for _, _, level, _ in received[1][1])
+        # forward the raw packets to the final recipient:
+        forwarded = []
+        for packet in received[:2]:
+            forwarded += proxy.encode(packet)
+        assert forwarded == list(received[0][1]) + list(received[1][1])
+        decoded = self.parse_chunks(self.make_memory_protocol(), forwarded)
+        assert [packet[0] for packet in decoded] == ["draw", "cursor"]
+        assert bytes(decoded[0][7]) == pixels
+        assert bytes(decoded[1][9]) == pixels
+        # without a compatible compressor, the packet must be decoded:
+        proxy = self.make_memory_protocol()
+        proxy.set_raw_packets(("cursor", ), {"zlib": False})
+        received = self.parse_chunks(proxy, sender.encode(packets[1]))
+        assert type(received[0]) is tuple
+        assert bytes(received[0][9]) == pixels
+
     def test_read_speed(self) -> None:
         if not SHOW_PERF:
             return
@@ -291,6 +382,33 @@ try:
 
     class WebsocketProtocolTest(ProtocolTest):
         protocol_class = WebSocketProtocol
+
+        def test_fragmented_frames(self) -> None:
+            import os
+            from xpra.net.websockets.common import OPCODE
+            from xpra.net.websockets.header import encode_hybi_header
+            from xpra.net.websockets.mask import hybi_mask
+
+            def frame(opcode, payload, fin=True):
+                mask = os.urandom(4)
+                return encode_hybi_header(opcode, len(payload), True, fin) + mask + bytes(hybi_mask(mask, payload))
+
+            payload = os.urandom(100000)
+            data = b"".join((
+                frame(OPCODE.BINARY, payload[:10], False),
+                frame(OPCODE.CONTINUE, payload[10:60000], False),
+                frame(OPCODE.CONTINUE, payload[60000:], True),
+                frame(OPCODE.BINARY, b"last"),
+            ))
+            for chunk_size in (7, 4096, len(data)):
+                p = self.make_memory_protocol()
+                received = []
+                p._read_queue_put = received.append
+                for i in range(0, len(data), chunk_size):
+                    p.parse_ws_frame(data[i:i + chunk_size])
+                assert all(received), "empty buffers must not be forwarded"
+                assert b"".join(bytes(v) for v in received) == payload + b"last"
+                assert not p.ws_data and not p.ws_payload_opcode
 except ImportError as e:
     log.warn("Warning: skipped websocket test")
     log.warn(" %s", e)
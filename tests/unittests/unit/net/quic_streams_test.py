@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+
+from xpra.net.websockets.header import encode_hybi_header, hybi_frame_size
+from xpra.net.quic.streams import get_stream_type, find_messages_end, StreamReassembler
+
+
+def frame(payload: bytes, fin=True) -> bytes:
+    return encode_hybi_header(2, len(payload), False, fin) + payload
+
+
+class QuicStreamsTest(unittest.TestCase):
+
+    def test_stream_type(self):
+        assert get_stream_type("draw:1") == "window-1"
+        assert get_stream_type("eos:2") == "window-2"
+        assert get_stream_type("new-window:1") == "window-1"
+        assert get_stream_type("window-resized:1") == "window-1"
+        assert get_stream_type("lost-window:1") == "window-1"
+        assert get_stream_type("draw") == "draw"
+        assert get_stream_type("sound-data") == "audio"
+        assert get_stream_type("send-file-chunk") == "file"
+        assert get_stream_type("ping") == ""
+
+    def test_frame_size(self):
+        for size in (0, 10, 125, 126, 65535, 65536):
+            data = frame(b"\0" * size)
+            assert hybi_frame_size(data) == len(data)
+            # truncated payloads still give us the full frame size:
+            assert hybi_frame_size(data[:len(data) - size]) == len(data)
+        assert hybi_frame_size(b"") == 0
+        assert hybi_frame_size(b"\x82") == 0
+        # extended length with the length field missing:
+        assert hybi_frame_size(frame(b"\0" * 126)[:3]) == 0
+
+    def test_messages_end(self):
+        data = frame(b"a" * 10) + frame(b"b" * 200, False) + frame(b"c" * 5)
+        assert find_messages_end(data) == (len(data), len(data))
+        # the second frame does not end the message:
+        first = len(frame(b"a" * 10))
+        end, needed = find_messages_end(data[:first + 10])
+        assert end == first
+        assert needed == first + len(frame(b"b" * 200))
+        end, needed = find_messages_end(data[:-1])
+        assert end == first
+        assert needed == len(data)
+
+    def test_reassembler(self):
+        r = StreamReassembler()
+        msg1 = frame(b"1" * 1000)
+        msg2 = frame(b"2" * 50, False) + frame(b"2" * 50)
+        # complete messages are returned as-is:
+        assert r.add(0, msg1) is msg1
+        # interleave partial messages from two streams:
+        assert r.add(3, msg1[:100]) == b""
+        assert r.add(7, msg2[:60]) == b""
+        assert r.add(3, msg1[100:500]) == b""
+        assert r.add(7, msg2[60:]) == msg2
+        assert r.get_pending() == 500
+        assert r.add(3, msg1[500:] + msg2[:10]) == msg1
+        assert r.get_pending() == 10
+        assert r.remove(3) == 10
+        assert r.get_pending() == 0
+        assert r.remove(3) == 0
+
+    def test_byte_at_a_time(self):
+        r = StreamReassembler()
+        data = frame(b"x" * 300) + frame(b"y" * 2, False) + frame(b"z" * 70000)
+        out = b""
+        for i in range(len(data)):
+            out += r.add(5, data[i:i + 1])
+        assert out == data
+        assert r.get_pending() == 0
+
+
+try:
+    from xpra.net.quic import connection, websocket
+
+    class FakeHttpConnection:
+        def __init__(self):
+            self.next_stream_id = 3
+            self.data = []
+
+        def send_push_promise(self, _stream_id: int, _headers) -> int:
+            self.next_stream_id += 4
+            return self.next_stream_id
+
+        def send_headers(self, stream_id: int, headers, end_stream=False) -> None:
+            """ the headers are not checked """
+
+        def send_data(self, stream_id: int, data: bytes, end_stream=False) -> None:
+            self.data.append((stream_id, data, end_stream))
+
+    class ImmediateLoop:
+        @staticmethod
+        def call(f) -> None:
+            f()
+
+    class WebSocketStreamsTest(unittest.TestCase):
+
+        def setUp(self):
+            self.saved = connection.get_threaded_loop, websocket.get_threaded_loop
+            connection.get_threaded_loop = websocket.get_threaded_loop = ImmediateLoop
+
+        def tearDown(self):
+            connection.get_threaded_loop, websocket.get_threaded_loop = self.saved
+
+        def test_window_streams(self):
+            http = FakeHttpConnection()
+            conn = websocket.ServerWebSocketConnection(http, {}, 0, lambda: None)
+            # not enabled yet:
+            conn.write(b"new-window", "new-window:1")
+            assert http.data == [(0, b"new-window", False)]
+            http.data.clear()
+            conn.set_multi_stream(True)
+            for packet_type in ("new-window:2", "draw:2", "ping", "window-resized:2", "draw:3", "draw:2"):
+                conn.write(packet_type.encode(), packet_type)
+            streams = {}
+            for stream_id, data, _ in http.data:
+                streams.setdefault(stream_id, []).append(data)
+            # the packets of each window are kept together and in order:
+            assert streams[0] == [b"ping"]
+            assert len(streams) == 3
+            window_stream = conn.get_packet_stream_id("draw:2")
+            assert streams[window_stream] == [b"new-window:2", b"draw:2", b"window-resized:2", b"draw:2"]
+            # the stream ends with the "lost-window" packet:
+            http.data.clear()
+            conn.write(b"lost-window", "lost-window:2")
+            assert http.data == [(window_stream, b"lost-window", False), (window_stream, b"", True)]
+            assert "window-2" not in conn._packet_type_streams
+            # lost windows do not get a new stream:
+            http.data.clear()
+            conn.write(b"lost-window", "lost-window:4")
+            assert http.data == [(0, b"lost-window", False)]
+            # a new window with the same id gets a new stream:
+            conn.write(b"new-window", "new-window:2")
+            assert conn.get_packet_stream_id("draw:2") not in (0, window_stream)
+
+        def test_streams_disabled(self):
+            http = FakeHttpConnection()
+            conn = websocket.ServerWebSocketConnection(http, {}, 0, lambda: None)
+            conn.set_multi_stream(True)
+            conn.write(b"draw", "draw:1")
+            stream_id = http.data[0][0]
+            assert stream_id != 0
+            # once allocated, the window's stream is used even if we can't allocate new ones:
+            conn._use_substreams = False
+            conn.write(b"draw", "draw:1")
+            conn.write(b"draw", "draw:5")
+            assert [v[0] for v in http.data] == [stream_id, stream_id, 0]
+except ImportError as e:
+    print(f"quic websocket test skipped: {e}")
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,14 +5,52 @@
 # later version. See the file COPYING for details.
 
 
+import zlib
+import struct
 import unittest
 
 from xpra.util.objects import AdHocStruct
 from xpra.codecs.image import ImageWrapper
 from xpra.common import noop
+from xpra.net.rfb.const import RFBEncoding
 from xpra.server.rfb.source import RFBSource
 
 
+def parse_updates(data: bytes, zstreams=None) -> list[list[tuple]]:
+    """
+    returns the list of rectangles for each framebuffer update,
+    the zlib data is decompressed using the `zstreams` given, which persist across updates
+    """
+    updates = []
+    pos = 0
+    while pos < len(data):
+        ptype, _, count = struct.unpack(b"!BBH", data[pos:pos + 4])
+        assert ptype == 0
+        pos += 4
+        rects = []
+        for _ in range(count):
+            x, y, w, h, encoding = struct.unpack(b"!HHHHi", data[pos:pos + 12])
+            pos += 12
+            if encoding == RFBEncoding.COPYRECT:
+                pos += 4
+            elif encoding in (RFBEncoding.ZRLE, RFBEncoding.ZLIB):
+                size = struct.unpack(b"!I", data[pos:pos + 4])[0]
+                pos += 4
+                if zstreams is not None:
+                    zstream = zstreams.setdefault(encoding, zlib.decompressobj())
+                    pixels = zstream.decompress(data[pos:pos + size])
+                    if encoding == RFBEncoding.ZLIB:
+                        assert len(pixels) == w * h * 4
+                pos += size
+            else:
+                assert encoding == RFBEncoding.RAW
+                pos += w * h * 4
+            rects.append((RFBEncoding(encoding), x, y, w, h))
+        updates.append(rects)
+    assert pos == len(data)
+    return updates
+
+
 class TestRFB(unittest.TestCase):
 
     def test_rfb_source(self):
@@ -49,6 +87,86 @@ class TestRFB(unittest.TestCase):
             s.damage(1, window, 0, 0, 2, 2, {"polling" : protocol is None})
             assert s.is_closed()
 
+    def test_update_request(self):
+        sent = []
+        p = AdHocStruct()
+        p.send = sent.append
+        p.queue_size = lambda: 0
+        W, H = 256, 256
+        # each line has its own color:
+        lines = [bytes((i, i * 3 & 0xff, i * 7 & 0xff, 0)) * W for i in range(H)]
+
+        window = AdHocStruct()
+        window.get_dimensions = lambda: (W, H)
+        window.acknowledge_changes = noop
+
+        def get_image(x, y, w, h):
+            pixels = b"".join(line[x * 4:(x + w) * 4] for line in lines[y:y + h])
+            return ImageWrapper(x, y, w, h, pixels, "BGRX", 24, w * 4, 4)
+        window.get_image = get_image
+
+        for encoding in (RFBEncoding.RAW, RFBEncoding.ZLIB, RFBEncoding.ZRLE):
+            zstreams = {}
+
+            def get_updates():
+                updates = parse_updates(b"".join(sent), zstreams)
+                sent.clear()
+                return updates
+
+            s = RFBSource(p, True)
+            s.set_encodings((encoding, RFBEncoding.COPYRECT))
+            # nothing is sent until the client asks for it:
+            s.damage(1, window, 0, 0, W, H)
+            assert not sent
+            s.update_request(window, 1, 0, 0, W, H)
+            assert get_updates() == [[(encoding, 0, 0, W, H)]]
+            # nothing has changed:
+            s.update_request(window, 1, 0, 0, W, H)
+            assert not sent
+            s.damage(1, window, 10, 20, 30, 40)
+            assert get_updates() == [[(encoding, 10, 20, 30, 40)]]
+            # damage without a request:
+            s.damage(1, window, 0, 0, 10, 10)
+            assert not sent
+            # a non-incremental request sends the area even if it has not changed:
+            s.update_request(window, 0, 100, 100, 50, 50)
+            updates = get_updates()
+            assert len(updates) == 1
+            assert (encoding, 100, 100, 50, 50) in updates[0]
+            assert (encoding, 0, 0, 10, 10) in updates[0]
+            s.close()
+
+    def test_copyrect(self):
+        sent = []
+        p = AdHocStruct()
+        p.send = sent.append
+        p.queue_size = lambda: 0
+        W, H = 256, 512
+        lines = [bytes((i & 0xff, i >> 8, i * 7 & 0xff, 0)) * W for i in range(H + 100)]
+        window = AdHocStruct()
+        window.get_dimensions = lambda: (W, H)
+        window.acknowledge_changes = noop
+        window.scroll = 0
+
+        def get_image(x, y, w, h):
+            visible = lines[window.scroll:window.scroll + H]
+            pixels = b"".join(line[x * 4:(x + w) * 4] for line in visible[y:y + h])
+            return ImageWrapper(x, y, w, h, pixels, "BGRX", 24, w * 4, 4)
+        window.get_image = get_image
+
+        s = RFBSource(p, True)
+        s.set_encodings((RFBEncoding.COPYRECT, RFBEncoding.ZRLE))
+        s.update_request(window, 0, 0, 0, W, H)
+        sent.clear()
+        # scroll down by 10 lines:
+        window.scroll = 10
+        s.damage(1, window, 0, 0, W, H)
+        s.update_request(window, 1, 0, 0, W, H)
+        rects = parse_updates(b"".join(sent))[0]
+        assert rects[0] == (RFBEncoding.COPYRECT, 0, 0, W, H - 10), rects
+        # only the new lines are repainted:
+        assert sum(h for _, _, _, _, h in rects[1:]) == 10, rects
+
 
 def main():
     unittest.main()
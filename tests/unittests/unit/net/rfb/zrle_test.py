@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import unittest
+
+from xpra.net.rfb.zrle import encode_zrle
+
+
+def decode_zrle(data, width: int, height: int) -> bytes:
+    """ decodes the tiles back to BGRX pixels, with the X byte set to zero """
+    out = bytearray(width * height * 4)
+    pos = 0
+
+    def cpixel() -> bytes:
+        nonlocal pos
+        v = bytes(data[pos:pos + 3]) + b"\0"
+        pos += 3
+        return v
+
+    def run_length() -> int:
+        nonlocal pos
+        length = 1
+        while True:
+            b = data[pos]
+            pos += 1
+            length += b
+            if b != 255:
+                return length
+
+    for ty in range(0, height, 64):
+        th = min(64, height - ty)
+        for tx in range(0, width, 64):
+            tw = min(64, width - tx)
+            sub = data[pos]
+            pos += 1
+            pixels = []
+            if sub == 0:
+                pixels = [cpixel() for _ in range(tw * th)]
+            elif sub == 1:
+                pixels = [cpixel()] * (tw * th)
+            elif sub <= 16:
+                palette = [cpixel() for _ in range(sub)]
+                bits = 1 if sub <= 2 else (2 if sub <= 4 else 4)
+                for _ in range(th):
+                    row_bytes = (tw * bits + 7) // 8
+                    row = int.from_bytes(data[pos:pos + row_bytes], "big")
+                    pos += row_bytes
+                    for x in range(tw):
+                        shift = row_bytes * 8 - (x + 1) * bits
+                        pixels.append(palette[(row >> shift) & ((1 << bits) - 1)])
+            elif sub == 128:
+                while len(pixels) < tw * th:
+                    v = cpixel()
+                    pixels += [v] * run_length()
+            elif sub >= 130:
+                palette = [cpixel() for _ in range(sub - 128)]
+                while len(pixels) < tw * th:
+                    idx = data[pos]
+                    pos += 1
+                    if idx & 128:
+                        pixels += [palette[idx & 127]] * run_length()
+                    else:
+                        pixels.append(palette[idx])
+            else:
+                raise ValueError(f"invalid sub-encoding {sub}")
+            assert len(pixels) == tw * th, f"expected {tw * th} pixels but got {len(pixels)}"
+            for y in range(th):
+                start = ((ty + y) * width + tx) * 4
+                out[start:start + tw * 4] = b"".join(pixels[y * tw:(y + 1) * tw])
+    assert pos == len(data), f"{len(data) - pos} bytes left over"
+    return bytes(out)
+
+
+def strip_x(pixels: bytes, width: int, height: int, rowstride: int) -> bytes:
+    out = bytearray(width * height * 4)
+    for y in range(height):
+        row = bytearray(pixels[y * rowstride:y * rowstride + width * 4])
+        row[3::4] = b"\0" * width
+        out[y * width * 4:(y + 1) * width * 4] = row
+    return bytes(out)
+
+
+class TestZRLE(unittest.TestCase):
+
+    def check(self, pixels: bytes, width: int, height: int, rowstride: int = 0) -> int:
+        rowstride = rowstride or width * 4
+        data = encode_zrle(pixels, width, height, rowstride)
+        assert decode_zrle(data, width, height) == strip_x(pixels, width, height, rowstride)
+        return len(data)
+
+    def test_solid(self):
+        # solid tiles only use 4 bytes:
+        assert self.check(b"\x10\x20\x30\xff" * 64 * 64, 64, 64) == 4
+        assert self.check(b"\x10\x20\x30\xff" * 130 * 70, 130, 70) == 3 * 2 * 4
+
+    def test_palette(self):
+        for ncolors in (2, 3, 4, 5, 16, 17, 100, 127, 128):
+            colors = [os.urandom(3) + b"\xff" for _ in range(ncolors)]
+            for width, height in ((64, 64), (33, 17), (100, 70)):
+                for run in (1, 5):
+                    pixels = b"".join(colors[(x // run * 7 + x // 3) % ncolors] for x in range(width * height))
+                    self.check(pixels, width, height)
+
+    def test_runs(self):
+        # long runs, longer than 255 pixels:
+        pixels = b"\x01\x02\x03\x00" * 300 + b"\x04\x05\x06\x00" * 600 + b"\x07\x08\x09\x00" * (4096 - 900)
+        size = self.check(pixels, 64, 64)
+        assert size < 32
+
+    def test_random(self):
+        for width, height in ((1, 1), (7, 3), (64, 64), (65, 65), (200, 130)):
+            self.check(os.urandom(width * height * 4), width, height)
+
+    def test_rowstride(self):
+        width, height, rowstride = 50, 40, 50 * 4 + 12
+        pixels = b"".join(bytes((y, y, y, 0)) * width + os.urandom(12) for y in range(height))
+        self.check(pixels, width, height, rowstride)
+
+    def test_invalid(self):
+        for args in ((b"", 0, 0, 0), (b"\0" * 16, 4, 1, 8), (b"\0" * 16, 2, 4, 8)):
+            with self.assertRaises(ValueError):
+                encode_zrle(*args)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -116,6 +116,35 @@ class QueueSchedulerTest(unittest.TestCase):
         qs.run()
         assert not times, "items remain in list: %s" % (times,)
 
+    def test_timer_order(self):
+        qs = QueueScheduler()
+        calls = []
+        for delay in (300, 100, 200, 50):
+            qs.timeout_add(delay, calls.append, delay)
+        cancelled = qs.timeout_add(150, calls.append, 150)
+        qs.source_remove(cancelled)
+        qs.timeout_add(500, qs.stop)
+        qs.run()
+        assert calls == [50, 100, 200, 300], "unexpected call order: %s" % (calls,)
+        # a single thread handles all the timeouts:
+        assert qs.timer_thread
+        info = qs.get_scheduler_info()
+        assert info["lateness"]["min"] >= 0
+        assert info["timers"] == 0
+
+    def test_many_timers(self):
+        qs = QueueScheduler()
+        tids = [qs.timeout_add(10000, qs.stop) for _ in range(1000)]
+        for tid in tids:
+            qs.source_remove(tid)
+        calls = []
+        qs.timeout_add(10, calls.append, True)
+        # the cancelled entries are purged from the heap:
+        assert len(qs.timer_heap) < 1000
+        qs.timeout_add(100, qs.stop)
+        qs.run()
+        assert calls == [True]
+
 def main():
     unittest.main()
 
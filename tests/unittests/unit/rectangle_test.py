@@ -93,6 +93,18 @@ class TestRegion(unittest.TestCase):
         assert rectangle(0, 50, 50, 50) in l
         assert rectangle(200, 200, 0, 0) not in l
 
+    def test_merge_regions(self):
+        from xpra.util.rectangle import rectangle as rect, merge_regions
+        # a line of text: merged into one region
+        line = [rect(10+i*8, 100, 7, 14) for i in range(100)]
+        assert merge_regions(line, 1024) == [rect(10, 100, 799, 14)]
+        # regions far apart are not merged:
+        far = [rect(0, 0, 10, 10), rect(1000, 1000, 10, 10)]
+        assert len(merge_regions(far, 1024)) == 2
+        # unless the packet cost is higher than the pixels we add:
+        assert merge_regions(far, 1010*1010) == [rect(0, 0, 1010, 1010)]
+        assert merge_regions([], 1024) == []
+
 
 def main():
     #skip test if import failed (ie: not a server build)
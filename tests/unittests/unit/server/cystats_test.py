@@ -100,6 +100,67 @@ class TestCystats(unittest.TestCase):
         a, ra = cystats.calculate_time_weighted_average(data)
         assert 0<a<1 and 0<ra<1
 
+    def test_decaying_average(self):
+        now = monotonic()
+        da = cystats.DecayingAverage()
+        assert not da
+        self.assertEqual(da.get(), (0, 0))
+        #a single value is the average, regardless of its age:
+        da.add(10, 1, now-5)
+        self.assertEqual(da.get(), (10, 10))
+        #the recent average follows new values more quickly:
+        for i in range(10):
+            da.add(20, 1, now-1+i/10)
+        a, ra = da.get()
+        assert 10<a<ra<=20.001, "expected 10<%s<%s<=20" % (a, ra)
+        self.assertEqual(len(da), 11)
+        #values received out of order matter less:
+        da.add(1000, 1, now-1000)
+        self.assertAlmostEqual(da.get()[0], a)
+        #with equal times, this is a weighted average:
+        da = cystats.DecayingAverage()
+        da.add(1, 1, now)
+        da.add(4, 2, now)
+        self.assertAlmostEqual(da.get()[0], 3)
+        #which can replace the list of values given to queue_inspect:
+        qsizes = [(now, 4), (now, 4)]
+        da = cystats.DecayingAverage()
+        for t, v in qsizes:
+            da.add(v, 1, t)
+        self.assertEqual(cystats.queue_inspect("q", da), cystats.queue_inspect("q", qsizes))
+
+    def test_size_weighted_average(self):
+        now = monotonic()
+        for x in (5, 1000):
+            swa = cystats.SizeWeightedAverage()
+            for i in range(1, 1000):
+                swa.record(now, i*x, x)
+            a, ra = swa.get()
+            self.assertEqual(x, round(a))
+            self.assertEqual(x, round(ra))
+        #invalid records are ignored:
+        swa = cystats.SizeWeightedAverage()
+        swa.record(now, 1000, 0)
+        swa.record(now, 0, 10)
+        assert not swa
+        #an old record won't make any difference:
+        swa.record(now-60*60, 1000, 10)
+        swa.record(now, 1000, 100)
+        self.assertEqual(round(swa.get()[0]), 100)
+
+    def test_windowed_min(self):
+        wm = cystats.WindowedMin(3)
+        self.assertIsNone(wm.get())
+        for v, expected in ((5, 5), (3, 3), (4, 3), (6, 3), (7, 4), (8, 6), (1, 1)):
+            wm.add(v)
+            self.assertEqual(wm.get(), expected)
+        self.assertEqual(len(wm), 3)
+        values = [random.random() for _ in range(1000)]
+        wm = cystats.WindowedMin(100)
+        for i, v in enumerate(values):
+            wm.add(v)
+            self.assertEqual(wm.get(), min(values[max(0, i-99):i+1]))
+
     def test_logp(self):
         for _ in range(1000):
             x = random.random()
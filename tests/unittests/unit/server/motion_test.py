@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 # This file is part of Xpra.
-# Copyright (C) 2016-2022 Antoine Martin <antoine@xpra.org>
+# Copyright (C) 2016-2024 Antoine Martin <antoine@xpra.org>
 # Xpra is released under the terms of the GNU GPL v2, or, at your option, any
 # later version. See the file COPYING for details.
 
+import os
 import unittest
 from zlib import crc32
 from time import monotonic
@@ -159,6 +160,55 @@ class TestMotion(unittest.TestCase):
         #log("na1:\n%s" % (na1, ))
         #log("na2:\n%s" % (na2, ))
 
+    def test_hash_index(self):
+        # the hash index must find the same distances as the full scan:
+        N = 500
+        for array1, array2 in (
+            (range(1, N), range(20, N+20)),
+            (range(1, N), [x*3 for x in range(N)]),
+            ([crc32(b"%i" % (x % 50)) for x in range(N)], [crc32(b"%i" % ((x+7) % 50)) for x in range(N)]),
+        ):
+            for max_distance in (10, 100, 1000):
+                sd = motion.ScrollData(0, 0, 1, len(array1))
+                sd.test_update(array1)
+                sd.test_update(array2)
+                sd.calculate(max_distance)
+                hashed = sd.get_distances()
+                sd.calculate_scan(max_distance)
+                assert hashed == sd.get_distances()
+
+    def make_picture(self, W, H):
+        return [os.urandom(W*4) for _ in range(H)]
+
+    def get_scroll_areas(self, W, H, rows1, rows2):
+        sd = motion.ScrollData(0, 0, W, H)
+        sd.update(b"".join(rows1), 0, 0, W, H, W*4, 4)
+        sd.update(b"".join(rows2), 0, 0, W, H, W*4, 4)
+        sd.calculate()
+        return sd.get_scroll_areas()
+
+    def test_scroll_areas(self):
+        W, H = 1024, 256
+        rows = self.make_picture(W, H)
+        # vertical:
+        scrolls, repaint = self.get_scroll_areas(W, H, rows, rows[10:]+self.make_picture(W, 10))
+        assert scrolls == [(0, 10, W, H-10, 0, -10)], scrolls
+        assert repaint == [(0, H-10, W, 10)], repaint
+        # horizontal:
+        scrolls, repaint = self.get_scroll_areas(W, H, rows, [row[40*4:]+os.urandom(40*4) for row in rows])
+        assert scrolls == [(40, 0, W-40, H, -40, 0)], scrolls
+        assert repaint == [(W-40, 0, 40, H)], repaint
+        # split panes, only the left one scrolls:
+        split = 600
+        rows2 = [rows[(i-5) % H][:split*4]+rows[i][split*4:] for i in range(H)]
+        scrolls, repaint = self.get_scroll_areas(W, H, rows, rows2)
+        band = 256
+        assert scrolls == [(0, 0, split//band*band, H-5, 0, 5)], scrolls
+        # everything else is either unchanged or needs to be repainted:
+        assert sum(w*h for _, _, w, h in repaint) < W*H//2
+        for x, y, w, h in repaint:
+            assert x+w <= W and y+h <= H
+
     def test_csum_data(self):
         a1=[
             5992220345606009987, 15040563112965825180, 420530012284267555, 3380071419019115782, 14243596304267993264, 834861281570233459, 10803583843784306120, 1379296002677236226,
@@ -224,6 +274,29 @@ class TestMotion(unittest.TestCase):
                     count, scroll, y, line, h)
                 scrolls.append((x, y+line, w, count, 0, scroll))
 
+    def test_perf(self):
+        if not SHOW_PERF:
+            return
+        W, H = 3840, 2160
+        rows = self.make_picture(W, H)
+        sd = motion.ScrollData(0, 0, W, H)
+        sd.update(b"".join(rows), 0, 0, W, H, W*4, 4)
+        start = monotonic()
+        sd.update(b"".join(rows[50:]+rows[:50]), 0, 0, W, H, W*4, 4)
+        log.info("hashed %ix%i in %5.1f ms" % (W, H, (monotonic()-start)*1000))
+        for name, fn in {
+            "scan": sd.calculate_scan,
+            "hash index": sd.calculate,
+        }.items():
+            N = 10
+            start = monotonic()
+            for _ in range(N):
+                fn(1000)
+            log.info("%-12s distances for %i lines in %5.1f ms" % (name, H, (monotonic()-start)*1000/N))
+        start = monotonic()
+        sd.get_scroll_areas()
+        log.info("scroll areas in %5.1f ms" % ((monotonic()-start)*1000))
+
 
 def main():
     if motion:
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+
+from xpra.server.shadow import damage
+from xpra.server.shadow.damage import ShadowDamage
+
+
+class TestShadowDamage(unittest.TestCase):
+
+    def test_damage(self):
+        sd = ShadowDamage()
+        # everything must be refreshed the first time around:
+        sd.damage(0, 0, 10, 10)
+        assert sd.take() is None
+        # then nothing, until we get damage events:
+        assert sd.take() == []
+        sd.damage(0, 0, 10, 10)
+        sd.damage(5, 5, 10, 10)
+        sd.damage(0, 0, 5, 5)
+        areas = sd.take()
+        assert areas
+        assert sum(r.width * r.height for r in areas) >= 175
+        assert all(r.x >= 0 and r.y >= 0 and r.x + r.width <= 15 and r.y + r.height <= 15 for r in areas)
+        assert sd.take() == []
+        info = sd.get_info()
+        assert info["events"] == 4
+        assert info["skipped"] == 2
+        sd.invalidate()
+        assert sd.take() is None
+
+    def test_many_rectangles(self):
+        sd = ShadowDamage()
+        sd.take()
+        for i in range(damage.MAX_RECTANGLES * 2):
+            sd.damage(i * 20, i * 20, 10, 10)
+        areas = sd.take()
+        assert len(areas) <= damage.MAX_RECTANGLES
+        # everything is still covered:
+        last = (damage.MAX_RECTANGLES * 2 - 1) * 20
+        assert any(r.contains(last, last, 10, 10) for r in areas)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
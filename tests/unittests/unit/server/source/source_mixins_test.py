@@ -7,6 +7,7 @@
 import sys
 import unittest
 from io import BytesIO
+from time import sleep
 
 from gi.repository import GLib  # @UnresolvedImport
 
@@ -107,6 +108,51 @@ class SourceMixinsTest(unittest.TestCase):
         assert ClientConnection.is_needed(typedict()) is True
         #self._test_mixin_class(ClientConnection)
 
+    def test_encode_threads(self):
+        from xpra.server.source.client_connection import ClientConnection
+        protocol = AdHocStruct()
+        protocol.source_has_more = lambda: None
+        protocol.set_packet_source = lambda _fn: None
+        cc = ClientConnection(protocol, None, "test", None, "", (), False, 0, False)
+        server = AdHocStruct()
+        server.encode_threads = 3
+        cc.init_from(protocol, server)
+        cc.init_state()
+        out = []
+        for i in range(100):
+            for wid in (1, 2, 3, 4):
+                cc.call_in_encode_thread(False, out.append, (wid, i), wid=wid)
+        cc.queue_encode(None)
+        for thread in cc.encode_thread_list:
+            thread.join()
+        #each window's work items must be processed in order:
+        for wid in (1, 2, 3, 4):
+            assert [i for w, i in out if w==wid]==list(range(100))
+
+    def test_encode_barrier(self):
+        from xpra.server.source.client_connection import ClientConnection
+        protocol = AdHocStruct()
+        protocol.source_has_more = lambda: None
+        protocol.set_packet_source = lambda _fn: None
+        cc = ClientConnection(protocol, None, "test", None, "", (), False, 0, False)
+        server = AdHocStruct()
+        server.encode_threads = 4
+        cc.init_from(protocol, server)
+        cc.init_state()
+        out = []
+        for wid in (1, 2, 3, 4):
+            cc.call_in_encode_thread(False, sleep, 0.05 * wid, wid=wid)
+            cc.call_in_encode_thread(False, out.append, wid, wid=wid)
+        cc.queue_encode_barrier(lambda: out.append("barrier"))
+        cc.queue_encode(None)
+        for thread in cc.encode_thread_list:
+            if thread:
+                thread.join()
+        #the barrier function runs once, after all the work items queued before it:
+        assert out.count("barrier")==1
+        assert out[-1]=="barrier"
+        assert sorted(out[:-1])==[1, 2, 3, 4]
+
     def test_clipboard(self):
         from xpra.server.source.clipboard import ClipboardConnection
         for fix in (False, True):
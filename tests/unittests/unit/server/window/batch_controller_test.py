@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+from time import monotonic
+
+from xpra.server.window.batch_config import DamageBatchConfig
+from xpra.server.window.batch_controller import PredictiveBatchController
+
+
+class TestBatchController(unittest.TestCase):
+
+    def run_model(self, send_rate: int, damage_rate: int, updates: int = 20):
+        bc = DamageBatchConfig()
+        controller = PredictiveBatchController(100)
+        size = (1000, 1000)
+        for _ in range(updates):
+            now = monotonic()
+            pixels = 100 * 100
+            bytecount = pixels // 2
+            controller.record_encode(pixels, bytecount, pixels / 100_000_000)
+            decode_time = pixels / 200_000_000
+            elapsed = 0.005 + decode_time + bytecount / send_rate
+            controller.record_ack(pixels, bytecount, int(decode_time * 1000 * 1000), elapsed, 0.005)
+            # damage events are spread over the last second:
+            n = damage_rate // pixels
+            events = tuple((now - i / max(1, n), 0, 0, 100, 100) for i in range(n))
+            controller.update(bc, size, events)
+        return bc, controller
+
+    def test_idle(self):
+        bc, controller = self.run_model(10_000_000, 0)
+        assert bc.delay == bc.min_delay
+        assert controller.predicted_latency < 0.1
+        assert controller.get_target_quality(0)[1] == 100
+        info = controller.get_info()
+        assert info["latency-goal"] == 100
+        assert info["samples"]["ack"] == 20
+
+    def test_converges(self):
+        # a busy window on a slow link must batch more,
+        # and trade quality for speed:
+        bc, controller = self.run_model(500_000, 1_000_000)
+        fast_bc, fast_controller = self.run_model(100_000_000, 1_000_000)
+        assert bc.delay > fast_bc.delay
+        assert controller.get_target_quality(0)[1] < fast_controller.get_target_quality(0)[1]
+        assert controller.get_target_speed(0)[1] > fast_controller.get_target_speed(0)[1]
+        # the model should settle instead of oscillating:
+        delay = bc.delay
+        for _ in range(5):
+            now = monotonic()
+            events = tuple((now - i / 100, 0, 0, 100, 100) for i in range(100))
+            controller.update(bc, (1000, 1000), events)
+            assert abs(bc.delay - delay) <= max(2, delay // 10)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
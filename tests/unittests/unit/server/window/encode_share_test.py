@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+from threading import Thread
+
+from xpra.codecs.image import ImageWrapper
+from xpra.server.window.encode_share import EncodeShare
+
+
+def make_image(pixels=b"0"*4*16*16):
+    return ImageWrapper(0, 0, 16, 16, pixels, "BGRX", 24, 16*4, 4)
+
+
+class TestEncodeShare(unittest.TestCase):
+
+    def setUp(self):
+        self.share = EncodeShare()
+        if not self.share.hash_fn:
+            self.skipTest("no hash function available")
+        self.calls = []
+
+    def encode(self, coding, image, options):
+        self.calls.append(image)
+        return coding, b"data", {"foo": "bar"}, image.get_width(), image.get_height(), 0, 24
+
+    def test_single_viewer(self):
+        self.share.add_viewer(1)
+        for _ in range(2):
+            self.share.encode(1, self.encode, "png", make_image(), {})
+        assert len(self.calls)==2
+
+    def test_shared(self):
+        for _ in range(2):
+            self.share.add_viewer(1)
+        r1 = self.share.encode(1, self.encode, "png", make_image(), {"quality": 81})
+        r1[2]["flush"] = 1
+        #same pixels and quality band: no need to encode again
+        r2 = self.share.encode(1, self.encode, "png", make_image(), {"quality": 85})
+        assert len(self.calls)==1
+        assert r2[1]==r1[1]
+        assert "flush" not in r2[2]
+        #different encoding, different pixels or different quality band:
+        self.share.encode(1, self.encode, "webp", make_image(), {"quality": 85})
+        self.share.encode(1, self.encode, "png", make_image(b"1"*4*16*16), {"quality": 85})
+        self.share.encode(1, self.encode, "png", make_image(), {"quality": 50})
+        assert len(self.calls)==4
+        assert self.share.get_info()["hits"]==1
+        self.share.remove_viewer(1)
+        self.share.remove_viewer(1)
+        assert not self.share.results
+
+    def test_rgb_shared(self):
+        from xpra.codecs.argb.encoder import encode
+        for _ in range(2):
+            self.share.add_viewer(1)
+        options = {"rgb_formats": ("BGRX", ), "lz4": False}
+        r1 = self.share.encode(1, encode, "rgb32", make_image(), options)
+        r2 = self.share.encode(1, encode, "rgb32", make_image(), options)
+        assert r2[1] is r1[1]
+        info = self.share.get_info()
+        assert info["hits"]==info["misses"]==1
+
+    def test_concurrent_counters(self):
+        for _ in range(2):
+            self.share.add_viewer(1)
+
+        def encode_all():
+            for i in range(200):
+                self.share.encode(1, self.encode, "png", make_image(b"%i" % (i % 10) * 4*16*16), {})
+        threads = tuple(Thread(target=encode_all) for _ in range(4))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        info = self.share.get_info()
+        assert info["hits"] + info["misses"] + info["timeouts"]==800
+        assert info["misses"] + info["timeouts"]==len(self.calls)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+
+from xpra.server.window.iconcache import IconCache, content_hash
+
+
+class TestIconCache(unittest.TestCase):
+
+    def test_content_hash(self):
+        pixels = b"\xff" * 64
+        key = content_hash(pixels, 4, 4, "BGRA", (64, 64))
+        assert key == content_hash(memoryview(pixels), 4, 4, "BGRA", (64, 64))
+        # different pixels or parameters must give a different hash:
+        assert key != content_hash(b"\0" * 64, 4, 4, "BGRA", (64, 64))
+        assert key != content_hash(pixels, 4, 4, "BGRA", (32, 32))
+
+    def test_cache(self):
+        cache = IconCache(1024)
+        assert cache.get("foo") is None
+        cache.set("foo", 16, 16, b"png" * 10)
+        assert cache.get("foo") == (16, 16, b"png" * 10)
+        info = cache.get_info()
+        assert info["hits"] == info["misses"] == 1
+        assert info["size"] == 30
+        # replacing an entry updates the size:
+        cache.set("foo", 16, 16, b"png")
+        assert cache.get_info()["size"] == 3
+
+    def test_eviction(self):
+        cache = IconCache(1000)
+        for i in range(10):
+            cache.set(f"icon{i}", 8, 8, b"0" * 300)
+        info = cache.get_info()
+        assert info["size"] <= 1000
+        assert info["entries"] == 3
+        assert info["evictions"] == 7
+        assert cache.get("icon0") is None
+        assert cache.get("icon9")
+        # too big for the cache:
+        cache.set("big", 64, 64, b"0" * 2000)
+        assert cache.get("big") is None
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
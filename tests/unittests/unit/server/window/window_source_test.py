@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+
+from xpra.util.objects import typedict
+
+
+class FakeWindow:
+
+    def is_OR(self) -> bool:
+        return False
+
+    def is_tray(self) -> bool:
+        return False
+
+    def is_shadow(self) -> bool:
+        return False
+
+    def has_alpha(self) -> bool:
+        return False
+
+    def get_dimensions(self):
+        return 640, 480
+
+    def get(self, _prop, default=None):
+        return default
+
+    def get_property(self, prop):
+        return 24 if prop == "depth" else None
+
+    def get_dynamic_property_names(self):
+        return ()
+
+    def get_internal_property_names(self):
+        return ()
+
+    def connect(self, *_args):
+        return 0
+
+    def disconnect(self, _sid):
+        pass
+
+
+class TestWindowSource(unittest.TestCase):
+
+    def make_window_source(self, wid: int):
+        from xpra.server.window.compress import WindowSource
+        from xpra.server.window.batch_config import DamageBatchConfig
+        from xpra.server.source.source_stats import GlobalPerformanceStatistics
+        encodings = ("rgb24", "rgb32")
+        return WindowSource(
+            640, 480,
+            lambda *_args: None, lambda: 0,
+            lambda *_args, **_kwargs: None, lambda *_args, **_kwargs: None,
+            GlobalPerformanceStatistics(),
+            wid, FakeWindow(), DamageBatchConfig(), 0,
+            False, 0,
+            None,
+            None,
+            encodings, encodings,
+            "rgb24", encodings, encodings,
+            (),
+            typedict(), typedict(), None,
+            ("BGRX", ),
+            typedict(),
+            None, 0, 0, 0,
+        )
+
+    def test_viewers(self):
+        from xpra.server.window.encode_share import get_encode_share
+        share = get_encode_share()
+        ws1 = self.make_window_source(100)
+        assert ws1.wid == 100
+        assert share.viewers.get(100) == 1
+        ws2 = self.make_window_source(100)
+        assert share.viewers.get(100) == 2
+        assert ws2.encode_share is share
+        ws2.cleanup()
+        assert ws2.encode_share is None
+        assert share.viewers.get(100) == 1
+        # cleaning up again must not unregister another viewer:
+        ws2.cleanup()
+        assert share.viewers.get(100) == 1
+        ws1.cleanup()
+        assert 100 not in share.viewers
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
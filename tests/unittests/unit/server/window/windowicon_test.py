@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+from time import sleep
+from threading import Thread
+
+from xpra.util.objects import typedict, LRUCache
+from xpra.server.window.windowicon import WindowIconSource
+
+
+class IconSource(WindowIconSource):
+
+    def __init__(self, wid: int, client_icons: LRUCache, packets: list):
+        super().__init__(("png", ), typedict(), client_icons)
+        self.wid = wid
+        self.packets = packets
+
+    def queue_packet(self, packet, wait_for_more=False):
+        # give the other windows a chance to update the mirror before this packet is queued:
+        sleep(0)
+        self.packets.append(packet)
+
+
+class TestWindowIcon(unittest.TestCase):
+
+    def test_concurrent_icons(self):
+        client_icons = LRUCache(3)
+        packets = []
+        icons = tuple(f"png{i}".encode() * 10 for i in range(6))
+        sources = tuple(IconSource(wid, client_icons, packets) for wid in (1, 2))
+
+        def update_icons(source, offset):
+            for i in range(200):
+                source.window_icon_data = (16, 16, "png", icons[(i + offset) % len(icons)])
+                source.compress_and_send_window_icon()
+        threads = tuple(Thread(target=update_icons, args=(source, wid)) for wid, source in enumerate(sources))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(packets) == 400
+        # replay the packets in the order the client receives them,
+        # the server must only ever send the key of an icon the client still has:
+        cache = LRUCache(3)
+        for packet in packets:
+            coding = packet[4]
+            if coding == "cached":
+                key = packet[5]
+                assert cache.get(key), f"icon {key!r} is missing from the client cache"
+            else:
+                assert coding == "png"
+                cache.set(packet[6], packet[5])
+        assert set(cache.items) == set(client_icons.items)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
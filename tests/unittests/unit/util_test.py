@@ -6,7 +6,7 @@
 
 import unittest
 
-from xpra.util.objects import AtomicInteger, MutableInteger, typedict
+from xpra.util.objects import AtomicInteger, MutableInteger, LRUCache, typedict
 from xpra.util.screen import log_screen_sizes
 from xpra.util.str_fn import std, alnum, nonl, pver
 
@@ -60,6 +60,34 @@ class TestIntegerClasses(unittest.TestCase):
         self._test_IntegerClass(MutableInteger)
 
 
+class TestLRUCache(unittest.TestCase):
+
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        # "b" is now the least recently used:
+        cache.set("c", 3)
+        assert "b" not in cache
+        assert cache.get("b", -1) == -1
+        assert len(cache) == 2
+        assert cache.get("a") == 1 and cache.get("c") == 3
+
+    def test_mirror(self):
+        # two caches see the same sequence of calls, with or without values:
+        client = LRUCache(3)
+        server = LRUCache(3)
+        for key in "abcadeafbgc":
+            if key in server:
+                server.get(key)
+                assert client.get(key) == key.upper()
+            else:
+                server.set(key, True)
+                client.set(key, key.upper())
+        assert list(client.items.keys()) == list(server.items.keys())
+
+
 class TestTypedict(unittest.TestCase):
 
     def test_typedict(self):
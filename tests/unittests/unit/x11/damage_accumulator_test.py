@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+
+from xpra.os_util import POSIX, OSX
+
+try:
+    from xpra.x11.gtk.bindings import DamageAccumulator    #@UnresolvedImport
+except ImportError as e:
+    print(f"damage accumulator test skipped: {e}")
+else:
+
+    class TestDamageAccumulator(unittest.TestCase):
+
+        def test_contained(self):
+            acc = DamageAccumulator()
+            acc.add(1, 10, 0, 0, 100, 100)
+            # already covered by the first rectangle:
+            acc.add(1, 11, 10, 10, 10, 10)
+            event = acc.take()
+            assert event.rectangles == ((0, 0, 100, 100), )
+            assert event.serial == 11
+            assert event.damage == 1
+
+        def test_covering(self):
+            acc = DamageAccumulator()
+            acc.add(1, 1, 10, 10, 5, 5)
+            acc.add(1, 2, 20, 20, 5, 5)
+            acc.add(1, 3, 100, 100, 5, 5)
+            # replaces the first two rectangles:
+            acc.add(1, 4, 0, 0, 50, 50)
+            event = acc.take()
+            assert sorted(event.rectangles) == [(0, 0, 50, 50), (100, 100, 5, 5)]
+            # the bounding box of all the rectangles:
+            assert (event.x, event.y, event.width, event.height) == (0, 0, 105, 105)
+
+        def test_merge(self):
+            acc = DamageAccumulator()
+            for i in range(16):
+                acc.add(1, i, i * 100, 0, 10, 10)
+            # too many rectangles, so this one is merged with the closest:
+            acc.add(1, 16, 1512, 0, 10, 10)
+            event = acc.take()
+            assert len(event.rectangles) == 16
+            assert (1500, 0, 22, 10) in event.rectangles
+            info = acc.get_info()
+            assert info["events"] == 17
+            assert info["rectangles"] == 16
+            assert info["merged"] == 1
+            assert info["pending"] == 0
+
+        def test_take(self):
+            acc = DamageAccumulator()
+            assert acc.take() is None
+            acc.add(1, 1, 0, 0, 10, 10)
+            assert acc.get_info()["pending"] == 1
+            assert acc.take()
+            # nothing left:
+            assert acc.take() is None
+            acc.add(1, 2, 5, 5, 10, 10)
+            event = acc.take()
+            assert event.rectangles == ((5, 5, 10, 10), )
+            info = acc.get_info()
+            assert info["batches"] == 2
+            assert info["events"] == info["rectangles"] == 2
+
+
+def main():
+    #can only work with an X11 server
+    if POSIX and not OSX:
+        unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import unittest
+
+from unit.server_test_util import ServerTestUtil
+from xpra.util.objects import AdHocStruct
+from xpra.os_util import OSX, POSIX
+
+
+class TestX11WindowProperties(ServerTestUtil):
+
+    @classmethod
+    def setUpClass(cls):
+        ServerTestUtil.setUpClass()
+        display = cls.find_free_display()
+        cls.xvfb = cls.start_Xvfb(display)
+        os.environ["DISPLAY"] = display
+        os.environ["GDK_BACKEND"] = "x11"
+        from xpra.x11.bindings.posix_display_source import init_posix_display_source  #@UnresolvedImport
+        cls.display_ptr = init_posix_display_source()
+        from xpra.scripts.server import verify_gdk_display
+        verify_gdk_display(display)
+
+    @classmethod
+    def tearDownClass(cls):
+        from xpra.x11.bindings.posix_display_source import close_display_source  #@UnresolvedImport
+        close_display_source(cls.display_ptr)
+        ServerTestUtil.tearDownClass()
+        cls.xvfb.terminate()
+
+    def setUp(self):
+        super().setUp()
+        from xpra.x11.bindings.window import X11WindowBindings  #@UnresolvedImport
+        self.X11Window = X11WindowBindings()
+        self.xid = self.X11Window.CreateWindow(self.X11Window.get_root_xid(), 0, 0, 10, 10)
+
+    def tearDown(self):
+        self.X11Window.DestroyWindow(self.xid)
+        super().tearDown()
+
+    def test_batch(self):
+        from xpra.x11.gtk.prop import prop_set, raw_props_get, cached_prop_get
+        values = {
+            "_XPRA_TEST_STRING": ("latin1", "hello"),
+            "_XPRA_TEST_UTF8": ("utf8", "café"),
+            "_XPRA_TEST_CARDINAL": ("u32", 1234),
+            "_XPRA_TEST_CARDINALS": (["u32"], [1, 2, 3]),
+        }
+        for key, (ptype, value) in values.items():
+            prop_set(self.xid, key, ptype, value)
+        # all the properties are returned by a single request:
+        props = raw_props_get(self.xid, {key: 65536 for key in values})
+        assert set(props.keys()) == set(values.keys())
+        for key, (ptype, value) in values.items():
+            assert cached_prop_get(key, ptype, props[key]) == value
+        # the wrong type is rejected, just like `prop_get`:
+        assert cached_prop_get("_XPRA_TEST_CARDINAL", "latin1", props["_XPRA_TEST_CARDINAL"], True) is None
+
+    def test_missing(self):
+        from xpra.x11.gtk.prop import prop_set, raw_props_get, cached_prop_get
+        prop_set(self.xid, "_XPRA_TEST_PRESENT", "u32", 1)
+        props = raw_props_get(self.xid, {"_XPRA_TEST_PRESENT": 64, "_XPRA_TEST_MISSING": 64})
+        assert props["_XPRA_TEST_MISSING"] is None
+        assert cached_prop_get("_XPRA_TEST_MISSING", "u32", props["_XPRA_TEST_MISSING"], True) is None
+        assert cached_prop_get("_XPRA_TEST_PRESENT", "u32", props["_XPRA_TEST_PRESENT"]) == 1
+
+    def test_cache_invalidation(self):
+        from xpra.x11.gtk.prop import prop_set
+        from xpra.x11.models.core import CoreX11WindowModel, X11_PROPERTY_CACHE
+        if not X11_PROPERTY_CACHE:
+            return
+        # the subset of the window model state used by the property cache:
+        window = AdHocStruct()
+        window.xid = self.xid
+        window._setup_done = True
+        window._managed = True
+        window._x11_property_cache = {}
+        window._handle_property_change = lambda _name: None
+
+        def get():
+            return CoreX11WindowModel.prop_get(window, "_XPRA_TEST_CACHED", "u32")
+        prop_set(self.xid, "_XPRA_TEST_CACHED", "u32", 1)
+        assert get() == 1
+        assert "_XPRA_TEST_CACHED" in window._x11_property_cache
+        # changed behind the model's back, the cached value is still used:
+        prop_set(self.xid, "_XPRA_TEST_CACHED", "u32", 2)
+        assert get() == 1
+        # until we get the `PropertyNotify` event:
+        event = AdHocStruct()
+        event.window = self.xid
+        event.atom = "_XPRA_TEST_CACHED"
+        CoreX11WindowModel.do_x11_property_notify_event(window, event)
+        assert "_XPRA_TEST_CACHED" not in window._x11_property_cache
+        assert get() == 2
+        # setting the value through the model also invalidates the cache:
+        CoreX11WindowModel.prop_set(window, "_XPRA_TEST_CACHED", "u32", 3)
+        assert get() == 3
+        CoreX11WindowModel.prop_del(window, "_XPRA_TEST_CACHED")
+        assert get() is None
+
+
+def main():
+    #can only work with an X11 server
+    if POSIX and not OSX:
+        unittest.main()
+
+
+if __name__ == '__main__':
+    main()
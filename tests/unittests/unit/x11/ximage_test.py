@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+from threading import Thread
+
+from unit.server_test_util import ServerTestUtil
+from xpra.os_util import POSIX, OSX
+
+
+class TestXShm(ServerTestUtil):
+
+    def setUp(self):
+        super().setUp()
+        self.display = self.find_free_display()
+        self.xvfb = self.start_Xvfb(self.display)
+
+    def tearDown(self):
+        self.xvfb.terminate()
+        super().tearDown()
+
+    def with_xshm(self, test_fn):
+        from xpra.x11.bindings.posix_display_source import X11DisplayContext    #@UnresolvedImport
+        from xpra.x11.bindings.ximage import XImageBindings    #@UnresolvedImport
+        with X11DisplayContext(self.display):
+            X11 = XImageBindings()
+            root = X11.get_root_xid()
+            xshm = X11.get_XShmWrapper(root)
+            assert xshm.setup()[0], "XShm setup failed"
+            try:
+                test_fn(xshm, root)
+            finally:
+                xshm.cleanup()
+
+    def test_segment_pool(self):
+        from xpra.x11.bindings import ximage    #@UnresolvedImport
+        pool_size = ximage.XSHM_POOL_SIZE
+
+        def check_pool(xshm, root):
+            # without a discard, the same capture is re-used:
+            images = [xshm.get_image(root, 0, 0, 64, 64) for _ in range(3)]
+            info = xshm.get_info()
+            assert info["images"] == 3
+            assert info["captures"] == 1 and info["reused"] == 2
+            assert info["pool"]["size"] == info["pool"]["in-use"] == 1
+            # new captures go to the next segment while the previous ones are still referenced:
+            for i in range(1, pool_size):
+                xshm.discard()
+                images.append(xshm.get_image(root, 0, 0, 64, 64))
+                assert xshm.get_info()["pool"]["in-use"] == i + 1
+            if pool_size > 1:
+                xshm.discard()
+                assert xshm.get_image(root, 0, 0, 64, 64) is None, "all the segments should be in use"
+                assert xshm.get_info()["pool"]["exhausted"] == 1
+            for image in images:
+                image.free()
+            info = xshm.get_info()
+            assert info["images"] == 0
+            assert info["pool"]["in-use"] == 0
+            # the segments can now be re-used:
+            xshm.discard()
+            image = xshm.get_image(root, 0, 0, 64, 64)
+            assert image
+            assert xshm.get_info()["pool"]["size"] == pool_size
+            image.free()
+        self.with_xshm(check_pool)
+
+    def test_free_from_threads(self):
+        from xpra.x11.bindings import ximage    #@UnresolvedImport
+
+        def free_after_cleanup(xshm, root):
+            images = []
+            for _ in range(ximage.XSHM_POOL_SIZE):
+                xshm.discard()
+                images += [xshm.get_image(root, 0, 0, 32, 32) for _ in range(10)]
+            # the images are still referenced, so the segments can't be freed yet:
+            xshm.cleanup()
+            assert xshm.get_info()["pool"]["size"] == ximage.XSHM_POOL_SIZE
+            # the encode threads free the images concurrently:
+            threads = tuple(Thread(target=lambda l=images[i::4]: [image.free() for image in l]) for i in range(4))
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            info = xshm.get_info()
+            assert info["images"] == 0
+            assert info["pool"]["size"] == 0
+            assert len(ximage.pending_segments) == ximage.XSHM_POOL_SIZE
+            # the pending segments are freed from the UI thread:
+            xshm.cleanup()
+            assert not ximage.pending_segments
+        self.with_xshm(free_after_cleanup)
+
+
+def main():
+    #can only work with an X11 server
+    if POSIX and not OSX:
+        try:
+            from xpra.x11.bindings import ximage    #@UnresolvedImport
+            assert ximage
+        except ImportError as e:
+            print(f"ximage test skipped: {e}")
+        else:
+            unittest.main()
+
+
+if __name__ == '__main__':
+    main()
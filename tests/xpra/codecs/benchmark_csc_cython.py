@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import sys
+from time import monotonic
+
+from xpra.util.objects import typedict
+from xpra.codecs.checks import make_test_image
+from xpra.codecs.csc_cython import converter  # @UnresolvedImport
+
+N = 10
+CONVERSIONS = (
+    ("BGRX", "YUV420P"),
+    ("BGRX", "YUV444P"),
+    ("YUV420P", "BGRX"),
+    ("GBRP", "BGRX"),
+    ("r210", "YUV420P"),
+    ("r210", "YUV444P10"),
+)
+
+
+def measure(src_format: str, dst_format: str, width: int, height: int, threads: int) -> float:
+    csc = converter.Converter()
+    csc.init_context(width, height, src_format, width, height, dst_format, typedict({"threads": threads}))
+    image = make_test_image(src_format, width, height)
+    # warmup:
+    csc.convert_image(image).free()
+    start = monotonic()
+    for _ in range(N):
+        csc.convert_image(image).free()
+    end = monotonic()
+    csc.clean()
+    return width * height * N / (end - start)
+
+
+def main(argv):
+    width, height = 3840, 2160
+    if len(argv) > 1:
+        width, height = (int(v) for v in argv[1].split("x"))
+    thread_counts = sorted(set((1, 2, 4, os.cpu_count() or 1)))
+    if len(argv) > 2:
+        thread_counts = tuple(int(v) for v in argv[2].split(","))
+    print("%ix%i, threads=%s" % (width, height, thread_counts))
+    for src_format, dst_format in CONVERSIONS:
+        results = []
+        for threads in thread_counts:
+            mps = measure(src_format, dst_format, width, height, threads)
+            results.append("%2i threads: %5i MPixels/s" % (threads, mps // 1024 // 1024))
+        print("%8s to %-10s : %s" % (src_format, dst_format, ",  ".join(results)))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -12,14 +12,24 @@
 #    which will be freed when the python object is garbage collected
 #    (also uses memalign to allocate the buffer)
 # 2) object to buffer conversion utility functions,
+# 3) a pool of buffers, grouped in power of two size classes,
+#    so that steady-state encoding pipelines can re-use the same buffers
+#    instead of calling posix_memalign / free for every frame
 
 #cython: wraparound=False
 
+from typing import Any, Dict
+
 from cpython.buffer cimport PyBuffer_FillInfo    # pylint: disable=syntax-error
+from cpython.pythread cimport (
+    PyThread_type_lock, PyThread_allocate_lock, PyThread_acquire_lock, PyThread_release_lock, WAIT_LOCK,
+)
 from libc.stdlib cimport free
 from libc.string cimport memset, memcpy
 from libc.stdint cimport uintptr_t
 
+from xpra.util.env import envint
+
 
 cdef extern from "Python.h":
     int PyObject_GetBuffer(object obj, Py_buffer *view, int flags)
@@ -35,18 +45,89 @@ cdef void free_buf(const void *p, size_t l, void *arg) noexcept nogil:
     free(<void *>p)
 
 
-cdef MemBuf getbuf(size_t l, int readonly=1):
-    cdef const void *p = xmemalign(l)
+cdef enum:
+    POOL_MIN_SHIFT = 8      #the smallest size class is 256 bytes
+    POOL_CLASSES = 20       #and the largest is 128MB
+    POOL_SLOTS = 8          #maximum number of free buffers kept per size class
+
+#maximum amount of memory held in free buffers, in MB (0 disables the pool):
+cdef size_t POOL_BUDGET = max(0, envint("XPRA_MEMBUF_POOL_SIZE", 64))*1024*1024
+#larger buffers are always allocated and freed directly, in MB:
+cdef size_t POOL_MAX_BUFFER = min(max(0, envint("XPRA_MEMBUF_POOL_MAX_BUFFER", 16))*1024*1024,
+                                  (<size_t> 1) << (POOL_MIN_SHIFT+POOL_CLASSES-1))
+
+cdef PyThread_type_lock pool_lock = PyThread_allocate_lock()
+cdef void *pool_slots[POOL_CLASSES][POOL_SLOTS]
+cdef unsigned int pool_count[POOL_CLASSES]
+cdef size_t pool_retained = 0
+cdef unsigned long long pool_hits = 0
+cdef unsigned long long pool_misses = 0
+cdef unsigned long long pool_recycled = 0
+cdef unsigned long long pool_released = 0
+
+
+cdef inline size_t class_size(unsigned int c) noexcept nogil:
+    return (<size_t> 1) << (POOL_MIN_SHIFT+c)
+
+
+cdef inline unsigned int size_class(size_t size) noexcept nogil:
+    cdef unsigned int c = 0
+    while class_size(c)<size:
+        c += 1
+    return c
+
+
+cdef void free_pool_buf(const void *p, size_t l, void *arg) noexcept nogil:
+    global pool_retained, pool_recycled, pool_released
+    cdef unsigned int c = <unsigned int> (<uintptr_t> arg)
+    cdef size_t size = class_size(c)
+    cdef int pooled = 0
+    PyThread_acquire_lock(pool_lock, WAIT_LOCK)
+    if pool_count[c]<POOL_SLOTS and pool_retained+size<=POOL_BUDGET:
+        pool_slots[c][pool_count[c]] = <void *> p
+        pool_count[c] += 1
+        pool_retained += size
+        pool_recycled += 1
+        pooled = 1
+    else:
+        pool_released += 1
+    PyThread_release_lock(pool_lock)
+    if not pooled:
+        free(<void *> p)
+
+
+cdef MemBuf allocbuf(size_t l, size_t size, int readonly):
+    global pool_retained, pool_hits, pool_misses
+    cdef const void *p = NULL
+    cdef unsigned int c
+    if POOL_BUDGET==0 or size>POOL_MAX_BUFFER:
+        p = xmemalign(size)
+        if p == NULL:
+            raise RuntimeError(f"failed to allocate {l} bytes of memory")
+        return MemBuf_init(p, l, &free_buf, NULL, readonly)
+    c = size_class(size)
+    PyThread_acquire_lock(pool_lock, WAIT_LOCK)
+    if pool_count[c]>0:
+        pool_count[c] -= 1
+        p = pool_slots[c][pool_count[c]]
+        pool_retained -= class_size(c)
+        pool_hits += 1
+    else:
+        pool_misses += 1
+    PyThread_release_lock(pool_lock)
     if p == NULL:
-        raise RuntimeError(f"failed to allocate {l} bytes of memory")
-    return MemBuf_init(p, l, &free_buf, NULL, readonly)
+        p = xmemalign(class_size(c))
+        if p == NULL:
+            raise RuntimeError(f"failed to allocate {l} bytes of memory")
+    return MemBuf_init(p, l, &free_pool_buf, <void *> (<uintptr_t> c), readonly)
+
+
+cdef MemBuf getbuf(size_t l, int readonly=1):
+    return allocbuf(l, l, readonly)
 
 
 cdef MemBuf padbuf(size_t l, size_t padding, int readonly=1):
-    cdef const void *p = xmemalign(l+padding)
-    if p == NULL:
-        raise RuntimeError(f"failed to allocate {l} bytes of memory")
-    return MemBuf_init(p, l, &free_buf, NULL, readonly)
+    return allocbuf(l, l+padding, readonly)
 
 
 cdef MemBuf makebuf(void *p, size_t l, int readonly=1):
@@ -63,6 +144,40 @@ def get_membuf(size_t l, int readonly=1) -> MemBuf:
     return getbuf(l, readonly)
 
 
+def get_membuf_pool_info() -> Dict[str, Any]:
+    cdef unsigned int c
+    PyThread_acquire_lock(pool_lock, WAIT_LOCK)
+    try:
+        return {
+            "budget"        : POOL_BUDGET,
+            "max-buffer"    : POOL_MAX_BUFFER,
+            "retained"      : pool_retained,
+            "buffers"       : sum(pool_count[c] for c in range(POOL_CLASSES)),
+            "hits"          : pool_hits,
+            "misses"        : pool_misses,
+            "recycled"      : pool_recycled,
+            "released"      : pool_released,
+            "classes"       : {class_size(c) : pool_count[c] for c in range(POOL_CLASSES) if pool_count[c]},
+        }
+    finally:
+        PyThread_release_lock(pool_lock)
+
+
+def clear_membuf_pool() -> None:
+    """
+    Frees all the buffers held in the pool.
+    """
+    global pool_retained
+    cdef unsigned int c
+    PyThread_acquire_lock(pool_lock, WAIT_LOCK)
+    for c in range(POOL_CLASSES):
+        while pool_count[c]>0:
+            pool_count[c] -= 1
+            free(pool_slots[c][pool_count[c]])
+    pool_retained = 0
+    PyThread_release_lock(pool_lock)
+
+
 cdef class MemBuf:
     def __len__(self):
         return self.l
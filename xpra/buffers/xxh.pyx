@@ -7,7 +7,9 @@
 # xxhash wrapper
 
 #cython: wraparound=False
-from libc.stdint cimport uint64_t
+from libc.stdint cimport uint64_t, uintptr_t
+
+from xpra.buffers.membuf cimport buffer_context  # pylint: disable=syntax-error
 
 cdef extern from "xxhash.h":
     ctypedef uint64_t XXH64_hash_t
@@ -15,3 +17,19 @@ cdef extern from "xxhash.h":
 
 cdef uint64_t xxh3(const void* data, size_t length) noexcept nogil:
     return XXH3_64bits(data, length)
+
+
+def hash64(data) -> int:
+    """
+        Returns the 64-bit xxh3 hash of a buffer,
+        for use from python code.
+    """
+    cdef const void *buf
+    cdef size_t length
+    cdef uint64_t value
+    with buffer_context(data) as bc:
+        buf = <const void *> (<uintptr_t> int(bc))
+        length = len(bc)
+        with nogil:
+            value = XXH3_64bits(buf, length)
+    return value
@@ -585,19 +585,22 @@ class GTKXpraClient(GObjectXpraClient, UIXpraClient):
             return
         filename = dialog.get_filename()
         filelog("file_upload_dialog_response: filename={filename!r}")
+        openit = v == Gtk.ResponseType.ACCEPT
         try:
             filesize = os.stat(filename).st_size
         except OSError:
             pass
         else:
-            if not self.check_file_size("upload", filename, filesize):
-                self.close_file_upload_dialog()
-                return
+            self.close_file_upload_dialog()
+            if self.check_file_size("upload", filename, filesize):
+                # local file, stream it from disk:
+                self.send_file(filename, "", None, filesize=filesize, openit=openit)
+            return
         gfile = dialog.get_file()
         self.close_file_upload_dialog()
         filelog(f"load_contents: filename={filename!r}, response={v}")
         cancellable = None
-        user_data = (filename, v == Gtk.ResponseType.ACCEPT)
+        user_data = (filename, openit)
         gfile.load_contents_async(cancellable, self.file_upload_ready, user_data)
 
     def file_upload_ready(self, gfile, result, user_data):
@@ -866,6 +869,7 @@ class GTKXpraClient(GObjectXpraClient, UIXpraClient):
             "greedy": True,  # we don't set a default window icon anymore
             "size": (64, 64),  # size we want
             "max_size": (128, 128),  # limit
+            "cache": self.icon_cache.size if self.icon_cache is not None else 0,
         }
         return capabilities
 
@@ -863,14 +863,40 @@ class WindowBackingBase:
     def paint_mmap(self, img_data, x: int, y: int, width: int, height: int, rowstride: int,
                    options: typedict, callbacks: PaintCallbacks) -> None:
         assert self.mmap_enabled
-        from xpra.net.mmap import mmap_read
-        data, free_cb = mmap_read(self.mmap, *img_data)
+        from xpra.net.mmap import mmap_read_rows
+        # discontiguous chunks are painted as separate row segments, without joining them:
+        segments, free_cb = mmap_read_rows(self.mmap, rowstride, *img_data)
         callbacks.append(free_cb)
         rgb_format = options.strget("rgb_format", "RGB")
         # Note: BGR(A) is only handled by gl.backing
         x, y = self.gravity_adjust(x, y, options)
-        self.ui_paint_rgb("mmap", rgb_format, data, x, y, width, height, width, height, rowstride,
-                          options, callbacks)
+        if len(segments) == 1:
+            data = segments[0][2]
+            self.ui_paint_rgb("mmap", rgb_format, data, x, y, width, height, width, height, rowstride,
+                              options, callbacks)
+            return
+        # the callbacks (including the one freeing the mmap space)
+        # must only fire once all the segments have been painted:
+        errors: list[str] = []
+
+        def segment_painted(success: int | bool, message="") -> None:
+            if not success:
+                errors.append(message)
+
+        def all_painted(success: int | bool, message="") -> None:
+            if success and errors:
+                success, message = False, errors[0]
+            fire_paint_callbacks(callbacks, success, message)
+
+        flush = options.intget("flush", 0)
+        for i, (row, rows, data) in enumerate(segments):
+            last = i == len(segments) - 1
+            seg_options = typedict(options)
+            # only present the window update once the last segment is painted:
+            seg_options["flush"] = flush if last else max(1, flush)
+            seg_callbacks = [all_painted if last else segment_painted]
+            self.ui_paint_rgb("mmap", rgb_format, data, x, y + row, width, rows, width, rows, rowstride,
+                              seg_options, seg_callbacks)
 
     def paint_scroll(self, img_data, options: typedict, callbacks: PaintCallbacks) -> None:
         log("paint_scroll%s", (img_data, options, callbacks))
@@ -39,6 +39,7 @@ class MmapClient(StubClientMixin):
         self.mmap_tempfile = None
         self.mmap_delete: bool = False
         self.mmap_supported: bool = True
+        self.mmap_slots: bool = False
 
     def init(self, opts) -> None:
         self.mmap_group = opts.mmap_group
@@ -82,6 +83,8 @@ class MmapClient(StubClientMixin):
                     return False
                 log.error(" mmap is disabled")
                 return True
+            self.mmap_slots = c.boolget("slots")
+            log("mmap slots=%s", self.mmap_slots)
             log.info("enabled fast mmap transfers using %sB shared memory area", std_unit(self.mmap_size, unit=1024))
         # the server will have a handle on the mmap file by now, safe to delete:
         if not KEEP_MMAP_FILE:
@@ -99,6 +102,7 @@ class MmapClient(StubClientMixin):
         }
 
     def get_raw_caps(self) -> dict[str, Any]:
+        from xpra.net.mmap import SLOTS  # pylint: disable=import-outside-toplevel
         return {
             "file": self.mmap_filename,
             "size": self.mmap_size,
@@ -106,6 +110,7 @@ class MmapClient(StubClientMixin):
             "token_index": self.mmap_token_index,
             "token_bytes": self.mmap_token_bytes,
             "group": self.mmap_group or "",
+            "slots": SLOTS,
         }
 
     def init_mmap(self, mmap_filename, mmap_group, socket_filename) -> None:
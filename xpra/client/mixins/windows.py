@@ -34,7 +34,7 @@ from xpra.util.thread import start_thread
 from xpra.util.str_fn import std, bytestostr, strtobytes, memoryview_to_bytes
 from xpra.os_util import OSX, POSIX, gi_import
 from xpra.util.system import is_Ubuntu, is_Wayland
-from xpra.util.objects import typedict, make_instance
+from xpra.util.objects import typedict, make_instance, LRUCache
 from xpra.util.str_fn import repr_ellipsized
 from xpra.util.env import envint, envbool, first_time
 from xpra.client.base.stub_client_mixin import StubClientMixin
@@ -60,6 +60,8 @@ SMOOTH_SCROLL: bool = envbool("XPRA_SMOOTH_SCROLL", True)
 PAINT_FAULT_RATE: int = envint("XPRA_PAINT_FAULT_INJECTION_RATE")
 PAINT_FAULT_TELL: bool = envbool("XPRA_PAINT_FAULT_INJECTION_TELL", True)
 PAINT_DELAY: int = envint("XPRA_PAINT_DELAY", -1)
+# the draw packets of each window are always decoded by the same thread:
+DRAW_THREADS: int = max(1, envint("XPRA_DRAW_THREADS", 1))
 
 WM_CLASS_CLOSEEXIT: list[str] = os.environ.get("XPRA_WM_CLASS_CLOSEEXIT", "Xephyr").split(",")
 TITLE_CLOSEEXIT: list[str] = os.environ.get("XPRA_TITLE_CLOSEEXIT", "Xnest").split(",")
@@ -82,6 +84,9 @@ ICON_OVERLAY: int = envint("XPRA_ICON_OVERLAY", 50)
 ICON_SHRINKAGE: int = envint("XPRA_ICON_SHRINKAGE", 75)
 SAVE_WINDOW_ICONS: bool = envbool("XPRA_SAVE_WINDOW_ICONS", False)
 SAVE_CURSORS: bool = envbool("XPRA_SAVE_CURSORS", False)
+# number of window icons and cursors we keep so the server can just send their hash:
+ICON_CACHE: int = envint("XPRA_CLIENT_ICON_CACHE", 64)
+CURSOR_CACHE: int = envint("XPRA_CLIENT_CURSOR_CACHE", 32)
 POLL_POINTER = envint("XPRA_POLL_POINTER", 0)
 
 DRAW_LOG_FMT = "process_draw: %7i %8s for window %3i, sequence %8i, %4ix%-4i at %4i,%-4i" \
@@ -246,8 +251,12 @@ class WindowClient(StubClientMixin):
         self.min_window_size: tuple[int, int] = (0, 0)
         self.max_window_size: tuple[int, int] = (0, 0)
 
-        # draw thread:
-        self._draw_queue = SimpleQueue()
+        # draw threads:
+        self._draw_queues: list[SimpleQueue] = [SimpleQueue() for _ in range(DRAW_THREADS)]
+        self._draw_queue = self._draw_queues[0]
+        # each window uses the same draw queue until it is destroyed:
+        self._draw_queue_index: dict[int, int] = {}
+        self._draw_threads: list[Thread] = []
         self._draw_thread: Thread | None = None
         self._draw_counter: int = 0
 
@@ -278,6 +287,8 @@ class WindowClient(StubClientMixin):
         self.client_supports_bell: bool = False
         self.cursors_enabled: bool = False
         self.default_cursor_data = None
+        self.icon_cache: LRUCache | None = LRUCache(ICON_CACHE) if ICON_CACHE > 0 else None
+        self.cursor_cache: LRUCache | None = LRUCache(CURSOR_CACHE) if CURSOR_CACHE > 0 else None
         self.server_bell: bool = False
         self.bell_enabled: bool = False
 
@@ -392,8 +403,11 @@ class WindowClient(StubClientMixin):
         return conn
 
     def run(self) -> ExitValue:
-        # we decode pixel data in this thread
-        self._draw_thread = start_thread(self._draw_thread_loop, "draw")
+        # we decode pixel data in these threads
+        for index in range(len(self._draw_queues)):
+            name = "draw" if index == 0 else f"draw-{index}"
+            self._draw_threads.append(start_thread(self._draw_thread_loop, name, args=(index, )))
+        self._draw_thread = self._draw_threads[0]
         if FAKE_SUSPEND_RESUME:
             GLib.timeout_add(FAKE_SUSPEND_RESUME * 1000, self.suspend)
             GLib.timeout_add(FAKE_SUSPEND_RESUME * 1000 * 2, self.resume)
@@ -401,21 +415,20 @@ class WindowClient(StubClientMixin):
 
     def cleanup(self) -> None:
         log("WindowClient.cleanup()")
-        # tell the draw thread to exit:
-        dq = self._draw_queue
-        if dq:
+        # tell the draw threads to exit:
+        for dq in self._draw_queues:
             dq.put(None)
         # the protocol has been closed, it is now safe to close all the windows:
         # (cleaner and needed when we run embedded in the client launcher)
         self.destroy_all_windows()
         self.cancel_lost_focus_timer()
         self.cancel_poll_pointer_timer()
-        if dq:
+        for dq in self._draw_queues:
             dq.put(None)
-        dt = self._draw_thread
-        log("WindowClient.cleanup() draw thread=%s, alive=%s", dt, dt and dt.is_alive())
-        if dt and dt.is_alive():
-            dt.join(0.1)
+        for dt in self._draw_threads:
+            log("WindowClient.cleanup() draw thread=%s, alive=%s", dt, dt.is_alive())
+            if dt.is_alive():
+                dt.join(0.1)
         log("WindowClient.cleanup() done")
 
     def set_modal_windows(self, modal_windows) -> None:
@@ -465,6 +478,9 @@ class WindowClient(StubClientMixin):
             },
             "named_cursors": False,
             "cursors": self.client_supports_cursors,
+            "cursor": {
+                "cache": CURSOR_CACHE,
+            },
             "double_click": {
                 "time": get_double_click_time(),
                 "distance": get_double_click_distance(),
@@ -651,9 +667,9 @@ class WindowClient(StubClientMixin):
     ######################################################################
     # cursor:
     def _process_cursor(self, packet: PacketType) -> None:
-        if not self.cursors_enabled:
-            return
         if len(packet) == 2:
+            if not self.cursors_enabled:
+                return
             # marker telling us to use the default cursor:
             new_cursor = packet[1]
             setdefault = False
@@ -666,6 +682,20 @@ class WindowClient(StubClientMixin):
             setdefault = encoding.startswith("default:")
             if setdefault:
                 encoding = encoding.split(":")[1]
+            if len(new_cursor) >= 14 and self.cursor_cache is not None:
+                # the server mirrors our cache, so we must update it even when cursors are disabled:
+                key = str(new_cursor[13])
+                if encoding == "cached":
+                    cached = self.cursor_cache.get(key)
+                    if not cached:
+                        cursorlog.warn(f"Warning: cursor {key!r} is missing from the cache")
+                        return
+                    encoding, new_cursor[8] = cached
+                    cursorlog(f"using cached {encoding} cursor {key!r}")
+                else:
+                    self.cursor_cache.set(key, (encoding, memoryview_to_bytes(new_cursor[8])))
+            if not self.cursors_enabled:
+                return
             new_cursor[0] = encoding
             if encoding == "png":
                 pixels = new_cursor[8]
@@ -1267,6 +1297,15 @@ class WindowClient(StubClientMixin):
 
     def _process_window_icon(self, packet: PacketType) -> None:
         wid, w, h, coding, data = packet[1:6]
+        if self.icon_cache is not None:
+            if coding == "cached":
+                cached = self.icon_cache.get(str(data))
+                if not cached:
+                    iconlog.warn(f"Warning: window icon {data!r} is missing from the cache")
+                    return
+                coding, data = cached
+            elif len(packet) > 6:
+                self.icon_cache.set(str(packet[6]), (coding, memoryview_to_bytes(data)))
         img = self._window_icon_image(wid, w, h, coding, data)
         window = self._id_to_window.get(wid)
         iconlog("_process_window_icon(%s, %s, %s, %s, %s bytes) image=%s, window=%s",
@@ -1396,6 +1435,7 @@ class WindowClient(StubClientMixin):
     def destroy_window(self, wid: int, window) -> None:
         log("destroy_window(%s, %s)", wid, window)
         window.destroy()
+        self._draw_queue_index.pop(wid, None)
         if self._window_with_grab == wid:
             log("destroying window %s which has grab, ungrabbing!", wid)
             self.window_ungrab()
@@ -1592,14 +1632,29 @@ class WindowClient(StubClientMixin):
 
     ######################################################################
     # painting windows:
+    def get_draw_queue(self, wid: int) -> SimpleQueue:
+        # mmap packets must be processed in the order they were written to the mmap area,
+        # so we can only use a single draw thread with mmap, unless it uses slots:
+        mmap_ring = getattr(self, "mmap_enabled", False) and not getattr(self, "mmap_slots", False)
+        if len(self._draw_queues) == 1 or mmap_ring:
+            return self._draw_queue
+        index = self._draw_queue_index.get(wid)
+        if index is None:
+            # use the queue which has the fewest windows:
+            assigned = tuple(self._draw_queue_index.values())
+            index = min(range(len(self._draw_queues)), key=assigned.count)
+            index = self._draw_queue_index.setdefault(wid, index)
+        return self._draw_queues[index]
+
     def _process_draw(self, packet: PacketType) -> None:
+        dq = self.get_draw_queue(packet[1])
         if PAINT_DELAY >= 0:
-            GLib.timeout_add(PAINT_DELAY, self._draw_queue.put, packet)
+            GLib.timeout_add(PAINT_DELAY, dq.put, packet)
         else:
-            self._draw_queue.put(packet)
+            dq.put(packet)
 
     def _process_eos(self, packet: PacketType) -> None:
-        self._draw_queue.put(packet)
+        self.get_draw_queue(packet[1]).put(packet)
 
     def send_damage_sequence(self, wid: int, packet_sequence: int, width: int, height: int,
                              decode_time: int, message="") -> None:
@@ -1607,20 +1662,22 @@ class WindowClient(StubClientMixin):
         drawlog("sending ack: %s", packet)
         self.send_now(*packet)
 
-    def _draw_thread_loop(self):
+    def _draw_thread_loop(self, index=0):
+        dq = self._draw_queues[index]
         while self.exit_code is None:
-            packet = self._draw_queue.get()
+            packet = dq.get()
             if packet is None:
-                log("draw queue found exit marker")
+                log("draw queue %i found exit marker", index)
                 break
             with log.trap_error(f"Error processing {packet[0]} packet"):
                 self._do_draw(packet)
                 sleep(0)
-        self._draw_thread = None
-        log("draw thread ended")
+        if index == 0:
+            self._draw_thread = None
+        log("draw thread %i ended", index)
 
     def _do_draw(self, packet) -> None:
-        """ this runs from the draw thread above """
+        """ this runs from one of the draw threads above """
         wid = packet[1]
         window = self._id_to_window.get(wid)
         if bytestostr(packet[0]) == "eos":
@@ -1637,11 +1694,9 @@ class WindowClient(StubClientMixin):
             def draw_cleanup() -> None:
                 if coding == "mmap":
                     assert self.mmap_enabled
-                    from xpra.net.mmap import int_from_buffer
+                    from xpra.net.mmap import mmap_free
                     # we need to ack the data to free the space!
-                    data_start = int_from_buffer(self.mmap, 0)
-                    offset, length = data[-1]
-                    data_start.value = offset + length
+                    mmap_free(self.mmap, *data)
                     # clear the mmap area via idle_add so any pending draw requests
                     # will get a chance to run first (preserving the order)
                 self.send_damage_sequence(wid, packet_sequence, width, height, WINDOW_NOT_FOUND, "window not found")
@@ -11,7 +11,9 @@ import sys
 import time
 from typing import Any, Tuple, List, Dict
 from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor, wait
 
+from xpra.util.env import envint
 from xpra.util.objects import typedict
 from xpra.codecs.constants import CSCSpec, get_subsampling_divs
 from xpra.codecs.image import ImageWrapper
@@ -33,7 +35,7 @@ cdef extern from "Python.h":
 cdef extern from "stdlib.h":
     void free(void *ptr)
 
-cdef inline int roundup(int n, int m) noexcept:
+cdef inline int roundup(int n, int m) noexcept nogil:
     return (n + m - 1) & ~(m - 1)
 
 #precalculate indexes in native endianness:
@@ -53,6 +55,11 @@ else:
     BGR_R, BGR_G, BGR_B = (0, 1, 2)
     RGB_R, RGB_G, RGB_B = (2, 1, 0)
 
+# large frames are split into horizontal bands which are converted in parallel:
+THREADS = max(1, envint("XPRA_CSC_CYTHON_THREADS", min(4, max(1, os.cpu_count()//2))))
+# the smallest band worth handing over to another thread, in rows:
+MIN_BAND_ROWS = max(1, envint("XPRA_CSC_CYTHON_MIN_BAND_ROWS", 64))
+
 log("csc_cython: %s endian:", sys.byteorder)
 log("csc_cython: byteorder(BGRX)=%s", (BGRX_B, BGRX_G, BGRX_R, BGRX_X))
 log("csc_cython: byteorder(RGBX)=%s", (RGBX_R, RGBX_G, RGBX_B, RGBX_X))
@@ -89,13 +96,27 @@ COLORSPACES = {
 }
 
 
+band_pool = None
+
+
+def get_band_pool() -> ThreadPoolExecutor:
+    global band_pool
+    if band_pool is None:
+        band_pool = ThreadPoolExecutor(max_workers=max(1, THREADS-1), thread_name_prefix="csc-cython")
+    return band_pool
+
+
 def init_module() -> None:
-    #nothing to do!
-    log("csc_cython.init_module()")
+    log("csc_cython.init_module() threads=%i", THREADS)
 
 
 def cleanup_module() -> None:
     log("csc_cython.cleanup_module()")
+    global band_pool
+    pool = band_pool
+    if pool:
+        band_pool = None
+        pool.shutdown(wait=False)
 
 
 def get_type() -> str:
@@ -109,6 +130,7 @@ def get_version() -> Tuple[int, int]:
 def get_info() -> Dict[str, Any]:
     return {
         "version"   : (4, 1),
+        "threads"   : THREADS,
     }
 
 
@@ -132,10 +154,12 @@ def get_spec(in_colorspace: str, out_colorspace: str) -> CSCSpec:
     if in_colorspace=="YUV420P":
         #safer not to try to handle odd dimensions as input:
         width_mask = height_mask = 0xFFFE
-    #low score as this should be used as fallback only:
+    #low score as this should be used as fallback only,
+    #unless we can use multiple threads:
+    speed = min(50, 15*(THREADS-1))
     return CSCSpec(input_colorspace=in_colorspace, output_colorspace=out_colorspace,
                     codec_class=Converter, codec_type=get_type(),
-                    quality=50, speed=0, setup_cost=0, min_w=2, min_h=2,
+                    quality=50, speed=speed, setup_cost=0, min_w=2, min_h=2,
                     max_w=16*1024, max_h=16*1024,
                     can_scale=can_scale,
                     width_mask=width_mask, height_mask=height_mask)
@@ -452,6 +476,406 @@ cdef inline void YUV444P_to_RGBX_copy(uintptr_t rgbxdata,
                     )
 
 
+cdef struct csc_job:
+    uintptr_t src[3]
+    unsigned int src_stride[3]
+    uintptr_t dst[3]
+    unsigned int dst_stride[3]
+    unsigned int src_width
+    unsigned int src_height
+    unsigned int dst_width
+    unsigned int dst_height
+    uint8_t Bpp
+    #R, G, B and X:
+    uint8_t index[4]
+    unsigned char full_range
+
+#converts the rows from `start` to `end`:
+ctypedef void (*csc_band_fn)(const csc_job *job, unsigned int start, unsigned int end) noexcept nogil
+
+
+cdef class Band:
+    cdef csc_band_fn fn
+    cdef const csc_job *job
+    cdef unsigned int start
+    cdef unsigned int end
+
+    def __call__(self):
+        cdef csc_band_fn fn = self.fn
+        cdef const csc_job *job = self.job
+        cdef unsigned int start = self.start
+        cdef unsigned int end = self.end
+        with nogil:
+            fn(job, start, end)
+
+
+cdef void convert_bands(csc_band_fn fn, const csc_job *job, unsigned int rows,
+                        unsigned int threads, int release_gil):
+    """
+        Converts `rows` rows, using up to `threads` threads
+        and only releasing the GIL if `release_gil` is set.
+        The caller's own thread converts the first band.
+    """
+    cdef unsigned int bands = 1
+    if release_gil:
+        bands = max(1, min(threads, rows//MIN_BAND_ROWS))
+    if bands==1:
+        if release_gil:
+            with nogil:
+                fn(job, 0, rows)
+        else:
+            fn(job, 0, rows)
+        return
+    pool = get_band_pool()
+    futures = []
+    cdef Band band
+    cdef unsigned int i
+    cdef unsigned int end = rows//bands
+    try:
+        for i in range(1, bands):
+            band = Band()
+            band.fn = fn
+            band.job = job
+            band.start = rows*i//bands
+            band.end = rows*(i+1)//bands
+            futures.append(pool.submit(band))
+        with nogil:
+            fn(job, 0, end)
+        for future in futures:
+            future.result()
+    finally:
+        #the job data belongs to the caller, so we must wait for all the bands,
+        #even if we failed to submit some of them or if one of them raised an exception:
+        wait(futures)
+
+
+cdef void r210_to_BGR48_band(const csc_job *job, unsigned int start, unsigned int end) noexcept nogil:
+    r210_to_BGR48_copy(<unsigned short *> (job.dst[0] + start*job.dst_stride[0]),
+                       <const unsigned int *> (job.src[0] + start*job.src_stride[0]),
+                       job.dst_width, end-start,
+                       job.src_stride[0], job.dst_stride[0])
+
+
+cdef void gbrp10_to_r210_band(const csc_job *job, unsigned int start, unsigned int end) noexcept nogil:
+    cdef uintptr_t gbrp10[3]
+    cdef unsigned int i
+    for i in range(3):
+        gbrp10[i] = job.src[i] + start*job.src_stride[0]
+    gbrp10_to_r210_copy(job.dst[0] + start*job.dst_stride[0], gbrp10,
+                        job.dst_width, end-start,
+                        job.src_stride[0], job.dst_stride[0])
+
+
+cdef void r210_to_YUV444P10_band(const csc_job *job, unsigned int start, unsigned int end) noexcept nogil:
+    r210_to_YUV444P10_copy(<unsigned short *> (job.dst[0] + start*job.dst_stride[0]),
+                           <unsigned short *> (job.dst[1] + start*job.dst_stride[1]),
+                           <unsigned short *> (job.dst[2] + start*job.dst_stride[2]),
+                           job.src[0] + start*job.src_stride[0],
+                           job.dst_width, end-start,
+                           job.dst_stride[0], job.dst_stride[1], job.dst_stride[2],
+                           job.src_stride[0])
+
+
+cdef void YUV444P10_to_r210_band(const csc_job *job, unsigned int start, unsigned int end) noexcept nogil:
+    YUV444P10_to_r210_copy(job.dst[0] + start*job.dst_stride[0],
+                           <const unsigned short *> (job.src[0] + start*job.src_stride[0]),
+                           <const unsigned short *> (job.src[1] + start*job.src_stride[1]),
+                           <const unsigned short *> (job.src[2] + start*job.src_stride[2]),
+                           job.dst_width, end-start,
+                           job.dst_stride[0],
+                           job.src_stride[0], job.src_stride[1], job.src_stride[2])
+
+
+cdef void YUV444P_to_BGRX_band(const csc_job *job, unsigned int start, unsigned int end) noexcept nogil:
+    YUV444P_to_BGRX_copy(job.dst[0] + start*job.dst_stride[0],
+                         <const unsigned char *> (job.src[0] + start*job.src_stride[0]),
+                         <const unsigned char *> (job.src[1] + start*job.src_stride[1]),
+                         <const unsigned char *> (job.src[2] + start*job.src_stride[2]),
+                         job.dst_width, end-start,
+                         job.dst_stride[0],
+                         job.src_stride[0], job.src_stride[1], job.src_stride[2],
+                         job.full_range)
+
+
+cdef void YUV444P_to_RGBX_band(const csc_job *job, unsigned int start, unsigned int end) noexcept nogil:
+    YUV444P_to_RGBX_copy(job.dst[0] + start*job.dst_stride[0],
+                         <const unsigned char *> (job.src[0] + start*job.src_stride[0]),
+                         <const unsigned char *> (job.src[1] + start*job.src_stride[1]),
+                         <const unsigned char *> (job.src[2] + start*job.src_stride[2]),
+                         job.dst_width, end-start,
+                         job.dst_stride[0],
+                         job.src_stride[0], job.src_stride[1], job.src_stride[2],
+                         job.full_range)
+
+
+cdef void r210_to_YUV420P_band(const csc_job *job, unsigned int start, unsigned int end) noexcept nogil:
+    #each row of the job is a row of U and V values, and two rows of Y values:
+    cdef const unsigned int *input_r210 = <const unsigned int *> job.src[0]
+    cdef unsigned char *Y = <unsigned char *> job.dst[0]
+    cdef unsigned char *U = <unsigned char *> job.dst[1]
+    cdef unsigned char *V = <unsigned char *> job.dst[2]
+    cdef unsigned int input_stride = job.src_stride[0]
+    cdef unsigned int Ystride = job.dst_stride[0]
+    cdef unsigned int Ustride = job.dst_stride[1]
+    cdef unsigned int Vstride = job.dst_stride[2]
+    cdef unsigned int src_width = job.src_width
+    cdef unsigned int src_height = job.src_height
+    cdef unsigned int dst_width = job.dst_width
+    cdef unsigned int dst_height = job.dst_height
+    cdef uint8_t Bpp = job.Bpp
+    cdef unsigned int workw = roundup(dst_width, 2)//2
+    cdef unsigned int x,y,o
+    cdef unsigned int sx, sy, ox, oy
+    cdef unsigned int r210
+    cdef unsigned char R, G, B
+    cdef unsigned short Rsum, Gsum, Bsum
+    cdef unsigned char count, dx, dy
+    for y in range(start, end):
+        for x in range(workw):
+            Rsum = Gsum = Bsum = 0
+            count = 0
+            for dy in range(2):
+                oy = y*2 + dy
+                if oy>=dst_height:
+                    break
+                sy = oy*src_height//dst_height
+                for dx in range(2):
+                    ox = x*2 + dx
+                    if ox>=dst_width:
+                        break
+                    sx = ox*src_width//dst_width
+                    o = sy*input_stride + sx*Bpp
+                    r210 = input_r210[o//4]
+                    B = (r210&0x3ff00000) >> 22
+                    G = (r210&0x000ffc00) >> 12
+                    R = (r210&0x000003ff) >> 2
+                    o = oy*Ystride + ox
+                    Y[o] = clamp(YR * R + YG * G + YB * B + YC)
+                    count += 1
+                    Rsum += R
+                    Gsum += G
+                    Bsum += B
+            #write 1U and 1V:
+            if count>0:
+                U[y*Ustride + x] = clamp(UR * Rsum//count + UG * Gsum//count + UB * Bsum//count + UC)
+                V[y*Vstride + x] = clamp(VR * Rsum//count + VG * Gsum//count + VB * Bsum//count + VC)
+
+
+cdef void RGB_to_YUV420P_band(const csc_job *job, unsigned int start, unsigned int end) noexcept nogil:
+    #each row of the job is a row of U and V values, and two rows of Y values:
+    cdef const unsigned char *input_image = <const unsigned char *> job.src[0]
+    cdef unsigned char *Y = <unsigned char *> job.dst[0]
+    cdef unsigned char *U = <unsigned char *> job.dst[1]
+    cdef unsigned char *V = <unsigned char *> job.dst[2]
+    cdef unsigned int input_stride = job.src_stride[0]
+    cdef unsigned int Ystride = job.dst_stride[0]
+    cdef unsigned int Ustride = job.dst_stride[1]
+    cdef unsigned int Vstride = job.dst_stride[2]
+    cdef unsigned int src_width = job.src_width
+    cdef unsigned int src_height = job.src_height
+    cdef unsigned int dst_width = job.dst_width
+    cdef unsigned int dst_height = job.dst_height
+    cdef uint8_t Bpp = job.Bpp
+    cdef uint8_t Rindex = job.index[0]
+    cdef uint8_t Gindex = job.index[1]
+    cdef uint8_t Bindex = job.index[2]
+    cdef unsigned char full_range = job.full_range
+    cdef unsigned int workw = roundup(dst_width, 2)//2
+    cdef unsigned int x,y,o
+    cdef unsigned int sx, sy, ox, oy
+    cdef unsigned char R, G, B
+    cdef unsigned short Rsum, Gsum, Bsum
+    cdef unsigned char count, dx, dy
+    for y in range(start, end):
+        for x in range(workw):
+            Rsum = Gsum = Bsum = 0
+            count = 0
+            for dy in range(2):
+                oy = y*2 + dy
+                if oy>=dst_height:
+                    break
+                sy = oy*src_height//dst_height
+                for dx in range(2):
+                    ox = x*2 + dx
+                    if ox>=dst_width:
+                        break
+                    sx = ox*src_width//dst_width
+                    o = sy*input_stride + sx*Bpp
+                    R = input_image[o + Rindex]
+                    G = input_image[o + Gindex]
+                    B = input_image[o + Bindex]
+                    o = oy*Ystride + ox
+                    if full_range:
+                        Y[o] = clamp(YR * R + YG * G + YB * B + YC)
+                    else:
+                        Y[o] = clamp_studio_Y(YR * R + YG * G + YB * B + YC)
+                    count += 1
+                    Rsum += R
+                    Gsum += G
+                    Bsum += B
+            #write 1U and 1V:
+            if count>0:
+                Rsum /= count
+                Gsum /= count
+                Bsum /= count
+                if full_range:
+                    U[y*Ustride + x] = clamp(UR * Rsum + UG * Gsum + UB * Bsum + UC)
+                    V[y*Vstride + x] = clamp(VR * Rsum + VG * Gsum + VB * Bsum + VC)
+                else:
+                    U[y*Ustride + x] = clamp_studio_UV(UR * Rsum + UG * Gsum + UB * Bsum + UC)
+                    V[y*Vstride + x] = clamp_studio_UV(VR * Rsum + VG * Gsum + VB * Bsum + VC)
+
+
+cdef void RGB_to_YUV444P_band(const csc_job *job, unsigned int start, unsigned int end) noexcept nogil:
+    cdef const unsigned char *input_image = <const unsigned char *> job.src[0]
+    cdef unsigned char *Y = <unsigned char *> job.dst[0]
+    cdef unsigned char *U = <unsigned char *> job.dst[1]
+    cdef unsigned char *V = <unsigned char *> job.dst[2]
+    cdef unsigned int input_stride = job.src_stride[0]
+    cdef unsigned int Ystride = job.dst_stride[0]
+    cdef unsigned int Ustride = job.dst_stride[1]
+    cdef unsigned int Vstride = job.dst_stride[2]
+    cdef unsigned int src_width = job.src_width
+    cdef unsigned int src_height = job.src_height
+    cdef unsigned int dst_width = job.dst_width
+    cdef unsigned int dst_height = job.dst_height
+    cdef uint8_t Bpp = job.Bpp
+    cdef uint8_t Rindex = job.index[0]
+    cdef uint8_t Gindex = job.index[1]
+    cdef uint8_t Bindex = job.index[2]
+    cdef unsigned char full_range = job.full_range
+    cdef unsigned int x, y, o
+    cdef unsigned int sx, sy
+    cdef unsigned char R, G, B
+    for y in range(start, end):
+        for x in range(dst_width):
+            sx = x * src_width // dst_width
+            sy = y * src_height // dst_height
+            o = sy * input_stride + sx * Bpp
+            R = input_image[o + Rindex]
+            G = input_image[o + Gindex]
+            B = input_image[o + Bindex]
+            if full_range:
+                Y[y * Ystride + x] = clamp(YR * R + YG * G + YB * B + YC)
+                U[y * Ustride + x] = clamp(UR * R + UG * G + UB * B + UC)
+                V[y * Vstride + x] = clamp(VR * R + VG * G + VB * B + VC)
+            else:
+                Y[y * Ystride + x] = clamp_studio_Y(YR * R + YG * G + YB * B + YC)
+                U[y * Ustride + x] = clamp_studio_UV(UR * R + UG * G + UB * B + UC)
+                V[y * Vstride + x] = clamp_studio_UV(VR * R + VG * G + VB * B + VC)
+
+
+cdef void YUV420P_to_RGB_band(const csc_job *job, unsigned int start, unsigned int end) noexcept nogil:
+    #each row of the job is a row of U and V values, and two rows of Y values:
+    cdef const unsigned char *Ybuf = <const unsigned char *> job.src[0]
+    cdef const unsigned char *Ubuf = <const unsigned char *> job.src[1]
+    cdef const unsigned char *Vbuf = <const unsigned char *> job.src[2]
+    cdef unsigned char *output_image = <unsigned char *> job.dst[0]
+    cdef unsigned int Ystride = job.src_stride[0]
+    cdef unsigned int Ustride = job.src_stride[1]
+    cdef unsigned int Vstride = job.src_stride[2]
+    cdef unsigned int stride = job.dst_stride[0]
+    cdef unsigned int src_width = job.src_width
+    cdef unsigned int src_height = job.src_height
+    cdef unsigned int dst_width = job.dst_width
+    cdef unsigned int dst_height = job.dst_height
+    cdef uint8_t Bpp = job.Bpp
+    cdef uint8_t Rindex = job.index[0]
+    cdef uint8_t Gindex = job.index[1]
+    cdef uint8_t Bindex = job.index[2]
+    cdef uint8_t Xindex = job.index[3]
+
+    cdef unsigned char yc = Yc
+    cdef unsigned char uc = Uc
+    cdef unsigned char vc = Vc
+    cdef int ry = RY, ru = RU, rv = RV
+    cdef int gy = GY, gu = GU, gv = GV
+    cdef int by = BY, bu = BU, bv = BV
+    if not job.full_range:
+        yc = SYc
+        uc = SUc
+        vc = SVc
+        ry = SRY
+        ru = SRU
+        rv = SRV
+        gy = SGY
+        gu = SGU
+        gv = SGV
+        by = SBY
+        bu = SBU
+        bv = SBV
+
+    cdef unsigned int workw = roundup(dst_width, 2)//2
+    cdef unsigned int x,y,o
+    cdef unsigned int sx, sy, ox, oy
+    cdef unsigned char dx, dy
+    cdef short Y, U, V
+    for y in range(start, end):
+        for x in range(workw):
+            #assert x*2<=src_width and y*2<=src_height
+            #read U and V for the next 4 pixels:
+            sx = x*src_width//dst_width
+            sy = y*src_height//dst_height
+            U = Ubuf[sy*Ustride + sx] - uc
+            V = Vbuf[sy*Vstride + sx] - vc
+            #now read up to 4 Y values and write an RGBX pixel for each:
+            for dy in range(2):
+                oy = y*2 + dy
+                if oy>=dst_height:
+                    break
+                sy = oy*src_height//dst_height
+                for dx in range(2):
+                    ox = x*2 + dx
+                    if ox>=dst_width:
+                        break
+                    sx = ox*src_width//dst_width
+                    Y = Ybuf[sy*Ystride + sx] - yc
+                    o = oy*stride + ox * Bpp
+                    output_image[o + Rindex] = clamp(ry * Y + ru * U + rv * V)
+                    output_image[o + Gindex] = clamp(gy * Y + gu * U + gv * V)
+                    output_image[o + Bindex] = clamp(by * Y + bu * U + bv * V)
+                    if Bpp==4:
+                        output_image[o + Xindex] = 255
+
+
+cdef void RGBP_to_RGB_band(const csc_job *job, unsigned int start, unsigned int end) noexcept nogil:
+    #the source planes are in R, G, B order:
+    cdef const unsigned char *Rbuf = <const unsigned char *> job.src[0]
+    cdef const unsigned char *Gbuf = <const unsigned char *> job.src[1]
+    cdef const unsigned char *Bbuf = <const unsigned char *> job.src[2]
+    cdef unsigned char *output_image = <unsigned char *> job.dst[0]
+    cdef unsigned int Rstride = job.src_stride[0]
+    cdef unsigned int Gstride = job.src_stride[1]
+    cdef unsigned int Bstride = job.src_stride[2]
+    cdef unsigned int stride = job.dst_stride[0]
+    cdef unsigned int src_width = job.src_width
+    cdef unsigned int src_height = job.src_height
+    cdef unsigned int dst_width = job.dst_width
+    cdef unsigned int dst_height = job.dst_height
+    cdef uint8_t Rdst = job.index[0]
+    cdef uint8_t Gdst = job.index[1]
+    cdef uint8_t Bdst = job.index[2]
+    cdef uint8_t Xdst = job.index[3]
+    cdef unsigned int x,y,o
+    cdef unsigned int sx, sy
+    cdef const unsigned char *Gptr
+    cdef const unsigned char *Bptr
+    cdef const unsigned char *Rptr
+    for y in range(start, end):
+        o = stride*y
+        sy = y*src_height/dst_height
+        Rptr  = Rbuf + (sy * Rstride)
+        Gptr  = Gbuf + (sy * Gstride)
+        Bptr  = Bbuf + (sy * Bstride)
+        for x in range(dst_width):
+            sx = x*src_width/dst_width
+            output_image[o+Rdst] = Rptr[sx]
+            output_image[o+Gdst] = Gptr[sx]
+            output_image[o+Bdst] = Bptr[sx]
+            output_image[o+Xdst] = 255
+            o += 4
+
+
 cdef class Converter:
     cdef unsigned int src_width
     cdef unsigned int src_height
@@ -463,6 +887,7 @@ cdef class Converter:
     cdef unsigned long[3] dst_sizes
     cdef unsigned long[3] offsets
     cdef unsigned char full_range
+    cdef unsigned int threads
 
     cdef convert_image_function
 
@@ -486,6 +911,7 @@ cdef class Converter:
         self.src_format = src_format
         self.dst_format = dst_format
         self.full_range = options.boolget("full-range", True)
+        self.threads = max(1, options.intget("threads", THREADS))
 
         self.time = 0
         self.frames = 0
@@ -624,6 +1050,7 @@ cdef class Converter:
                 "src_height": self.src_height,
                 "dst_width" : self.dst_width,
                 "dst_height": self.dst_height,
+                "threads"   : self.threads,
                 }
         if self.src_format:
             info["src_format"] = self.src_format
@@ -697,14 +1124,6 @@ cdef class Converter:
                            const uint8_t Gindex,
                            const uint8_t Bindex,
                            ):
-        cdef const unsigned int *input_r210
-        cdef unsigned int x,y,o
-        cdef unsigned int sx, sy, ox, oy
-        cdef unsigned unsigned int r210
-        cdef unsigned char R, G, B
-        cdef unsigned short Rsum, Gsum, Bsum
-        cdef unsigned char count, dx, dy
-
         self.validate_rgb_image(image)
         pixels = image.get_pixels()
         cdef unsigned int input_stride = image.get_rowstride()
@@ -712,106 +1131,48 @@ cdef class Converter:
 
         #allocate output buffer:
         cdef unsigned char *output_image = <unsigned char*> memalign(self.buffer_size)
-        cdef unsigned char *Y = output_image + self.offsets[0]
-        cdef unsigned char *U = output_image + self.offsets[1]
-        cdef unsigned char *V = output_image + self.offsets[2]
-
-        #copy to local variables (ensures C code will be optimized correctly)
-        cdef unsigned int Ystride = self.dst_strides[0]
-        cdef unsigned int Ustride = self.dst_strides[1]
-        cdef unsigned int Vstride = self.dst_strides[2]
-        cdef unsigned int src_width = self.src_width
-        cdef unsigned int src_height = self.src_height
-        cdef unsigned int dst_width = self.dst_width
-        cdef unsigned int dst_height = self.dst_height
-        cdef unsigned char full_range = self.full_range
+        cdef csc_job job
+        self.init_job(&job, <uintptr_t> output_image)
+        job.src_stride[0] = input_stride
+        job.Bpp = Bpp
+        job.index[0] = Rindex
+        job.index[1] = Gindex
+        job.index[2] = Bindex
 
         #we process 4 pixels at a time:
-        cdef unsigned int workw = roundup(dst_width, 2)//2
-        cdef unsigned int workh = roundup(dst_height, 2)//2
+        cdef unsigned int workh = roundup(self.dst_height, 2)//2
 
         cdef Py_buffer py_buf
         if PyObject_GetBuffer(pixels, &py_buf, PyBUF_ANY_CONTIGUOUS):
             raise ValueError("failed to read pixel data from %s" % type(pixels))
-        cdef const unsigned char *input_image = <const unsigned char *> py_buf.buf
+        job.src[0] = <uintptr_t> py_buf.buf
 
-        #from now on, we can release the gil:
+        #the bands can release the gil:
         if self.src_format=="r210":
             assert Bpp==4
-            input_r210 = <unsigned int*> input_image
-            with nogil:
-                for y in range(workh):
-                    for x in range(workw):
-                        Rsum = Gsum = Bsum = 0
-                        count = 0
-                        for dy in range(2):
-                            oy = y*2 + dy
-                            if oy>=dst_height:
-                                break
-                            sy = oy*src_height//dst_height
-                            for dx in range(2):
-                                ox = x*2 + dx
-                                if ox>=dst_width:
-                                    break
-                                sx = ox*src_width//dst_width
-                                o = sy*input_stride + sx*Bpp
-                                r210 = input_r210[o//4]
-                                B = (r210&0x3ff00000) >> 22
-                                G = (r210&0x000ffc00) >> 12
-                                R = (r210&0x000003ff) >> 2
-                                o = oy*Ystride + ox
-                                Y[o] = clamp(YR * R + YG * G + YB * B + YC)
-                                count += 1
-                                Rsum += R
-                                Gsum += G
-                                Bsum += B
-                        #write 1U and 1V:
-                        if count>0:
-                            U[y*Ustride + x] = clamp(UR * Rsum//count + UG * Gsum//count + UB * Bsum//count + UC)
-                            V[y*Vstride + x] = clamp(VR * Rsum//count + VG * Gsum//count + VB * Bsum//count + VC)
+            convert_bands(r210_to_YUV420P_band, &job, workh, self.threads, True)
         else:
-            with nogil:
-                for y in range(workh):
-                    for x in range(workw):
-                        Rsum = Gsum = Bsum = 0
-                        count = 0
-                        for dy in range(2):
-                            oy = y*2 + dy
-                            if oy>=dst_height:
-                                break
-                            sy = oy*src_height//dst_height
-                            for dx in range(2):
-                                ox = x*2 + dx
-                                if ox>=dst_width:
-                                    break
-                                sx = ox*src_width//dst_width
-                                o = sy*input_stride + sx*Bpp
-                                R = input_image[o + Rindex]
-                                G = input_image[o + Gindex]
-                                B = input_image[o + Bindex]
-                                o = oy*Ystride + ox
-                                if full_range:
-                                    Y[o] = clamp(YR * R + YG * G + YB * B + YC)
-                                else:
-                                    Y[o] = clamp_studio_Y(YR * R + YG * G + YB * B + YC)
-                                count += 1
-                                Rsum += R
-                                Gsum += G
-                                Bsum += B
-                        #write 1U and 1V:
-                        if count>0:
-                            Rsum /= count
-                            Gsum /= count
-                            Bsum /= count
-                            if full_range:
-                                U[y*Ustride + x] = clamp(UR * Rsum + UG * Gsum + UB * Bsum + UC)
-                                V[y*Vstride + x] = clamp(VR * Rsum + VG * Gsum + VB * Bsum + VC)
-                            else:
-                                U[y*Ustride + x] = clamp_studio_UV(UR * Rsum + UG * Gsum + UB * Bsum + UC)
-                                V[y*Vstride + x] = clamp_studio_UV(VR * Rsum + VG * Gsum + VB * Bsum + VC)
+            convert_bands(RGB_to_YUV420P_band, &job, workh, self.threads, True)
         PyBuffer_Release(&py_buf)
         return self.planar3_image_wrapper(<void *> output_image)
 
+    cdef void init_job(self, csc_job *job, uintptr_t output_image):
+        #copy to the job structure (ensures C code will be optimized correctly)
+        cdef unsigned int i
+        for i in range(3):
+            job.src[i] = 0
+            job.src_stride[i] = 0
+            job.dst[i] = output_image + self.offsets[i]
+            job.dst_stride[i] = self.dst_strides[i]
+        job.src_width = self.src_width
+        job.src_height = self.src_height
+        job.dst_width = self.dst_width
+        job.dst_height = self.dst_height
+        job.Bpp = 0
+        for i in range(4):
+            job.index[i] = 0
+        job.full_range = self.full_range
+
     def BGR_to_YUV444P(self, image: ImageWrapper) -> CythonImageWrapper:
         return self.do_RGB_to_YUV444P(image, 3, BGR_R, BGR_G, BGR_B)
 
@@ -831,10 +1192,6 @@ cdef class Converter:
                            const uint8_t Gindex,
                            const uint8_t Bindex,
                            ):
-        cdef unsigned int x, y, o
-        cdef unsigned int sx, sy
-        cdef unsigned char R, G, B
-
         self.validate_rgb_image(image)
         pixels = image.get_pixels()
         cdef unsigned int input_stride = image.get_rowstride()
@@ -842,43 +1199,17 @@ cdef class Converter:
 
         #allocate output buffer:
         cdef unsigned char *output_image = <unsigned char*> memalign(self.buffer_size)
-        cdef unsigned char *Y = output_image + self.offsets[0]
-        cdef unsigned char *U = output_image + self.offsets[1]
-        cdef unsigned char *V = output_image + self.offsets[2]
-
-        #copy to local variables (ensures C code will be optimized correctly)
-        cdef unsigned int Ystride = self.dst_strides[0]
-        cdef unsigned int Ustride = self.dst_strides[1]
-        cdef unsigned int Vstride = self.dst_strides[2]
-        cdef unsigned int src_width = self.src_width
-        cdef unsigned int src_height = self.src_height
-        cdef unsigned int dst_width = self.dst_width
-        cdef unsigned int dst_height = self.dst_height
-        cdef unsigned char full_range = self.full_range
-
-        cdef const unsigned char *input_image
-        cdef uintptr_t buf
+        cdef csc_job job
+        self.init_job(&job, <uintptr_t> output_image)
+        job.src_stride[0] = input_stride
+        job.Bpp = Bpp
+        job.index[0] = Rindex
+        job.index[1] = Gindex
+        job.index[2] = Bindex
+
         with buffer_context(pixels) as bc:
-            input_image = <const unsigned char *> (<uintptr_t> int(bc))
-            # buf_size = len(bc)
-            with nogil:
-                for y in range(dst_height):
-                    for x in range(dst_width):
-                        sx = x * src_width // dst_width
-                        sy = y * src_height // dst_height
-                        o = sy * input_stride + sx * Bpp
-                        # assert o + Bpp <= buf_size
-                        R = input_image[o + Rindex]
-                        G = input_image[o + Gindex]
-                        B = input_image[o + Bindex]
-                        if full_range:
-                            Y[y * Ystride + x] = clamp(YR * R + YG * G + YB * B + YC)
-                            U[y * Ustride + x] = clamp(UR * R + UG * G + UB * B + UC)
-                            V[y * Vstride + x] = clamp(VR * R + VG * G + VB * B + VC)
-                        else:
-                            Y[y * Ystride + x] = clamp_studio_Y(YR * R + YG * G + YB * B + YC)
-                            U[y * Ustride + x] = clamp_studio_UV(UR * R + UG * G + UB * B + UC)
-                            V[y * Vstride + x] = clamp_studio_UV(VR * R + VG * G + VB * B + VC)
+            job.src[0] = <uintptr_t> int(bc)
+            convert_bands(RGB_to_YUV444P_band, &job, self.dst_height, self.threads, True)
         return self.planar3_image_wrapper(<void *> output_image)
 
     cdef planar3_image_wrapper(self, void *buf, unsigned char bpp=24):
@@ -910,28 +1241,13 @@ cdef class Converter:
 
         #allocate output buffer:
         cdef void *output_image = memalign(self.buffer_size)
-        cdef unsigned short *Y = <unsigned short *> ((<uintptr_t> output_image) + self.offsets[0])
-        cdef unsigned short *U = <unsigned short *> ((<uintptr_t> output_image) + self.offsets[1])
-        cdef unsigned short *V = <unsigned short *> ((<uintptr_t> output_image) + self.offsets[2])
-        #copy to local variables (ensures C code will be optimized correctly)
-        cdef unsigned int Ystride = self.dst_strides[0]
-        cdef unsigned int Ustride = self.dst_strides[1]
-        cdef unsigned int Vstride = self.dst_strides[2]
-
-        cdef uintptr_t buf
+        cdef csc_job job
+        self.init_job(&job, <uintptr_t> output_image)
+        job.src_stride[0] = input_stride
+
         with buffer_context(pixels) as bc:
-            buf = <uintptr_t> int(bc)
-            if image.is_thread_safe():
-                with nogil:
-                    r210_to_YUV444P10_copy(Y, U, V, buf,
-                                           self.dst_width, self.dst_height,
-                                           Ystride, Ustride, Vstride,
-                                           input_stride)
-            else:
-                r210_to_YUV444P10_copy(Y, U, V, buf,
-                                       self.dst_width, self.dst_height,
-                                       Ystride, Ustride, Vstride,
-                                       input_stride)
+            job.src[0] = <uintptr_t> int(bc)
+            convert_bands(r210_to_YUV444P10_band, &job, self.dst_height, self.threads, image.is_thread_safe())
         return self.planar3_image_wrapper(output_image)
 
     def YUV444P10_to_r210(self, image: ImageWrapper) -> CythonImageWrapper:
@@ -940,37 +1256,22 @@ cdef class Converter:
         input_strides = image.get_rowstride()
         log("YUV444P10_to_r210(%s) strides=%s", image, input_strides)
 
-        #copy to local variables:
-        cdef unsigned int width = self.dst_width
-        cdef unsigned int height = self.dst_height
-
         #allocate output buffer:
         cdef char *output_image = <char *> memalign(self.buffer_size)
-        cdef unsigned int stride = self.dst_strides[0]
+        cdef csc_job job
+        self.init_job(&job, <uintptr_t> output_image)
 
-        cdef unsigned int YUVstrides[3]
         cdef Py_buffer py_buf[3]
-        cdef const unsigned short * YUV[3]
         cdef int i
         for i in range(3):
-            YUVstrides[i] = input_strides[i]
+            job.src_stride[i] = input_strides[i]
             if PyObject_GetBuffer(planes[i], &py_buf[i], PyBUF_ANY_CONTIGUOUS):
                 raise ValueError("failed to read pixel data from %s" % type(planes[i]))
-            YUV[i] = <const unsigned short *> py_buf[i].buf
-            min_len = YUVstrides[i]*image.get_height()
+            job.src[i] = <uintptr_t> py_buf[i].buf
+            min_len = job.src_stride[i]*image.get_height()
             assert py_buf.len>=min_len, "buffer for Y plane is too small: %s bytes, expected at least %s" % (py_buf.len, min_len)
 
-        if image.is_thread_safe():
-            with nogil:
-                YUV444P10_to_r210_copy(<uintptr_t> output_image, YUV[0], YUV[1], YUV[2],
-                                       width, height,
-                                       stride,
-                                       YUVstrides[0], YUVstrides[1], YUVstrides[2])
-        else:
-            YUV444P10_to_r210_copy(<uintptr_t> output_image, YUV[0], YUV[1], YUV[2],
-                                   width, height,
-                                   stride,
-                                   YUVstrides[0], YUVstrides[1], YUVstrides[2])
+        convert_bands(YUV444P10_to_r210_band, &job, self.dst_height, self.threads, image.is_thread_safe())
         for i in range(3):
             PyBuffer_Release(&py_buf[i])
         return self.packed_image_wrapper(output_image, 30)
@@ -981,56 +1282,26 @@ cdef class Converter:
         input_strides = image.get_rowstride()
         log("YUV444P_to_RGB(%s) strides=%s", image, input_strides)
 
-        #copy to local variables:
-        cdef unsigned int width = self.dst_width
-        cdef unsigned int height = self.dst_height
-
         #allocate output buffer:
         cdef char *output_image = <char *> memalign(self.buffer_size)
-        cdef unsigned int stride = self.dst_strides[0]
-        cdef unsigned char full_range = self.full_range
+        cdef csc_job job
+        self.init_job(&job, <uintptr_t> output_image)
 
-        cdef unsigned int YUVstrides[3]
         cdef Py_buffer py_buf[3]
-        cdef const unsigned char * YUV[3]
         cdef int i
         for i in range(3):
-            YUVstrides[i] = input_strides[i]
+            job.src_stride[i] = input_strides[i]
             if PyObject_GetBuffer(planes[i], &py_buf[i], PyBUF_ANY_CONTIGUOUS):
                 raise ValueError("failed to read pixel data from %s" % type(planes[i]))
-            YUV[i] = <const unsigned char *> py_buf[i].buf
-            min_len = YUVstrides[i]*image.get_height()
+            job.src[i] = <uintptr_t> py_buf[i].buf
+            min_len = job.src_stride[i]*image.get_height()
             assert py_buf.len>=min_len, "buffer for Y plane is too small: %s bytes, expected at least %s" % (py_buf.len, min_len)
 
         assert self.dst_format=="BGRX" or self.dst_format=="RGBX"
-        if image.is_thread_safe():
-            if self.dst_format=="BGRX":
-                with nogil:
-                    YUV444P_to_BGRX_copy(<uintptr_t> output_image, YUV[0], YUV[1], YUV[2],
-                                         width, height,
-                                         stride,
-                                         YUVstrides[0], YUVstrides[1], YUVstrides[2],
-                                         full_range)
-            else:
-                with nogil:
-                    YUV444P_to_RGBX_copy(<uintptr_t> output_image, YUV[0], YUV[1], YUV[2],
-                                         width, height,
-                                         stride,
-                                         YUVstrides[0], YUVstrides[1], YUVstrides[2],
-                                         full_range)
+        if self.dst_format=="BGRX":
+            convert_bands(YUV444P_to_BGRX_band, &job, self.dst_height, self.threads, image.is_thread_safe())
         else:
-            if self.dst_format=="BGRX":
-                YUV444P_to_BGRX_copy(<uintptr_t> output_image, YUV[0], YUV[1], YUV[2],
-                                     width, height,
-                                     stride,
-                                     YUVstrides[0], YUVstrides[1], YUVstrides[2],
-                                     full_range)
-            else:
-                YUV444P_to_RGBX_copy(<uintptr_t> output_image, YUV[0], YUV[1], YUV[2],
-                                     width, height,
-                                     stride,
-                                     YUVstrides[0], YUVstrides[1], YUVstrides[2],
-                                     full_range)
+            convert_bands(YUV444P_to_RGBX_band, &job, self.dst_height, self.threads, image.is_thread_safe())
         for i in range(3):
             PyBuffer_Release(&py_buf[i])
         return self.packed_image_wrapper(output_image, 30)
@@ -1043,22 +1314,15 @@ cdef class Converter:
 
         #allocate output buffer:
         cdef unsigned short *bgr48 = <unsigned short*> memalign(self.dst_sizes[0])
+        cdef csc_job job
+        self.init_job(&job, <uintptr_t> bgr48)
+        job.src_stride[0] = input_stride
 
-        cdef unsigned int w = self.src_width
-        cdef unsigned int h = self.src_height
-        cdef unsigned int src_stride = image.get_rowstride()
-        cdef unsigned int dst_stride = self.dst_strides[0]
-
-        assert (dst_stride%2)==0
+        assert (job.dst_stride[0]%2)==0
 
-        cdef const unsigned int *r210
         with buffer_context(pixels) as bc:
-            r210 = <const unsigned int*> (<uintptr_t> int(bc))
-            if image.is_thread_safe():
-                with nogil:
-                    r210_to_BGR48_copy(bgr48, r210, w, h, src_stride, dst_stride)
-            else:
-                r210_to_BGR48_copy(bgr48, r210, w, h, src_stride, dst_stride)
+            job.src[0] = <uintptr_t> int(bc)
+            convert_bands(r210_to_BGR48_band, &job, self.src_height, self.threads, image.is_thread_safe())
         return self.packed_image_wrapper(<char *> bgr48, 48)
 
     cdef packed_image_wrapper(self, char *buf, unsigned char bpp=24):
@@ -1088,25 +1352,19 @@ cdef class Converter:
 
         #allocate output buffer:
         cdef unsigned int *r210 = <unsigned int*> memalign(self.dst_sizes[0])
+        cdef csc_job job
+        self.init_job(&job, <uintptr_t> r210)
 
-        cdef uintptr_t gbrp10[3]
         cdef unsigned int i
         cdef Py_buffer py_buf[3]
         for i in range(3):
             if PyObject_GetBuffer(pixels[i], &py_buf[i], PyBUF_ANY_CONTIGUOUS):
                 raise ValueError("failed to read pixel data from %s" % type(pixels[i]))
-            gbrp10[i] = <uintptr_t> py_buf[i].buf
+            job.src[i] = <uintptr_t> py_buf[i].buf
+            job.src_stride[i] = src_stride
             assert (<unsigned long> py_buf[i].len)>=src_stride*h, "input plane '%s' is too small: %i bytes" % ("GBR"[i], py_buf[i].len)
 
-        if image.is_thread_safe():
-            with nogil:
-                gbrp10_to_r210_copy(<uintptr_t> r210, gbrp10,
-                                    w, h,
-                                    src_stride, dst_stride)
-        else:
-            gbrp10_to_r210_copy(<uintptr_t> r210, gbrp10,
-                                w, h,
-                                src_stride, dst_stride)
+        convert_bands(gbrp10_to_r210_band, &job, h, self.threads, image.is_thread_safe())
         for i in range(3):
             PyBuffer_Release(&py_buf[i])
         return self.packed_image_wrapper(<char *> r210, 30)
@@ -1130,11 +1388,6 @@ cdef class Converter:
                            const uint8_t Bindex,
                            const uint8_t Xindex,
                            ):
-        cdef unsigned int x,y,o
-        cdef unsigned int sx, sy, ox, oy
-        cdef unsigned char dx, dy
-        cdef short Y, U, V
-
         self.validate_planar3_image(image)
         planes = image.get_pixels()
         input_strides = image.get_rowstride()
@@ -1142,16 +1395,14 @@ cdef class Converter:
 
         #allocate output buffer:
         cdef unsigned char *output_image = <unsigned char*> memalign(self.buffer_size)
+        cdef csc_job job
+        self.init_job(&job, <uintptr_t> output_image)
+        job.Bpp = Bpp
+        job.index[0] = Rindex
+        job.index[1] = Gindex
+        job.index[2] = Bindex
+        job.index[3] = Xindex
 
-        #copy to local variables:
-        cdef unsigned int stride = self.dst_strides[0]
-        cdef unsigned int src_width = self.src_width
-        cdef unsigned int src_height = self.src_height
-        cdef unsigned int dst_width = self.dst_width
-        cdef unsigned int dst_height = self.dst_height
-        cdef unsigned int Ystride = input_strides[0]
-        cdef unsigned int Ustride = input_strides[1]
-        cdef unsigned int Vstride = input_strides[2]
         cdef Py_buffer py_buf[3]
         cdef int i
         for i in range(3):
@@ -1159,62 +1410,13 @@ cdef class Converter:
                 raise ValueError("failed to read pixel data from %s" % type(planes[i]))
             min_len = input_strides[i]*image.get_height()
             assert py_buf.len>=min_len, "buffer for Y plane is too small: %s bytes, expected at least %s" % (py_buf.len, min_len)
-        cdef unsigned char *Ybuf = <unsigned char *> py_buf[0].buf
-        cdef unsigned char *Ubuf = <unsigned char *> py_buf[1].buf
-        cdef unsigned char *Vbuf = <unsigned char *> py_buf[2].buf
-        cdef unsigned char full_range = self.full_range
-
-        cdef unsigned char yc = Yc
-        cdef unsigned char uc = Uc
-        cdef unsigned char vc = Vc
-        cdef int ry = RY, ru = RU, rv = RV
-        cdef int gy = GY, gu = GU, gv = GV
-        cdef int by = BY, bu = BU, bv = BV
-        if not full_range:
-            yc = SYc
-            uc = SUc
-            vc = SVc
-            ry = SRY
-            ru = SRU
-            rv = SRV
-            gy = SGY
-            gu = SGU
-            gv = SGV
-            by = SBY
-            bu = SBU
-            bv = SBV
+            job.src[i] = <uintptr_t> py_buf[i].buf
+            job.src_stride[i] = input_strides[i]
 
         #we process 4 pixels at a time:
-        cdef unsigned int workw = roundup(dst_width//2, 2)
-        cdef unsigned int workh = roundup(dst_height//2, 2)
-        #from now on, we can release the gil:
-        with nogil:
-            for y in range(workh):
-                for x in range(workw):
-                    #assert x*2<=src_width and y*2<=src_height
-                    #read U and V for the next 4 pixels:
-                    sx = x*src_width//dst_width
-                    sy = y*src_height//dst_height
-                    U = Ubuf[sy*Ustride + sx] - uc
-                    V = Vbuf[sy*Vstride + sx] - vc
-                    #now read up to 4 Y values and write an RGBX pixel for each:
-                    for dy in range(2):
-                        oy = y*2 + dy
-                        if oy>=dst_height:
-                            break
-                        sy = oy*src_height//dst_height
-                        for dx in range(2):
-                            ox = x*2 + dx
-                            if ox>=dst_width:
-                                break
-                            sx = ox*src_width//dst_width
-                            Y = Ybuf[sy*Ystride + sx] - yc
-                            o = oy*stride + ox * Bpp
-                            output_image[o + Rindex] = clamp(ry * Y + ru * U + rv * V)
-                            output_image[o + Gindex] = clamp(gy * Y + gu * U + gv * V)
-                            output_image[o + Bindex] = clamp(by * Y + bu * U + bv * V)
-                            if Bpp==4:
-                                output_image[o + Xindex] = 255
+        cdef unsigned int workh = roundup(self.dst_height, 2)//2
+        #the bands can release the gil:
+        convert_bands(YUV420P_to_RGB_band, &job, workh, self.threads, True)
         for i in range(3):
             PyBuffer_Release(&py_buf[i])
         return self.packed_image_wrapper(<char *> output_image, 24)
@@ -1234,12 +1436,6 @@ cdef class Converter:
                         const uint8_t Bdst,
                         const uint8_t Xdst,
                         ):
-        cdef unsigned int x,y,o
-        cdef unsigned int sx, sy
-        cdef unsigned char *Gptr
-        cdef unsigned char *Bptr
-        cdef unsigned char *Rptr
-
         self.validate_planar3_image(image)
         planes = image.get_pixels()
         input_strides = image.get_rowstride()
@@ -1247,16 +1443,13 @@ cdef class Converter:
 
         #allocate output buffer:
         cdef unsigned char *output_image = <unsigned char*> memalign(self.buffer_size)
+        cdef csc_job job
+        self.init_job(&job, <uintptr_t> output_image)
+        job.index[0] = Rdst
+        job.index[1] = Gdst
+        job.index[2] = Bdst
+        job.index[3] = Xdst
 
-        #copy to local variables:
-        cdef unsigned int Rstride = input_strides[Rsrc]
-        cdef unsigned int Gstride = input_strides[Gsrc]
-        cdef unsigned int Bstride = input_strides[Bsrc]
-        cdef unsigned int stride = self.dst_strides[0]
-        cdef unsigned int src_width = self.src_width
-        cdef unsigned int src_height = self.src_height
-        cdef unsigned int dst_width = self.dst_width
-        cdef unsigned int dst_height = self.dst_height
         cdef Py_buffer py_buf[3]
         cdef int i
         for i in range(3):
@@ -1264,25 +1457,16 @@ cdef class Converter:
                 raise ValueError("failed to read pixel data from %s" % type(planes[i]))
             min_len = input_strides[i]*image.get_height()
             assert py_buf.len>=min_len, "buffer for G plane is too small: %s bytes, expected at least %s" % (py_buf.len, min_len)
-        cdef unsigned char *Gbuf = <unsigned char*> py_buf[Gsrc].buf
-        cdef unsigned char *Bbuf = <unsigned char*> py_buf[Bsrc].buf
-        cdef unsigned char *Rbuf = <unsigned char*> py_buf[Rsrc].buf
-
-        #from now on, we can release the gil:
-        with nogil:
-            for y in range(dst_height):
-                o = stride*y
-                sy = y*src_height/dst_height
-                Rptr  = Rbuf + (sy * Rstride)
-                Gptr  = Gbuf + (sy * Gstride)
-                Bptr  = Bbuf + (sy * Bstride)
-                for x in range(dst_width):
-                    sx = x*src_width/dst_width
-                    output_image[o+Rdst] = Rptr[sx]
-                    output_image[o+Gdst] = Gptr[sx]
-                    output_image[o+Bdst] = Bptr[sx]
-                    output_image[o+Xdst] = 255
-                    o += 4
+        #the job's source planes are in R, G, B order:
+        job.src[0] = <uintptr_t> py_buf[Rsrc].buf
+        job.src[1] = <uintptr_t> py_buf[Gsrc].buf
+        job.src[2] = <uintptr_t> py_buf[Bsrc].buf
+        job.src_stride[0] = input_strides[Rsrc]
+        job.src_stride[1] = input_strides[Gsrc]
+        job.src_stride[2] = input_strides[Bsrc]
+
+        #the bands can release the gil:
+        convert_bands(RGBP_to_RGB_band, &job, self.dst_height, self.threads, True)
         for i in range(3):
             PyBuffer_Release(&py_buf[i])
         return self.packed_image_wrapper(<char *> output_image, 24)
@@ -142,6 +142,9 @@ class Connection:
     def set_cork(self, cork: bool) -> None:
         """ TCP sockets override this method  """
 
+    def set_multi_stream(self, enabled: bool) -> None:
+        """ QUIC connections override this method  """
+
     def is_active(self) -> bool:
         return self.active
 
@@ -65,6 +65,18 @@ ServerPacketHandlerType = Callable[[Any, PacketType], None]
 NetPacketType: TypeAlias = tuple[int, int, int, SizedBuffer]
 
 
+class RawPacket(tuple):
+    """
+    A packet received but not decoded: `(packet_type, chunks)`,
+    the chunks are still in their wire format (compressed, but not encrypted)
+    so they can be forwarded as-is by the proxy.
+    """
+    __slots__ = ()
+
+    def __new__(cls, packet_type: str, chunks: tuple[NetPacketType, ...]):
+        return super().__new__(cls, (packet_type, chunks))
+
+
 class ConnectionClosedException(Exception):
     pass
 
@@ -170,6 +182,16 @@ def _may_log_packet(sending, packet_type, packet) -> None:
             get_logger().info(s)
 
 
+# these packets start with a window id,
+# which is passed to the connection with the packet type, ie: "draw:1"
+# so that connections with multiple streams can keep all the packets of a window on the same stream:
+WINDOW_PACKET_TYPES: Sequence[str] = (
+    "new-window", "new-override-redirect", "new-tray", "lost-window",
+    "window-metadata", "window-resized", "window-move-resize", "configure-override-redirect",
+    "window-icon", "raise-window", "restack-window", "initiate-moveresize",
+    "draw", "eos",
+)
+
 LOG_PACKETS: Sequence[str] = ()
 NOLOG_PACKETS: Sequence[str] = ()
 LOG_PACKET_TYPE: bool = False
@@ -21,6 +21,8 @@ TRY_COMPRESSORS: Sequence[str] = ("lz4", "brotli", "none")
 PERFORMANCE_ORDER: Sequence[str] = ("none", "lz4", "brotli")
 # require compression (disallow 'none'):
 PERFORMANCE_COMPRESSION: Sequence[str] = ("lz4", "brotli")
+# use the built-in dictionary for compressing packets if the peer supports it:
+COMPRESSION_DICTIONARY = envbool("XPRA_COMPRESSION_DICTIONARY", True)
 
 
 @dataclass
@@ -29,6 +31,9 @@ class Compression:
     version: str
     compress: Callable[[SizedBuffer, int], tuple[int, SizedBuffer]]
     decompress: Callable[[SizedBuffer], SizedBuffer]
+    # same as above, but using the built-in dictionary:
+    dict_compress: Callable[[SizedBuffer, int], tuple[int, SizedBuffer]] | None = None
+    dict_decompress: Callable[[SizedBuffer], SizedBuffer] | None = None
 
 
 COMPRESSION: dict[str, Compression] = {}
@@ -38,7 +43,8 @@ def init_lz4() -> Compression:
     # pylint: disable=import-outside-toplevel
     # pylint: disable=redefined-outer-name
     from xpra.net.lz4.lz4 import compress, decompress, get_version  # @UnresolvedImport
-    from xpra.net.protocol.header import LZ4_FLAG
+    from xpra.net.protocol.header import LZ4_FLAG, DICTIONARY_FLAG
+    from xpra.net.compression_dictionary import DICTIONARY
 
     def lz4_compress(data: SizedBuffer, level: int) -> tuple[int, memoryview]:
         flag = min(15, level) | LZ4_FLAG
@@ -47,7 +53,14 @@ def init_lz4() -> Compression:
     def lz4_decompress(data: SizedBuffer) -> memoryview:
         return decompress(data, max_size=MAX_DECOMPRESSED_SIZE)
 
-    return Compression("lz4", get_version(), lz4_compress, lz4_decompress)
+    def lz4_dict_compress(data: SizedBuffer, level: int) -> tuple[int, memoryview]:
+        flag = min(15, level) | LZ4_FLAG | DICTIONARY_FLAG
+        return flag, compress(data, acceleration=max(0, 5 - level // 3), dictionary=DICTIONARY)
+
+    def lz4_dict_decompress(data: SizedBuffer) -> memoryview:
+        return decompress(data, max_size=MAX_DECOMPRESSED_SIZE, dictionary=DICTIONARY)
+
+    return Compression("lz4", get_version(), lz4_compress, lz4_decompress, lz4_dict_compress, lz4_dict_decompress)
 
 
 def init_brotli() -> Compression:
@@ -127,17 +140,36 @@ def get_compression_caps(full_info: int = 1) -> dict[str, Any]:
         ccaps = caps.setdefault(x, {})
         if full_info > 1 and c.version:
             ccaps["version"] = c.version
+        if COMPRESSION_DICTIONARY and c.dict_compress:
+            from xpra.net.compression_dictionary import DICTIONARY_ID
+            ccaps["dictionary"] = DICTIONARY_ID
         ccaps[""] = True
     return caps
 
 
+def use_dictionary(name: str, caps) -> bool:
+    """
+    The peer must be using the exact same dictionary as us,
+    the `caps` are the peer's capabilities as a `typedict`.
+    """
+    c = COMPRESSION.get(name)
+    if not COMPRESSION_DICTIONARY or c is None or not c.dict_compress:
+        return False
+    from xpra.net.compression_dictionary import DICTIONARY_ID
+    return caps.intget(f"{name}.dictionary", 0) == DICTIONARY_ID
+
+
 def get_enabled_compressors(order=TRY_COMPRESSORS) -> Sequence[str]:
     return tuple(x for x in order if x in COMPRESSION)
 
 
-def get_compressor(name) -> Callable:
+def get_compressor(name, dictionary=False) -> Callable:
     c = COMPRESSION.get(name)
     if c is not None:
+        if dictionary:
+            if not c.dict_compress:
+                raise ValueError(f"{name!r} compression does not support dictionaries")
+            return c.dict_compress
         return c.compress
     raise ValueError(f"{name!r} compression is not supported")
 
@@ -240,20 +272,24 @@ def get_compression_type(level) -> str:
 
 
 def decompress(data: bytes, level: int):
-    from xpra.net.protocol.header import LZ4_FLAG, BROTLI_FLAG
+    from xpra.net.protocol.header import LZ4_FLAG, BROTLI_FLAG, DICTIONARY_FLAG
     if level & LZ4_FLAG:
         algo = "lz4"
     elif level & BROTLI_FLAG:
         algo = "brotli"
     else:
         algo = "zlib"
-    return decompress_by_name(data, algo)
+    return decompress_by_name(data, algo, bool(level & DICTIONARY_FLAG))
 
 
-def decompress_by_name(data: bytes, algo: str):
+def decompress_by_name(data: bytes, algo: str, dictionary=False):
     c = COMPRESSION.get(algo)
     if c is None:
         raise InvalidCompressionException(f"{algo} is not available")
+    if dictionary:
+        if not c.dict_decompress:
+            raise InvalidCompressionException(f"{algo} dictionary compression is not available")
+        return c.dict_decompress(data)
     return c.decompress(data)
 
 
@@ -0,0 +1,63 @@
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+A built-in compression dictionary for the small packets exchanged
+between xpra peers: packet types, capability and metadata keys,
+and the values that recur the most in those packets.
+Small packets compress poorly on their own,
+using a pre-shared dictionary allows the compressor to reference
+these strings without having to send them first.
+
+Both peers must use exactly the same dictionary,
+so this data must never be modified in place:
+the `DICTIONARY_ID` is advertised in the capabilities,
+and the dictionary is only used when both ends agree on it.
+"""
+
+from zlib import crc32
+
+# the strings that are more likely to be matched go last,
+# so that their offsets are shorter:
+WORDS: tuple[str, ...] = (
+    # info and capabilities:
+    "info-response", "hello", "version", "platform", "encoding", "encodings", "compressors",
+    "rencodeplus", "lz4", "brotli", "none", "enabled", "count", "elapsed-time",
+    "min", "max", "avg", "90p", "cur", "last", "total", "latency", "queue-sizes",
+    "damage-latency", "decoding-latency", "frame-total-latency", "target-latency",
+    "min-delay", "max-delay", "min-quality", "min-speed", "max-speed", "pixel-rate",
+    "bandwidth-limit",
+    # window metadata:
+    "window-metadata", "title", "class-instance", "window-type", "_NET_WM_WINDOW_TYPE_NORMAL",
+    "_NET_WM_WINDOW_TYPE_DIALOG", "_NET_WM_WINDOW_TYPE_POPUP_MENU", "_NET_WM_WINDOW_TYPE_TOOLTIP",
+    "size-constraints", "minimum-size", "maximum-size", "base-size", "increment",
+    "iconic", "fullscreen", "maximized", "above", "below", "sticky", "shaded", "focused",
+    "skip-taskbar", "skip-pager", "has-alpha", "override-redirect", "transient-for",
+    "group-leader", "opaque-region", "decorations", "workspace", "modal", "role", "pid",
+    "content-type", "bypass-compositor", "set-initial-position", "requested-position",
+    "protocols", "WM_DELETE_WINDOW", "_NET_WM_PING", "WM_TAKE_FOCUS", "frame", "command",
+    # window management:
+    "new-window", "new-override-redirect", "new-tray", "lost-window", "raise-window",
+    "restack-window", "configure-window", "configure-override-redirect", "map-window",
+    "unmap-window", "close-window", "focus", "window-move-resize", "window-resized",
+    "window-icon", "initiate-moveresize", "desktop_size", "bell", "notify_show", "notify_close",
+    # clipboard:
+    "clipboard-token", "clipboard-request", "clipboard-contents", "clipboard-contents-none",
+    "set-clipboard-enabled", "CLIPBOARD", "PRIMARY", "TARGETS", "UTF8_STRING", "text/plain",
+    # input:
+    "key-action", "keymap-changed", "button-action", "pointer-button", "pointer-motion",
+    "pointer", "pointer-position", "pointer-grab", "pointer-ungrab", "cursor", "default",
+    "modifiers", "shift", "control", "mod1", "mod2", "lock",
+    # pixels:
+    "draw", "eos", "damage-sequence", "rgb24", "rgb32", "webp", "jpeg", "png", "h264", "vp8",
+    "vp9", "scroll", "BGRX", "BGRA", "RGBX", "RGBA", "quality", "speed", "flush", "csc",
+    "rgb_formats", "scaled_size", "compress_level", "zlib", "window",
+    # connection:
+    "ping", "ping_echo", "connection-data", "startup-complete", "sound-data", "start-of-stream",
+    "end-of-stream", "sequence", "timestamp", "load-average", "server-load", "client-load",
+)
+
+DICTIONARY: bytes = "".join(WORDS).encode("latin1")
+DICTIONARY_ID: int = crc32(DICTIONARY)
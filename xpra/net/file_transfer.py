@@ -10,7 +10,7 @@ import os
 import subprocess
 import hashlib
 import uuid
-from typing import Any, Final
+from typing import Any, Final, BinaryIO
 from time import monotonic
 from dataclasses import dataclass
 from collections.abc import Callable
@@ -35,10 +35,18 @@ filelog = Logger("file")
 
 DELETE_PRINTER_FILE = envbool("XPRA_DELETE_PRINTER_FILE", True)
 FILE_CHUNKS_SIZE = max(0, envint("XPRA_FILE_CHUNKS_SIZE", 65536))
+# how many chunks we can send before waiting for the first one to be acknowledged:
+FILE_CHUNKS_WINDOW = max(1, envint("XPRA_FILE_CHUNKS_WINDOW", 16))
+# how many times the receiver can ask the sender to resume a stalled transfer:
+FILE_CHUNKS_RESUME = max(0, envint("XPRA_FILE_CHUNKS_RESUME", 3))
 MAX_CONCURRENT_FILES = max(1, envint("XPRA_MAX_CONCURRENT_FILES", 10))
 PRINT_JOB_TIMEOUT = max(60, envint("XPRA_PRINT_JOB_TIMEOUT", 3600))
 SEND_REQUEST_TIMEOUT = max(300, envint("XPRA_SEND_REQUEST_TIMEOUT", 3600))
 CHUNK_TIMEOUT = 10 * 1000
+# the sender waits longer, so the receiver has a chance to request a resume first:
+SEND_CHUNK_TIMEOUT = CHUNK_TIMEOUT * 2
+# the `ack-file-chunk` message used for requesting the chunks following the one given:
+RESUME = "resume"
 
 MIMETYPE_EXTS: dict[str, str] = {
     "application/postscript": "ps",
@@ -124,15 +132,26 @@ class ReceiveChunkState:
     send_id: str
     timer: int
     chunk: int
+    resumed: int = 0
 
 
 @dataclass
 class SendChunkState:
     start: float
-    data: bytes
+    # the source of the chunks, either a buffer or a file:
+    data: SizedBuffer | None
+    file: BinaryIO | None
+    filesize: int
     chunk_size: int
+    chunks: int
+    window: int
     timer: int
-    chunk: int
+    # the last chunk sent, and the last chunk acknowledged by the receiver:
+    sent: int = 0
+    acked: int = -1
+    # the digest sent with the last chunk, updated as we read the chunks:
+    digest: hashlib._Hash | None = None
+    hashed: int = 0
 
 
 @dataclass
@@ -140,7 +159,7 @@ class SendPendingData:
     datatype: str
     url: str
     mimetype: str
-    data: bytes
+    data: SizedBuffer | None
     filesize: int
     printit: bool
     openit: bool
@@ -170,6 +189,7 @@ class FileTransferAttributes:
         self.file_transfer = fta or str_to_bool(file_transfer)
         self.file_size_limit = parse_with_unit("file-size-limit", file_size_limit, "B", min_value=0) or 0
         self.file_chunks = FILE_CHUNKS_SIZE
+        self.file_chunks_window = FILE_CHUNKS_WINDOW
         pa = pask(printing)
         self.printing_ask = pa and can_ask
         self.printing = pa or str_to_bool(printing)
@@ -217,6 +237,7 @@ class FileTransferAttributes:
             "ask": self.file_transfer_ask,
             "size-limit": self.file_size_limit,
             "chunks": self.file_chunks,
+            "chunks-window": self.file_chunks_window,
             "open": self.open_files,
             "open-ask": self.open_files_ask,
             "open-url": self.open_url,
@@ -227,6 +248,18 @@ class FileTransferAttributes:
         }
 
 
+def file_digest(filename: str, hash_fn="sha256") -> str:
+    # hash the file without loading it all in memory:
+    digest = hashlib.new(hash_fn)
+    with open(filename, "rb") as f:
+        while True:
+            data = f.read(1024 * 1024)
+            if not data:
+                break
+            digest.update(data)
+    return digest.hexdigest()
+
+
 def digest_mismatch(filename: str, digest, expected_digest) -> None:
     filelog.error(f"Error: data does not match, invalid {digest.name} file digest")
     filelog.error(f" for {filename!r}")
@@ -265,6 +298,7 @@ class FileTransferHandler(FileTransferAttributes):
         self.remote_file_ask_timeout = SEND_REQUEST_TIMEOUT
         self.remote_file_size_limit = 0
         self.remote_file_chunks = 0
+        self.remote_file_chunks_window = 0
         self.pending_send_data: dict[str, SendPendingData] = {}
         self.pending_send_data_timers: dict[str, int] = {}
         self.send_chunks_in_progress: dict[str, SendChunkState] = {}
@@ -278,6 +312,8 @@ class FileTransferHandler(FileTransferAttributes):
         for v in self.receive_chunks_in_progress.values():
             GLib.source_remove(v.timer)
         self.receive_chunks_in_progress = {}
+        for chunk_id in tuple(self.send_chunks_in_progress.keys()):
+            self.cancel_sending(chunk_id)
         for x in tuple(self.file_descriptors):
             try:
                 os.close(x)
@@ -301,6 +337,9 @@ class FileTransferHandler(FileTransferAttributes):
         self.remote_file_ask_timeout = fc.intget("ask-timeout")
         self.remote_file_size_limit = fc.intget("max-file-size") or fc.intget("size-limit")
         self.remote_file_chunks = max(0, fc.intget("chunks"))
+        # peers that don't advertise a window can only handle one chunk at a time,
+        # and they cannot resume transfers:
+        self.remote_file_chunks_window = max(0, fc.intget("chunks-window"))
         self.dump_remote_caps()
 
     def dump_remote_caps(self) -> None:
@@ -318,6 +357,7 @@ class FileTransferHandler(FileTransferAttributes):
             "file-transfer-ask": self.remote_file_transfer_ask,
             "file-size-limit": self.remote_file_size_limit,
             "file-chunks": self.remote_file_chunks,
+            "file-chunks-window": self.remote_file_chunks_window,
             "open-files": self.remote_open_files,
             "open-files-ask": self.remote_open_files_ask,
             "open-url": self.remote_open_url,
@@ -338,9 +378,18 @@ class FileTransferHandler(FileTransferAttributes):
             # transfer has been cancelled
             return
         chunk_state.timer = 0  # this timer has been used
-        if chunk_state.chunk == chunk_no:
-            filelog.error(f"Error: chunked file transfer f{chunk_id} timed out")
-            self.receive_chunks_in_progress.pop(chunk_id, None)
+        if chunk_state.chunk != chunk_no:
+            return
+        if self.remote_file_chunks_window and chunk_state.resumed < FILE_CHUNKS_RESUME:
+            # ask the sender to send everything after the last chunk we have written:
+            chunk_state.resumed += 1
+            filelog.warn(f"Warning: chunked file transfer {chunk_id} stalled")
+            filelog.warn(f" requesting a resume from chunk {chunk_no + 1}")
+            chunk_state.timer = GLib.timeout_add(CHUNK_TIMEOUT, self._check_chunk_receiving, chunk_id, chunk_no)
+            self.send("ack-file-chunk", chunk_id, True, RESUME, chunk_no)
+            return
+        filelog.error(f"Error: chunked file transfer {chunk_id} timed out")
+        self.receive_chunks_in_progress.pop(chunk_id, None)
 
     def cancel_download(self, send_id: str, message="Cancelled") -> None:
         filelog("cancel_download(%s, %s)", send_id, message)
@@ -384,6 +433,8 @@ class FileTransferHandler(FileTransferAttributes):
         chunk = int(packet[2])
         file_data: SizedBuffer = packet[3]
         has_more = bool(packet[4])
+        # the last chunk may include the digest of the whole file:
+        trailing_digest = str(packet[5]) if len(packet) >= 6 else ""
         # if len(file_data)<1024:
         #    from xpra.util.str_fn import hexstr
         #    filelog.warn("file_data=%s", hexstr(file_data))
@@ -404,6 +455,11 @@ class FileTransferHandler(FileTransferAttributes):
             self.transfer_progress_update(False, chunk_state.send_id, s_elapsed, position, chunk_state.filesize, error)
 
         fd = chunk_state.fd
+        if chunk_state.chunk + 1 != chunk and self.remote_file_chunks_window:
+            # chunks we already have are sent again when the sender resumes the transfer,
+            # and we wait for a resume before accepting chunks past a missing one:
+            filelog("ignoring chunk %i, expected %i", chunk, chunk_state.chunk + 1)
+            return
         if chunk_state.chunk + 1 != chunk:
             filelog.error("Error: chunk number mismatch, expected %i but got %i", chunk_state.chunk + 1, chunk)
             self.cancel_file(chunk_id, "chunk number mismatch", chunk)
@@ -449,7 +505,7 @@ class FileTransferHandler(FileTransferAttributes):
         options = chunk_state.options
         filelog(f"file {filename!r} complete")
         if chunk_state.digest:
-            expected_digest = options.strget(chunk_state.digest.name)  # ie: "sha256"
+            expected_digest = options.strget(chunk_state.digest.name) or trailing_digest  # ie: "sha256"
             if expected_digest and chunk_state.digest.hexdigest() != expected_digest:
                 progress(-1, "checksum mismatch")
                 digest_mismatch(filename, chunk_state.digest, expected_digest)
@@ -543,7 +599,7 @@ class FileTransferHandler(FileTransferAttributes):
         self.file_descriptors.add(fd)
         digest: hashlib._Hash | None = None
         for hash_fn in ("sha512", "sha384", "sha256", "sha224", "sha1"):
-            if options.strget(hash_fn):
+            if options.strget(hash_fn) or (chunk_id and options.strget("file-chunk-digest") == hash_fn):
                 digest = getattr(hashlib, hash_fn)()
                 break
         if chunk_id:
@@ -767,8 +823,12 @@ class FileTransferHandler(FileTransferAttributes):
     def do_send_open_url(self, url: str, send_id: str = "") -> None:
         self.send("open-url", url, send_id)
 
-    def send_file(self, filename: str, mimetype: str, data: SizedBuffer, filesize=0,
+    def send_file(self, filename: str, mimetype: str, data: SizedBuffer | None, filesize=0,
                   printit=False, openit=False, options=None) -> bool:
+        """
+        Sends the file `data`, or if `data` is None,
+        streams the contents of `filename` from disk.
+        """
         if printit:
             if not self.printing:
                 printlog.warn("Warning: printing is not enabled for %s", self)
@@ -798,8 +858,16 @@ class FileTransferHandler(FileTransferAttributes):
                 else:
                     ask |= self.remote_open_files_ask
                     action = "open"
-        assert len(data) >= filesize, "data is smaller then the given file size!"
-        data = data[:filesize]  # gio may null terminate it
+        if data is None:
+            try:
+                filesize = filesize or os.path.getsize(filename)
+            except OSError as e:
+                logger.error(f"Error: cannot {action} {filename!r}")
+                logger.estr(e)
+                return False
+        else:
+            assert len(data) >= filesize, "data is smaller then the given file size!"
+            data = data[:filesize]  # gio may null terminate it
         logger("send_file%s action=%s, ask=%s",
                (filename, mimetype, type(data), f"{filesize} bytes", printit, openit, options), action, ask)
         self.dump_remote_caps()
@@ -935,7 +1003,7 @@ class FileTransferHandler(FileTransferAttributes):
         filelog.warn(" the send approval request timed out")
         return False
 
-    def do_send_file(self, filename: str, mimetype: str, data, filesize: int = 0,
+    def do_send_file(self, filename: str, mimetype: str, data: SizedBuffer | None, filesize: int = 0,
                      printit: bool = False, openit: bool = False, options=None, send_id: str = "") -> bool:
         if printit:
             action = "print"
@@ -946,27 +1014,59 @@ class FileTransferHandler(FileTransferAttributes):
         logger("do_send_file%s", (filename, mimetype, type(data), f"{filesize} bytes", printit, openit, options))
         if not self.check_file_size(action, filename, filesize):
             return False
-        h = hashlib.sha256()
-        h.update(data)
         absfile = os.path.abspath(filename)
-        filelog(f"sha256 digest({absfile})=%s", h.hexdigest())
         options = options or {}
-        options["sha256"] = h.hexdigest()
         chunk_size = min(self.file_chunks, self.remote_file_chunks)
-        if 0 < chunk_size < filesize:
+        chunked = 0 < chunk_size < filesize
+        digest = None
+        try:
+            if data is None and not chunked:
+                # small enough to be sent in one packet:
+                with open(absfile, "rb") as f:
+                    data = f.read(filesize)
+            if data is not None:
+                options["sha256"] = hashlib.sha256(data).hexdigest()
+            elif self.remote_file_chunks_window:
+                # the digest is calculated as we read the chunks, and sent with the last one:
+                options["file-chunk-digest"] = "sha256"
+                digest = hashlib.sha256()
+            else:
+                # this peer needs the digest upfront:
+                options["sha256"] = file_digest(absfile)
+        except OSError as e:
+            logger("do_send_file(%s, ..)", filename, exc_info=True)
+            logger.error(f"Error: cannot {action} {filename!r}")
+            logger.estr(e)
+            return False
+        filelog(f"sha256 digest({absfile})=%s", options.get("sha256", "pending"))
+        if chunked:
             in_progress = len(self.send_chunks_in_progress)
             if in_progress >= MAX_CONCURRENT_FILES:
                 raise RuntimeError(f"too many file transfers in progress: {in_progress}")
             # chunking is supported and the file is big enough
             chunk_id = uuid.uuid4().hex
             options["file-chunk-id"] = chunk_id
+            if data is None:
+                # stream it from disk:
+                try:
+                    file = open(absfile, "rb")  # pylint: disable=consider-using-with
+                except OSError as e:
+                    logger.error(f"Error: cannot {action} {filename!r}")
+                    logger.estr(e)
+                    return False
+            else:
+                file = None
+                data = memoryview(data)
+            chunks = (filesize + chunk_size - 1) // chunk_size
+            window = max(1, min(self.file_chunks_window, self.remote_file_chunks_window))
             # timer to check that the other end is requesting more chunks:
-            chunk_no = 0
-            timer = GLib.timeout_add(CHUNK_TIMEOUT, self._check_chunk_sending, chunk_id, chunk_no)
-            self.send_chunks_in_progress[chunk_id] = SendChunkState(monotonic(), data, chunk_size, timer, chunk_no)
+            timer = GLib.timeout_add(SEND_CHUNK_TIMEOUT, self._check_chunk_sending, chunk_id, -1)
+            self.send_chunks_in_progress[chunk_id] = SendChunkState(monotonic(), data, file, filesize,
+                                                                    chunk_size, chunks, window, timer,
+                                                                    digest=digest)
             cdata = b""
-            filelog("using chunks, sending initial file-chunk-id=%s, for chunk size=%s",
-                    chunk_id, chunk_size)
+            filelog("using chunks, sending initial file-chunk-id=%s, for %i chunks of size=%s, window=%i",
+                    chunk_id, chunks, chunk_size, window)
         else:
             # send everything now:
             cdata = self.compressed_wrapper("file-data", data)
@@ -983,9 +1083,9 @@ class FileTransferHandler(FileTransferAttributes):
             # transfer already removed
             return
         chunk_state.timer = 0  # timer has fired
-        if chunk_state.chunk == chunk_no:
+        if chunk_state.acked == chunk_no:
             filelog.error(f"Error: chunked file transfer {chunk_id} timed out")
-            filelog.error(f" on chunk {chunk_no}")
+            filelog.error(f" on chunk {chunk_no + 1}")
             self.cancel_sending(chunk_id)
 
     def cancel_sending(self, chunk_id: str) -> None:
@@ -997,6 +1097,10 @@ class FileTransferHandler(FileTransferAttributes):
         if timer:
             chunk_state.timer = 0
             GLib.source_remove(timer)
+        if chunk_state.file:
+            chunk_state.file.close()
+            chunk_state.file = None
+        chunk_state.data = None
 
     def _process_ack_file_chunk(self, packet: PacketType) -> None:
         # the other end received our send-file or send-file-chunk,
@@ -1004,39 +1108,78 @@ class FileTransferHandler(FileTransferAttributes):
         filelog("ack-file-chunk: %s", packet[1:])
         chunk_id = str(packet[1])
         state = bool(packet[2])
-        error_message = str(packet[3])
+        message = str(packet[3])
         chunk = int(packet[4])
         if not state:
             filelog.info("the remote end is cancelling the file transfer:")
-            filelog.info(" %s", error_message)
+            filelog.info(" %s", message)
             self.cancel_sending(chunk_id)
             return
         chunk_state = self.send_chunks_in_progress.get(chunk_id)
         if not chunk_state:
             filelog.error(f"Error: cannot find the file transfer id {chunk_id!r}")
             return
-        if chunk_state.chunk != chunk:
-            filelog.error("Error: chunk number mismatch (%i vs %i)", chunk_state.chunk, chunk)
+        if message == RESUME and chunk_state.acked <= chunk <= chunk_state.sent:
+            # the receiver has everything up to `chunk`, send the rest again:
+            filelog.info(f"resuming file transfer {chunk_id} from chunk {chunk + 1}")
+            chunk_state.sent = chunk
+        elif chunk_state.acked + 1 != chunk:
+            filelog.error("Error: chunk number mismatch (%i vs %i)", chunk_state.acked + 1, chunk)
             self.cancel_sending(chunk_id)
             return
-        chunk_size = chunk_state.chunk_size
-        if not chunk_state.data:
+        chunk_state.acked = chunk
+        # acknowledgements for chunks sent before a resume request may still arrive:
+        chunk_state.sent = max(chunk_state.sent, chunk)
+        if chunk == chunk_state.chunks:
             # all sent!
-            elapsed = monotonic() - chunk_state.start
+            elapsed = max(0.001, monotonic() - chunk_state.start)
             filelog("%i chunks of %i bytes sent in %ims (%sB/s)",
-                    chunk, chunk_size, elapsed * 1000, std_unit(chunk * chunk_size / elapsed))
+                    chunk, chunk_state.chunk_size, elapsed * 1000, std_unit(chunk_state.filesize / elapsed))
             self.cancel_sending(chunk_id)
             return
-        assert chunk_size > 0
-        # carve out another chunk:
-        cdata = self.compressed_wrapper("file-data", chunk_state.data[:chunk_size])
-        chunk_state.data = chunk_state.data[chunk_size:]
-        chunk += 1
-        chunk_state.chunk = chunk
         if chunk_state.timer:
             GLib.source_remove(chunk_state.timer)
-        chunk_state.timer = GLib.timeout_add(CHUNK_TIMEOUT, self._check_chunk_sending, chunk_id, chunk)
-        self.send("send-file-chunk", chunk_id, chunk, cdata, bool(chunk_state.data))
+        chunk_state.timer = GLib.timeout_add(SEND_CHUNK_TIMEOUT, self._check_chunk_sending, chunk_id, chunk)
+        self.send_file_chunks(chunk_id, chunk_state)
+
+    def send_file_chunks(self, chunk_id: str, chunk_state: SendChunkState) -> None:
+        # keep up to `window` chunks in flight:
+        while chunk_state.sent - chunk_state.acked < chunk_state.window and chunk_state.sent < chunk_state.chunks:
+            chunk = chunk_state.sent + 1
+            try:
+                data = self.read_file_chunk(chunk_state, chunk)
+            except OSError as e:
+                filelog("read_file_chunk(%s, %i)", chunk_state, chunk, exc_info=True)
+                filelog.error(f"Error reading chunk {chunk} of file transfer {chunk_id}")
+                filelog.estr(e)
+                self.cancel_sending(chunk_id)
+                return
+            cdata = self.compressed_wrapper("file-data", data)
+            chunk_state.sent = chunk
+            has_more = chunk < chunk_state.chunks
+            if has_more or not chunk_state.digest:
+                self.send("send-file-chunk", chunk_id, chunk, cdata, has_more)
+            else:
+                self.send("send-file-chunk", chunk_id, chunk, cdata, False, chunk_state.digest.hexdigest())
+
+    @staticmethod
+    def read_file_chunk(chunk_state: SendChunkState, chunk: int) -> bytes:
+        # chunk numbers start at 1, chunk 0 is the initial `send-file` packet:
+        offset = (chunk - 1) * chunk_state.chunk_size
+        size = min(chunk_state.chunk_size, chunk_state.filesize - offset)
+        if chunk_state.file:
+            chunk_state.file.seek(offset)
+            data = chunk_state.file.read(size)
+        else:
+            data = bytes(chunk_state.data[offset:offset + size])
+        if len(data) != size:
+            raise OSError(f"expected {size} bytes at offset {offset} but got {len(data)}")
+        # chunks are always read in order the first time,
+        # re-reading them for a resume must not update the digest again:
+        if chunk_state.digest and chunk > chunk_state.hashed:
+            chunk_state.digest.update(data)
+            chunk_state.hashed = chunk
+        return data
 
     def send(self, packet_type: str, *parts: PacketElement) -> None:
         raise NotImplementedError()
@@ -6,12 +6,15 @@
 import os
 import sys
 import glob
+import shutil
 import posixpath
 import mimetypes
 import socket
+from collections import OrderedDict
+from threading import Lock
 from urllib.parse import unquote
 from http.server import BaseHTTPRequestHandler
-from typing import Any
+from typing import Any, BinaryIO
 from collections.abc import Iterable, Callable
 
 from xpra.common import FULL_INFO
@@ -21,7 +24,7 @@ from xpra.net.http.directory_listing import list_directory
 from xpra.net.bytestreams import pretty_socket
 from xpra.util.objects import AdHocStruct
 from xpra.util.str_fn import std, csv, repr_ellipsized
-from xpra.util.env import envbool
+from xpra.util.env import envint, envbool
 from xpra.platform.paths import get_desktop_background_paths
 from xpra.log import Logger
 
@@ -29,6 +32,11 @@ log = Logger("http")
 
 HTTP_ACCEPT_ENCODING = os.environ.get("XPRA_HTTP_ACCEPT_ENCODING", "br,gzip").split(",")
 DIRECTORY_LISTING = envbool("XPRA_HTTP_DIRECTORY_LISTING", False)
+# memory budget for caching static file responses, in MB (0 to disable):
+HTTP_CACHE_SIZE = max(0, envint("XPRA_HTTP_CACHE_SIZE", 32)) * 1024 * 1024
+# larger files are never cached, and can be sent using sendfile:
+HTTP_CACHE_MAX_FILE = max(0, envint("XPRA_HTTP_CACHE_MAX_FILE", 4)) * 1024 * 1024
+HTTP_SENDFILE = envbool("XPRA_HTTP_SENDFILE", True)
 
 AUTH_REALM = os.environ.get("XPRA_HTTP_AUTH_REALM", "Xpra")
 AUTH_USERNAME = os.environ.get("XPRA_HTTP_AUTH_USERNAME", "")
@@ -118,7 +126,118 @@ def translate_path(path: str, web_root: str = "/usr/share/xpra/www") -> str:
     return path
 
 
-def load_path(accept_encoding: list[str], path: str) -> tuple[int, dict[str, Any], bytes]:
+def file_stat(path: str) -> tuple[str, int, int]:
+    st = os.stat(path)
+    return path, st.st_mtime_ns, st.st_size
+
+
+class ContentCache:
+    """
+    LRU cache of the responses for static files, ready to send.
+    Each entry records the files it was loaded from,
+    and is discarded if any of them have been modified.
+    """
+
+    def __init__(self, max_size: int = HTTP_CACHE_SIZE, max_entry: int = HTTP_CACHE_MAX_FILE):
+        self.max_size = max_size
+        self.max_entry = max_entry
+        self.entries: OrderedDict[tuple, tuple[tuple, int, dict[str, Any], bytes]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = Lock()
+
+    def __repr__(self):
+        return f"ContentCache({len(self.entries)} entries, {self.size} bytes)"
+
+    def get(self, key: tuple) -> tuple[int, dict[str, Any], bytes] | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+        if entry:
+            files, code, headers, content = entry
+            try:
+                valid = all(file_stat(f[0]) == f for f in files)
+            except OSError:
+                valid = False
+            if valid:
+                self.hits += 1
+                return code, headers.copy(), content
+            log("ContentCache.get(%s) entry is stale", key)
+            with self.lock:
+                if self.entries.get(key) is entry:
+                    self.remove(key)
+        self.misses += 1
+        return None
+
+    def set(self, key: tuple, files: tuple, code: int, headers: dict[str, Any], content: bytes) -> None:
+        size = len(content)
+        if size > self.max_entry or size > self.max_size:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (files, code, headers.copy(), content)
+            self.size += size
+            while self.size > self.max_size:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def remove(self, key: tuple) -> None:
+        # the lock must be held by the caller
+        entry = self.entries.pop(key)
+        self.size -= len(entry[3])
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def get_info(self) -> dict[str, Any]:
+        return {
+            "entries": len(self.entries),
+            "size": self.size,
+            "max-size": self.max_size,
+            "max-entry": self.max_entry,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+content_cache = ContentCache()
+
+
+def make_etag(stat: tuple[str, int, int], encoding: str) -> str:
+    _, mtime_ns, size = stat
+    return f'"{mtime_ns:x}-{size:x}-{encoding}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    for value in if_none_match.split(","):
+        value = value.strip()
+        if value == "*" or value.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def load_path(accept_encoding: list[str], path: str,
+              sendfile: bool = False) -> tuple[int, dict[str, Any], bytes | BinaryIO]:
+    """
+    Returns the response code, headers and content for the file at `path`.
+    If `sendfile` is set, files too big to be cached are returned as an open file object instead,
+    which the caller must close.
+    """
+    accept = tuple(x.split(";")[0].strip() for x in accept_encoding)
+    log("accept-encoding=%s", csv(accept))
+    encodings = tuple(enc for enc in HTTP_ACCEPT_ENCODING if enc in accept)
+    key = (path, encodings)
+    cached = content_cache.get(key)
+    if cached:
+        log("load_path(%s, %s) using cached response", encodings, path)
+        return cached
     ext = os.path.splitext(path)[1]
     extra_headers: dict[str, Any] = {}
     with open(path, "rb") as f:
@@ -127,6 +246,8 @@ def load_path(accept_encoding: list[str], path: str) -> tuple[int, dict[str, Any
         # transmitted *less* than the content-length!
         fs = os.fstat(f.fileno())
         content_length = fs[6]
+        stat = (path, fs.st_mtime_ns, content_length)
+        files = [stat]
         content_type = EXTENSION_TO_MIMETYPE.get(ext)
         if not content_type:
             if not mimetypes.inited:
@@ -137,14 +258,11 @@ def load_path(accept_encoding: list[str], path: str) -> tuple[int, dict[str, Any
         log("guess_type(%s)=%s", path, content_type)
         if content_type:
             extra_headers["Content-type"] = content_type
-        accept = tuple(accept_encoding)
-        accept = tuple(x.split(";")[0].strip() for x in accept)
+        extra_headers["Vary"] = "Accept-Encoding"
+        extra_headers["Last-Modified"] = fs.st_mtime
         content = None
-        log("accept-encoding=%s", csv(accept))
-        for enc in HTTP_ACCEPT_ENCODING:
+        for enc in encodings:
             # find a matching pre-compressed file:
-            if enc not in accept:
-                continue
             compressed_path = f"{path}.{enc}"  # ie: "/path/to/index.html.br"
             if not os.path.exists(compressed_path):
                 continue
@@ -159,13 +277,26 @@ def load_path(accept_encoding: list[str], path: str) -> tuple[int, dict[str, Any
                 log.warn(f"Warning: {compressed_path!r} is empty")
                 continue
             log("sending pre-compressed file '%s'", compressed_path)
+            compressed_stat = (compressed_path, st.st_mtime_ns, st.st_size)
+            extra_headers |= {
+                "Content-Encoding": enc,
+                "ETag": make_etag(compressed_stat, enc),
+            }
+            if sendfile and st.st_size > content_cache.max_entry:
+                extra_headers["Content-Length"] = st.st_size
+                return 200, extra_headers, open(compressed_path, "rb")
             # read pre-gzipped file:
             with open(compressed_path, "rb") as cf:
                 content = cf.read()
             assert content, f"no data in {compressed_path!r}"
-            extra_headers["Content-Encoding"] = enc
+            files.append(compressed_stat)
             break
         if not content:
+            extra_headers["ETag"] = make_etag(stat, "identity")
+            if sendfile and content_length > content_cache.max_entry:
+                # too big to be cached or compressed on the fly:
+                extra_headers["Content-Length"] = content_length
+                return 200, extra_headers, open(path, "rb")
             content = f.read()
             if len(content) != content_length:
                 raise RuntimeError(f"expected {path!r} to contain {content_length} bytes but read {len(content)} bytes")
@@ -182,11 +313,10 @@ def load_path(accept_encoding: list[str], path: str) -> tuple[int, dict[str, Any
                 if len(compressed_content) < content_length:
                     log("gzip compressed '%s': %i down to %i bytes", path, content_length, len(compressed_content))
                     extra_headers["Content-Encoding"] = "gzip"
+                    extra_headers["ETag"] = make_etag(stat, "gzip")
                     content = compressed_content
-        extra_headers |= {
-            "Content-Length": len(content),
-            "Last-Modified": fs.st_mtime,
-        }
+        extra_headers["Content-Length"] = len(content)
+        content_cache.set(key, tuple(files), 200, extra_headers, content)
         return 200, extra_headers, content
 
 
@@ -200,6 +330,8 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
     * sets cache headers on responses,
     * supports delegation to external script classes,
     * supports pre-compressed brotli and gzip, can gzip on-the-fly,
+    * caches the responses for static files, supports ETag validation,
+      and uses sendfile for large files,
     (subclassed in WebSocketRequestHandler to add WebSocket support)
     """
 
@@ -313,7 +445,10 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
         content = self.send_head()
         if content:
             try:
-                self.wfile.write(content)
+                if hasattr(content, "read"):
+                    self.send_file(content)
+                else:
+                    self.wfile.write(content)
             except (BrokenPipeError, ConnectionResetError, socket.error) as e:
                 # ssl.SSLEOFError is a socket.error
                 log("handle_request() %s", e)
@@ -328,8 +463,18 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
                 log.error("Error handling http request")
                 log.error(" for '%s'", self.path, exc_info=True)
 
+    def send_file(self, file: BinaryIO) -> None:
+        with file:
+            if HTTP_SENDFILE and hasattr(self.request, "sendfile"):
+                # the headers have already been flushed, since wbufsize is zero:
+                self.request.sendfile(file)
+            else:
+                shutil.copyfileobj(file, self.wfile)
+
     def do_HEAD(self) -> None:
-        self.send_head()
+        content = self.send_head()
+        if hasattr(content, "close"):
+            content.close()
 
     def do_AUTHHEAD(self) -> None:
         self.send_response(401)
@@ -345,7 +490,7 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
             log(f"failed to send {code} error - maybe some of the headers were already sent?", exc_info=True)
 
     # code taken from MIT licensed code in GzipSimpleHTTPServer.py
-    def send_head(self) -> bytes:
+    def send_head(self) -> bytes | BinaryIO:
         path = self.path.split("?", 1)[0].split("#", 1)[0]
         # strip path after second slash:
         script_path = path
@@ -392,10 +537,20 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
                 return body
         try:
             accept_encoding = self.headers.get("accept-encoding", "").split(",")
-            code, extra_headers, content = load_path(accept_encoding, path)
+            code, extra_headers, content = load_path(accept_encoding, path, True)
             lm = extra_headers.get("Last-Modified")
             if lm:
                 extra_headers["Last-Modified"] = self.date_time_string(lm)
+            etag = extra_headers.get("ETag")
+            if etag and etag_matches(self.headers.get("If-None-Match", ""), etag):
+                # the client already has this version:
+                if hasattr(content, "close"):
+                    content.close()
+                self.send_response(304)
+                self.extra_headers.update({k: v for k, v in extra_headers.items()
+                                           if k in ("ETag", "Last-Modified", "Vary")})
+                self.end_headers()
+                return b""
             self.send_response(code)
             self.extra_headers.update(extra_headers)
             self.end_headers()
@@ -31,11 +31,14 @@ cdef extern from "lz4_compat.h":
 
     int LZ4_compressBound(int inputSize)
     void LZ4_resetStream_fast(LZ4_stream_t* stream)
+    int LZ4_loadDict(LZ4_stream_t* stream, const char* dictionary, int dictSize)
     int LZ4_compress_fast_continue(LZ4_stream_t* stream,
                                    const char* src, char* dst,
                                    int srcSize, int dstCapacity, int acceleration) nogil
 
     int LZ4_decompress_safe(const char* src, char* dst, int compressedSize, int dstCapacity) nogil
+    int LZ4_decompress_safe_usingDict(const char* src, char* dst, int compressedSize, int dstCapacity,
+                                      const char* dictStart, int dictSize) nogil
 
 
 def get_version() -> Tuple[int, int, int]:
@@ -45,9 +48,15 @@ def get_version() -> Tuple[int, int, int]:
 
 cdef class compressor:
     cdef LZ4_stream_t state
+    cdef object dictionary
 
-    def __init__(self):
+    def __init__(self, dictionary: bytes = b""):
         LZ4_resetStream_fast(&self.state)
+        # the stream references the dictionary's memory, so we must keep it:
+        self.dictionary = dictionary
+        cdef const char *dict_ptr = dictionary
+        if dictionary:
+            LZ4_loadDict(&self.state, dict_ptr, len(dictionary))
 
     def bound(self, int size) -> int:
         return LZ4_compressBound(size)
@@ -82,12 +91,12 @@ cdef class compressor:
         return (mem[:(size_header+r)]).toreadonly()
 
 
-def compress(data: SizedBuffer, acceleration=1) -> SizedBuffer:
-    c = compressor()
+def compress(data: SizedBuffer, acceleration=1, dictionary: bytes = b"") -> SizedBuffer:
+    c = compressor(dictionary)
     return c.compress(data, acceleration)
 
 
-def decompress(data: SizedBuffer, int max_size=0, int size=0) -> SizedBuffer:
+def decompress(data: SizedBuffer, int max_size=0, int size=0, dictionary: bytes = b"") -> SizedBuffer:
     cdef int size_header = 0
     if size == 0:
         size = struct.unpack_from(b"@I", data[:4])[0]
@@ -103,9 +112,14 @@ def decompress(data: SizedBuffer, int max_size=0, int size=0) -> SizedBuffer:
     cdef char *in_ptr = <char*> ((<uintptr_t> in_buf.buf) + size_header)
     cdef char *out_ptr = <char *> out_buf.get_mem()
     cdef int l = <int> in_buf.len
+    cdef const char *dict_ptr = dictionary
+    cdef int dict_size = len(dictionary)
     cdef int r
     with nogil:
-        r = LZ4_decompress_safe(in_ptr, out_ptr, l-size_header, size)
+        if dict_size:
+            r = LZ4_decompress_safe_usingDict(in_ptr, out_ptr, l-size_header, size, dict_ptr, dict_size)
+        else:
+            r = LZ4_decompress_safe(in_ptr, out_ptr, l-size_header, size)
     PyBuffer_Release(&in_buf)
     if r <= 0:
         msg = f"LZ4_decompress_safe failed for input size {in_buf.len}"
@@ -4,12 +4,15 @@
 # later version. See the file COPYING for details.
 
 import os
+import re
 import sys
+from math import ceil
+from threading import Lock
 from ctypes import c_ubyte, c_uint32
 from typing import Any
 
-from xpra.common import roundup, noop, PaintCallback
-from xpra.util.env import envbool, shellsub
+from xpra.common import roundup, noop, PaintCallback, SizedBuffer
+from xpra.util.env import envbool, envint, shellsub
 from xpra.os_util import get_group_id, WIN32, POSIX
 from xpra.scripts.config import FALSE_OPTIONS
 from xpra.util.stats import std_unit
@@ -21,6 +24,10 @@ ALWAYS_WRAP = envbool("XPRA_MMAP_ALWAYS_WRAP", False)
 MMAP_GROUP = os.environ.get("XPRA_MMAP_GROUP", "xpra")
 MADVISE = envbool("XPRA_MMAP_MADVISE", True)
 MADVISE_FLAGS = os.environ.get("XPRA_MMAP_MADVISE_FLAGS", "SEQUENTIAL,DONTFORK,UNMERGEABLE,DONTDUMP").split(",")
+SLOTS = envbool("XPRA_MMAP_SLOTS", True)
+SLOT_SIZE = max(4096, envint("XPRA_MMAP_SLOT_SIZE", 64 * 1024))
+# maximum number of discontiguous chunks we can split a single write into:
+SLOT_MAX_CHUNKS = max(1, envint("XPRA_MMAP_SLOT_MAX_CHUNKS", 8))
 
 DEFAULT_TOKEN_BYTES: int = 128
 
@@ -265,15 +272,50 @@ def int_from_buffer(mmap_area, pos: int) -> c_uint32:
     return c_uint32.from_buffer(mmap_area, pos)  # @UndefinedVariable
 
 
+def free_slots(mmap_area, *descr_data: tuple[int, int, int, int]) -> None:
+    """
+        Releases the slots used by the chunks written by `SlotAllocator`,
+        each chunk is described by: (offset, length, flag_offset, flag_count)
+    """
+    mv = memoryview(mmap_area)
+    for _, _, flag_offset, flag_count in descr_data:
+        mv[flag_offset:flag_offset + flag_count] = bytes(flag_count)
+
+
+def mmap_free(mmap_area, *descr_data) -> None:
+    """
+        Releases the space used by the chunks without reading them.
+    """
+    if descr_data and len(descr_data[0]) == 4:
+        free_slots(mmap_area, *descr_data)
+        return
+    data_start = int_from_buffer(mmap_area, 0)
+    offset, length = descr_data[-1]
+    data_start.value = offset + length
+
+
 # descr_data is a list of (offset, length)
-# areas from the mmap region
-def mmap_read(mmap_area, *descr_data: tuple[int, int]) -> tuple[bytes | memoryview, PaintCallback]:
+# areas from the mmap region,
+# or (offset, length, flag_offset, flag_count) when using slots
+def mmap_read(mmap_area, *descr_data) -> tuple[bytes | memoryview, PaintCallback]:
     """
-        Reads data from the mmap_area as written by 'mmap_write'.
+        Reads data from the mmap_area as written by 'mmap_write' or `SlotAllocator.write`.
         The descr_data is the list of mmap chunks used.
     """
-    data_start: c_uint32 = int_from_buffer(mmap_area, 0)
     mv = memoryview(mmap_area)
+    if descr_data and len(descr_data[0]) == 4:
+        # slots can be released in any order:
+        if len(descr_data) == 1:
+            offset, length = descr_data[0][:2]
+
+            def free_mem(*_args):
+                free_slots(mmap_area, *descr_data)
+
+            return mv[offset:offset + length], free_mem
+        bdata = b"".join(mv[offset:offset + length] for offset, length, _, _ in descr_data)
+        free_slots(mmap_area, *descr_data)
+        return bdata, noop
+    data_start: c_uint32 = int_from_buffer(mmap_area, 0)
     if len(descr_data) == 1:
         # construct a zero copy buffer directly from the mmap zone
         # we can only move the `data_start` shared pointer after the buffer has been used
@@ -297,6 +339,50 @@ def mmap_read(mmap_area, *descr_data: tuple[int, int]) -> tuple[bytes | memoryvi
     return bdata, noop
 
 
+def mmap_read_rows(mmap_area, rowstride: int, *descr_data) -> tuple[list[tuple[int, int, SizedBuffer]], PaintCallback]:
+    """
+        Same as `mmap_read`, but without concatenating discontiguous chunks:
+        returns a list of row aligned segments: (first row, number of rows, pixel data).
+        Only the rows that straddle two chunks are copied,
+        all the other segments are zero copy buffers from the mmap area,
+        so the space is only released when the callback is called.
+    """
+    mv = memoryview(mmap_area)
+    segments: list[tuple[int, int, SizedBuffer]] = []
+    row = 0
+    # the pieces of a row split between chunks:
+    partial: list[memoryview] = []
+    for chunk in descr_data:
+        offset, length = chunk[:2]
+        buf = mv[offset:offset + length]
+        pos = 0
+        if partial:
+            piece = buf[:rowstride - sum(len(p) for p in partial)]
+            partial.append(piece)
+            pos = len(piece)
+            if sum(len(p) for p in partial) < rowstride:
+                # this chunk is smaller than the remainder of the row
+                continue
+            segments.append((row, 1, b"".join(partial)))
+            row += 1
+            partial = []
+        rows = (length - pos) // rowstride
+        if rows:
+            segments.append((row, rows, buf[pos:pos + rows * rowstride]))
+            row += rows
+            pos += rows * rowstride
+        if pos < length:
+            partial.append(buf[pos:])
+    if partial:
+        # the last row may be shorter than the rowstride:
+        segments.append((row, 1, b"".join(partial)))
+
+    def free_mem(*_args):
+        mmap_free(mmap_area, *descr_data)
+
+    return segments, free_mem
+
+
 def mmap_write(mmap_area, mmap_size: int, data) -> tuple[list[tuple[int, int]], int]:
     """
         Sends 'data' to the client via the mmap shared memory region,
@@ -377,3 +463,135 @@ def mmap_write(mmap_area, mmap_size: int, data) -> tuple[list[tuple[int, int]],
             mmap_data_end.value = 8 + l2
     log("sending damage with mmap: %s bytes", len(data))
     return chunks, mmap_free_size
+
+
+class RingAllocator:
+    """
+    Serializes the calls to `mmap_write`,
+    which may be used from multiple encode threads.
+    """
+
+    def __init__(self, mmap_area, mmap_size: int):
+        self.mmap_area = mmap_area
+        self.mmap_size = mmap_size
+        self.lock = Lock()
+
+    def write(self, data) -> tuple[list[tuple[int, int]], int]:
+        with self.lock:
+            return mmap_write(self.mmap_area, self.mmap_size, data)
+
+    def get_info(self) -> dict[str, Any]:
+        return {"type": "ring"}
+
+
+class SlotAllocator:
+    """
+    Divides the mmap area into fixed size slots,
+    each slot has a flag byte in a table at the start of the area:
+    the server sets the flags of the slots it writes to,
+    and the client clears them once it is done with the data.
+    Since each flag is only ever set by the server and cleared by the client,
+    no locking is needed between the two,
+    and the slots can be released in any order.
+    A single write uses contiguous slots whenever possible,
+    and is split across up to `SLOT_MAX_CHUNKS` free runs otherwise.
+    """
+
+    def __init__(self, mmap_area, mmap_size: int, slot_size: int = SLOT_SIZE):
+        self.mmap_area = mmap_area
+        self.mmap_size = mmap_size
+        self.slot_size = slot_size
+        # the first 8 bytes are the ring buffer header, the flags table follows:
+        self.table_offset = 8
+        self.slot_count = (mmap_size - self.table_offset - 4096) // (slot_size + 1)
+        if self.slot_count <= 0:
+            raise ValueError(f"mmap area is too small for {slot_size} bytes slots")
+        self.data_offset = roundup(self.table_offset + self.slot_count, 4096)
+        self.table_end = self.table_offset + self.slot_count
+        mmap_area[self.table_offset:self.table_end] = bytes(self.slot_count)
+        self.lock = Lock()
+        self.next_slot = 0
+        self.free_size = self.slot_count * slot_size
+        self.allocations = 0
+        self.split = 0
+        self.full = 0
+
+    def write(self, data) -> tuple[list[tuple[int, int, int, int]], int]:
+        """
+            Same as `mmap_write`, but the chunks also include
+            the location of the flags the client must clear to free them.
+        """
+        size = len(data)
+        needed = ceil(size / self.slot_size)
+        with self.lock:
+            flags = self.mmap_area[self.table_offset:self.table_end]
+            free_slots_count = flags.count(0)
+            self.free_size = (free_slots_count - needed) * self.slot_size
+            if needed > free_slots_count:
+                self.full += 1
+                log("mmap area is full: need %i slots but only %i are free", needed, free_slots_count)
+                return [], self.free_size
+            runs = self.find_runs(flags, needed)
+            if not runs:
+                self.full += 1
+                log("mmap area is too fragmented to store %i slots", needed)
+                return [], self.free_size
+            chunks = []
+            pos = 0
+            for slot, count in runs:
+                flag_offset = self.table_offset + slot
+                self.mmap_area[flag_offset:flag_offset + count] = b"\1" * count
+                offset = self.data_offset + slot * self.slot_size
+                length = min(size - pos, count * self.slot_size)
+                self.mmap_area[offset:offset + length] = data[pos:pos + length]
+                chunks.append((offset, length, flag_offset, count))
+                pos += length
+            slot, count = runs[-1]
+            self.next_slot = (slot + count) % self.slot_count
+            self.allocations += 1
+            if len(runs) > 1:
+                self.split += 1
+        log("sending damage with mmap: %s bytes in %s", size, chunks)
+        return chunks, self.free_size
+
+    def find_runs(self, flags: bytes, needed: int) -> list[tuple[int, int]]:
+        zeros = bytes(needed)
+        # next-fit, so the slots we release are not re-used immediately:
+        slot = flags.find(zeros, self.next_slot)
+        if slot < 0:
+            slot = flags.find(zeros)
+        if slot >= 0:
+            return [(slot, needed)]
+        # split it into the largest free runs:
+        free_runs = sorted(((m.start(), m.end() - m.start()) for m in re.finditer(b"\0+", flags)),
+                           key=lambda run: -run[1])
+        runs = []
+        for slot, count in free_runs[:SLOT_MAX_CHUNKS]:
+            count = min(count, needed)
+            runs.append((slot, count))
+            needed -= count
+            if needed == 0:
+                return runs
+        return []
+
+    def get_fragmentation(self, flags: bytes) -> float:
+        free_count = flags.count(0)
+        if not free_count:
+            return 0
+        largest = max(m.end() - m.start() for m in re.finditer(b"\0+", flags))
+        return 1 - largest / free_count
+
+    def get_info(self) -> dict[str, Any]:
+        flags = self.mmap_area[self.table_offset:self.table_end]
+        used = self.slot_count - flags.count(0)
+        return {
+            "type": "slots",
+            "slot-size": self.slot_size,
+            "slots": self.slot_count,
+            "used": used,
+            "occupancy": round(100 * used / self.slot_count),
+            "fragmentation": round(100 * self.get_fragmentation(flags)),
+            "allocations": self.allocations,
+            "split": self.split,
+            "full": self.full,
+        }
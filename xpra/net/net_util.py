@@ -384,6 +384,8 @@ def get_network_caps(full_info: int = 1) -> dict[str, Any]:
         "compressors": get_enabled_compressors(),
         "encoders": get_enabled_encoders(),
         "flush": FLUSH_HEADER,
+        # we can receive packets on multiple streams (QUIC):
+        "multi-stream": True,
     }
     caps.update(get_compression_caps(full_info))
     caps.update(get_packet_encoding_caps(full_info))
@@ -148,6 +148,38 @@ def decode(data, protocol_flags: int):
     raise InvalidPacketEncodingException(f"{ptype!r} decoder is not available")
 
 
+# rencodeplus type codes:
+RENCODE_CHR_LIST = 59
+RENCODE_INT_POS_FIXED_COUNT = 44
+RENCODE_STR_FIXED_START = 128
+RENCODE_LIST_FIXED_START = 192
+
+
+def peek_packet_type(data: SizedBuffer, protocol_flags: int) -> str | int | None:
+    """
+    Returns the packet type (or alias) of an encoded packet without decoding it,
+    or `None` if it cannot be found cheaply.
+    Only `rencodeplus` packets with a short packet type or an alias are supported.
+    """
+    if not protocol_flags & FLAGS_RENCODEPLUS or len(data) < 2:
+        return None
+    mv = memoryview(data)
+    if mv[0] != RENCODE_CHR_LIST and mv[0] < RENCODE_LIST_FIXED_START:
+        return None
+    code = mv[1]
+    if code < RENCODE_INT_POS_FIXED_COUNT:
+        return code
+    if code < RENCODE_STR_FIXED_START or code >= RENCODE_LIST_FIXED_START:
+        return None
+    end = 2 + code - RENCODE_STR_FIXED_START
+    if len(mv) < end:
+        return None
+    try:
+        return mv[2:end].tobytes().decode("utf8")
+    except UnicodeDecodeError:
+        return None
+
+
 def main():  # pragma: no cover
     from xpra.util.str_fn import print_nested_dict
     from xpra.platform import program_context
@@ -0,0 +1,35 @@
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from xpra.log import Logger
+from xpra.util.env import envint
+
+log = Logger("network", "compress")
+
+# number of threads used for compressing packets, 0 to disable:
+COMPRESS_THREADS = envint("XPRA_COMPRESS_THREADS", 0)
+# how many consecutive packets can be compressed at the same time:
+COMPRESS_PIPELINE = max(1, envint("XPRA_COMPRESS_PIPELINE", 4))
+
+# all the connections share the same pool:
+singleton: ThreadPoolExecutor | None = None
+lock = Lock()
+
+
+def get_compress_pool(create: bool = True) -> ThreadPoolExecutor | None:
+    global singleton
+    if COMPRESS_THREADS <= 0:
+        return None
+    # fast path (no lock):
+    if singleton is not None or not create:
+        return singleton
+    with lock:
+        if not singleton:
+            log("creating compression pool with %i threads", COMPRESS_THREADS)
+            singleton = ThreadPoolExecutor(max_workers=COMPRESS_THREADS, thread_name_prefix="compress")
+    return singleton
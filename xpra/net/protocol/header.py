@@ -25,6 +25,9 @@ ZLIB_FLAG = 0x0  # assume zlib if no other compression flag is set
 LZ4_FLAG = 0x10
 # LZO_FLAG        = 0x20
 BROTLI_FLAG = 0x40
+# can be combined with the compression flags above:
+# the data was compressed using the built-in dictionary
+DICTIONARY_FLAG = 0x80
 FLAGS_NOHEADER = 0x10000  # never encoded, so we can use a value bigger than a byte
 
 _header_unpack_struct = struct.Struct(b'!cBBBL')
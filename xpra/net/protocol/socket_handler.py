@@ -13,6 +13,7 @@ from enum import Enum, IntEnum
 from time import monotonic
 from socket import error as socket_error
 from threading import Lock, RLock, Event, Thread, current_thread
+from concurrent.futures import Future
 from queue import Queue, SimpleQueue, Empty, Full
 from typing import Any
 from collections.abc import Callable, Iterable, Sequence, Mapping
@@ -28,13 +29,13 @@ from xpra.common import noop, SizedBuffer
 from xpra.net.bytestreams import SOCKET_TIMEOUT, set_socket_timeout
 from xpra.net.protocol.header import (
     unpack_header, pack_header, find_xpra_header,
-    FLAGS_CIPHER, FLAGS_NOHEADER, FLAGS_FLUSH, HEADER_SIZE,
+    FLAGS_CIPHER, FLAGS_NOHEADER, FLAGS_FLUSH, HEADER_SIZE, DICTIONARY_FLAG,
 )
 from xpra.net.protocol.constants import CONNECTION_LOST, INVALID, GIBBERISH
 from xpra.net.common import (
     ConnectionClosedException, may_log_packet,
-    MAX_PACKET_SIZE,
-    PacketType, NetPacketType,
+    MAX_PACKET_SIZE, WINDOW_PACKET_TYPES,
+    PacketType, NetPacketType, RawPacket,
 )
 from xpra.net.bytestreams import ABORT
 from xpra.net import compression
@@ -43,9 +44,10 @@ from xpra.net.compression import (
     InvalidCompressionException, Compressed, LevelCompressed, Compressible, LargeStructure,
 )
 from xpra.net import packet_encoding
+from xpra.net.protocol.compress_pool import get_compress_pool, COMPRESS_PIPELINE
 from xpra.net.socket_util import guess_packet_type
 from xpra.net.packet_encoding import (
-    decode,
+    decode, peek_packet_type,
     InvalidPacketEncodingException,
 )
 from xpra.net.crypto import get_encryptor, get_decryptor, pad, INITIAL_PADDING
@@ -64,6 +66,8 @@ LOG_RAW_PACKET_SIZE = envbool("XPRA_LOG_RAW_PACKET_SIZE", False)
 INLINE_SIZE = envint("XPRA_INLINE_SIZE", 32768)
 FAKE_JITTER = envint("XPRA_FAKE_JITTER", 0)
 MIN_COMPRESS_SIZE = envint("XPRA_MIN_COMPRESS_SIZE", 378)
+# the dictionary makes it worth compressing much smaller packets:
+MIN_DICTIONARY_COMPRESS_SIZE = envint("XPRA_MIN_DICTIONARY_COMPRESS_SIZE", 32)
 SEND_INVALID_PACKET = envint("XPRA_SEND_INVALID_PACKET", 0)
 SEND_INVALID_PACKET_DATA = strtobytes(os.environ.get("XPRA_SEND_INVALID_PACKET_DATA", b"ZZinvalid-packetZZ"))
 ALIAS_INFO = envbool("XPRA_ALIAS_INFO", False)
@@ -155,6 +159,9 @@ class SocketProtocol:
         ]
         self.send_aliases: dict[str, int] = {}
         self.receive_aliases: dict[int, str] = {}
+        # packets types that are not decoded, see `set_raw_packets`:
+        self.raw_packet_types: set[str] = set()
+        self.raw_compressors: dict[str, bool] = {}
         self._log_stats = None  # None here means auto-detect
         if "XPRA_LOG_SOCKET_STATS" in os.environ:
             self._log_stats = envbool("XPRA_LOG_SOCKET_STATS")
@@ -162,6 +169,7 @@ class SocketProtocol:
         self.encoder = "none"
         self._encoder = packet_encoding.get_encoder("none")
         self.compressor = "none"
+        self.compression_dictionary = False
         self._compress = compression.get_compressor("none")
         self.compression_level = 0
         self.authenticators = ()
@@ -192,7 +200,7 @@ class SocketProtocol:
         "max_packet_size", "large_packets", "send_aliases", "receive_aliases",
         "cipher_in", "cipher_in_name", "cipher_in_block_size", "cipher_in_padding",
         "cipher_out", "cipher_out_name", "cipher_out_block_size", "cipher_out_padding",
-        "compression_level", "encoder", "compressor",
+        "compression_level", "encoder", "compressor", "compression_dictionary",
     )
 
     def save_state(self) -> dict[str, Any]:
@@ -207,7 +215,7 @@ class SocketProtocol:
             assert x in state, f"field {x!r} is missing"
             setattr(self, x, state[x])
         # special handling for compressor / encoder which are named objects:
-        self.enable_compressor(self.compressor)
+        self.enable_compressor(self.compressor, self.compression_dictionary)
         self.enable_encoder(self.encoder)
 
     def is_closed(self) -> bool:
@@ -268,11 +276,36 @@ class SocketProtocol:
     def parse_remote_caps(self, caps: typedict) -> None:
         for k, v in caps.dictget("aliases", {}).items():
             self.send_aliases[k] = int(v)
-        set_socket_timeout(self._conn, SOCKET_TIMEOUT)
+        conn = self._conn
+        set_socket_timeout(conn, SOCKET_TIMEOUT)
+        # the packets sent on separate streams may be re-ordered,
+        # which would break the stream cipher:
+        if conn and caps.boolget("multi-stream") and not self.cipher_out:
+            conn.set_multi_stream(True)
 
     def set_receive_aliases(self, aliases: dict[int, str]) -> None:
         self.receive_aliases = aliases
 
+    def set_raw_packets(self, packet_types: Iterable[str], compressors: dict[str, bool]) -> None:
+        """
+        Packets of these types will be passed to the packet handler as a `RawPacket`,
+        without being decompressed or decoded.
+        This is only done when the packet's chunks use one of the `compressors` given,
+        which must be supported by the peer the packet is forwarded to,
+        (the values indicate if the compressor can use the dictionary)
+        """
+        self.raw_packet_types = set(packet_types)
+        self.raw_compressors = compressors
+        log("set_raw_packets(%s, %s)", packet_types, compressors)
+
+    def can_forward(self, level: int) -> bool:
+        if level == 0:
+            return True
+        ctype = compression.get_compression_type(level)
+        if ctype not in self.raw_compressors:
+            return False
+        return not level & DICTIONARY_FLAG or self.raw_compressors[ctype]
+
     def get_info(self, alias_info: bool = ALIAS_INFO) -> dict[str, Any]:
         shm = self._source_has_more
         info = {
@@ -287,9 +320,12 @@ class SocketProtocol:
         comp = self.compressor
         if comp:
             info["compressor"] = comp
+            info["compression-dictionary"] = self.compression_dictionary
         encoder = self.encoder
         if encoder:
             info["encoder"] = encoder
+        if self.raw_packet_types:
+            info["raw-packets"] = tuple(sorted(self.raw_packet_types))
         if alias_info:
             info["send_alias"] = self.send_aliases
             info["receive_alias"] = self.receive_aliases
@@ -317,6 +353,7 @@ class SocketProtocol:
                 "large-packet-size": LARGE_PACKET_SIZE,
                 "inline-size": INLINE_SIZE,
                 "min-compress-size": MIN_COMPRESS_SIZE,
+                "min-dictionary-compress-size": MIN_DICTIONARY_COMPRESS_SIZE,
                 "packetcount": self.output_packetcount,
                 "raw_packetcount": self.output_raw_packetcount,
                 "count": self.output_stats,
@@ -388,7 +425,11 @@ class SocketProtocol:
                 gpc = self._get_packet_cb
                 if self._closed or not gpc:
                     return
-                self._add_packet_to_queue(*gpc())
+                pool = get_compress_pool()
+                if pool:
+                    self._add_packets_to_queue(gpc, pool)
+                else:
+                    self._add_packet_to_queue(*gpc())
         except Exception as e:
             if self._closed:
                 return
@@ -404,10 +445,46 @@ class SocketProtocol:
         packet_type: str | int = packet[0]
         if packet_type in ("closed", "none"):
             return
-        chunks: tuple[NetPacketType, ...] = tuple(self.encode(packet))
+        self._queue_chunks(packet, tuple(self.encode(packet)), synchronous, more)
+
+    def _add_packets_to_queue(self, get_packet_cb: Callable[[], tuple[PacketType, bool, bool]], pool) -> None:
+        """
+        Encodes up to `COMPRESS_PIPELINE` consecutive packets concurrently using the compression pool,
+        the resulting chunks are still queued in the original packet order.
+        """
+        pending: list[tuple[PacketType, bool, bool]] = []
+        more = True
+        for _ in range(COMPRESS_PIPELINE):
+            packet, synchronous, more = get_packet_cb()
+            if not more:
+                shm = self._source_has_more
+                if shm:
+                    shm.clear()
+            if packet and packet[0] not in ("closed", "none"):
+                pending.append((packet, synchronous, more))
+            # `send_now` callbacks can only be used once, they replace themselves after the first call,
+            # so only call again if the callback is still the packet source:
+            if not more or self._get_packet_cb is not get_packet_cb:
+                break
+        if len(pending) == 1:
+            # only one packet, compress its chunks in parallel instead:
+            packet, synchronous, more = pending[0]
+            self._queue_chunks(packet, tuple(self.encode(packet, pool)), synchronous, more)
+            return
+        futures = tuple((packet, pool.submit(self.encode, packet), synchronous, more)
+                        for packet, synchronous, more in pending)
+        for packet, future, synchronous, more in futures:
+            self._queue_chunks(packet, tuple(future.result()), synchronous, more)
+
+    def _queue_chunks(self, packet: PacketType, chunks: tuple[NetPacketType, ...],
+                      synchronous=True, more=False) -> None:
+        packet_type: str | int = packet[0]
+        if packet_type in WINDOW_PACKET_TYPES and not isinstance(packet, RawPacket):
+            packet_type = f"{packet_type}:{packet[1]}"
         with self._write_lock:
             if self._closed:
                 return
+            self._count_output_packet(packet[0])
             try:
                 self._add_chunks_to_queue(packet_type, chunks, synchronous, more)
             except Exception:
@@ -415,6 +492,12 @@ class SocketProtocol:
                 log("add_chunks_to_queue%s", (chunks, ), exc_info=True)
                 raise
 
+    def _count_output_packet(self, packet_type: str | int) -> None:
+        """ the write_lock must be held when calling this function,
+        since packets may be encoded concurrently by the compression threads """
+        ptype = str(packet_type)
+        self.output_stats[ptype] = self.output_stats.get(ptype, 0) + 1
+
     def _add_chunks_to_queue(self, packet_type: str | int,
                              chunks: Iterable[NetPacketType],
                              synchronous=True, more=False) -> None:
@@ -536,7 +619,7 @@ class SocketProtocol:
             if c == "none":
                 continue
             if c in compressors or caps.boolget(c):
-                self.enable_compressor(c)
+                self.enable_compressor(c, compression.use_dictionary(c, caps))
                 return
             log(f"client does not support {c}")
         if not compressors:
@@ -547,12 +630,13 @@ class SocketProtocol:
             log.info(f" enabled compressors: {csv(opts)}")
         self.enable_compressor("none")
 
-    def enable_compressor(self, compressor: str) -> None:
-        self._compress = compression.get_compressor(compressor)
+    def enable_compressor(self, compressor: str, dictionary: bool = False) -> None:
+        self._compress = compression.get_compressor(compressor, dictionary)
         self.compressor = compressor
-        log(f"enable_compressor({compressor}): {self._compress}")
+        self.compression_dictionary = dictionary
+        log(f"enable_compressor({compressor}, {dictionary}): {self._compress}")
 
-    def encode(self, packet_in: PacketType) -> list[NetPacketType]:
+    def encode(self, packet_in: PacketType, pool=None) -> list[NetPacketType]:
         """
         Given a packet (tuple or list of items), converts it for the wire.
         This method returns all the binary packets to send, as an array of:
@@ -567,15 +651,25 @@ class SocketProtocol:
             (0,                 0, rencoded(["blah", '', "hello", 200]))
         ]
         ```
+        When a compression `pool` is specified, the large items are compressed in parallel.
+        A `RawPacket` is already in wire format, so its chunks are returned unchanged.
         """
+        if isinstance(packet_in, RawPacket):
+            return list(packet_in[1])
         packets: list[NetPacketType] = []
         packet = list(packet_in)
         level = self.compression_level
         size_check = LARGE_PACKET_SIZE
-        min_comp_size = MIN_COMPRESS_SIZE
+        min_comp_size = MIN_DICTIONARY_COMPRESS_SIZE if self.compression_dictionary else MIN_COMPRESS_SIZE
         packet_type = str(packet[0])
         log(f"encode({packet_type}, ...)")
         payload_size = 0
+        compress_jobs: dict[int, Future] = {}
+        if pool:
+            compressible = tuple(i for i in range(1, len(packet)) if isinstance(packet[i], Compressible))
+            if len(compressible) > 1:
+                for i in compressible:
+                    compress_jobs[i] = pool.submit(packet[i].compress)
         for i in range(1, len(packet)):
             item = packet[i]
             if item is None:
@@ -595,7 +689,8 @@ class SocketProtocol:
             if isinstance(item, Compressible):
                 # this is a marker used to tell us we should compress it now
                 # (used by the client for clipboard data)
-                item = item.compress()
+                job = compress_jobs.get(i)
+                item = job.result() if job else item.compress()
                 packet[i] = item
                 # (it may now be a "Compressed" item and be processed further)
             if isinstance(item, memoryview):
@@ -639,7 +734,6 @@ class SocketProtocol:
                 log.warn(f"Warning: unexpected data type {type(item)}")
                 log.warn(f" in {packet_type!r} packet at position {i}: {repr_ellipsized(item)}")
         # now the main packet (or what is left of it):
-        self.output_stats[packet_type] = self.output_stats.get(packet_type, 0) + 1
         if USE_ALIASES:
             alias = self.send_aliases.get(packet_type)
             if alias:
@@ -665,6 +759,7 @@ class SocketProtocol:
             log.warn(" sizes: %s", csv(len(strtobytes(x)) for x in packet[1:]))
             log.warn(f" packet: {repr_ellipsized(packet, limit=4096)}")
         # compress, but don't bother for small packets:
+        cl, cdata = 0, main_packet
         if level > 0 and size > min_comp_size:
             try:
                 cl, cdata = self._compress(main_packet, level)
@@ -674,9 +769,10 @@ class SocketProtocol:
                 log.error(f"Error compressing {packet_type!r} packet")
                 log.estr(e)
                 raise
-            packets.append((proto_flags, 0, cl, cdata))
-        else:
-            packets.append((proto_flags, 0, 0, main_packet))
+            if len(cdata) >= size:
+                # compression did not help, send it as-is:
+                cl, cdata = 0, main_packet
+        packets.append((proto_flags, 0, cl, cdata))
         may_log_packet(True, packet_type, packet)
         if LOG_RAW_PACKET_SIZE and packet_type != "logging":
             log.info(f"sending  {packet_type!r:<32}: %i bytes", HEADER_SIZE + payload_size)
@@ -887,7 +983,8 @@ class SocketProtocol:
         protocol_flags = 0
         data_size = 0
         compression_level = 0
-        raw_packets: dict[int, SizedBuffer] = {}
+        # the compression level and data of each raw chunk:
+        raw_packets: dict[int, tuple[int, SizedBuffer]] = {}
         while not self._closed:
             # log("parse thread: %i items in read queue", self._read_queue.qsize())
             buf = self._read_queue.get()
@@ -1043,27 +1140,6 @@ class SocketProtocol:
                             self._internal_error(f"{self.cipher_in_name} encryption padding error - wrong key?")
                             return
                         data = data[:-padding_size]
-                # uncompress if needed:
-                if compression_level > 0:
-                    try:
-                        data = decompress(data, compression_level)
-                    except InvalidCompressionException as e:
-                        self.invalid(f"invalid compression: {e}", data)
-                        return
-                    except Exception as e:
-                        ctype = compression.get_compression_type(compression_level)
-                        msg = f"{ctype} packet decompression failed"
-                        log(msg, exc_info=True)
-                        if self.cipher_in:
-                            msg += " (invalid encryption key?)"
-                        else:
-                            # only include the exception text when not using encryption
-                            # as this may leak crypto information:
-                            msg += f" {e}"
-                        del e
-                        self.gibberish(msg, data)
-                        return
-
                 if self._closed:
                     return
 
@@ -1075,7 +1151,8 @@ class SocketProtocol:
                         self.invalid(f"duplicate raw packet at index {packet_index}", data)
                         return
                     # raw packet, store it and continue:
-                    raw_packets[packet_index] = data
+                    # (decompressed later, unless we forward it as-is)
+                    raw_packets[packet_index] = (compression_level, data)
                     payload_size = -1
                     if len(raw_packets) >= 4:
                         self.invalid(f"too many raw packets: {len(raw_packets)}", data)
@@ -1084,7 +1161,36 @@ class SocketProtocol:
                     # the one with packet_index=0 for this raw packet
                     self.receive_pending = True
                     continue
-                # final packet (packet_index==0), decode it:
+                # final packet (packet_index==0):
+                wire_data = data
+                if compression_level > 0:
+                    data = self._decompress_chunk(data, compression_level)
+                    if data is None:
+                        return
+                if self.raw_packet_types:
+                    raw_type = peek_packet_type(data, protocol_flags)
+                    if (
+                        isinstance(raw_type, str) and raw_type in self.raw_packet_types and
+                        self.can_forward(compression_level) and
+                        all(self.can_forward(level) for level, _ in raw_packets.values())
+                    ):
+                        chunks = [(0, index, level, raw_data) for index, (level, raw_data) in raw_packets.items()]
+                        chunks.append((protocol_flags & ~(FLAGS_CIPHER | FLAGS_FLUSH), 0, compression_level, wire_data))
+                        raw_packets = {}
+                        self.input_stats[raw_type] = self.input_stats.get(raw_type, 0) + 1
+                        payload_size = -1
+                        self.input_packetcount += 1
+                        self.receive_pending = bool(protocol_flags & FLAGS_FLUSH)
+                        log("forwarding raw packet %s", raw_type)
+                        self._process_packet_cb(self, RawPacket(raw_type, tuple(chunks)))
+                        continue
+                for index, (level, raw_data) in tuple(raw_packets.items()):
+                    if level > 0:
+                        raw_data = self._decompress_chunk(raw_data, level)
+                        if raw_data is None:
+                            return
+                        raw_packets[index] = (0, raw_data)
+                # decode it:
                 try:
                     packet = list(decode(data, protocol_flags))
                 except InvalidPacketEncodingException as e:
@@ -1110,7 +1216,7 @@ class SocketProtocol:
                 payload_size = len(data)
                 # add any raw packets back into it:
                 if raw_packets:
-                    for index, raw_data in raw_packets.items():
+                    for index, (_, raw_data) in raw_packets.items():
                         # replace placeholder with the raw_data packet data:
                         packet[index] = raw_data
                         payload_size += len(raw_data)
@@ -1135,6 +1241,26 @@ class SocketProtocol:
                 self._process_packet_cb(self, tuple(packet))
                 del packet
 
+    def _decompress_chunk(self, data: SizedBuffer, level: int) -> SizedBuffer | None:
+        try:
+            return decompress(data, level)
+        except InvalidCompressionException as e:
+            self.invalid(f"invalid compression: {e}", data)
+            return None
+        except Exception as e:
+            ctype = compression.get_compression_type(level)
+            msg = f"{ctype} packet decompression failed"
+            log(msg, exc_info=True)
+            if self.cipher_in:
+                msg += " (invalid encryption key?)"
+            else:
+                # only include the exception text when not using encryption
+                # as this may leak crypto information:
+                msg += f" {e}"
+            del e
+            self.gibberish(msg, data)
+            return None
+
     def do_flush_then_close(self, encoder: Callable | None = None,
                             last_packet=None,
                             done_callback: Callable = noop) -> None:  # pylint: disable=method-hidden
@@ -1206,6 +1332,7 @@ class SocketProtocol:
                 log("last packet: %s", last_packet)
                 chunks = encoder(last_packet)
                 log("last packet has %i chunks", len(chunks))
+                self._count_output_packet(last_packet[0])
                 self._add_chunks_to_queue(last_packet[0], chunks, synchronous=False, more=False)
             else:
                 self.raw_write((last_packet,), "flush-then-close")
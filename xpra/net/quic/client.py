@@ -36,7 +36,7 @@ from xpra.net.quic.connection import XpraQuicConnection, aioquic_version_info
 from xpra.net.quic.asyncio_thread import get_threaded_loop
 from xpra.net.quic.common import USER_AGENT, MAX_DATAGRAM_FRAME_SIZE, binary_headers
 from xpra.util.str_fn import csv, Ellipsizer
-from xpra.util.env import envbool
+from xpra.util.env import envint, envbool
 from xpra.log import Logger
 
 log = Logger("quic")
@@ -47,6 +47,8 @@ IPV6 = socket.has_ipv6 and envbool("XPRA_IPV6", True)
 PREFER_IPV6 = IPV6 and envbool("XPRA_PREFER_IPV6", POSIX)
 HOSTS_PREFER_IPV4 = os.environ.get("XPRA_HOSTS_PREFER_IPV4", "localhost,127.0.0.1").split(",")
 FAST_OPEN = envbool("XPRA_QUIC_FAST_OPEN", aioquic_version_info>=(1, 2))
+# the server may push a new stream for each window:
+MAX_PUSH_ID = envint("XPRA_QUIC_MAX_PUSH_ID", 65535)
 
 WS_HEADERS: dict[str, str] = {
     ":method": "CONNECT",
@@ -58,6 +60,17 @@ WS_HEADERS: dict[str, str] = {
 }
 
 
+class ClientH3Connection(H3Connection):
+    """
+    aioquic only allows the server to push 8 streams,
+    we announce a higher limit when the connection is initialized.
+    """
+
+    def _init_connection(self) -> None:
+        self._max_push_id = max(self._max_push_id or 0, MAX_PUSH_ID)
+        super()._init_connection()
+
+
 class ClientWebSocketConnection(XpraQuicConnection):
 
     def __init__(self, connection: HttpConnection, stream_id: int, transmit: Callable[[], None],
@@ -114,7 +127,7 @@ class WebSocketClient(QuicConnectionProtocol):
         if self._quic.configuration.alpn_protocols[0].startswith("hq-"):
             self._http = H0Connection(self._quic)
         else:
-            self._http = H3Connection(self._quic)
+            self._http = ClientH3Connection(self._quic)
 
     def open(self, host: str, port: int, path: str) -> ClientWebSocketConnection:
         log(f"open({host}, {port}, {path})")
@@ -157,8 +170,11 @@ class WebSocketClient(QuicConnectionProtocol):
                 log.warn(f"Warning: stream {sub} not found in {self._websockets}")
                 return
             subtype = hdict.get("stream-type")
-            log.info(f"new quic substream {stream_id} for {subtype} packets")
+            log(f"new quic substream {stream_id} for {subtype} packets")
             self._websockets[stream_id] = websocket
+        elif isinstance(event, DataReceived) and event.stream_ended and stream_id != websocket.stream_id:
+            # the server is done with this substream:
+            self._websockets.pop(stream_id, None)
         websocket.http_event_received(event)
 
 
@@ -17,6 +17,7 @@ from aioquic.quic.packet import QuicErrorCode
 from xpra.net.quic.asyncio_thread import get_threaded_loop
 from xpra.net.bytestreams import Connection
 from xpra.net.quic.common import binary_headers, override_aioquic_logger
+from xpra.net.quic.streams import StreamReassembler
 from xpra.util.str_fn import Ellipsizer, memoryview_to_bytes
 from xpra.util.version import parse_version, vtrim
 from xpra.util.env import envbool
@@ -49,6 +50,8 @@ class XpraQuicConnection(Connection):
         self.transmit: Callable[[], None] = transmit
         self.accepted: bool = False
         self.closed: bool = False
+        self.multi_stream: bool = False
+        self.reassembler = StreamReassembler()
 
     def __repr__(self):
         return f"XpraQuicConnection<{self.socktype}:{self.stream_id}>"
@@ -60,6 +63,8 @@ class XpraQuicConnection(Connection):
             "stream-id": self.stream_id,
             "accepted": self.accepted,
             "closed": self.closed,
+            "multi-stream": self.multi_stream,
+            "pending": self.reassembler.get_pending(),
             "aioquic": vtrim(aioquic_version_info),
         }
         quic = getattr(self.connection, "_quic", None)
@@ -80,7 +85,16 @@ class XpraQuicConnection(Connection):
         log("quic:http_event_received(%s)", Ellipsizer(event))
         if self.closed:
             return
-        if isinstance(event, (DataReceived, DatagramReceived)):
+        if isinstance(event, DataReceived):
+            # the data from each stream must be re-assembled separately:
+            data = self.reassembler.add(event.stream_id, event.data)
+            if event.stream_ended and event.stream_id != self.stream_id:
+                dropped = self.reassembler.remove(event.stream_id)
+                log("stream %i ended, %i bytes dropped", event.stream_id, dropped)
+            # an empty buffer would be interpreted as the end of the connection:
+            if data:
+                self.read_queue.put(data)
+        elif isinstance(event, DatagramReceived):
             self.read_queue.put(event.data)
         else:
             log.warn(f"Warning: unhandled websocket http event {event}")
@@ -113,6 +127,10 @@ class XpraQuicConnection(Connection):
             headers=binary_headers(headers),
             end_stream=self.closed)
 
+    def set_multi_stream(self, enabled: bool) -> None:
+        log("set_multi_stream(%s)", enabled)
+        self.multi_stream = enabled
+
     def write(self, buf, packet_type: str = "") -> int:
         log("quic.write(%s, %r)", Ellipsizer(buf), packet_type)
         return self.stream_write(buf, packet_type)
@@ -121,7 +139,8 @@ class XpraQuicConnection(Connection):
         data = memoryview_to_bytes(buf)
         if not packet_type:
             log.warn(f"Warning: missing packet type for {data}")
-        if packet_type in DATAGRAM_PACKET_TYPES:
+        # the packet type may include the window id, ie: "draw:1"
+        if packet_type.split(":", 1)[0] in DATAGRAM_PACKET_TYPES:
             self.connection.send_datagram(self.stream_id, data=data)
             log(f"sending {packet_type!r} using datagram")
             return len(buf)
@@ -0,0 +1,108 @@
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+from xpra.common import SizedBuffer
+from xpra.net.common import WINDOW_PACKET_TYPES
+from xpra.net.websockets.header import hybi_frame_size
+from xpra.util.env import envbool
+
+# send packets using separate streams when the peer supports it,
+# so that a large frame does not delay the packets of other windows or the control packets:
+MULTI_STREAM = envbool("XPRA_QUIC_MULTI_STREAM", True)
+
+# the stream used for each type of packet,
+# all the other packets use the main stream:
+STREAM_PACKET_TYPES: dict[str, str] = {
+    "draw": "draw",
+    "eos": "draw",
+    "sound-data": "audio",
+    "sound-control": "audio",
+    "send-file": "file",
+    "send-file-chunk": "file",
+}
+
+
+def get_stream_type(packet_type: str) -> str:
+    """
+    The `packet_type` may include the window id, ie: "draw:1",
+    in which case all the packets of this window use the same stream
+    so that they are received in order, ie: "new-window" before the first "draw".
+    Returns an empty string for the packets that belong on the main stream.
+    ie: "draw:1" -> "window-1", "sound-data" -> "audio", "ping" -> ""
+    """
+    ptype, _, wid = packet_type.partition(":")
+    if wid and ptype in WINDOW_PACKET_TYPES:
+        return f"window-{wid}"
+    return STREAM_PACKET_TYPES.get(ptype, "")
+
+
+def find_messages_end(data: SizedBuffer) -> tuple[int, int]:
+    """
+    Walks through the websocket frames in the buffer,
+    returns the position where the last complete message ends
+    and the buffer size needed for the next frame to be complete.
+    """
+    size = len(data)
+    pos = end = 0
+    with memoryview(data) as view:
+        while pos < size:
+            frame_size = hybi_frame_size(view[pos:])
+            if not frame_size:
+                # we need at least the frame header:
+                return end, pos + 2
+            if pos + frame_size > size:
+                return end, pos + frame_size
+            if view[pos] & 0x80:
+                # 'fin' bit set: the message ends with this frame
+                end = pos + frame_size
+            pos += frame_size
+    return end, end
+
+
+class StreamReassembler:
+    """
+    Buffers the data received on each stream until it contains complete websocket messages,
+    so that the messages received on different streams are never interleaved.
+    """
+
+    def __init__(self):
+        self.buffers: dict[int, bytearray] = {}
+        # the buffer size we need before we can find the end of the next message:
+        self.needed: dict[int, int] = {}
+
+    def __repr__(self):
+        return f"StreamReassembler({len(self.buffers)} streams)"
+
+    def add(self, stream_id: int, data: SizedBuffer) -> SizedBuffer:
+        """
+        Returns all the complete messages now available for this stream,
+        or an empty buffer if there are none yet.
+        """
+        buf = self.buffers.get(stream_id)
+        if not buf:
+            # nothing buffered, so we may be able to use the data as-is:
+            end, needed = find_messages_end(data)
+            if end == len(data):
+                return data
+            buf = self.buffers[stream_id] = bytearray(data)
+        else:
+            buf += data
+            if len(buf) < self.needed.get(stream_id, 0):
+                return b""
+            end, needed = find_messages_end(buf)
+        self.needed[stream_id] = needed - end
+        if not end:
+            return b""
+        messages = bytes(buf[:end])
+        del buf[:end]
+        return messages
+
+    def remove(self, stream_id: int) -> int:
+        """ discards the data of a stream that has ended, returns the number of bytes dropped """
+        self.needed.pop(stream_id, None)
+        return len(self.buffers.pop(stream_id, b""))
+
+    def get_pending(self) -> int:
+        return sum(len(buf) for buf in self.buffers.values())
@@ -3,7 +3,6 @@
 # Xpra is released under the terms of the GNU GPL v2, or, at your option, any
 # later version. See the file COPYING for details.
 
-import os
 from typing import Any
 from collections.abc import Callable
 
@@ -14,6 +13,8 @@ from aioquic.quic.packet import QuicErrorCode
 from xpra.net.bytestreams import pretty_socket
 from xpra.net.quic.connection import XpraQuicConnection
 from xpra.net.quic.common import SERVER_NAME, http_date, binary_headers
+from xpra.net.quic.streams import MULTI_STREAM, get_stream_type
+from xpra.net.quic.asyncio_thread import get_threaded_loop
 from xpra.net.websockets.header import close_packet
 from xpra.util.env import first_time
 from xpra.util.str_fn import Ellipsizer
@@ -21,13 +22,6 @@ from xpra.log import Logger
 
 log = Logger("quic")
 
-# can be used to use substreams based on packet prefix: sound,webcam,draw
-SUBSTREAM_PACKET_TYPES = tuple(x.strip() for x in os.environ.get(
-    "XPRA_QUIC_SUBSTREAM_PACKET_TYPES",
-    ""
-).split(",") if x.strip())
-
-
 # SUBSTREAM_PACKET_LOSS_PCT = envint("XPRA_QUIC_SUBSTREAM_PACKET_LOSS_PCT", 0)
 
 
@@ -37,13 +31,19 @@ class ServerWebSocketConnection(XpraQuicConnection):
         super().__init__(connection, stream_id, transmit, "", 0, "wss", info=None, options=None)
         self.scope: dict = scope
         self._packet_type_streams: dict[str, int] = {}
-        self._use_substreams = bool(SUBSTREAM_PACKET_TYPES)
+        self._use_substreams = False
 
     def get_info(self) -> dict[str, Any]:
         info = super().get_info()
-        info.setdefault("quic", {})["scope"] = self.scope
+        qinfo = info.setdefault("quic", {})
+        qinfo["scope"] = self.scope
+        qinfo["streams"] = dict(self._packet_type_streams)
         return info
 
+    def set_multi_stream(self, enabled: bool) -> None:
+        super().set_multi_stream(enabled)
+        self._use_substreams = MULTI_STREAM and enabled
+
     def __repr__(self):
         try:
             return f"QuicConnection({pretty_socket(self.endpoint)}, {self.stream_id})"
@@ -90,22 +90,46 @@ class ServerWebSocketConnection(XpraQuicConnection):
             self.transmit()
 
     def get_packet_stream_id(self, packet_type: str) -> int:
-        if self.closed or not self._use_substreams or not packet_type:
+        if self.closed or not self.multi_stream or not packet_type:
             return self.stream_id
-        if not any(packet_type.startswith(x) for x in SUBSTREAM_PACKET_TYPES):
+        stream_type = get_stream_type(packet_type)
+        if not stream_type:
             return self.stream_id
-        # ie: "sound-data" -> "sound"
-        stream_type = packet_type.split("-", 1)[0]
         stream_id = self._packet_type_streams.get(stream_type)
         if stream_id is not None:
-            # already allocated substream:
+            # already allocated substream,
+            # keep using it to preserve the order of the packets:
             return stream_id
+        if not self._use_substreams or packet_type.startswith("lost-window:"):
+            return self.stream_id
         # allocate a new one and record it
         # (even if it fails, so we don't retry to allocate it again and again):
         stream_id = self.allocate_new_stream_id(stream_type) or self.stream_id
         self._packet_type_streams[stream_type] = stream_id
         return stream_id
 
+    def stream_write(self, buf, packet_type: str) -> int:
+        size = super().stream_write(buf, packet_type)
+        if packet_type.startswith("lost-window:"):
+            # the window's stream ends after this packet:
+            self.end_stream(get_stream_type(packet_type))
+        return size
+
+    def end_stream(self, stream_type: str) -> None:
+        stream_id = self._packet_type_streams.pop(stream_type, None)
+        if stream_id is None or stream_id == self.stream_id:
+            return
+        log(f"end_stream({stream_type!r}) stream {stream_id}")
+
+        def do_end_stream() -> None:
+            if self.closed:
+                return
+            # this is queued after all the data already written to this stream:
+            self.connection.send_data(stream_id=stream_id, data=b"", end_stream=True)
+            self.transmit()
+
+        get_threaded_loop().call(do_end_stream)
+
     def allocate_new_stream_id(self, stream_type: str) -> int:
         log(f"allocate_new_stream_id({stream_type!r})")
         # should use more "correct" values here
@@ -127,7 +151,7 @@ class ServerWebSocketConnection(XpraQuicConnection):
                 # more than one error, stop trying:
                 self._use_substreams = False
             return 0
-        log.info(f"new stream: {stream_id} for {stream_type!r} with headers={headers}")
+        log(f"new stream: {stream_id} for {stream_type!r} with headers={headers}")
         self.send_headers(stream_id=stream_id, headers={
             ":status": 200,
             "substream": self.stream_id,
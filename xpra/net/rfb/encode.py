@@ -16,21 +16,28 @@ log = Logger("rfb")
 
 PILLOW_OPTIONS = typedict({"alpha": False})
 
+# the pixel formats we can use with the zlib and zrle encoders,
+# these must match the pixel format we advertise to the client:
+ZLIB_PIXEL_FORMATS = ("BGRX", "BGRA")
+
 
 def pillow_encode(encoding, img):
     return encode(encoding, img, PILLOW_OPTIONS)[1].data
 
 
-def make_header(encoding, x, y, w, h):
-    fbupdate = struct.pack(b"!BBH", 0, 0, 1)
-    rect = struct.pack(b"!HHHHi", x, y, w, h, encoding)
-    return fbupdate + rect
+def fbupdate_header(count: int) -> bytes:
+    return struct.pack(b"!BBH", 0, 0, count)
+
+
+def rect_header(encoding, x, y, w, h) -> bytes:
+    return struct.pack(b"!HHHHi", x, y, w, h, encoding)
 
 
-def rgb222_encode(window, x, y, w, h):
-    img = window.get_image(x, y, w, h)
-    window.acknowledge_changes()
-    header = make_header(RFBEncoding.RAW, x, y, w, h)
+# the encoders below return the rectangle header and its data,
+# the caller must prefix the rectangles with an `fbupdate_header`:
+
+def rgb222_encode(img, x, y):
+    header = rect_header(RFBEncoding.RAW, x, y, img.get_width(), img.get_height())
     if img.get_pixel_format() != "BGRX":
         log.warn("Warning: cannot convert %s to rgb222", img.get_pixel_format())
         return []
@@ -40,10 +47,8 @@ def rgb222_encode(window, x, y, w, h):
     return [header, data]
 
 
-def raw_encode(window, x, y, w, h):
-    img = window.get_image(x, y, w, h)
-    window.acknowledge_changes()
-    header = make_header(RFBEncoding.RAW, x, y, w, h)
+def raw_encode(img, x, y):
+    header = rect_header(RFBEncoding.RAW, x, y, img.get_width(), img.get_height())
     return [header, raw_pixels(img)]
 
 
@@ -61,29 +66,44 @@ def raw_pixels(img):
     return pixels[:Bpp * w * h]
 
 
-def zlib_encode(window, x, y, w, h):
-    img = window.get_image(x, y, w, h)
-    window.acknowledge_changes()
-    if not img:
-        return []
-    pixels = raw_pixels(img)
+def zlib_compress(zstream, data) -> bytes:
+    """
+    The client uses a single zlib stream for the whole connection,
+    so we must flush the data without ending the stream.
+    """
     import zlib  # pylint: disable=import-outside-toplevel
-    if isinstance(pixels, memoryview):
-        pixels = pixels.tobytes()
-    data = zlib.compress(pixels, 1)
+    return zstream.compress(data) + zstream.flush(zlib.Z_SYNC_FLUSH)
+
+
+def zlib_encode(img, x, y, zstream):
+    pixels = raw_pixels(img)
+    data = zlib_compress(zstream, pixels)
     log("zlib compressed %i down to %i", len(pixels), len(data))
-    header = make_header(RFBEncoding.ZLIB, x, y, w, h) + struct.pack(b"!I", len(data))
+    header = rect_header(RFBEncoding.ZLIB, x, y, img.get_width(), img.get_height()) + struct.pack(b"!I", len(data))
     return [header, data]
 
 
-def tight_encode(window, x, y, w, h, quality=0):
-    img = window.get_image(x, y, w, h)
-    window.acknowledge_changes()
-    if not img:
-        return []
+def zrle_encode(img, x, y, zstream):
+    from xpra.net.rfb.zrle import encode_zrle  # pylint: disable=import-outside-toplevel
+    w = img.get_width()
+    h = img.get_height()
+    tiles = encode_zrle(img.get_pixels(), w, h, img.get_rowstride())
+    data = zlib_compress(zstream, tiles)
+    log("zrle compressed %ix%i: %i bytes of tiles down to %i", w, h, len(tiles), len(data))
+    header = rect_header(RFBEncoding.ZRLE, x, y, w, h) + struct.pack(b"!I", len(data))
+    return [header, data]
+
+
+def copyrect_encode(x, y, w, h, src_x, src_y):
+    return [rect_header(RFBEncoding.COPYRECT, x, y, w, h) + struct.pack(b"!HH", src_x, src_y)]
+
+
+def tight_encode(img, x, y, quality=0):
+    w = img.get_width()
+    h = img.get_height()
     if quality == 10:
         # Fill Compression
-        header = make_header(RFBEncoding.TIGHT, x, y, w, h)
+        header = rect_header(RFBEncoding.TIGHT, x, y, w, h)
         header += struct.pack(b"!B", 0x80)
         pixel_format = img.get_pixel_format()
         log.warn("fill compression of %s", pixel_format)
@@ -97,7 +117,7 @@ def tight_encode(window, x, y, w, h, quality=0):
 
 
 def tight_header(encoding, x, y, w, h, control, length):
-    header = make_header(encoding, x, y, w, h)
+    header = rect_header(encoding, x, y, w, h)
     header += struct.pack(b"!B", control)
     # the length header is in a weird format:
     if length < 128:
@@ -111,11 +131,7 @@ def tight_header(encoding, x, y, w, h, control, length):
     return header
 
 
-def tight_png(window, x, y, w, h):
-    img = window.get_image(x, y, w, h)
-    window.acknowledge_changes()
-    if not img:
-        return []
+def tight_png(img, x, y):
     data = pillow_encode("png", img)
-    header = tight_header(RFBEncoding.TIGHT_PNG, x, y, w, h, 0x80 + 0x20, len(data))
+    header = tight_header(RFBEncoding.TIGHT_PNG, x, y, img.get_width(), img.get_height(), 0x80 + 0x20, len(data))
     return [header, data]
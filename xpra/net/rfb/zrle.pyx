@@ -0,0 +1,231 @@
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+#cython: boundscheck=False, wraparound=False, initializedcheck=False
+
+from libc.stdint cimport uint8_t, uint16_t, uint32_t, uintptr_t   # pylint: disable=syntax-error
+from libc.stdlib cimport free, malloc
+from libc.string cimport memset
+from xpra.buffers.membuf cimport getbuf, MemBuf, buffer_context
+
+from xpra.common import SizedBuffer
+
+
+DEF TILE_SIZE = 64
+DEF MAX_PIXELS = TILE_SIZE * TILE_SIZE
+DEF MAX_PALETTE = 127
+DEF PACKED_PALETTE = 16
+
+DEF SUB_RAW = 0
+DEF SUB_SOLID = 1
+DEF SUB_PLAIN_RLE = 128
+
+
+cdef struct tile_state:
+    # the runs of identical pixels, in tile order:
+    uint32_t run_px[MAX_PIXELS]
+    uint16_t run_len[MAX_PIXELS]
+    uint8_t run_idx[MAX_PIXELS]
+    uint32_t nruns
+    uint32_t palette[MAX_PALETTE]
+    uint32_t npal
+    # a small direct-mapped cache of palette lookups, 0 for empty slots:
+    uint8_t cache[256]
+
+
+def encode_zrle(pixels, unsigned int width, unsigned int height, unsigned int rowstride) -> SizedBuffer:
+    """
+    Encodes BGRX or BGRA pixels using the ZRLE tile sub-encodings,
+    the output still needs to be compressed using the connection's ZRLE zlib stream.
+    The compressed pixels (CPIXEL) are the 3 least significant bytes of each little-endian pixel.
+    """
+    if width == 0 or height == 0:
+        raise ValueError(f"invalid dimensions {width}x{height}")
+    if rowstride < width * 4:
+        raise ValueError(f"invalid rowstride {rowstride} for width {width}")
+    cdef unsigned int tiles = ((width + TILE_SIZE - 1) // TILE_SIZE) * ((height + TILE_SIZE - 1) // TILE_SIZE)
+    # raw tiles are always an option, so this is the worst case:
+    cdef MemBuf out_buf = getbuf(tiles + width * height * 3, 0)
+    cdef uint8_t *out = <uint8_t *> out_buf.get_mem()
+    cdef tile_state *state = <tile_state *> malloc(sizeof(tile_state))
+    if state == NULL:
+        raise MemoryError("failed to allocate the zrle tile state")
+    cdef const uint8_t *buf
+    cdef unsigned int tx, ty, tw, th
+    cdef size_t pos = 0
+    try:
+        with buffer_context(pixels) as bc:
+            if len(bc) < (<Py_ssize_t> (rowstride * (height - 1) + width * 4)):
+                raise ValueError(f"buffer too small {len(bc)} for {width}x{height} with rowstride {rowstride}")
+            buf = <const uint8_t *> (<uintptr_t> int(bc))
+            with nogil:
+                ty = 0
+                while ty < height:
+                    th = min(TILE_SIZE, height - ty)
+                    tx = 0
+                    while tx < width:
+                        tw = min(TILE_SIZE, width - tx)
+                        pos += encode_tile(state, buf + ty * rowstride + tx * 4, tw, th, rowstride, out + pos)
+                        tx += TILE_SIZE
+                    ty += TILE_SIZE
+    finally:
+        free(state)
+    return memoryview(out_buf)[:pos]
+
+
+cdef inline uint32_t read_pixel(const uint8_t *p) noexcept nogil:
+    return p[0] | (<uint32_t> p[1] << 8) | (<uint32_t> p[2] << 16)
+
+
+cdef inline uint8_t *write_cpixel(uint8_t *out, uint32_t v) noexcept nogil:
+    out[0] = v & 0xff
+    out[1] = (v >> 8) & 0xff
+    out[2] = (v >> 16) & 0xff
+    return out + 3
+
+
+cdef inline uint8_t *write_run_length(uint8_t *out, uint32_t length) noexcept nogil:
+    cdef uint32_t l = length - 1
+    while l >= 255:
+        out[0] = 255
+        out += 1
+        l -= 255
+    out[0] = l
+    return out + 1
+
+
+cdef inline uint32_t run_length_size(uint32_t length) noexcept nogil:
+    return (length - 1) // 255 + 1
+
+
+cdef int palette_index(tile_state *state, uint32_t v) noexcept nogil:
+    """ returns the palette index for this pixel value, or -1 if the palette is full """
+    cdef uint8_t slot = (<uint32_t> (v * 0x9E3779B1U)) >> 24
+    cdef uint8_t cached = state.cache[slot]
+    if cached and state.palette[cached - 1] == v:
+        return cached - 1
+    cdef uint32_t i
+    for i in range(state.npal):
+        if state.palette[i] == v:
+            state.cache[slot] = i + 1
+            return i
+    if state.npal == MAX_PALETTE:
+        return -1
+    i = state.npal
+    state.palette[i] = v
+    state.npal += 1
+    state.cache[slot] = i + 1
+    return i
+
+
+cdef size_t encode_tile(tile_state *state, const uint8_t *buf, unsigned int tw, unsigned int th,
+                        unsigned int rowstride, uint8_t *out) noexcept nogil:
+    cdef unsigned int x, y, i, j
+    cdef const uint8_t *row
+    cdef uint32_t v, prev = 0, length = 0
+    # find the runs:
+    state.nruns = 0
+    for y in range(th):
+        row = buf + y * rowstride
+        for x in range(tw):
+            v = read_pixel(row + x * 4)
+            if length and v == prev:
+                length += 1
+                continue
+            if length:
+                state.run_px[state.nruns] = prev
+                state.run_len[state.nruns] = length
+                state.nruns += 1
+            prev = v
+            length = 1
+    state.run_px[state.nruns] = prev
+    state.run_len[state.nruns] = length
+    state.nruns += 1
+    # build the palette and calculate the size of each sub-encoding:
+    state.npal = 0
+    memset(state.cache, 0, 256)
+    cdef int use_palette = 1
+    cdef int idx
+    cdef size_t plain_rle = 0
+    cdef size_t palette_rle = 0
+    for i in range(state.nruns):
+        length = state.run_len[i]
+        plain_rle += 3 + run_length_size(length)
+        if use_palette:
+            idx = palette_index(state, state.run_px[i])
+            if idx < 0:
+                use_palette = 0
+            else:
+                state.run_idx[i] = idx
+                palette_rle += 1 if length == 1 else 1 + run_length_size(length)
+    cdef uint8_t *start = out
+    if use_palette and state.npal == 1:
+        out[0] = SUB_SOLID
+        return write_cpixel(out + 1, state.palette[0]) - start
+    cdef size_t raw = tw * th * 3
+    cdef size_t packed = 0
+    cdef unsigned int bits = 0
+    if use_palette:
+        palette_rle += state.npal * 3
+        if state.npal <= PACKED_PALETTE:
+            bits = 1 if state.npal <= 2 else (2 if state.npal <= 4 else 4)
+            packed = state.npal * 3 + th * ((tw * bits + 7) // 8)
+    cdef size_t best = min(raw, plain_rle)
+    if use_palette:
+        best = min(best, palette_rle)
+        if packed:
+            best = min(best, packed)
+    cdef uint8_t byte, shift, pidx
+    cdef unsigned int col
+    if use_palette and best == packed:
+        out[0] = state.npal
+        out += 1
+        for i in range(state.npal):
+            out = write_cpixel(out, state.palette[i])
+        # the first pixel goes in the most significant bits,
+        # and each row starts on a byte boundary:
+        byte = 0
+        shift = 8
+        col = 0
+        for i in range(state.nruns):
+            pidx = state.run_idx[i]
+            for j in range(state.run_len[i]):
+                shift -= bits
+                byte |= pidx << shift
+                col += 1
+                if shift == 0 or col == tw:
+                    out[0] = byte
+                    out += 1
+                    byte = 0
+                    shift = 8
+                if col == tw:
+                    col = 0
+    elif use_palette and best == palette_rle:
+        out[0] = 128 + state.npal
+        out += 1
+        for i in range(state.npal):
+            out = write_cpixel(out, state.palette[i])
+        for i in range(state.nruns):
+            length = state.run_len[i]
+            if length == 1:
+                out[0] = state.run_idx[i]
+                out += 1
+            else:
+                out[0] = state.run_idx[i] | 128
+                out = write_run_length(out + 1, length)
+    elif best == plain_rle:
+        out[0] = SUB_PLAIN_RLE
+        out += 1
+        for i in range(state.nruns):
+            out = write_cpixel(out, state.run_px[i])
+            out = write_run_length(out, state.run_len[i])
+    else:
+        out[0] = SUB_RAW
+        out += 1
+        for y in range(th):
+            row = buf + y * rowstride
+            for x in range(tw):
+                out = write_cpixel(out, read_pixel(row + x * 4))
+    return out - start
@@ -9,7 +9,7 @@ import struct
 
 from xpra.common import SizedBuffer
 from xpra.net.websockets.common import OPCODE
-from xpra.net.websockets.mask import hybi_unmask
+from xpra.net.websockets.mask import hybi_unmask, hybi_unmask_inplace
 
 
 def close_packet(code: int = 1000, reason: str = "") -> bytes:
@@ -34,8 +34,36 @@ def encode_hybi_header(opcode, payload_len, has_mask=False, fin=True) -> bytes:
     return struct.pack('>BBQ', b1, 127 | mask_bit, payload_len)
 
 
-def decode_hybi(buf: SizedBuffer) -> tuple[int, SizedBuffer, int, int] | None:
-    """ Decode HyBi style WebSocket packets """
+def hybi_frame_size(buf: SizedBuffer) -> int:
+    """
+    Returns the total size of the HyBi WebSocket frame found at the start of the buffer,
+    or zero if the buffer does not contain the complete frame header yet.
+    """
+    blen = len(buf)
+    if blen < 2:
+        return 0
+    b2 = buf[1]
+    hlen = 2 + 4 * bool(b2 & 0x80)
+    payload_len = b2 & 0x7f
+    if payload_len == 126:
+        hlen += 2
+        if blen < hlen:
+            return 0
+        payload_len = struct.unpack('>H', buf[2:4])[0]
+    elif payload_len == 127:
+        hlen += 8
+        if blen < hlen:
+            return 0
+        payload_len = struct.unpack('>Q', buf[2:10])[0]
+    return hlen + payload_len
+
+
+def decode_hybi(buf: SizedBuffer, inplace=False) -> tuple[int, SizedBuffer, int, int] | None:
+    """
+    Decode HyBi style WebSocket packets,
+    masked payloads are unmasked directly in the buffer if `inplace` is set,
+    in which case the buffer must be writable.
+    """
     blen = len(buf)
     hlen = 2
     if blen < hlen:
@@ -74,7 +102,8 @@ def decode_hybi(buf: SizedBuffer) -> tuple[int, SizedBuffer, int, int] | None:
         return None
 
     if masked:
-        payload = hybi_unmask(buf, hlen - 4, payload_len)
+        unmask = hybi_unmask_inplace if inplace else hybi_unmask
+        payload = unmask(buf, hlen - 4, payload_len)
     else:
         payload = buf[hlen:length]
     # log("decode_hybi_header() payload_len=%i, hlen=%i,
@@ -5,7 +5,8 @@
 
 #cython: boundscheck=False, wraparound=False, initializedcheck=False, always_allow_keywords=False
 
-from libc.stdint cimport uint32_t, uintptr_t   # pylint: disable=syntax-error
+from libc.stdint cimport uint64_t, uintptr_t   # pylint: disable=syntax-error
+from libc.string cimport memcpy
 from xpra.buffers.membuf cimport getbuf, MemBuf, buffer_context
 
 from xpra.common import SizedBuffer
@@ -21,6 +22,26 @@ def hybi_unmask(data, unsigned int offset, unsigned int datalen) -> SizedBuffer:
         return do_hybi_mask(mp, mp+4, datalen)
 
 
+def hybi_unmask_inplace(data, unsigned int offset, unsigned int datalen) -> SizedBuffer:
+    """
+    Unmasks the payload directly in the buffer given, which must be writable,
+    and returns a view of the payload.
+    """
+    cdef uintptr_t mp
+    cdef uintptr_t dp
+    cdef unsigned int min_len = offset+4+datalen
+    with buffer_context(data) as bc:
+        if len(bc)<(<Py_ssize_t> min_len):
+            raise ValueError(f"buffer too small {len(bc)} vs {min_len}: offset={offset}, datalen={datalen}")
+        if bc.is_readonly():
+            raise ValueError(f"cannot unmask {type(data)} in place: buffer is read-only")
+        mp = (<uintptr_t> int(bc))+offset
+        dp = mp+4
+        with nogil:
+            xor_mask(<const unsigned char *> mp, <const unsigned char *> dp, <unsigned char *> dp, datalen)
+    return memoryview(data)[offset+4:min_len]
+
+
 def hybi_mask(mask: bytes, data: SizedBuffer) -> SizedBuffer:
     if len(mask) != 4:
         raise ValueError(f"invalid mask buffer size: {len(mask)} bytes")
@@ -32,40 +53,40 @@ def hybi_mask(mask: bytes, data: SizedBuffer) -> SizedBuffer:
 cdef object do_hybi_mask(uintptr_t mp, uintptr_t dp, unsigned int datalen):
     # we skip the first 'align' bytes in the output buffer,
     # to ensure that its alignment is the same as the input data buffer
-    cdef unsigned int align = (<uintptr_t> dp) & 0x3
-    cdef unsigned int initial_chars = (4 - align) & 0x3
+    cdef unsigned int align = (<uintptr_t> dp) & 0x7
     cdef MemBuf out_buf = getbuf(datalen+align, 0)
-    cdef uintptr_t op = <uintptr_t> out_buf.get_mem()
-    # char pointers:
-    cdef unsigned char *mcbuf = <unsigned char *> mp
-    cdef unsigned char *dcbuf = <unsigned char *> dp
-    cdef unsigned char *ocbuf = <unsigned char *> op
-    cdef unsigned int j
-    # bytes at a time until we reach the 32-bit boundary:
-    for i in range(initial_chars):
-        ocbuf[align+i] = dcbuf[i] ^ mcbuf[i & 0x3]
-    # 32-bit pointers:
-    cdef uint32_t *dbuf
-    cdef uint32_t *obuf
-    cdef uint32_t mask_value
-    cdef unsigned int uint32_steps
-    cdef unsigned int last_chars
-    if datalen>initial_chars:
-        uint32_steps = (datalen-initial_chars) // 4
-        if uint32_steps:
-            dbuf = <uint32_t*> (dp+initial_chars)
-            obuf = <uint32_t*> (op+align+initial_chars)
-            mask_value = 0
-            for i in range(4):
-                mask_value = mask_value << 8
-                mask_value += mcbuf[(3 - i + initial_chars) & 0x3]
-            for i in range(uint32_steps):
-                obuf[i] = dbuf[i] ^ mask_value
-        # bytes at a time again at the end:
-        last_chars = (datalen-initial_chars) & 0x3
-        for i in range(last_chars):
-            j = datalen - last_chars + i
-            ocbuf[align+j] = dcbuf[j] ^ mcbuf[j & 0x3]
+    cdef uintptr_t op = (<uintptr_t> out_buf.get_mem()) + align
+    with nogil:
+        xor_mask(<const unsigned char *> mp, <const unsigned char *> dp, <unsigned char *> op, datalen)
     if align>0:
         return (memoryview(out_buf)[align:]).toreadonly()
     return memoryview(out_buf).toreadonly()
+
+
+cdef void xor_mask(const unsigned char *mcbuf, const unsigned char *dcbuf, unsigned char *ocbuf,
+                   unsigned int datalen) noexcept nogil:
+    # the input and output buffers must have the same 64-bit alignment,
+    # they may also be the same buffer
+    cdef unsigned int initial_chars = (8 - ((<uintptr_t> dcbuf) & 0x7)) & 0x7
+    if initial_chars>datalen:
+        initial_chars = datalen
+    cdef unsigned int i
+    # bytes at a time until we reach the 64-bit boundary:
+    for i in range(initial_chars):
+        ocbuf[i] = dcbuf[i] ^ mcbuf[i & 0x3]
+    # the mask repeated for the 8 bytes that follow,
+    # using memcpy so this does not depend on the byte order:
+    cdef unsigned char mask_bytes[8]
+    for i in range(8):
+        mask_bytes[i] = mcbuf[(i + initial_chars) & 0x3]
+    cdef uint64_t mask_value
+    memcpy(&mask_value, mask_bytes, 8)
+    # 64-bit pointers, the compiler can vectorize this loop:
+    cdef const uint64_t *dbuf = <const uint64_t *> (dcbuf+initial_chars)
+    cdef uint64_t *obuf = <uint64_t *> (ocbuf+initial_chars)
+    cdef unsigned int uint64_steps = (datalen-initial_chars) // 8
+    for i in range(uint64_steps):
+        obuf[i] = dbuf[i] ^ mask_value
+    # bytes at a time again at the end:
+    for i in range(initial_chars + uint64_steps*8, datalen):
+        ocbuf[i] = dcbuf[i] ^ mcbuf[i & 0x3]
@@ -26,8 +26,7 @@ class WebSocketProtocol(SocketProtocol):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.ws_data: bytes = b""
-        self.ws_payload: list[SizedBuffer] = []
+        self.ws_data: SizedBuffer = b""
         self.ws_payload_opcode: int = 0
         self.ws_mask: bool = MASK
         self._process_read = self.parse_ws_frame
@@ -43,7 +42,7 @@ class WebSocketProtocol(SocketProtocol):
         self.send_ws_close(reason=message)
         super().close(message)
         self.ws_data = b""
-        self.ws_payload = []
+        self.ws_payload_opcode = 0
 
     def send_ws_close(self, code: int = 1000, reason: str = "closing") -> None:
         data = close_packet(code, reason)
@@ -67,63 +66,62 @@ class WebSocketProtocol(SocketProtocol):
             self._read_queue_put(buf)
             return
         if self.ws_data:
-            ws_data = b"".join((self.ws_data, buf))
+            # join with the incomplete frame we kept,
+            # using a writable buffer so that we can unmask the payloads in place:
+            ws_data = bytearray().join((self.ws_data, buf))
             self.ws_data = b""
         else:
             ws_data = buf
         while self.input_packetcount == 0 and ws_data.startswith(b"\r\n"):
             ws_data = ws_data[2:]
         log("parse_ws_frame(%i bytes) total buffer is %i bytes", len(buf), len(ws_data))
-        while ws_data and not self._closed:
-            parsed = decode_hybi(ws_data)
+        inplace = isinstance(ws_data, bytearray)
+        # walk through the frames without slicing copies of the remaining data:
+        view = memoryview(ws_data)
+        pos = 0
+        while pos < len(view) and not self._closed:
+            parsed = decode_hybi(view[pos:], inplace)
             if parsed is None:
-                log("parse_ws_frame(%i bytes) not enough data: %r", len(ws_data), Ellipsizer(ws_data))
+                log("parse_ws_frame(%i bytes) not enough data: %r", len(view) - pos, Ellipsizer(view[pos:]))
                 # not enough data to get a full websocket frame,
                 # save it for later:
-                self.ws_data = ws_data
+                self.ws_data = view[pos:]
                 return
             opcode, payload, processed, fin = parsed
-            ws_data = ws_data[processed:]
+            pos += processed
             log("parse_ws_frame(%i bytes) payload=%i bytes, processed=%i, remaining=%i, opcode=%s, fin=%s",
-                len(buf), len(payload), processed, len(ws_data), OPCODE_STR.get(opcode, opcode), fin)
+                len(buf), len(payload), processed, len(view) - pos, OPCODE_STR.get(opcode, opcode), fin)
             if opcode == OPCODE.CONTINUE:
-                assert self.ws_payload_opcode and self.ws_payload, "continuation frame does not follow a partial frame"
-                self.ws_payload.append(payload)
-                if not fin:
-                    # wait for more
-                    continue
-                # join all the frames and process the payload:
-                full_payload = b"".join(memoryview_to_bytes(v) for v in self.ws_payload)
-                self.ws_payload = []
+                assert self.ws_payload_opcode, "continuation frame does not follow a partial frame"
                 opcode = self.ws_payload_opcode
-                self.ws_payload_opcode = 0
+                if fin:
+                    self.ws_payload_opcode = 0
             else:
-                if self.ws_payload and self.ws_payload_opcode:
+                if self.ws_payload_opcode:
                     op = OPCODE_STR.get(opcode, opcode)
                     raise ValueError(f"expected a continuation frame not {op}")
-                full_payload = payload
                 if not fin:
                     if opcode not in (OPCODE.BINARY, OPCODE.TEXT):
                         op = OPCODE_STR.get(opcode, opcode)
                         log(f"invalid opcode {opcode} from {buf!r}")
                         log(f"parsed as {parsed}")
                         raise RuntimeError(f"cannot handle fragmented {op} frames")
-                    # fragmented, keep this payload for later
+                    # fragmented, the continuation frames will follow:
                     self.ws_payload_opcode = opcode
-                    self.ws_payload.append(payload)
-                    continue
-            if opcode == OPCODE.BINARY:
-                self._read_queue_put(full_payload)
-            elif opcode == OPCODE.TEXT:
-                if first_time(f"ws-text-frame-from-{self._conn}"):
+            if opcode in (OPCODE.BINARY, OPCODE.TEXT):
+                if opcode == OPCODE.TEXT and first_time(f"ws-text-frame-from-{self._conn}"):
                     log.warn("Warning: handling text websocket frame as binary")
-                self._read_queue_put(full_payload)
+                # the packet parser re-assembles the stream,
+                # so there is no need to join the fragments first:
+                # (but an empty buffer would be interpreted as the end of the stream)
+                if payload:
+                    self._read_queue_put(payload)
             elif opcode == OPCODE.CLOSE:
-                self._process_ws_close(full_payload)
+                self._process_ws_close(payload)
             elif opcode == OPCODE.PING:
-                self._process_ws_ping(full_payload)
+                self._process_ws_ping(payload)
             elif opcode == OPCODE.PONG:
-                self._process_ws_pong(full_payload)
+                self._process_ws_pong(payload)
             else:
                 log.warn("Warning unhandled websocket opcode '%s'", OPCODE_STR.get(opcode, f"{opcode:x}"))
                 log("payload=%r", payload)
@@ -597,6 +597,7 @@ OPTION_TYPES: dict[str, Any] = {
     "debug"             : str,
     "input-method"      : str,
     "video-scaling"     : str,
+    "batch-controller"  : str,
     "video"             : bool,
     "audio"             : bool,
     "microphone"        : str,
@@ -641,6 +642,8 @@ OPTION_TYPES: dict[str, Any] = {
     "min-quality"       : int,
     "speed"             : int,
     "min-speed"         : int,
+    "encode-threads"    : int,
+    "latency-goal"      : int,
     "compression_level" : int,
     "dpi"               : int,
     "file-size-limit"   : str,
@@ -839,6 +842,7 @@ PROXY_START_OVERRIDABLE_OPTIONS: list[str] = [
     # no corresponding command line option:
     # "wm-name", "download-path",
     "compression_level", "video-scaling",
+    "batch-controller", "latency-goal",
     "title", "session-name",
     "clipboard", "clipboard-direction", "clipboard-filter-file",
     "input-method",
@@ -1116,6 +1120,8 @@ def get_defaults() -> dict[str, Any]:
         "min-quality"       : 1,
         "speed"             : 0,
         "min-speed"         : 1,
+        "encode-threads"    : 1,
+        "latency-goal"      : 100,
         "compression_level" : 1,
         "dpi"               : 0,
         "file-size-limit"   : "1G",
@@ -1144,6 +1150,7 @@ def get_defaults() -> dict[str, Any]:
         "speaker"           : ["disabled", "on"][has_audio_support() and not is_arm()],
         "microphone"        : ["disabled", "off"][has_audio_support()],
         "video-scaling"     : "auto",
+        "batch-controller"  : "heuristic",
         "readonly"          : False,
         "keyboard-sync"     : True,
         "displayfd"         : 0,
@@ -1510,6 +1510,24 @@ def parse_command_line(cmdline, defaults):
                      help="Use image compression with the given encoding speed,"
                           " from 1 to 100, 0 to use automatic setting."
                           " Default: %default.")
+    group.add_option("--encode-threads", action="store",
+                     metavar="THREADS",
+                     dest="encode_threads", type="int", default=defaults.encode_threads,
+                     help="Number of threads used for encoding the windows of each client,"
+                          " the windows are distributed amongst those threads."
+                          " Default: %default.")
+    group.add_option("--batch-controller", action="store",
+                     metavar="heuristic|predictive",
+                     dest="batch_controller", type="str", default=defaults.batch_controller,
+                     help="How the batch delay, speed and quality are calculated:"
+                          " 'heuristic' combines many factors,"
+                          " 'predictive' models the latency of each window to meet the latency goal."
+                          " Default: %default.")
+    group.add_option("--latency-goal", action="store",
+                     metavar="MILLISECONDS",
+                     dest="latency_goal", type="int", default=defaults.latency_goal,
+                     help="The end-to-end latency that the predictive batch controller aims for."
+                          " Default: %default.")
     group.add_option("--auto-refresh-delay", action="store",
                      dest="auto_refresh_delay", type="float", default=defaults.auto_refresh_delay,
                      metavar="DELAY",
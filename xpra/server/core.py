@@ -2522,6 +2522,18 @@ class ServerCore:
             info["original-desktop-display"] = self.original_desktop_display
         return info
 
+    def get_www_info(self) -> dict[str, Any]:
+        info = {
+            "": self._html,
+            "websocket-upgrade": self.websocket_upgrade,
+            "dir": self._www_dir or "",
+            "http-headers-dirs": self._http_headers_dirs or "",
+        }
+        if self._html:
+            from xpra.net.http.handler import content_cache  # pylint: disable=import-outside-toplevel
+            info["cache"] = content_cache.get_info()
+        return info
+
     def get_info(self, proto, *_args) -> dict[str, Any]:
         start = monotonic()
         # this function is for non UI thread info
@@ -2553,16 +2565,17 @@ class ServerCore:
                 "tcp-encryption": self.tcp_encryption or "",
                 "bandwidth-limit": self.bandwidth_limit or 0,
                 "packet-handlers": self.get_packet_handlers_info(),
-                "www": {
-                    "": self._html,
-                    "websocket-upgrade": self.websocket_upgrade,
-                    "dir": self._www_dir or "",
-                    "http-headers-dirs": self._http_headers_dirs or "",
-                },
+                "www": self.get_www_info(),
                 "mdns": self.mdns,
             }
             up("network", ni)
             up("threads", self.get_thread_info(proto))
+            try:
+                from xpra.buffers.membuf import get_membuf_pool_info  # pylint: disable=import-outside-toplevel
+            except ImportError as e:
+                log("no membuf pool info: %s", e)
+            else:
+                up("buffers", {"pool": get_membuf_pool_info()})
             up("logging", get_log_info())
             from xpra.platform.info import get_sys_info
             up("sys", get_sys_info())
@@ -9,8 +9,12 @@
 from time import monotonic
 from typing import Tuple
 
+from collections import deque
+cimport cython
+
 cdef extern from "math.h":
     double log(double x)
+    double exp(double x)
 
 from math import sqrt
 def logp(double x):
@@ -24,6 +28,150 @@ def smn(fn):
     return str(SMOOTHING_NAMES.get(fn, fn))
 
 
+DEF LN2 = 0.6931471805599453
+
+
+cdef class DecayingAverage:
+    """
+        Streaming version of `calculate_time_weighted_average`:
+        each value is added to two exponentially decayed sums,
+        one for the average and one for the recent average,
+        so both adding a value and querying the averages are O(1).
+        The half lives are expressed in seconds.
+    """
+    cdef double avg_rate
+    cdef double recent_rate
+    cdef double last_time
+    cdef double tv
+    cdef double tw
+    cdef double rv
+    cdef double rw
+    cdef readonly unsigned long count
+
+    def __init__(self, double half_life=10.0, double recent_half_life=1.0):
+        assert half_life>0 and recent_half_life>0
+        self.avg_rate = LN2/half_life
+        self.recent_rate = LN2/recent_half_life
+        self.reset()
+
+    def __repr__(self):
+        return "DecayingAverage(%i values)" % self.count
+
+    def __len__(self):
+        return self.count
+
+    def reset(self) -> None:
+        self.last_time = 0
+        self.tv = self.tw = self.rv = self.rw = 0
+        self.count = 0
+
+    cdef void accumulate(self, double value, double weight, double event_time):
+        cdef double delta = event_time-self.last_time
+        cdef double ad = 1.0
+        cdef double rd = 1.0
+        if weight<=0:
+            return
+        if self.count==0:
+            self.last_time = event_time
+        elif delta>=0:
+            #age the values we already have:
+            ad = exp(-delta*self.avg_rate)
+            rd = exp(-delta*self.recent_rate)
+            self.tv *= ad
+            self.tw *= ad
+            self.rv *= rd
+            self.rw *= rd
+            self.last_time = event_time
+            ad = rd = 1.0
+        else:
+            #this value is older than the last one we added:
+            ad = exp(delta*self.avg_rate)
+            rd = exp(delta*self.recent_rate)
+        self.tv += value*weight*ad
+        self.tw += weight*ad
+        self.rv += value*weight*rd
+        self.rw += weight*rd
+        self.count += 1
+
+    def add(self, double value, double weight=1.0, double event_time=0) -> None:
+        if event_time<=0:
+            event_time = monotonic()
+        self.accumulate(value, weight, event_time)
+
+    def get(self) -> Tuple[float,float]:
+        """
+            Returns the average and the recent average,
+            both are 0 until we have values.
+        """
+        #the sums all decay at the same rate,
+        #so their ratio does not depend on when we query it:
+        if self.tw<=0 or self.rw<=0:
+            return 0.0, 0.0
+        return self.tv / self.tw, self.rv / self.rw
+
+
+cdef class SizeWeightedAverage(DecayingAverage):
+    """
+        Streaming version of `calculate_size_weighted_average`,
+        the size of each record also gives it a weight boost.
+        The size boost is relative to a moving average of the sizes,
+        rather than to the average of all the records.
+    """
+    cdef double size_avg
+
+    def reset(self) -> None:
+        DecayingAverage.reset(self)
+        self.size_avg = 0
+
+    def record(self, double event_time, double size, double value) -> None:
+        if value<=0 or size<=0:
+            return      #invalid record
+        if self.size_avg<=0:
+            self.size_avg = size
+        else:
+            self.size_avg += (size-self.size_avg)/16
+        cdef double pw = clogp(size/self.size_avg)
+        self.accumulate(max(1, size*value)/size, pw*size, event_time)
+
+
+cdef class WindowedMin:
+    """
+        The minimum of the last `size` values,
+        using a monotonic queue so that adding values is O(1) amortized,
+        and the minimum is always at the front of the queue.
+    """
+    cdef object values
+    cdef long long size
+    cdef long long sequence
+
+    def __init__(self, long long size=100):
+        self.size = max(1, size)
+        self.values = deque()
+        self.sequence = 0
+
+    def __repr__(self):
+        return "WindowedMin(%s)" % self.get()
+
+    def __len__(self):
+        return min(self.sequence, self.size)
+
+    @cython.wraparound(True)
+    def add(self, value) -> None:
+        values = self.values
+        while values and values[-1][1]>=value:
+            values.pop()
+        values.append((self.sequence, value))
+        self.sequence += 1
+        while values[0][0]<self.sequence-self.size:
+            values.popleft()
+
+    def get(self):
+        values = self.values
+        if not values:
+            return None
+        return values[0][1]
+
+
 def calculate_time_weighted_average(data) -> Tuple[float,float]:
     """
         Given a list of items of the form [(event_time, value)],
@@ -203,10 +351,14 @@ def queue_inspect(metric, time_values, float target=1.0, float div=1.0,
     """
         Given an historical list of values and a current value,
         figure out if things are getting better or worse.
+        The values can also be accumulated in a `DecayingAverage`.
     """
     #inspect a queue size history: figure out if things are better or worse than before
     if len(time_values)==0:
         return metric, {}, 1.0, 0.0
-    avg, recent = calculate_time_weighted_average(tuple(time_values))
+    if isinstance(time_values, DecayingAverage):
+        avg, recent = time_values.get()
+    else:
+        avg, recent = calculate_time_weighted_average(tuple(time_values))
     weight_multiplier = sqrt(max(avg, recent) / div / target)
     return calculate_for_target(metric, target, avg, recent, aim=0.25, div=div, slope=1.0, smoothing=smoothing, weight_multiplier=weight_multiplier)
@@ -12,7 +12,6 @@ from xpra.util.parsing import parse_scaling_value, from0to100
 from xpra.util.objects import typedict
 from xpra.util.str_fn import csv
 from xpra.common import ConnectionMessage
-from xpra.util.io import load_binary_file
 from xpra.net.common import PacketType
 from xpra.util.stats import std_unit
 from xpra.scripts.config import str_to_bool, FALSE_OPTIONS, TRUE_OPTIONS
@@ -371,22 +370,19 @@ class ServerBaseControlCommands(StubServerMixin):
                 raise ControlError("file '%s' is too large: %sB (limit is %sB)" % (
                     filename, std_unit(file_size), std_unit(self.file_transfer.file_size_limit)))
 
-        # find the file and load it:
+        # find the file, it will be streamed from disk:
         actual_filename = os.path.abspath(os.path.expanduser(filename))
+        if not os.path.exists(actual_filename):
+            raise ControlError(f"file {filename!r} does not exist")
         try:
             stat = os.stat(actual_filename)
             filelog("os.stat(%s)=%s", actual_filename, stat)
-        except os.error:
+        except OSError as e:
             filelog("os.stat(%s)", actual_filename, exc_info=True)
-        else:
-            checksize(stat.st_size)
-        if not os.path.exists(actual_filename):
-            raise ControlError(f"file {filename!r} does not exist")
-        data = load_binary_file(actual_filename)
-        if not data:
-            raise ControlError(f"no data loaded from {actual_filename!r}")
-        # verify size:
-        file_size = len(data)
+            raise ControlError(f"cannot access {actual_filename!r}: {e}") from None
+        file_size = stat.st_size
+        if not file_size:
+            raise ControlError(f"no data found in {actual_filename!r}")
         checksize(file_size)
         # send it to each client:
         for ss in sources:
@@ -413,7 +409,7 @@ class ServerBaseControlCommands(StubServerMixin):
                              ss, std_unit(ss.file_size_limit), std_unit(file_size))
             else:
                 filelog(f"sending {filename} to {ss}")
-                ss.send_file(filename, "", data, file_size, *send_file_args)
+                ss.send_file(actual_filename, "", None, file_size, *send_file_args)
         return f"{command_type} of {filename!r} to {client_uuids} initiated"
 
     def control_command_remove_window_filters(self) -> str:
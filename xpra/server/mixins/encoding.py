@@ -10,13 +10,14 @@ from collections.abc import Sequence
 from xpra.scripts.config import parse_bool_or_int, csvstrl
 from xpra.util.env import envint
 from xpra.os_util import OSX
-from xpra.util.str_fn import bytestostr
+from xpra.util.str_fn import bytestostr, csv
 from xpra.net.common import PacketType
 from xpra.util.version import vtrim
 from xpra.codecs.constants import preforder, STREAM_ENCODINGS, TRUE_LOSSLESS_ENCODINGS
 from xpra.codecs.loader import get_codec, codec_versions, load_codec
 from xpra.codecs.video import getVideoHelper
 from xpra.server.mixins.stub_server_mixin import StubServerMixin
+from xpra.server.window.batch_controller import BATCH_CONTROLLERS
 from xpra.log import Logger
 from xpra.common import FULL_INFO
 
@@ -47,6 +48,9 @@ class EncodingServer(StubServerMixin):
         self.default_min_quality = 0
         self.default_speed = -1
         self.default_min_speed = 0
+        self.encode_threads = 1
+        self.batch_controller = "heuristic"
+        self.latency_goal = 100
         self.allowed_encodings: Sequence[str] = ()
         self.core_encodings: Sequence[str] = ()
         self.encodings: Sequence[str] = ()
@@ -65,6 +69,13 @@ class EncodingServer(StubServerMixin):
         self.default_min_quality = opts.min_quality
         self.default_speed = opts.speed
         self.default_min_speed = opts.min_speed
+        self.encode_threads = max(1, opts.encode_threads)
+        self.batch_controller = (opts.batch_controller or "heuristic").lower()
+        if self.batch_controller not in BATCH_CONTROLLERS:
+            log.warn("Warning: invalid batch controller '%s', using 'heuristic'", self.batch_controller)
+            log.warn(" valid options: %s", csv(BATCH_CONTROLLERS))
+            self.batch_controller = "heuristic"
+        self.latency_goal = max(1, opts.latency_goal)
         self.video = opts.video
         if self.video:
             if opts.video_scaling.lower() not in ("auto", "on"):
@@ -126,9 +137,19 @@ class EncodingServer(StubServerMixin):
     def get_info(self, _proto) -> dict[str, Any]:
         info = {
             "encodings": self.get_encoding_info(),
+            "batch": {
+                "controller": self.batch_controller,
+                "latency-goal": self.latency_goal,
+            },
         }
         if self.video:
             info["video"] = getVideoHelper().get_info()
+        try:
+            from xpra.server.window.encode_share import get_encode_share
+        except ImportError:
+            pass
+        else:
+            info["encode-share"] = get_encode_share().get_info()
         if FULL_INFO > 0:
             for k, v in codec_versions.items():
                 info.setdefault("encoding", {}).setdefault(k, {})["version"] = vtrim(v)
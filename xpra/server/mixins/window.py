@@ -10,6 +10,7 @@ from xpra.os_util import gi_import
 from xpra.util.objects import typedict
 from xpra.server.mixins.stub_server_mixin import StubServerMixin
 from xpra.server.source.windows import WindowsMixin
+from xpra.server.window.iconcache import icon_cache
 from xpra.net.common import PacketType
 from xpra.log import Logger
 
@@ -86,6 +87,7 @@ class WindowServer(StubServerMixin):
                 "windows": sum(int(window.is_managed()) for window in tuple(self._id_to_window.values())),
             },
             "filters": tuple((uuid, repr(f)) for uuid, f in self.window_filters),
+            "icon-cache": icon_cache.get_info(),
         }
 
     def get_ui_info(self, _proto, _client_uuids=None, wids=None, *_args) -> dict[str, Any]:
@@ -12,9 +12,10 @@ from threading import Thread
 from collections.abc import Callable, Iterable, Sequence
 
 from xpra.net.net_util import get_network_caps
+from xpra.net import compression
 from xpra.net.compression import Compressed, compressed_wrapper, MIN_COMPRESS_SIZE
 from xpra.net.protocol.constants import CONNECTION_LOST
-from xpra.net.common import MAX_PACKET_SIZE, PacketType
+from xpra.net.common import MAX_PACKET_SIZE, PacketType, RawPacket
 from xpra.net.digest import get_salt, gendigest
 from xpra.codecs.loader import load_codec, get_codec
 from xpra.codecs.image import ImageWrapper
@@ -41,6 +42,13 @@ PROXY_QUEUE_SIZE = envint("XPRA_PROXY_QUEUE_SIZE", 0)
 PASSTHROUGH_RGB = envbool("XPRA_PROXY_PASSTHROUGH_RGB", False)
 VIDEO_TIMEOUT = 5  # destroy video encoder after N seconds of idle state
 PASSTHROUGH_AUTH = envbool("XPRA_PASSTHROUGH_AUTH", True)
+# forward packets we don't need to look at without decoding them:
+PROXY_RAW_PACKETS = envbool("XPRA_PROXY_RAW_PACKETS", True)
+SERVER_RAW_PACKETS = ("cursor", "window-icon", "sound-data", "send-file-chunk", "ping")
+CLIENT_RAW_PACKETS = (
+    "damage-sequence", "pointer", "pointer-position", "pointer-button", "key-action",
+    "sound-data", "send-file-chunk", "ack-file-chunk", "ping",
+)
 
 PING_INTERVAL = max(1, envint("XPRA_PROXY_PING_INTERVAL", 5)) * 1000
 PING_WARNING = max(5, envint("XPRA_PROXY_PING_WARNING", 5))
@@ -315,6 +323,29 @@ class ProxyInstance:
         self.server_protocol.enable_encoder_from_caps(caps)
         return filter_caps(caps, ("aliases",), self.client_protocol)
 
+    def setup_raw_packets(self, server_caps: typedict) -> None:
+        """
+        Packets that we don't need to inspect or modify can be forwarded
+        without being decompressed, decoded and re-encoded,
+        provided that both ends use the same packet encoder
+        and that the receiving end supports the compressor used by the sender.
+        """
+        sp = self.server_protocol
+        cp = self.client_protocol
+        if not PROXY_RAW_PACKETS or not sp or not cp or sp.encoder != cp.encoder:
+            log("raw packets disabled, encoders: %s / %s", sp and sp.encoder, cp and cp.encoder)
+            return
+
+        def get_compressors(caps: typedict) -> dict[str, bool]:
+            return {name: compression.use_dictionary(name, caps) for name in caps.strtupleget("compressors")}
+
+        server_packets = list(SERVER_RAW_PACKETS)
+        if not self.video_encoder_types and not PASSTHROUGH_RGB:
+            # draw packets are never re-encoded:
+            server_packets.append("draw")
+        sp.set_raw_packets(server_packets, get_compressors(self.caps))
+        cp.set_raw_packets(CLIENT_RAW_PACKETS, get_compressors(server_caps))
+
     ################################################################################
 
     def queue_client_packet(self, packet: PacketType) -> None:
@@ -330,6 +361,10 @@ class ProxyInstance:
         return p, True, s > 0 or self.server_has_more
 
     def process_client_packet(self, proto, packet: PacketType) -> None:
+        if isinstance(packet, RawPacket):
+            self.client_has_more = proto.receive_pending
+            self.queue_server_packet(packet)
+            return
         packet_type = str(packet[0])
         log("process_client_packet: %s", packet_type)
         if packet_type == CONNECTION_LOST:
@@ -455,6 +490,10 @@ class ProxyInstance:
         return True
 
     def process_server_packet(self, proto, packet: PacketType) -> None:
+        if isinstance(packet, RawPacket):
+            self.server_has_more = proto.receive_pending
+            self.queue_client_packet(packet)
+            return
         packet_type = str(packet[0])
         log("process_server_packet: %s", packet_type)
         if packet_type == CONNECTION_LOST:
@@ -485,6 +524,7 @@ class ProxyInstance:
                 caps.update(auth_caps)
             # may need to bump packet size:
             proto.max_packet_size = max(MAX_PACKET_SIZE, maxw * maxh * 4 * 4)
+            self.setup_raw_packets(c)
             packet = ("hello", caps)
         elif packet_type == "ping_echo" and self.server_ping_timer and len(packet) >= 7 and packet[6] == self.uuid:
             # this is one of our ping packets:
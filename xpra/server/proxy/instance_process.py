@@ -354,6 +354,11 @@ class ProxyInstanceProcess(ProxyInstance, QueueScheduler, Process):
             return True
         return False
 
+    def get_proxy_info(self, proto) -> dict[str, Any]:
+        info = super().get_proxy_info(proto)
+        info["proxy"]["scheduler"] = self.get_scheduler_info()
+        return info
+
     ################################################################################
 
     def stop(self, skip_proto, *reasons) -> None:
@@ -3,12 +3,17 @@
 # Xpra is released under the terms of the GNU GPL v2, or, at your option, any
 # later version. See the file COPYING for details.
 
+from heapq import heappush, heappop, heapify
 from queue import SimpleQueue
-from threading import Timer, RLock
+from threading import Condition, RLock, Thread
+from time import monotonic
+from collections import deque
 from typing import Any, TypeAlias
 from collections.abc import Callable, Sequence
 
 from xpra.util.objects import AtomicInteger
+from xpra.util.stats import get_list_stats
+from xpra.util.thread import start_thread
 from xpra.log import Logger
 
 log = Logger("util")
@@ -18,27 +23,39 @@ ScheduledItemType: TypeAlias = tuple[Callable, Sequence[Any], dict[str, Any]]
 
 # emulate the glib main loop using a single thread + queue:
 class QueueScheduler:
-    __slots__ = ("main_queue", "exit", "timer_id", "timers", "timer_lock")
+    """
+    Timeouts are kept in a heap ordered by deadline,
+    a single timer thread waits for the earliest one to expire
+    and posts the callback to the main queue.
+    Cancelled timers are only removed from `timers`,
+    their heap entries are discarded when they reach the top.
+    """
+    __slots__ = ("main_queue", "exit", "timer_id", "timers", "timer_lock",
+                 "timer_heap", "timer_condition", "timer_thread", "timer_lateness")
 
     def __init__(self):
         self.main_queue: SimpleQueue[ScheduledItemType | None] = SimpleQueue()
         self.exit = False
         self.timer_id = AtomicInteger()
-        self.timers: dict[int, Timer | None] = {}
+        # the deadline of each timer, or None for idle callbacks:
+        self.timers: dict[int, float | None] = {}
         self.timer_lock = RLock()
+        self.timer_heap: list[tuple[float, int, tuple]] = []
+        self.timer_condition = Condition(self.timer_lock)
+        self.timer_thread: Thread | None = None
+        # how late the timers ran, in milliseconds:
+        self.timer_lateness: deque[float] = deque(maxlen=100)
 
     def source_remove(self, tid: int) -> None:
         log("source_remove(%i)", tid)
         with self.timer_lock:
-            timer = self.timers.pop(tid, None)
-            if timer:
-                timer.cancel()
+            # the heap entry will be skipped:
+            self.timers.pop(tid, None)
 
     def idle_add(self, fn: Callable, *args, **kwargs) -> int:
         tid = self.timer_id.increase()
         self.main_queue.put((self.idle_repeat_call, (tid, fn, args, kwargs), {}))
-        # add an entry,
-        # but use the value None to stop us from trying to call cancel()
+        # add an entry without a deadline:
         self.timers[tid] = None
         return tid
 
@@ -53,35 +70,70 @@ class QueueScheduler:
         return tid
 
     def do_timeout_add(self, tid: int, timeout: int, fn: Callable, *args, **kwargs) -> None:
-        # emulate glib's timeout_add using Timers
-        args = (tid, timeout, fn, args, kwargs)
-        t = Timer(timeout / 1000.0, self.queue_timeout_function, args)
-        self.timers[tid] = t
-        t.start()
-
-    def queue_timeout_function(self, tid: int, timeout: int, fn: Callable, fn_args, fn_kwargs) -> None:
-        if tid not in self.timers:  # pragma: no cover
-            return  # cancelled
-        # add to run queue:
-        mqargs = (tid, timeout, fn, fn_args, fn_kwargs)
-        self.main_queue.put((self.timeout_repeat_call, mqargs, {}))
-
-    def timeout_repeat_call(self, tid: int, timeout: int, fn: Callable, fn_args, fn_kwargs) -> bool:
+        deadline = monotonic() + timeout / 1000.0
+        with self.timer_lock:
+            self.timers[tid] = deadline
+            heap = self.timer_heap
+            if len(heap) > 64 and len(heap) > 2 * len(self.timers):
+                # too many cancelled entries, drop them:
+                heap[:] = [entry for entry in heap if self.timers.get(entry[1]) == entry[0]]
+                heapify(heap)
+            heappush(heap, (deadline, tid, (timeout, fn, args, kwargs)))
+            if heap[0][1] == tid:
+                # this is now the first timer to expire:
+                self.timer_condition.notify()
+            if not self.timer_thread:
+                self.timer_thread = start_thread(self.timer_loop, "queue-scheduler-timers", daemon=True)
+
+    def timer_loop(self) -> None:
+        heap = self.timer_heap
+        with self.timer_condition:
+            while not self.exit:
+                if not heap:
+                    self.timer_condition.wait()
+                    continue
+                deadline, tid, timer_args = heap[0]
+                delay = deadline - monotonic()
+                if delay > 0:
+                    self.timer_condition.wait(delay)
+                    continue
+                heappop(heap)
+                if self.timers.get(tid) != deadline:
+                    continue  # cancelled or rescheduled
+                # add to run queue:
+                self.main_queue.put((self.timeout_repeat_call, (tid, deadline, *timer_args), {}))
+
+    def timeout_repeat_call(self, tid: int, deadline: float, timeout: int, fn: Callable, fn_args, fn_kwargs) -> bool:
         # executes the function then re-schedules it (if it returns True)
         if tid not in self.timers:  # pragma: no cover
             return False  # cancelled
+        self.timer_lateness.append(1000 * (monotonic() - deadline))
         v = fn(*fn_args, **fn_kwargs)
         if bool(v):
-            # create a new timer with the same tid:
+            # schedule it again with the same tid:
             with self.timer_lock:
                 if tid in self.timers:
                     self.do_timeout_add(tid, timeout, fn, *fn_args, **fn_kwargs)
         else:
             self.timers.pop(tid, None)
-        # we do the scheduling via timers, so always return False here
+        # we do the scheduling via the timer thread, so always return False here
         # so that the main queue won't re-schedule this function call itself:
         return False
 
+    def get_scheduler_info(self) -> dict[str, Any]:
+        with self.timer_lock:
+            timers = sum(1 for deadline in self.timers.values() if deadline is not None)
+            info: dict[str, Any] = {
+                "queue": self.main_queue.qsize(),
+                "timers": timers,
+                "idle": len(self.timers) - timers,
+                "heap": len(self.timer_heap),
+            }
+        lateness = tuple(self.timer_lateness)
+        if lateness:
+            info["lateness"] = get_list_stats(lateness)
+        return info
+
     def run(self) -> None:
         log("run() queue has %s items already in it", self.main_queue.qsize())
         # process "idle_add"/"timeout_add" events in the main loop:
@@ -102,6 +154,8 @@ class QueueScheduler:
 
     def stop(self) -> None:
         self.exit = True
+        with self.timer_condition:
+            self.timer_condition.notify()
         self.stop_main_queue()
 
     def stop_main_queue(self) -> None:
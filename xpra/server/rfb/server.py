@@ -203,13 +203,13 @@ class RFBServer:
         pixel_format = packet[4:14]
         self._server_sources[proto].set_pixel_format(pixel_format)
 
-    def _process_rfb_FramebufferUpdateRequest(self, _proto, packet):
-        # pressed, _, _, keycode = packet[1:5]
+    def _process_rfb_FramebufferUpdateRequest(self, proto, packet):
         inc, x, y, w, h = packet[1:6]
         log("RFB: FramebufferUpdateRequest inc=%s, geometry=%s", inc, (x, y, w, h))
-        if not inc:
-            model = self._get_rfb_desktop_model()
-            GLib.idle_add(self.refresh_window_area, model, x, y, w, h)
+        source = self._server_sources.get(proto)
+        model = self._get_rfb_desktop_model()
+        if source and model:
+            GLib.idle_add(source.update_request, model, inc, x, y, w, h)
 
     def _process_rfb_ClientCutText(self, _proto, packet):
         # l = packet[4]
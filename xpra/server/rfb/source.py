@@ -3,19 +3,49 @@
 # Xpra is released under the terms of the GNU GPL v2, or, at your option, any
 # later version. See the file COPYING for details.
 
+import zlib
 import struct
 from threading import Event
 from typing import Any
 
 from xpra.net.rfb.const import RFBEncoding
-from xpra.net.rfb.encode import raw_encode, tight_encode, tight_png, rgb222_encode
+from xpra.net.rfb.encode import (
+    ZLIB_PIXEL_FORMATS, fbupdate_header,
+    raw_encode, tight_encode, tight_png, rgb222_encode, zlib_encode, zrle_encode, copyrect_encode,
+)
 from xpra.net.protocol.socket_handler import PACKET_JOIN_SIZE
 from xpra.net.common import PacketElement
+from xpra.util.rectangle import rectangle, add_rectangle, merge_all, merge_regions
 from xpra.util.objects import AtomicInteger
 from xpra.util.str_fn import csv, strtobytes, memoryview_to_bytes
+from xpra.util.env import envint, envbool
 from xpra.log import Logger
 
 log = Logger("rfb")
+scrolllog = Logger("rfb", "scroll")
+
+# compression level of the zlib streams used by the 'zlib' and 'zrle' encodings:
+ZLIB_LEVEL = max(0, min(9, envint("XPRA_RFB_ZLIB_LEVEL", 1)))
+# use scroll detection to send 'CopyRect' updates,
+# and to skip the lines that have not changed:
+SCROLL = envbool("XPRA_RFB_SCROLL", True)
+# only look for scrolling when the update covers at least this percentage of the screen:
+SCROLL_MIN_PERCENT = envint("XPRA_RFB_SCROLL_MIN_PERCENT", 50)
+# send the whole update as a single rectangle rather than more pieces than this:
+MAX_RECTANGLES = envint("XPRA_RFB_MAX_RECTANGLES", 50)
+# the cost of sending an extra rectangle, expressed in pixels:
+RECTANGLE_COST = envint("XPRA_RFB_RECTANGLE_COST", 1024)
+
+
+def has_zrle() -> bool:
+    try:
+        from xpra.net.rfb import zrle
+        assert zrle
+        return True
+    except ImportError as e:
+        log("no zrle encoder: %s", e)
+        return False
+
 
 counter = AtomicInteger()
 
@@ -24,7 +54,8 @@ class RFBSource:
     __slots__ = (
         "protocol", "close_event", "log_disconnect",
         "ui_client", "counter", "share", "uuid", "lock", "keyboard_config",
-        "encodings", "quality", "pixel_format"
+        "encodings", "quality", "pixel_format",
+        "window", "dirty", "update_requested", "zlib_streams", "scroll_data",
     )
 
     def __init__(self, protocol, share=False):
@@ -40,12 +71,22 @@ class RFBSource:
         self.encodings = [RFBEncoding.RAW]
         self.pixel_format = (32, 24, 0, 1, 255, 255, 255, 16, 8, 0)
         self.quality = 0
+        self.window = None
+        # the areas that have changed since we last sent them to the client:
+        self.dirty: list[rectangle] = []
+        self.update_requested = False
+        # the zlib streams persist for the lifetime of the connection, one per encoding:
+        self.zlib_streams: dict[int, Any] = {}
+        self.scroll_data = None
 
     def get_info(self) -> dict[str, Any]:
         return {
             "protocol": "rfb",
             "uuid": self.uuid,
             "share": self.share,
+            "encodings": csv(e.name for e in self.encodings),
+            "dirty": len(self.dirty),
+            "update-requested": self.update_requested,
         }
 
     def set_encodings(self, encodings) -> None:
@@ -56,6 +97,8 @@ class RFBSource:
                 known_encodings.append(RFBEncoding(v))
             except ValueError:
                 unknown_encodings.append(v)
+        if RFBEncoding.ZRLE in known_encodings and not has_zrle():
+            known_encodings.remove(RFBEncoding.ZRLE)
         self.encodings = known_encodings
         log("RFB encodings: %s", csv(self.encodings))
         if unknown_encodings:
@@ -78,6 +121,16 @@ class RFBSource:
 
     def close(self) -> None:
         self.close_event.set()
+        self.window = None
+        self.dirty = []
+        self.zlib_streams = {}
+        self.free_scroll_data()
+
+    def free_scroll_data(self) -> None:
+        sd = self.scroll_data
+        if sd:
+            self.scroll_data = None
+            sd.free()
 
     def ping(self) -> None:
         """ ignore as there are no equivalent messages in RFB """
@@ -107,36 +160,145 @@ class RFBSource:
         log("update_mouse%s", args)
 
     def damage(self, _wid, window, x, y, w, h, options=None) -> None:
-        polling = options and options.get("polling", False)
-        p = self.protocol
-        if polling and p is None or p.queue_size() >= 2:
-            # very basic RFB update rate control,
-            # if there are packets waiting already
-            # we'll just process the next polling update instead:
+        if self.is_closed():
             return
+        self.window = window
+        add_rectangle(self.dirty, rectangle(x, y, w, h))
+        self.send_updates()
+
+    def update_request(self, window, incremental, x, y, w, h) -> None:
+        """
+        Updates are only sent in response to a `FramebufferUpdateRequest`,
+        which is also how the client controls the update rate.
+        """
         if self.is_closed():
             return
-        encode = raw_encode
-        kwargs = {}
+        self.window = window
+        self.update_requested = True
+        if not incremental:
+            # the client wants this area even if it has not changed,
+            # and we can no longer rely on its contents for scrolling:
+            add_rectangle(self.dirty, rectangle(x, y, w, h))
+            self.free_scroll_data()
+        self.send_updates()
+
+    def send_updates(self) -> None:
+        window = self.window
+        if not self.update_requested or not self.dirty or not window or not self.protocol:
+            return
+        regions = self.dirty
+        self.dirty = []
+        rects = self.encode_regions(window, regions)
+        if not rects:
+            # nothing has actually changed,
+            # so the request remains pending until something does:
+            return
+        self.update_requested = False
+        self.send_many(fbupdate_header(len(rects)), *(part for rect in rects for part in rect))
+
+    def encode_regions(self, window, regions: list[rectangle]) -> list[list]:
+        ww, wh = window.get_dimensions()
+        screen = rectangle(0, 0, ww, wh)
+        regions = [r for r in (screen.intersection_rect(region) for region in regions) if r]
+        if not regions:
+            return []
+        if len(regions) > 1:
+            regions = merge_regions(regions, RECTANGLE_COST)
+        if len(regions) > MAX_RECTANGLES:
+            regions = [merge_all(regions)]
+        bounds = merge_all(regions)
+        if SCROLL and self.pixel_format[:2] == (32, 24) and \
+                bounds.width * bounds.height * 100 >= ww * wh * SCROLL_MIN_PERCENT:
+            img = window.get_image(0, 0, ww, wh)
+            window.acknowledge_changes()
+            if not img:
+                return []
+            areas = self.get_scroll_areas(img)
+            if areas:
+                return self.encode_scrolling(img, *areas)
+            return [self.encode_rect(img.get_sub_image(r.x, r.y, r.width, r.height), r.x, r.y) for r in regions]
+        rects = []
+        for r in regions:
+            img = window.get_image(r.x, r.y, r.width, r.height)
+            window.acknowledge_changes()
+            if not img:
+                continue
+            rects.append(self.encode_rect(img, r.x, r.y))
+            # the client's copy of this area no longer matches the scroll data:
+            if self.scroll_data:
+                self.scroll_data.invalidate(r.x, r.y, r.width, r.height)
+        return [rect for rect in rects if rect]
+
+    def get_scroll_areas(self, img) -> tuple[list, list] | None:
+        """
+        Compares the image with the one we sent previously,
+        returns the areas that have scrolled and the ones that need to be repainted.
+        """
+        try:
+            if not self.scroll_data:
+                from xpra.server.window.motion import ScrollData  # pylint: disable=import-outside-toplevel
+                self.scroll_data = ScrollData()
+            w = img.get_width()
+            h = img.get_height()
+            self.scroll_data.update(img.get_pixels(), 0, 0, w, h, img.get_rowstride(), img.get_bytesperpixel())
+            self.scroll_data.calculate(min(1000, h))
+            return self.scroll_data.get_scroll_areas()
+        except ImportError as e:
+            scrolllog("no scroll detection: %s", e)
+        except (RuntimeError, ValueError, AssertionError):
+            scrolllog("get_scroll_areas(%s)", img, exc_info=True)
+        self.free_scroll_data()
+        return None
+
+    def encode_scrolling(self, img, scrolls: list, repaint: list) -> list[list]:
+        w = img.get_width()
+        h = img.get_height()
+        if len(scrolls) + len(repaint) > MAX_RECTANGLES:
+            scrolllog("too many rectangles: %i scrolls and %i repaints", len(scrolls), len(repaint))
+            return [self.encode_rect(img, 0, 0)]
+        rects = []
+        copied: list[rectangle] = []
+        use_copyrect = RFBEncoding.COPYRECT in self.encodings
+        for sx, sy, sw, sh, dx, dy in scrolls:
+            src = rectangle(sx, sy, sw, sh)
+            # the client processes the rectangles in order,
+            # so the source must not have been overwritten by a previous copy:
+            if use_copyrect and not any(src.intersects_rect(r) for r in copied):
+                rects.append(copyrect_encode(sx + dx, sy + dy, sw, sh, sx, sy))
+                copied.append(rectangle(sx + dx, sy + dy, sw, sh))
+            else:
+                repaint.append((sx + dx, sy + dy, sw, sh))
+        scrolllog("scroll areas for %ix%i: %i copies, repaint=%s", w, h, len(rects), repaint)
+        for x, y, rw, rh in repaint:
+            rects.append(self.encode_rect(img.get_sub_image(x, y, rw, rh), x, y))
+        return [rect for rect in rects if rect]
+
+    def get_zlib_stream(self, encoding: int):
+        zstream = self.zlib_streams.get(encoding)
+        if not zstream:
+            zstream = self.zlib_streams[encoding] = zlib.compressobj(ZLIB_LEVEL)
+        return zstream
+
+    def encode_rect(self, img, x: int, y: int) -> list:
         if self.pixel_format[:2] != (32, 24):
             if self.pixel_format[:3] == (8, 6, 0):
                 # crappy initial format chosen by realvnc
-                encode = rgb222_encode
-            else:
-                log("damage: unsupported client pixel format: %s", self.pixel_format)
-                return
-        elif RFBEncoding.TIGHT_PNG in self.encodings:
-            encode = tight_png
-        elif RFBEncoding.TIGHT in self.encodings:
-            encode = tight_encode
-            kwargs = {"quality": self.quality}
-        # doesn't work
-        # elif RFBEncoding.ZLIB in self.encodings:
-        #    encode = zlib_encode
-        packets = encode(window, x, y, w, h, **kwargs)
-        if not packets:
-            return
-        self.send_many(*packets)
+                return rgb222_encode(img, x, y)
+            log("damage: unsupported client pixel format: %s", self.pixel_format)
+            return []
+        # the client lists the encodings in its order of preference:
+        for encoding in self.encodings:
+            if encoding == RFBEncoding.ZRLE and img.get_pixel_format() in ZLIB_PIXEL_FORMATS:
+                return zrle_encode(img, x, y, self.get_zlib_stream(encoding))
+            if encoding == RFBEncoding.ZLIB and img.get_pixel_format() in ZLIB_PIXEL_FORMATS:
+                return zlib_encode(img, x, y, self.get_zlib_stream(encoding))
+            if encoding == RFBEncoding.TIGHT_PNG:
+                return tight_png(img, x, y)
+            if encoding == RFBEncoding.TIGHT:
+                return tight_encode(img, x, y, quality=self.quality)
+            if encoding == RFBEncoding.RAW:
+                break
+        return raw_encode(img, x, y)
 
     def send_many(self, *packets):
         # merge small packets together:
@@ -0,0 +1,73 @@
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+from typing import Any
+
+from xpra.util.env import envint
+from xpra.util.rectangle import rectangle, add_rectangle, merge_all, merge_regions
+from xpra.log import Logger
+
+log = Logger("shadow", "damage")
+
+# beyond this number of rectangles, we just use the bounding box:
+MAX_RECTANGLES = max(1, envint("XPRA_SHADOW_DAMAGE_MAX_RECTANGLES", 256))
+# the cost of each rectangle we refresh, expressed in pixels:
+PACKET_COST = max(0, envint("XPRA_SHADOW_DAMAGE_PACKET_COST", 4096))
+
+
+class ShadowDamage:
+    """
+    Accumulates the areas of the shadowed screen that have changed between two refreshes.
+    """
+
+    def __init__(self):
+        self.regions: list[rectangle] = []
+        # until we receive damage events, we have to assume that everything has changed:
+        self.full = True
+        self.events = 0
+        self.refreshes = 0
+        self.skipped = 0
+
+    def __repr__(self):
+        return f"ShadowDamage({len(self.regions)} regions, full={self.full})"
+
+    def damage(self, x: int, y: int, width: int, height: int) -> None:
+        self.events += 1
+        if self.full or width <= 0 or height <= 0:
+            return
+        add_rectangle(self.regions, rectangle(x, y, width, height))
+        if len(self.regions) > MAX_RECTANGLES:
+            self.regions = [merge_all(self.regions)]
+
+    def invalidate(self) -> None:
+        self.full = True
+        self.regions = []
+
+    def take(self) -> list[rectangle] | None:
+        """
+        Returns the areas that have changed since the last call,
+        None if everything must be refreshed,
+        or an empty list if nothing has changed.
+        """
+        self.refreshes += 1
+        if self.full:
+            self.full = False
+            self.regions = []
+            return None
+        regions = self.regions
+        self.regions = []
+        if not regions:
+            self.skipped += 1
+            return regions
+        return merge_regions(regions, PACKET_COST)
+
+    def get_info(self) -> dict[str, Any]:
+        return {
+            "regions": len(self.regions),
+            "full": self.full,
+            "events": self.events,
+            "refreshes": self.refreshes,
+            "skipped": self.skipped,
+        }
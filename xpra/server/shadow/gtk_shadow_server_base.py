@@ -146,6 +146,10 @@ class GTKShadowServerBase(ShadowServerBase, GTKServerBase):
             self.refresh_timer = 0
             return False
         self.refresh_window_models()
+        areas = self.get_damaged_areas()
+        if areas is not None and not areas:
+            # nothing has changed since the last refresh
+            return True
         if self.capture:
             try:
                 if not self.capture.refresh():
@@ -165,12 +169,26 @@ class GTKShadowServerBase(ShadowServerBase, GTKServerBase):
                 log.warn(" %s", cse)
                 self.recreate_window_models()
                 return False
-        self.refresh_windows()
+        self.refresh_windows(areas)
         return True
 
-    def refresh_windows(self) -> None:
+    def get_damaged_areas(self) -> list | None:
+        # subclasses that can track screen updates
+        # return the rectangles that have changed since the last refresh,
+        # `None` means that we don't know and that everything must be refreshed
+        return None
+
+    def refresh_windows(self, areas=None) -> None:
         for window in self._id_to_window.values():
-            self.refresh_window(window)
+            if areas is None:
+                self.refresh_window(window)
+                continue
+            wx, wy, ww, wh = window.get_geometry()[:4]
+            for area in areas:
+                # convert to window relative coordinates:
+                r = area.intersection(wx, wy, ww, wh)
+                if r:
+                    self.refresh_window_area(window, r.x - wx, r.y - wy, r.width, r.height)
 
     ############################################################################
     # handle monitor changes
@@ -108,6 +108,9 @@ class RootWindowModel:
     def uses_xshm(self) -> bool:
         return False
 
+    def get_xshm_info(self) -> dict[str, Any]:
+        return {}
+
     def is_shadow(self) -> bool:
         return True
 
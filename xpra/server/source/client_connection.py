@@ -9,7 +9,7 @@ import sys
 from typing import Any, TypeAlias
 from collections.abc import Callable, Sequence, Iterable
 from time import sleep, monotonic
-from threading import Event
+from threading import Event, Lock, Thread
 from collections import deque
 from queue import SimpleQueue
 
@@ -32,6 +32,7 @@ MIN_BANDWIDTH = envint("XPRA_MIN_BANDWIDTH", 5 * 1024 * 1024)
 AUTO_BANDWIDTH_PCT = envint("XPRA_AUTO_BANDWIDTH_PCT", 80)
 assert 1 < AUTO_BANDWIDTH_PCT <= 100, "invalid value for XPRA_AUTO_BANDWIDTH_PCT: %i" % AUTO_BANDWIDTH_PCT
 YIELD = envbool("XPRA_YIELD", False)
+MAX_ENCODE_THREADS = envint("XPRA_MAX_ENCODE_THREADS", 64)
 
 counter = AtomicInteger()
 
@@ -57,6 +58,8 @@ class ClientConnection(StubSourceMixin):
     adds the damage pixels ready for processing to the encode_work_queue,
     items are picked off by the separate 'encode' thread (see 'encode_loop')
     and added to the damage_packet_queue.
+    When 'encode-threads' is greater than one, each window id is assigned to one
+    of the encode threads, so the packets of a given window are still generated in order.
     """
 
     def __init__(self, protocol, disconnect_cb: Callable, session_name: str,
@@ -81,8 +84,15 @@ class ClientConnection(StubSourceMixin):
         # this queue will hold functions to call to compress data (pixels, clipboard)
         # items placed in this queue are picked off by the "encode" thread,
         # the functions should add the packets they generate to the 'packet_queue'
-        self.encode_work_queue: SimpleQueue[None | tuple[bool, Callable, Sequence[Any]]] = SimpleQueue()
-        self.encode_thread = None
+        self.encode_work_queue: SimpleQueue[ENCODE_WORK_ITEM] = SimpleQueue()
+        self.encode_thread: Thread | None = None
+        # when using more than one encode thread,
+        # the window ids are sharded across the extra queues:
+        # (the first queue and thread are the ones above)
+        self.encode_threads = 1
+        self.encode_work_queues: list[SimpleQueue[ENCODE_WORK_ITEM]] = [self.encode_work_queue]
+        self.encode_thread_list: list[Thread | None] = [None]
+        self.encode_thread_lock = Lock()
         self.ordinary_packets: list[tuple[PacketType, bool, bool]] = []
         self.socket_dir = socket_dir
         self.unix_socket_paths = unix_socket_paths
@@ -93,7 +103,11 @@ class ClientConnection(StubSourceMixin):
         # network constraints:
         self.server_bandwidth_limit = bandwidth_limit
         self.bandwidth_detection = bandwidth_detection
-        self.queue_encode: Callable[[ENCODE_WORK_ITEM], None] = self.start_queue_encode
+
+    def init_from(self, _protocol, server) -> None:
+        self.encode_threads = max(1, min(MAX_ENCODE_THREADS, getattr(server, "encode_threads", 1)))
+        self.encode_work_queues = [self.encode_work_queue] + [SimpleQueue() for _ in range(self.encode_threads - 1)]
+        self.encode_thread_list = [None] * self.encode_threads
 
     def run(self) -> None:
         # ready for processing:
@@ -234,25 +248,66 @@ class ClientConnection(StubSourceMixin):
 
     # The encode thread loop management:
     #
-    def start_queue_encode(self, item: ENCODE_WORK_ITEM) -> None:
-        # start the encode work queue:
+    def get_encode_thread_index(self, wid: int = 0) -> int:
+        # non-window work items (clipboard, etc) always use the first thread:
+        if wid <= 0:
+            return 0
+        return wid % self.encode_threads
+
+    def start_encode_thread(self, index: int) -> None:
+        # start the encode thread for this work queue:
         # holds functions to call to compress data (pixels, clipboard)
         # items placed in this queue are picked off by the "encode" thread,
         # the functions should add the packets they generate to the 'packet_queue'
-        self.queue_encode = self.encode_work_queue.put
-        self.queue_encode(item)
-        self.encode_thread = start_thread(self.encode_loop, "encode")
+        with self.encode_thread_lock:
+            if self.encode_thread_list[index]:
+                return
+            name = "encode" if index == 0 else f"encode-{index}"
+            thread = start_thread(self.encode_loop, name, args=(index, ))
+            self.encode_thread_list[index] = thread
+            if index == 0:
+                self.encode_thread = thread
+
+    def queue_encode(self, item: ENCODE_WORK_ITEM, wid: int = 0) -> None:
+        if item is None:
+            # the end of queue marker must reach every encode thread,
+            # the first one is always started so that this method behaves the same with a single thread:
+            for index, thread in enumerate(self.encode_thread_list):
+                if index == 0 or thread:
+                    self.encode_work_queues[index].put(None)
+                    self.start_encode_thread(index)
+            return
+        index = self.get_encode_thread_index(wid)
+        self.encode_work_queues[index].put(item)
+        if not self.encode_thread_list[index]:
+            self.start_encode_thread(index)
+
+    def queue_encode_barrier(self, fn: Callable) -> None:
+        """
+            Calls `fn` once every encode thread has processed the items queued before this barrier,
+            from whichever encode thread gets there last.
+        """
+        indexes = [index for index, thread in enumerate(self.encode_thread_list) if index == 0 or thread]
+        remaining = AtomicInteger(len(indexes))
+
+        def barrier() -> None:
+            if remaining.decrease() == 0:
+                fn()
+        for index in indexes:
+            self.encode_work_queues[index].put((False, barrier, ()))
+            self.start_encode_thread(index)
 
     def encode_queue_size(self) -> int:
-        return self.encode_work_queue.qsize()
+        return sum(queue.qsize() for queue in self.encode_work_queues)
 
-    def call_in_encode_thread(self, optional: bool, fn: Callable, *args) -> None:
+    def call_in_encode_thread(self, optional: bool, fn: Callable, *args, wid: int = 0) -> None:
         """
             This is used by WindowSource to queue damage processing to be done in the 'encode' thread.
             The 'encode_and_send_cb' will then add the resulting packet to the 'packet_queue' via 'queue_packet'.
+            Items for the same window id are always processed by the same thread.
         """
-        self.statistics.compression_work_qsizes.append((monotonic(), self.encode_queue_size()))
-        self.queue_encode((optional, fn, args))
+        self.statistics.record_compression_work_qsize(self.encode_queue_size())
+        self.queue_encode((optional, fn, args), wid)
 
     def queue_packet(self, packet: PacketType, wid=0, pixels=0,
                      wait_for_more=False) -> None:
@@ -260,27 +315,27 @@ class ClientConnection(StubSourceMixin):
             Add a new 'draw' packet to the 'packet_queue'.
             Note: this code runs in the non-ui thread
         """
-        now = monotonic()
-        self.statistics.packet_qsizes.append((now, len(self.packet_queue)))
+        self.statistics.record_packet_qsize(len(self.packet_queue))
         if wid > 0:
-            self.statistics.damage_packet_qpixels.append(
-                (now, wid, sum(x[2] for x in tuple(self.packet_queue) if x[1] == wid))
+            self.statistics.record_damage_packet_qpixels(
+                wid, sum(x[2] for x in tuple(self.packet_queue) if x[1] == wid)
             )
         self.packet_queue.append((packet, wid, pixels, wait_for_more))
         p = self.protocol
         if p:
             p.source_has_more()
 
-    def encode_loop(self) -> None:
+    def encode_loop(self, index: int = 0) -> None:
         """
             This runs in a separate thread and calls all the function callbacks
-            which are added to the 'encode_work_queue'.
+            which are added to the 'encode_work_queue' with this index.
             Must run until we hit the end of queue marker,
             to ensure all the queued items get called,
             those that are marked as optional will be skipped when is_closed()
         """
+        work_queue = self.encode_work_queues[index]
         while True:
-            item = self.encode_work_queue.get(True)
+            item = work_queue.get(True)
             if item is None:
                 return  # empty marker
             # some function calls are optional and can be skipped when closing:
@@ -355,7 +410,12 @@ class ClientConnection(StubSourceMixin):
             "bandwidth-limit": {
                 "detection": self.bandwidth_detection,
                 "actual": self.soft_bandwidth_limit or 0,
-            }
+            },
+            "encode": {
+                "threads": self.encode_threads,
+                "started": sum(1 for thread in self.encode_thread_list if thread),
+                "queue-sizes": tuple(queue.qsize() for queue in self.encode_work_queues),
+            },
         }
         p = self.protocol
         if p:
@@ -79,6 +79,8 @@ class EncodingsMixin(StubSourceMixin):
         self.default_min_quality = server.default_min_quality
         self.default_speed = server.default_speed
         self.default_min_speed = server.default_min_speed
+        self.default_batch_config.controller = getattr(server, "batch_controller", "heuristic")
+        self.default_batch_config.latency_goal = getattr(server, "latency_goal", 100)
 
     def reinit_encodings(self, server) -> None:
         self.server_core_encodings = server.core_encodings
@@ -87,7 +89,8 @@ class EncodingsMixin(StubSourceMixin):
     def cleanup(self) -> None:
         self.cancel_recalculate_timer()
         if self.cuda_device_context:
-            self.queue_encode((False, self.free_cuda_device_context, ()))
+            # windows can be using the context from any of the encode threads:
+            self.queue_encode_barrier(self.free_cuda_device_context)
         # Warning: this mixin must come AFTER the window mixin!
         # to make sure that it is safe to add the end of queue marker:
         # (all window sources will have stopped queuing data)
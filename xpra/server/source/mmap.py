@@ -34,6 +34,7 @@ class MMAP_Connection(StubSourceMixin):
     def init_state(self) -> None:
         self.mmap = None
         self.mmap_size = 0
+        self.mmap_allocator = None
         self.mmap_client_token = 0  # the token we write that the client may check
         self.mmap_client_token_index = 512
         self.mmap_client_token_bytes = 0
@@ -43,6 +44,7 @@ class MMAP_Connection(StubSourceMixin):
         if mmap:
             self.mmap = None
             self.mmap_size = 0
+            self.mmap_allocator = None
             mmap.close()
 
     def parse_client_caps(self, c: typedict) -> None:
@@ -73,7 +75,10 @@ class MMAP_Connection(StubSourceMixin):
         elif not os.path.exists(mmap_filename):
             log(f"mmap_file {mmap_filename!r} cannot be found!")
         else:
-            from xpra.net.mmap import init_server_mmap, read_mmap_token, write_mmap_token, DEFAULT_TOKEN_BYTES
+            from xpra.net.mmap import (
+                init_server_mmap, read_mmap_token, write_mmap_token,
+                RingAllocator, SlotAllocator, DEFAULT_TOKEN_BYTES, SLOTS,
+            )
             self.mmap, self.mmap_size = init_server_mmap(mmap_filename, mmap_size)
             log("found client mmap area: %s, %i bytes - min mmap size=%i in '%s'",
                 self.mmap, self.mmap_size, self.min_mmap_size, mmap_filename)
@@ -95,10 +100,17 @@ class MMAP_Connection(StubSourceMixin):
                     self.mmap = None
                     self.mmap_size = 0
                 else:
+                    token_start = 0
+                    if SLOTS and c.boolget("slots"):
+                        self.mmap_allocator = SlotAllocator(self.mmap, self.mmap_size)
+                        # don't write the token over the slot flags:
+                        token_start = self.mmap_allocator.data_offset
+                    else:
+                        self.mmap_allocator = RingAllocator(self.mmap, self.mmap_size)
                     from xpra.os_util import get_int_uuid
                     self.mmap_client_token = get_int_uuid()
                     self.mmap_client_token_bytes = DEFAULT_TOKEN_BYTES
-                    self.mmap_client_token_index = randint(0, self.mmap_size - self.mmap_client_token_bytes)
+                    self.mmap_client_token_index = randint(token_start, self.mmap_size - self.mmap_client_token_bytes)
                     write_mmap_token(self.mmap,
                                      self.mmap_client_token,
                                      self.mmap_client_token_index,
@@ -111,6 +123,7 @@ class MMAP_Connection(StubSourceMixin):
         mmap_caps: dict[str, Any] = {}
         if self.mmap_size > 0:
             mmap_caps["enabled"] = True
+            mmap_caps["slots"] = self.mmap_allocator is not None and self.mmap_allocator.get_info()["type"] == "slots"
             if self.mmap_client_token:
                 mmap_caps.update({
                     "token": self.mmap_client_token,
@@ -126,5 +139,6 @@ class MMAP_Connection(StubSourceMixin):
                 "enabled": self.mmap is not None,
                 "size": self.mmap_size,
                 "filename": self.mmap_filename,
+                "allocator": self.mmap_allocator.get_info() if self.mmap_allocator else {},
             },
         }
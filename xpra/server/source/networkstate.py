@@ -126,10 +126,10 @@ class NetworkStateMixin(StubSourceMixin):
         client_ping_latency = monotonic() - echoedtime / 1000.0
         stats = getattr(self, "statistics", None)
         if stats and 0 < client_ping_latency < 60:
-            stats.client_ping_latency.append((monotonic(), client_ping_latency))
+            stats.record_client_ping_latency(client_ping_latency)
         self.client_load = l1, l2, l3
         if 0 <= server_ping_latency < 60000 and stats:
-            stats.server_ping_latency.append((monotonic(), server_ping_latency / 1000.0))
+            stats.record_server_ping_latency(server_ping_latency / 1000.0)
         pinglog(f"ping echo client load={self.client_load}, "
                 f"latency measured from server={client_ping_latency}ms, from client={server_ping_latency}ms")
 
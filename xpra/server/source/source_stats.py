@@ -12,8 +12,9 @@ from collections import deque
 from collections.abc import Sequence
 
 from xpra.server.cystats import (
-    logp, calculate_time_weighted_average, calculate_size_weighted_average,
+    logp, calculate_size_weighted_average,
     calculate_for_target, time_weighted_average, queue_inspect,
+    DecayingAverage, SizeWeightedAverage, WindowedMin,
 )
 from xpra.util.stats import get_list_stats
 from xpra.log import Logger
@@ -78,6 +79,18 @@ class GlobalPerformanceStatistics:
         self.frame_total_latency = d()  # how long it takes from the time we get a damage event
         # until we get the ack back from the client
         # (wid, event_time, no_of_pixels, latency)
+        # the same values, accumulated as they are recorded,
+        # so that the averages can be calculated without walking the records:
+        self.compression_work_qsizes_average = DecayingAverage()
+        self.packet_qsizes_average = DecayingAverage()
+        self.damage_packet_qpixels_average = DecayingAverage()
+        self.client_latency_average = DecayingAverage()
+        self.client_latency_min = WindowedMin(maxlen)
+        self.client_ping_latency_average = DecayingAverage()
+        self.client_ping_latency_min = WindowedMin(maxlen)
+        self.server_ping_latency_average = DecayingAverage()
+        self.server_ping_latency_min = WindowedMin(maxlen)
+        self.frame_total_latency_average = SizeWeightedAverage()
         self.client_load = None
         self.last_congestion_time = 0
         self.congestion_value = 0
@@ -109,7 +122,37 @@ class GlobalPerformanceStatistics:
         if self.min_client_latency is None or self.min_client_latency > net_total_latency:
             self.min_client_latency = net_total_latency
         self.client_latency.append((wid, now, pixels, net_total_latency))
+        self.client_latency_average.add(net_total_latency, 1, now)
+        self.client_latency_min.add(net_total_latency)
         self.frame_total_latency.append((wid, now, pixels, latency))
+        self.frame_total_latency_average.record(now, pixels, latency)
+
+    def record_client_ping_latency(self, latency: float) -> None:
+        now = monotonic()
+        self.client_ping_latency.append((now, latency))
+        self.client_ping_latency_average.add(latency, 1, now)
+        self.client_ping_latency_min.add(latency)
+
+    def record_server_ping_latency(self, latency: float) -> None:
+        now = monotonic()
+        self.server_ping_latency.append((now, latency))
+        self.server_ping_latency_average.add(latency, 1, now)
+        self.server_ping_latency_min.add(latency)
+
+    def record_compression_work_qsize(self, size: int) -> None:
+        now = monotonic()
+        self.compression_work_qsizes.append((now, size))
+        self.compression_work_qsizes_average.add(size, 1, now)
+
+    def record_packet_qsize(self, size: int) -> None:
+        now = monotonic()
+        self.packet_qsizes.append((now, size))
+        self.packet_qsizes_average.add(size, 1, now)
+
+    def record_damage_packet_qpixels(self, wid: int, pixels: int) -> None:
+        now = monotonic()
+        self.damage_packet_qpixels.append((now, wid, pixels))
+        self.damage_packet_qpixels_average.add(pixels, 1, now)
 
     def get_damage_pixels(self, wid: int) -> Sequence[tuple[float, int]]:
         """ returns the tuple of (event_time, pixelcount) for the given window id """
@@ -117,25 +160,23 @@ class GlobalPerformanceStatistics:
             (event_time, value) for event_time, dwid, value in tuple(self.damage_packet_qpixels) if dwid == wid)
 
     def update_averages(self) -> None:
-        def latency_averages(values):
-            avg, recent = calculate_time_weighted_average(values)
+        def latency_averages(average: DecayingAverage) -> tuple[float, float]:
+            avg, recent = average.get()
             return max(0.001, avg), max(0.001, recent)
 
-        client_latency = tuple(self.client_latency)
-        if client_latency:
-            data = tuple((when, latency) for _, when, _, latency in client_latency)
-            self.min_client_latency = min(x for _, x in data)
-            self.avg_client_latency, self.recent_client_latency = latency_averages(data)
+        if self.client_latency_average:
+            self.min_client_latency = self.client_latency_min.get()
+            self.avg_client_latency, self.recent_client_latency = latency_averages(self.client_latency_average)
         # client ping latency: from ping packets
-        client_ping_latency = tuple(self.client_ping_latency)
-        if client_ping_latency:
-            self.min_client_ping_latency = min(x for _, x in client_ping_latency)
-            self.avg_client_ping_latency, self.recent_client_ping_latency = latency_averages(client_ping_latency)
+        if self.client_ping_latency_average:
+            self.min_client_ping_latency = self.client_ping_latency_min.get()
+            self.avg_client_ping_latency, self.recent_client_ping_latency = latency_averages(
+                self.client_ping_latency_average)
         # server ping latency: from ping packets
-        server_ping_latency = tuple(self.server_ping_latency)
-        if server_ping_latency:
-            self.min_server_ping_latency = min(x for _, x in server_ping_latency)
-            self.avg_server_ping_latency, self.recent_server_ping_latency = latency_averages(server_ping_latency)
+        if self.server_ping_latency_average:
+            self.min_server_ping_latency = self.server_ping_latency_min.get()
+            self.avg_server_ping_latency, self.recent_server_ping_latency = latency_averages(
+                self.server_ping_latency_average)
         # set to 0 if we have less than 2 events in the last 60 seconds:
         now = monotonic()
         min_time = now - 60
@@ -161,11 +202,8 @@ class GlobalPerformanceStatistics:
             cps.append((etime, sum(matches)))
         # log("cps(%s)=%s (now=%s)", cst, cps, now)
         self.congestion_value = time_weighted_average(cps)
-        ftl = tuple(self.frame_total_latency)
-        if ftl:
-            edata = tuple((event_time, pixels, latency) for _, event_time, pixels, latency in ftl)
-            # (wid, event_time, no_of_pixels, latency)
-            self.avg_frame_total_latency = safeint(calculate_size_weighted_average(edata)[1])
+        if self.frame_total_latency_average:
+            self.avg_frame_total_latency = safeint(self.frame_total_latency_average.get()[1])
 
     def get_factors(self, pixel_count: int) -> list[tuple[str, dict, float, float]]:
         factors = []
@@ -194,14 +232,14 @@ class GlobalPerformanceStatistics:
             mayaddfac(*calculate_for_target(metric, l, self.avg_server_ping_latency, self.recent_server_ping_latency,
                                             aim=0.95, slope=0.005, smoothing=sqrt, weight_multiplier=wm))
         # packet queue size: (includes packets from all windows)
-        mayaddfac(*queue_inspect("packet-queue-size", self.packet_qsizes, smoothing=sqrt))
+        mayaddfac(*queue_inspect("packet-queue-size", self.packet_qsizes_average, smoothing=sqrt))
         # packet queue pixels (global):
-        qpix_time_values = tuple((event_time, value) for event_time, _, value in tuple(self.damage_packet_qpixels))
-        mayaddfac(*queue_inspect("packet-queue-pixels", qpix_time_values, div=pixel_count, smoothing=sqrt))
+        mayaddfac(*queue_inspect("packet-queue-pixels", self.damage_packet_qpixels_average,
+                                 div=pixel_count, smoothing=sqrt))
         # compression data queue: (This is an important metric
         # since each item will consume a fair amount of memory
         # and each will later on go through the other queues.)
-        mayaddfac(*queue_inspect("compression-work-queue", self.compression_work_qsizes))
+        mayaddfac(*queue_inspect("compression-work-queue", self.compression_work_qsizes_average))
         if self.mmap_size > 0:
             # full: effective range is 0.0 to ~1.2
             full = 1.0 - self.mmap_free_size / self.mmap_size
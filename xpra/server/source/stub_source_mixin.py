@@ -80,11 +80,16 @@ class StubSourceMixin:
         This dummy implementation makes it easier to test without a network connection.
         """
 
-    def queue_encode(self, item: None | tuple[bool, Callable, tuple]):
+    def queue_encode(self, item: None | tuple[bool, Callable, tuple], wid: int = 0):
         """
         Used by the window source to send data to be processed in the encode thread
         """
 
+    def queue_encode_barrier(self, fn: Callable) -> None:
+        """
+        Used to call `fn` once all the encode threads have processed their pending items
+        """
+
     def send_more(self, packet_type: str, *parts: PacketElement, **kwargs) -> None:
         """
         Send a packet to the client,
@@ -8,6 +8,7 @@ import os
 from io import BytesIO
 from time import monotonic
 from typing import Any
+from functools import partial
 from collections.abc import Callable, Sequence
 
 try:
@@ -19,9 +20,10 @@ from xpra.os_util import gi_import
 from xpra.server.source.stub_source_mixin import StubSourceMixin
 from xpra.server.window.metadata import make_window_metadata
 from xpra.server.window.filters import get_window_filter
+from xpra.server.window.iconcache import icon_cache, content_hash
 from xpra.net.compression import Compressed
 from xpra.util.str_fn import bytestostr, memoryview_to_bytes
-from xpra.util.objects import typedict
+from xpra.util.objects import typedict, LRUCache
 from xpra.util.env import envint, envbool
 from xpra.common import NotificationID, DEFAULT_METADATA_SUPPORTED, force_size_constraint
 from xpra.log import Logger
@@ -92,6 +94,9 @@ class WindowsMixin(StubSourceMixin):
         self.metadata_supported: Sequence[str] = ()
         self.cursor_timer = 0
         self.last_cursor_sent: tuple = ()
+        # mirrors of the client's icon and cursor caches:
+        self.client_icons: LRUCache | None = None
+        self.client_cursors: LRUCache | None = None
 
     def cleanup(self) -> None:
         for window_source in self.all_window_sources():
@@ -143,6 +148,10 @@ class WindowsMixin(StubSourceMixin):
         self.send_cursors = self.send_windows and c.boolget("cursors")
         self.cursor_encodings = c.strtupleget("encodings.cursor")
         cursorlog(f"cursors={self.send_cursors}, cursor encodings={self.cursor_encodings}")
+        icon_cache_size = c.intget("encoding.icons.cache")
+        self.client_icons = LRUCache(icon_cache_size) if icon_cache_size > 0 else None
+        cursor_cache_size = c.intget("cursor.cache")
+        self.client_cursors = LRUCache(cursor_cache_size) if cursor_cache_size > 0 else None
         self.send_bell = c.boolget("bell")
         self.system_tray = c.boolget("system_tray")
         self.metadata_supported = c.strtupleget("metadata.supported", DEFAULT_METADATA_SUPPORTED)
@@ -172,6 +181,15 @@ class WindowsMixin(StubSourceMixin):
             "suspended": self.suspended,
             "restack": self.window_restack,
         }
+        for name, cache in {
+            "icon-cache": self.client_icons,
+            "cursor-cache": self.client_cursors,
+        }.items():
+            if cache is not None:
+                info[name] = {
+                    "entries": len(cache),
+                    "size": cache.size,
+                }
         wsize: dict[str, Any] = {
             "min": self.window_min_size,
             "max": self.window_max_size,
@@ -278,15 +296,29 @@ class WindowsMixin(StubSourceMixin):
         w, h, _xhot, _yhot, serial, pixels, name = cursor_data[2:9]
         # compress pixels if needed:
         encoding = "raw"
+        cache_key = ""
         if pixels is not None:
             cpixels: bytes | Compressed = memoryview_to_bytes(pixels)
-            if "png" in self.cursor_encodings and Image:
+            client_cursors = None if encoding_prefix else self.client_cursors
+            if client_cursors is not None or "png" in self.cursor_encodings:
+                cache_key = content_hash(cpixels, w, h, "cursor")
+            if client_cursors is not None and cache_key in client_cursors:
+                # the client still has this cursor in its cache:
+                client_cursors.get(cache_key)
+                cpixels = b""
+                encoding = "cached"
+            elif "png" in self.cursor_encodings and Image:
                 cursorlog(f"do_send_cursor() got {len(cpixels)} bytes of pixel data for {w}x{h} cursor named {name!r}")
-                img = Image.frombytes("RGBA", (w, h), cpixels, "raw", "BGRA", w * 4, 1)
-                buf = BytesIO()
-                img.save(buf, "PNG")
-                pngdata = buf.getvalue()
-                buf.close()
+                cached = None if SAVE_CURSORS else icon_cache.get(cache_key)
+                if cached:
+                    pngdata = cached[2]
+                else:
+                    img = Image.frombytes("RGBA", (w, h), cpixels, "raw", "BGRA", w * 4, 1)
+                    buf = BytesIO()
+                    img.save(buf, "PNG")
+                    pngdata = buf.getvalue()
+                    buf.close()
+                    icon_cache.set(cache_key, w, h, pngdata)
                 cpixels = Compressed("png cursor", pngdata, can_inline=True)
                 encoding = "png"
                 if SAVE_CURSORS:
@@ -301,10 +333,17 @@ class WindowsMixin(StubSourceMixin):
             else:
                 cursorlog("no supported cursor encodings")
                 return
+            if client_cursors is not None:
+                if encoding != "cached":
+                    client_cursors.set(cache_key, True)
+            else:
+                cache_key = ""
             cursor_data[7] = cpixels
         cursorlog("do_send_cursor(..) %sx%s %s cursor name='%s', serial=%#x with delay=%s (cursor_encodings=%s)",
                   w, h, (encoding or "empty"), bytestostr(name), serial, delay, self.cursor_encodings)
         args = [encoding_prefix + encoding] + list(cursor_data[:9]) + [cursor_sizes[0]] + list(cursor_sizes[1])
+        if cache_key:
+            args.append(cache_key)
         self.send_more("cursor", *args)
 
     def send_empty_cursor(self) -> None:
@@ -546,7 +585,7 @@ class WindowsMixin(StubSourceMixin):
             batch_config = self.make_batch_config(wid, window)
             ww, wh = window.get_dimensions()
             bandwidth_limit = self.bandwidth_limit
-            mmap = getattr(self, "mmap", None)
+            mmap_allocator = getattr(self, "mmap_allocator", None)
             mmap_size = getattr(self, "mmap_size", 0)
             av_sync = getattr(self, "av_sync", False)
             av_sync_delay = getattr(self, "av_sync_delay", 0)
@@ -554,6 +593,9 @@ class WindowsMixin(StubSourceMixin):
             socktype = getattr(conn, "socktype_wrapped", "")
             datagram = 1350 if socktype == "quic" else 0
             log(f"datagram({socktype=})={datagram}")
+            # the packets of different windows may be re-ordered when they use separate streams,
+            # so the client's icon cache can't be mirrored:
+            client_icons = None if getattr(conn, "multi_stream", False) else self.client_icons
             if mmap_size > 0:
                 bandwidth_limit = 0
             # pylint: disable=import-outside-toplevel
@@ -561,7 +603,7 @@ class WindowsMixin(StubSourceMixin):
             ws = WindowVideoSource(
                 ww, wh,
                 self.record_congestion_event, self.encode_queue_size,
-                self.call_in_encode_thread, self.queue_packet,
+                partial(self.call_in_encode_thread, wid=wid), self.queue_packet,
                 self.statistics,
                 wid, window, batch_config, self.auto_refresh_delay,
                 av_sync, av_sync_delay,
@@ -569,10 +611,10 @@ class WindowsMixin(StubSourceMixin):
                 self.cuda_device_context,
                 self.server_core_encodings, self.server_encodings,
                 self.encoding, self.encodings, self.core_encodings,
-                self.window_icon_encodings, self.encoding_options, self.icons_encoding_options,
+                self.window_icon_encodings, self.encoding_options, self.icons_encoding_options, client_icons,
                 self.rgb_formats,
                 self.default_encoding_options,
-                mmap, mmap_size, bandwidth_limit, self.jitter, datagram)
+                mmap_allocator, mmap_size, bandwidth_limit, self.jitter, datagram)
             ws.init_encoders()
             self.window_sources[wid] = ws
             if len(self.window_sources) > 1:
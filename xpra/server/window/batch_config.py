@@ -67,6 +67,7 @@ class DamageBatchConfig:
         "saved", "locked",
         "last_event", "last_delays", "last_delay", "last_actual_delays", "last_actual_delay",
         "last_updated", "factors",
+        "controller", "latency_goal",
     )
 
     def __init__(self):
@@ -95,6 +96,9 @@ class DamageBatchConfig:
         # the metrics derived from statistics which we use for calculating the new batch delay:
         # (see batch delay calculator)
         self.factors: Sequence[tuple[str, dict, int, int]] = ()
+        # "heuristic" uses the factors above, "predictive" aims for the latency goal (in milliseconds):
+        self.controller: str = "heuristic"
+        self.latency_goal: int = 100
 
     def cleanup(self) -> None:
         self.factors = ()
@@ -106,6 +110,7 @@ class DamageBatchConfig:
             "expire": self.expire_delay,
             "timeout-delay": self.timeout_delay,
             "locked": self.locked,
+            "controller": self.controller,
         }
         if self.delay_per_megapixel >= 0:
             info["normalized"] = self.delay_per_megapixel
@@ -147,6 +152,7 @@ class DamageBatchConfig:
         for x in (
                 "always", "max_events", "max_pixels", "time_unit",
                 "min_delay", "max_delay", "timeout_delay", "start_delay", "delay", "expire_delay",
+                "controller", "latency_goal",
         ):
             setattr(c, x, getattr(self, x))
         return c
@@ -0,0 +1,193 @@
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+from time import monotonic
+from typing import Any
+
+from xpra.util.env import envint
+from xpra.log import Logger
+
+log = Logger("server", "stats")
+
+BATCH_CONTROLLERS: tuple[str, ...] = ("heuristic", "predictive")
+
+# how quickly the model follows new samples, in percent:
+SMOOTHING = max(1, min(100, envint("XPRA_BATCH_CONTROLLER_SMOOTHING", 20))) / 100.0
+# how far the batch delay can move towards its new target at each update, in percent:
+DAMPING = max(1, min(100, envint("XPRA_BATCH_CONTROLLER_DAMPING", 50))) / 100.0
+# the share of the time we can spend processing frames, in percent:
+UTILIZATION = max(10, min(100, envint("XPRA_BATCH_CONTROLLER_UTILIZATION", 80))) / 100.0
+# the time window used for measuring the damage rate, in milliseconds:
+DAMAGE_WINDOW = max(100, envint("XPRA_BATCH_CONTROLLER_DAMAGE_WINDOW", 1000)) / 1000.0
+
+# conservative values used until we have samples:
+DEFAULT_ENCODE_RATE = 50 * 1000 * 1000        # pixels per second
+DEFAULT_DECODE_RATE = 100 * 1000 * 1000       # pixels per second
+DEFAULT_SEND_RATE = 1024 * 1024               # bytes per second
+DEFAULT_BYTES_PER_PIXEL = 0.5
+# fixed cost of each frame, regardless of its size:
+FRAME_OVERHEAD = envint("XPRA_BATCH_CONTROLLER_FRAME_OVERHEAD", 2) / 1000.0
+
+
+def ewma(current: float, value: float) -> float:
+    if current <= 0:
+        return value
+    return current + (value - current) * SMOOTHING
+
+
+def clamp(v: float, minv: float = 0, maxv: float = 1) -> float:
+    return max(minv, min(maxv, v))
+
+
+class PredictiveBatchController:
+    """
+    Models the end-to-end latency of the frames of a single window:
+    encoding, network transfer and client decoding,
+    and chooses the batch delay and the speed and quality targets
+    that should allow us to meet the `latency_goal`.
+    The batch delay is the smallest one that still allows us to keep up with the damage rate,
+    without exceeding the latency goal, any latency headroom left is spent on quality.
+    All the rates are exponentially weighted moving averages,
+    so the model follows changes in load without oscillating.
+    """
+
+    def __init__(self, latency_goal: int = 100):
+        self.latency_goal: float = max(1, latency_goal) / 1000.0
+        self.reset()
+
+    def reset(self) -> None:
+        # rates in units per second:
+        self.encode_rate: float = 0
+        self.decode_rate: float = 0
+        self.send_rate: float = 0
+        self.damage_rate: float = 0
+        self.bytes_per_pixel: float = 0
+        # in seconds:
+        self.network_latency: float = 0
+        # the pixels we expect to find in the next frame:
+        self.frame_pixels: int = 0
+        # values derived from the model:
+        self.delay: int = 0
+        self.predicted_latency: float = 0
+        self.utilization: float = 0
+        self.pressure: float = 0
+        self.samples: dict[str, int] = {"encode": 0, "ack": 0}
+        self.last_update: float = 0
+
+    def record_encode(self, pixels: int, compressed_size: int, encode_time: float) -> None:
+        if pixels <= 0:
+            return
+        if encode_time > 0:
+            self.encode_rate = ewma(self.encode_rate, pixels / encode_time)
+        if compressed_size > 0:
+            self.bytes_per_pixel = ewma(self.bytes_per_pixel, compressed_size / pixels)
+        self.samples["encode"] += 1
+
+    def record_ack(self, pixels: int, bytecount: int, decode_time: int,
+                   elapsed: float, network_latency: float) -> None:
+        """
+        `decode_time` is in microseconds, as reported by the client,
+        `elapsed` is the time between queuing the packet and receiving the ack, in seconds.
+        """
+        if decode_time <= 0 or pixels <= 0:
+            return
+        decode = decode_time / 1000.0 / 1000.0
+        self.decode_rate = ewma(self.decode_rate, pixels / decode)
+        if network_latency > 0:
+            self.network_latency = ewma(self.network_latency, network_latency)
+        # whatever is left was spent sending the data:
+        send_time = elapsed - decode - self.network_latency
+        if bytecount > 0 and send_time > 0:
+            self.send_rate = ewma(self.send_rate, bytecount / send_time)
+        self.samples["ack"] += 1
+
+    def update_damage_rate(self, damage_events, now: float) -> None:
+        # damage events are: (time, x, y, w, h)
+        cutoff = now - DAMAGE_WINDOW
+        pixels = sum(w * h for t, _, _, w, h in tuple(damage_events) if t >= cutoff)
+        self.damage_rate = ewma(self.damage_rate, pixels / DAMAGE_WINDOW)
+
+    def pixel_cost(self) -> float:
+        # the time it takes to process a single pixel, from encoding to decoding:
+        return (
+            1 / (self.encode_rate or DEFAULT_ENCODE_RATE) +
+            (self.bytes_per_pixel or DEFAULT_BYTES_PER_PIXEL) / (self.send_rate or DEFAULT_SEND_RATE) +
+            1 / (self.decode_rate or DEFAULT_DECODE_RATE)
+        )
+
+    def predict_latency(self, delay: float, window_pixels: int) -> float:
+        pixels = min(window_pixels, self.damage_rate * delay)
+        return delay + FRAME_OVERHEAD + pixels * self.pixel_cost() + self.network_latency
+
+    def update(self, batch, window_dimensions: tuple[int, int], damage_events) -> None:
+        """
+        Updates the model with the latest damage events,
+        then sets the batch delay to the value that should meet the latency goal.
+        """
+        now = monotonic()
+        self.update_damage_rate(damage_events, now)
+        ww, wh = window_dimensions
+        window_pixels = max(1, ww * wh)
+        k = self.pixel_cost()
+        # the fraction of the time spent processing the pixels, regardless of how we batch them:
+        busy = self.damage_rate * k
+        # the latency grows with the batch delay since larger batches take longer to process,
+        # this is the largest delay that meets the goal: delay + delay * damage_rate * k = budget
+        budget = self.latency_goal - self.network_latency - FRAME_OVERHEAD
+        ceiling = budget / (1 + busy)
+        if self.damage_rate * ceiling > window_pixels:
+            # the frames can't be larger than the window:
+            ceiling = budget - window_pixels * k
+        if busy < UTILIZATION:
+            # the per-frame overhead requires larger batches when we're busy:
+            target = min(ceiling, FRAME_OVERHEAD / (UTILIZATION - busy))
+        else:
+            # we can't keep up, batch as much as the goal allows:
+            target = ceiling
+        target_ms = clamp(target * 1000, batch.min_delay, batch.max_delay)
+        current = self.delay or batch.delay
+        self.delay = int(current + (target_ms - current) * DAMPING)
+        delay = self.delay / 1000.0
+        self.predicted_latency = self.predict_latency(delay, window_pixels)
+        self.utilization = busy + FRAME_OVERHEAD / max(0.001, delay)
+        self.pressure = max(self.predicted_latency / self.latency_goal, self.utilization)
+        self.frame_pixels = int(min(window_pixels, self.damage_rate * delay))
+        self.last_update = now
+        log("predictive batch delay=%i (target=%i), predicted latency=%ims, utilization=%i%%",
+            self.delay, target_ms, self.predicted_latency * 1000, self.utilization * 100)
+        batch.delay = self.delay
+        batch.last_updated = now
+        batch.factors = ()
+
+    def get_target_speed(self, min_speed: int) -> tuple[dict[str, Any], int]:
+        # go faster as we approach the latency goal:
+        pressure = clamp(self.pressure - 0.5)
+        speed = int(min_speed + (100 - min_speed) * pressure)
+        return {"pressure": round(100 * self.pressure)}, speed
+
+    def get_target_quality(self, min_quality: int) -> tuple[dict[str, Any], int]:
+        # lower the quality (and the bandwidth used) when we exceed the latency goal:
+        headroom = clamp(1.5 - self.pressure)
+        quality = int(min_quality + (100 - min_quality) * headroom)
+        return {"pressure": round(100 * self.pressure)}, quality
+
+    def get_info(self) -> dict[str, Any]:
+        return {
+            "latency-goal": int(self.latency_goal * 1000),
+            "delay": self.delay,
+            "predicted-latency": int(self.predicted_latency * 1000),
+            "network-latency": int(self.network_latency * 1000),
+            "utilization": round(100 * self.utilization),
+            "pressure": round(100 * self.pressure),
+            "frame-pixels": self.frame_pixels,
+            "rate": {
+                "encode": int(self.encode_rate),
+                "decode": int(self.decode_rate),
+                "send": int(self.send_rate),
+                "damage": int(self.damage_rate),
+            },
+            "bytes-per-pixel": round(self.bytes_per_pixel, 3),
+            "samples": dict(self.samples),
+        }
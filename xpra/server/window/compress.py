@@ -16,16 +16,18 @@ from typing import ContextManager, Any
 from collections.abc import Callable, Iterable, Sequence
 
 from xpra.os_util import POSIX, OSX, gi_import
-from xpra.util.objects import typedict
+from xpra.util.objects import typedict, LRUCache
 from xpra.util.str_fn import csv, repr_ellipsized, decode_str
 from xpra.util.env import envint, envbool, first_time
 from xpra.common import MAX_WINDOW_SIZE, WINDOW_DECODE_SKIPPED, WINDOW_DECODE_ERROR, WINDOW_NOT_FOUND
 from xpra.server.window.windowicon import WindowIconSource
 from xpra.server.window.perfstats import WindowPerformanceStatistics
 from xpra.server.window.batch_delay_calculator import calculate_batch_delay, get_target_speed, get_target_quality
+from xpra.server.window.batch_controller import PredictiveBatchController
+from xpra.server.window.encode_share import get_encode_share
 from xpra.server.cystats import time_weighted_average, logp
 from xpra.server.source.source_stats import GlobalPerformanceStatistics
-from xpra.util.rectangle import rectangle, add_rectangle, remove_rectangle, merge_all
+from xpra.util.rectangle import rectangle, add_rectangle, remove_rectangle, merge_all, merge_regions
 from xpra.util.stats import get_list_stats
 from xpra.codecs.rgb_transform import rgb_reformat
 from xpra.codecs.loader import get_codec
@@ -84,6 +86,10 @@ MAX_SPEED = envint("XPRA_ENCODING_MAX_SPEED", 100)
 assert MAX_QUALITY > 0 and MAX_SPEED > 0
 
 MERGE_REGIONS = envbool("XPRA_MERGE_REGIONS", True)
+# coalesce the pending damage regions when we accumulate more than this:
+MAX_PENDING_REGIONS = envint("XPRA_MAX_PENDING_REGIONS", 256)
+# upper limit for the packet cost estimated from the encoding statistics:
+MAX_PACKET_COST = envint("XPRA_MAX_PACKET_COST", 64*1024)
 DOWNSCALE = envbool("XPRA_DOWNSCALE", True)
 DOWNSCALE_THRESHOLD = envint("XPRA_DOWNSCALE_THRESHOLD", 20)
 MAX_SYNC_BUFFER_SIZE = envint("XPRA_MAX_SYNC_BUFFER_SIZE", 256)*1024*1024        # 256MB
@@ -196,13 +202,13 @@ class WindowSource(WindowIconSource):
                  server_core_encodings: Sequence[str], server_encodings: Sequence[str],
                  encoding: str, encodings: Sequence[str], core_encodings: Sequence[str],
                  window_icon_encodings: Sequence[str],
-                 encoding_options:typedict, icons_encoding_options: typedict,
+                 encoding_options:typedict, icons_encoding_options: typedict, client_icons: LRUCache | None,
                  rgb_formats: Sequence[str],
                  default_encoding_options,
-                 mmap, mmap_size: int, bandwidth_limit: int, jitter: int, datagram=0):
-        super().__init__(window_icon_encodings, icons_encoding_options)
+                 mmap_allocator, mmap_size: int, bandwidth_limit: int, jitter: int, datagram=0):
+        super().__init__(window_icon_encodings, icons_encoding_options, client_icons)
         # mmap:
-        self._mmap = mmap
+        self._mmap_allocator = mmap_allocator
         self._mmap_size = mmap_size
 
         self.init_vars()
@@ -216,6 +222,9 @@ class WindowSource(WindowIconSource):
         self.queue_packet = queue_packet                # callback to add a network packet to the outgoing queue
         self.wid: int = wid
         self.window = window                            # only to be used from the UI thread!
+        # other clients viewing the same window may share the encoder output:
+        self.encode_share = get_encode_share()
+        self.encode_share.add_viewer(wid)
         self.global_statistics: GlobalPerformanceStatistics = statistics             # shared/global statistics from ClientConnection
         self.statistics: WindowPerformanceStatistics = WindowPerformanceStatistics()
         self.av_sync: bool = av_sync                   # flag: enabled or not?
@@ -248,6 +257,9 @@ class WindowSource(WindowIconSource):
         self.send_window_size: bool = encoding_options.boolget("send-window-size", False)
         self.decoder_speed = typedict(self.encoding_options.dictget("decoder-speed") or {})
         self.batch_config = batch_config
+        self.batch_controller: PredictiveBatchController | None = None
+        if batch_config.controller == "predictive":
+            self.batch_controller = PredictiveBatchController(batch_config.latency_goal)
         # auto-refresh:
         self.auto_refresh_delay = auto_refresh_delay
         self.base_auto_refresh_delay = auto_refresh_delay
@@ -509,6 +521,10 @@ class WindowSource(WindowIconSource):
 
     def cleanup(self) -> None:
         self.cancel_damage(MAX_SEQUENCE)
+        es = self.encode_share
+        if es:
+            self.encode_share = None
+            es.remove_viewer(self.wid)
         log("encoding_totals for wid=%s with primary encoding=%s : %s",
             self.wid, self.encoding, self.statistics.encoding_totals)
         self.init_vars()
@@ -620,6 +636,9 @@ class WindowSource(WindowIconSource):
         if crs:
             info["render-size"] = crs
         info["damage.fps"] = int(self.get_damage_fps())
+        bcon = self.batch_controller
+        if bcon:
+            info["batch-controller"] = bcon.get_info()
         if self.pixel_format:
             info["pixel-format"] = self.pixel_format
         cdd = self.cuda_device_context
@@ -1278,8 +1297,13 @@ class WindowSource(WindowIconSource):
             # mmap is so fast that we don't need to use the batch delay:
             bc.delay = bc.min_delay
             return
-        # calculations take time (CPU), see if we can just skip it this time around:
         now = monotonic()
+        if self.batch_controller:
+            # the model is cheap to update, no need to skip any updates:
+            self.batch_controller.update(bc, self.window_dimensions, self.statistics.last_damage_events)
+            self.update_normalized_delay(now)
+            return
+        # calculations take time (CPU), see if we can just skip it this time around:
         lr = self.statistics.last_recalculate
         elapsed = now-lr
         statslog("calculate_batch_delay for wid=%i current batch delay=%i, last update %.1f seconds ago",
@@ -1317,7 +1341,10 @@ class WindowSource(WindowIconSource):
                               other_is_fullscreen, other_is_maximized,
                               self.is_OR, self.soft_expired, bc,
                               self.global_statistics, self.statistics, self.bandwidth_limit, self.jitter)
-        # update the normalized value:
+        self.update_normalized_delay(now)
+
+    def update_normalized_delay(self, now: float) -> None:
+        bc = self.batch_config
         ww, wh = self.window_dimensions
         bc.delay_per_megapixel = round(bc.delay * 1000000 // max(1, (ww*wh)))
         self.statistics.last_recalculate = now
@@ -1357,9 +1384,13 @@ class WindowSource(WindowIconSource):
         now = monotonic()
         # make a copy to work on:
         speed_data = list(self._encoding_speed)
-        info, target, max_speed = get_target_speed(self.window_dimensions, self.batch_config,
-                                                   self.global_statistics, self.statistics,
-                                                   self.bandwidth_limit, self._fixed_min_speed, speed_data)
+        if self.batch_controller:
+            info, target = self.batch_controller.get_target_speed(self._fixed_min_speed)
+            max_speed = 100
+        else:
+            info, target, max_speed = get_target_speed(self.window_dimensions, self.batch_config,
+                                                       self.global_statistics, self.statistics,
+                                                       self.bandwidth_limit, self._fixed_min_speed, speed_data)
         speed_data.append((monotonic(), target))
         speed = int(time_weighted_average(speed_data, min_offset=1, rpow=1.1))
         speed = max(0, self._fixed_min_speed, speed)
@@ -1432,9 +1463,12 @@ class WindowSource(WindowIconSource):
             self._current_quality = 100
             return cq != self._current_quality
         now = monotonic()
-        info, target = get_target_quality(self.window_dimensions, self.batch_config,
-                                          self.global_statistics, self.statistics,
-                                          self.bandwidth_limit, self._fixed_min_quality, self._fixed_min_speed)
+        if self.batch_controller:
+            info, target = self.batch_controller.get_target_quality(self._fixed_min_quality)
+        else:
+            info, target = get_target_quality(self.window_dimensions, self.batch_config,
+                                              self.global_statistics, self.statistics,
+                                              self.bandwidth_limit, self._fixed_min_quality, self._fixed_min_speed)
         # make a copy to work on:
         ves_copy = list(self._encoding_quality)
         ves_copy.append((now, target))
@@ -1599,6 +1633,9 @@ class WindowSource(WindowIconSource):
             if not self.full_frames_only:
                 region = rectangle(x, y, w, h)
                 add_rectangle(regions, region)
+                if MERGE_REGIONS and len(regions) > MAX_PENDING_REGIONS:
+                    # keep the list short, so that adding more rectangles stays cheap:
+                    regions[:] = merge_regions(regions, self.small_packet_cost)
             # merge/override options
             if options is not None:
                 override = options.get("override_options", False)
@@ -1944,11 +1981,15 @@ class WindowSource(WindowIconSource):
                 raise RuntimeError(f"no encoding for {ww}x{wh} full screen update")
             self.process_damage_region(damage_time, 0, 0, ww, wh, actual_encoding, options)
 
+        packet_cost = self.get_packet_cost(coding)
         if exclude_region is None:
             if self.full_frames_only or self.encoding == "stream":
                 send_full_window_update("full-frames-only set")
                 return
 
+            if MERGE_REGIONS and len(regions) > self.max_small_regions and self._mmap_size == 0:
+                # try to coalesce the regions first:
+                regions = merge_regions(regions, packet_cost)
             if len(regions) > self.max_small_regions:
                 # too many regions!
                 send_full_window_update(f"too many regions: {len(regions)}")
@@ -1968,24 +2009,25 @@ class WindowSource(WindowIconSource):
         if MERGE_REGIONS and len(regions) > 1:
             merge_threshold = ww*wh*self.max_bytes_percent//100
             pixel_count = sum(rect.width*rect.height for rect in regions)
-            packet_cost = pixel_count+self.small_packet_cost*len(regions)
-            log("send_delayed_regions: packet_cost=%s, merge_threshold=%s, pixel_count=%s",
-                packet_cost, merge_threshold, pixel_count)
-            if packet_cost >= merge_threshold and exclude_region is None:
-                send_full_window_update(f"bytes cost ({packet_cost}) too high (max {merge_threshold})")
+            bytes_cost = pixel_count+packet_cost*len(regions)
+            log("send_delayed_regions: bytes_cost=%s, merge_threshold=%s, pixel_count=%s, packet_cost=%s",
+                bytes_cost, merge_threshold, pixel_count, packet_cost)
+            if bytes_cost >= merge_threshold and exclude_region is None:
+                send_full_window_update(f"bytes cost ({bytes_cost}) too high (max {merge_threshold})")
                 return
-            # try to merge all the regions to see if we save anything:
-            merged = merge_all(regions)
-            if exclude_region:
-                merged_rects = merged.subtract_rect(exclude_region)
-                merged_pixel_count = sum(r.width*r.height for r in merged_rects)
+            if self._mmap_size > 0:
+                # with mmap, merge all the regions:
+                merged_rects = [merge_all(regions)]
             else:
-                merged_rects = (merged,)
-                merged_pixel_count = merged.width*merged.height
-            merged_packet_cost = merged_pixel_count+self.small_packet_cost*len(merged_rects)
+                # only merge the regions where this saves more than the extra pixels cost:
+                merged_rects = merge_regions(regions, packet_cost)
+            if exclude_region:
+                merged_rects = [sub for r in merged_rects for sub in r.subtract_rect(exclude_region)]
+            merged_pixel_count = sum(r.width*r.height for r in merged_rects)
+            merged_bytes_cost = merged_pixel_count+packet_cost*len(merged_rects)
             log("send_delayed_regions: merged=%s, merged_bytes_cost=%s, bytes_cost=%s, merged_pixel_count=%s, pixel_count=%s",
-                merged_rects, merged_packet_cost, packet_cost, merged_pixel_count, pixel_count)
-            if self._mmap_size > 0 or merged_packet_cost < packet_cost or merged_pixel_count < pixel_count:
+                merged_rects, merged_bytes_cost, bytes_cost, merged_pixel_count, pixel_count)
+            if self._mmap_size > 0 or merged_bytes_cost < bytes_cost or merged_pixel_count < pixel_count:
                 # better, so replace with merged regions:
                 regions = merged_rects
 
@@ -2023,6 +2065,15 @@ class WindowSource(WindowIconSource):
             encodings.append(actual_encoding)
         log("send_delayed_regions: queued %i regions for encoding using %s", len(i_reg_enc), encodings)
 
+    def get_packet_cost(self, coding: str) -> int:
+        """
+        The cost of sending an extra packet, expressed as a number of pixels:
+        our base cost for small packets,
+        plus the fixed cost of each encoding call measured from the encoding statistics.
+        """
+        measured = self.statistics.get_packet_cost(coding)
+        return self.small_packet_cost + min(MAX_PACKET_COST, max(0, measured))
+
     def assign_sq_options(self, options: dict, speed_pct: int = 100, quality_pct: int = 100) -> dict[str, Any]:
         packets_backlog = None
         speed = options.get("speed", 0)
@@ -2469,7 +2520,7 @@ class WindowSource(WindowIconSource):
         )
         if process_damage_time > 0:
             damage_in_latency = now-process_damage_time
-            stats.damage_in_latency.append((now, width*height, actual_batch_delay, damage_in_latency))
+            stats.record_damage_in_latency(now, width*height, actual_batch_delay, damage_in_latency)
         stats.last_packet_time = monotonic()
         if SCREEN_UPDATES_DIRECTORY:
             self.save_update(packet, damage_time)
@@ -2610,7 +2661,7 @@ class WindowSource(WindowIconSource):
         statslog("packet decoding sequence %s for window %s: %sx%s took %.1fms",
                  damage_packet_sequence, self.wid, width, height, decode_time/1000.0)
         if decode_time > 0:
-            self.statistics.client_decode_time.append((monotonic(), width*height, decode_time))
+            self.statistics.record_decode_time(monotonic(), width*height, decode_time)
         elif decode_time == WINDOW_DECODE_SKIPPED:
             log(f"client skipped decoding sequence {damage_packet_sequence} for window {self.wid}")
         elif decode_time == WINDOW_NOT_FOUND:
@@ -2625,6 +2676,8 @@ class WindowSource(WindowIconSource):
         # pending = (now, coding, pixcount, bytecount, client_options, damage_time)
         queued_at, coding, pixels, bytecount, client_options, damage_time = pending
         now = monotonic()
+        if self.batch_controller:
+            self.batch_controller.record_ack(pixels, bytecount, decode_time, now - queued_at, gs.min_client_latency)
         if decode_time > 0:
             latency = int(1000 * (now - damage_time))
             self.global_statistics.record_latency(self.wid, damage_packet_sequence, decode_time, queued_at,
@@ -2716,7 +2769,7 @@ class WindowSource(WindowIconSource):
             The actual encoding method used is: self._encoders[coding], ie:
             * 'mmap' will use 'mmap_encode'
             * 'webp' uses 'webp_encode'
-            * 'rgb24' and 'rgb32' use 'rgb_encode'
+            * 'rgb24' and 'rgb32' use the 'enc_rgb' module's 'encode'
             * etc..
         """
         def nodata(msg: str, *args) -> None:
@@ -2756,7 +2809,13 @@ class WindowSource(WindowIconSource):
                 return nodata("cancelled")
             raise RuntimeError(f"BUG: no encoder found for {coding!r} with options={options}")
         try:
-            ret = encoder(coding, image, options)
+            es = self.encode_share
+            if es and getattr(encoder, "__self__", None) is not self:
+                # not one of our own (stateful) methods like mmap or video,
+                # so the output can be shared with other clients:
+                ret = es.encode(self.wid, encoder, coding, image, options)
+            else:
+                ret = encoder(coding, image, options)
         except (TypeError, RuntimeError) as e:
             log.error(f"Error on {encoder}({coding}, {image}, {options})", exc_info=True)
             return nodata(str(e))
@@ -2787,6 +2846,8 @@ class WindowSource(WindowIconSource):
                     100.0*csize/psize, ceil(psize/1024), ceil(csize/1024),
                     self._damage_packet_sequence, client_options, options)
         self.statistics.encoding_stats.append((end, coding, w*h, bpp, csize, end-start))
+        if self.batch_controller:
+            self.batch_controller.record_encode(w*h, csize, end-start)
         return self.make_draw_packet(x, y, outw, outh, coding, data, outstride, client_options, options)
 
     def make_draw_packet(self, x: int, y: int, outw: int, outh: int,
@@ -2834,7 +2895,7 @@ class WindowSource(WindowIconSource):
 
     def mmap_encode(self, coding: str, image: ImageWrapper, _options) -> tuple:
         assert coding == "mmap"
-        assert self._mmap and self._mmap_size > 0
+        assert self._mmap_allocator and self._mmap_size > 0
         # prepare the pixels in a format accepted by the client:
         pf = image.get_pixel_format()
         if pf not in self.rgb_formats:
@@ -2848,8 +2909,7 @@ class WindowSource(WindowIconSource):
         data = image.get_pixels()
         if not data:
             raise RuntimeError(f"failed to get pixels from {image}")
-        from xpra.net.mmap import mmap_write
-        mmap_data, mmap_free_size = mmap_write(self._mmap, self._mmap_size, data)
+        mmap_data, mmap_free_size = self._mmap_allocator.write(data)
         # elapsed = monotonic()-start+0.000000001 # make sure never zero!
         # log("%s MBytes/s - %s bytes written to mmap in %.1f ms", int(len(data)/elapsed/1024/1024),
         #    len(data), 1000*elapsed)
@@ -0,0 +1,175 @@
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+from time import monotonic
+from threading import Event, Lock
+from typing import Any
+from collections.abc import Callable
+
+from xpra.util.env import envint, envbool
+from xpra.log import Logger
+
+log = Logger("encoding")
+
+SHARED_ENCODE = envbool("XPRA_SHARED_ENCODE", True)
+# quality and speed values within the same band can share the same output:
+SHARED_ENCODE_BAND = max(1, envint("XPRA_SHARED_ENCODE_BAND", 10))
+# how long to wait for another client's encoder to produce the data we need:
+SHARED_ENCODE_WAIT = envint("XPRA_SHARED_ENCODE_WAIT", 100)
+SHARED_ENCODE_EXPIRY = envint("XPRA_SHARED_ENCODE_EXPIRY", 1000)
+SHARED_ENCODE_MAX_ITEMS = envint("XPRA_SHARED_ENCODE_MAX_ITEMS", 64)
+
+# the encoder options which can modify the output of the picture encoders:
+KEY_OPTIONS = ("alpha", "lz4", "grayscale", "content-type", "scaled-width", "scaled-height")
+
+
+def get_pixel_hash_function() -> Callable | None:
+    try:
+        from xpra.buffers.xxh import hash64
+        return hash64
+    except ImportError as e:
+        log("no xxh3 hash function: %s", e)
+        return None
+
+
+class SharedEncoding:
+    """
+    The output of a picture encoder,
+    which may still be in progress (see `done`)
+    """
+    __slots__ = ("done", "result", "timestamp")
+
+    def __init__(self):
+        self.done = Event()
+        self.result: tuple = ()
+        self.timestamp = monotonic()
+
+
+class EncodeShare:
+    """
+    When multiple clients are viewing the same window
+    and they end up encoding identical pixels with compatible settings,
+    only the first one runs the encoder, the others re-use its output.
+    Each client still generates its own draw packets, so the damage sequence numbers,
+    acks and backpressure remain per client.
+    Only the stateless picture encoders can be shared this way,
+    video encoders have their own per-client state.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.hash_fn = get_pixel_hash_function()
+        self.viewers: dict[int, int] = {}
+        self.results: dict[tuple, SharedEncoding] = {}
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+
+    def add_viewer(self, wid: int) -> None:
+        with self.lock:
+            self.viewers[wid] = self.viewers.get(wid, 0) + 1
+
+    def remove_viewer(self, wid: int) -> None:
+        with self.lock:
+            count = self.viewers.get(wid, 0) - 1
+            if count > 0:
+                self.viewers[wid] = count
+                return
+            self.viewers.pop(wid, None)
+            for key in tuple(self.results.keys()):
+                if key[0] == wid:
+                    del self.results[key]
+
+    def is_shared(self, wid: int) -> bool:
+        return SHARED_ENCODE and self.hash_fn is not None and self.viewers.get(wid, 0) > 1
+
+    def make_key(self, wid: int, coding: str, image, options) -> tuple:
+        pixels = image.get_pixels()
+        if not pixels:
+            return ()
+        band = SHARED_ENCODE_BAND
+        quality = options.get("quality", -1)
+        speed = options.get("speed", -1)
+        return (
+            wid, coding,
+            image.get_target_x(), image.get_target_y(), image.get_width(), image.get_height(),
+            image.get_pixel_format(), image.get_rowstride(),
+            quality // band if quality >= 0 else -1,
+            speed // band if speed >= 0 else -1,
+            tuple(options.get("rgb_formats", ())),
+            tuple(options.get(k) for k in KEY_OPTIONS),
+            self.hash_fn(pixels),
+        )
+
+    def encode(self, wid: int, encoder: Callable, coding: str, image, options) -> tuple:
+        if not self.is_shared(wid):
+            return encoder(coding, image, options)
+        key = self.make_key(wid, coding, image, options)
+        if not key:
+            return encoder(coding, image, options)
+        with self.lock:
+            entry = self.results.get(key)
+            owner = entry is None
+            if owner:
+                entry = self.results[key] = SharedEncoding()
+                self.misses += 1
+                self.expire()
+        if not owner:
+            if entry.done.wait(SHARED_ENCODE_WAIT / 1000) and entry.result:
+                with self.lock:
+                    self.hits += 1
+                return self.copy_result(entry.result)
+            # the other encoder failed or is too slow, do it ourselves:
+            with self.lock:
+                self.timeouts += 1
+            log("shared encoding timeout for %s", key[:-1])
+            return encoder(coding, image, options)
+        ret = ()
+        try:
+            ret = encoder(coding, image, options)
+            return ret
+        finally:
+            if ret:
+                # the caller will modify the client options,
+                # so we store a copy:
+                entry.result = self.copy_result(ret)
+            else:
+                with self.lock:
+                    self.results.pop(key, None)
+            entry.done.set()
+
+    @staticmethod
+    def copy_result(result: tuple) -> tuple:
+        coding, data, client_options, outw, outh, outstride, bpp = result
+        return coding, data, dict(client_options), outw, outh, outstride, bpp
+
+    def expire(self) -> None:
+        # must be called with the lock held
+        expired = monotonic() - SHARED_ENCODE_EXPIRY / 1000
+        for key, entry in tuple(self.results.items()):
+            if entry.timestamp >= expired and len(self.results) <= SHARED_ENCODE_MAX_ITEMS:
+                # entries are in insertion order, so the remaining ones are more recent:
+                break
+            del self.results[key]
+
+    def get_info(self) -> dict[str, Any]:
+        return {
+            "enabled": SHARED_ENCODE and self.hash_fn is not None,
+            "windows": sum(1 for count in self.viewers.values() if count > 1),
+            "cached": len(self.results),
+            "hits": self.hits,
+            "misses": self.misses,
+            "timeouts": self.timeouts,
+        }
+
+
+instance = None
+
+
+def get_encode_share() -> EncodeShare:
+    global instance
+    if instance is None:
+        instance = EncodeShare()
+    return instance
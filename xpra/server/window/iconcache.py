@@ -0,0 +1,92 @@
+# This file is part of Xpra.
+# Copyright (C) 2024 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+from hashlib import blake2b
+from threading import Lock
+from collections import OrderedDict
+from typing import Any
+
+from xpra.util.env import envint
+from xpra.log import Logger
+
+log = Logger("icon")
+
+# total size of the encoded icons and cursors we keep, in KiB:
+ICON_CACHE_SIZE = max(0, envint("XPRA_ICON_CACHE_SIZE", 4096)) * 1024
+
+
+def content_hash(pixels, *params) -> str:
+    """
+    Identifies the output of an encoding operation:
+    the hash covers the source pixels and all the parameters used for encoding them.
+    """
+    h = blake2b(digest_size=16)
+    h.update(repr(params).encode())
+    h.update(pixels)
+    return h.hexdigest()
+
+
+class IconCache:
+    """
+    Server-wide LRU cache of encoded window icons and cursors,
+    shared by all the clients so that each icon is only encoded once.
+    The entries are keyed by the `content_hash` of the source pixels and encoding parameters.
+    """
+
+    def __init__(self, max_size: int = ICON_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries: OrderedDict[str, tuple[int, int, bytes]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = Lock()
+
+    def __repr__(self):
+        return f"IconCache({len(self.entries)} entries, {self.size} bytes)"
+
+    def get(self, key: str) -> tuple[int, int, bytes] | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry
+
+    def set(self, key: str, width: int, height: int, data: bytes) -> None:
+        size = len(data)
+        if size > self.max_size:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.size -= len(old[2])
+            self.entries[key] = (width, height, data)
+            self.size += size
+            while self.size > self.max_size:
+                _, entry = self.entries.popitem(last=False)
+                self.size -= len(entry[2])
+                self.evictions += 1
+        log("IconCache.set(%s, %i, %i, %i bytes) %s", key, width, height, size, self)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def get_info(self) -> dict[str, Any]:
+        return {
+            "entries": len(self.entries),
+            "size": self.size,
+            "max-size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+icon_cache = IconCache()
@@ -1,15 +1,15 @@
 # -*- coding: utf-8 -*-
 # This file is part of Xpra.
-# Copyright (C) 2016-2021 Antoine Martin <antoine@xpra.org>
+# Copyright (C) 2016-2024 Antoine Martin <antoine@xpra.org>
 # Xpra is released under the terms of the GNU GPL v2, or, at your option, any
 # later version. See the file COPYING for details.
 
 #cython: boundscheck=False, wraparound=False
 
 import struct
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List
 
-from xpra.util.env import envbool
+from xpra.util.env import envbool, envint
 from xpra.util.str_fn import repr_ellipsized, csv
 from xpra.log import Logger
 log = Logger("encoding", "scroll")
@@ -18,16 +18,100 @@ from xpra.buffers.membuf cimport memalign, buffer_context  # pylint: disable=syn
 from xpra.buffers.xxh cimport xxh3
 from xpra.util.rectangle import rectangle
 
+from libc.stdint cimport uint8_t, int16_t, uint16_t, int32_t, uint32_t, uint64_t, uintptr_t
+from libc.stdlib cimport free, malloc, calloc, qsort
+from libc.string cimport memset
+
 
 cdef int DEBUG = envbool("XPRA_SCROLL_DEBUG", False)
+# rows are also hashed in vertical bands of this width (in pixels),
+# so we can find areas that scroll independently, ie: split panes:
+cdef uint16_t BAND_WIDTH = max(32, min(4096, envint("XPRA_SCROLL_BAND_WIDTH", 256)))
+# hash the columns to detect horizontal scrolling:
+cdef int HORIZONTAL = envbool("XPRA_SCROLL_HORIZONTAL", True)
+# how many identical lines we record hits for, starting with the nearest ones:
+cdef uint16_t MAX_DUPLICATES = max(1, envint("XPRA_SCROLL_MAX_DUPLICATES", 32))
 
 
-from libc.stdint cimport uint8_t, int16_t, uint16_t, uint32_t, uint64_t, uintptr_t
-from libc.stdlib cimport free, malloc
-from libc.string cimport memset
+MIN_LINE_COUNT = 2
 
+cdef uint32_t PRIME32 = 0x9E3779B1
+cdef int32_t NO_DISTANCE = 0x7fffffff
+
+ctypedef struct hash_entry:
+    uint64_t value
+    uint16_t index
+
+
+cdef int cmp_entry(const void *p1, const void *p2) noexcept nogil:
+    cdef const hash_entry *e1 = <const hash_entry*> p1
+    cdef const hash_entry *e2 = <const hash_entry*> p2
+    if e1.value < e2.value:
+        return -1
+    if e1.value > e2.value:
+        return 1
+    return <int> e1.index - <int> e2.index
+
+
+cdef uint32_t hash_distances(const uint64_t *a1, const uint64_t *a2, uint16_t l, size_t stride,
+                             uint16_t max_distance, uint16_t *distances, hash_entry *entries) noexcept nogil:
+    """
+        Records in `distances` the number of lines of `a2` found in `a1` at each distance.
+        Instead of comparing each line with all the lines within `max_distance`,
+        we sort the checksums of `a1` and use a binary search to find the matching lines,
+        then record up to MAX_DUPLICATES hits per line, starting with the nearest ones.
+        The values are read every `stride` items, so we can use the same code for the bands.
+        `distances` must have room for `2*l` values, and `entries` for `l` values.
+    """
+    cdef uint16_t n = 0
+    cdef int i, y2, lo, hi, mid, above, below, d_above, d_below
+    cdef uint16_t hits
+    cdef uint64_t v
+    for i in range(l):
+        v = a1[i*stride]
+        if v:
+            entries[n].value = v
+            entries[n].index = i
+            n += 1
+    if n==0:
+        return 0
+    qsort(entries, n, sizeof(hash_entry), &cmp_entry)
+    cdef uint32_t matches = 0
+    for y2 in range(l):
+        v = a2[y2*stride]
+        if v==0:
+            continue
+        #find the first entry matching (v, y2) or above:
+        lo = 0
+        hi = n
+        while lo<hi:
+            mid = (lo+hi) >> 1
+            if entries[mid].value<v or (entries[mid].value==v and entries[mid].index<y2):
+                lo = mid+1
+            else:
+                hi = mid
+        above = lo
+        below = lo-1
+        hits = 0
+        while hits<MAX_DUPLICATES:
+            d_above = d_below = NO_DISTANCE
+            if above<n and entries[above].value==v and entries[above].index-y2<max_distance:
+                d_above = entries[above].index-y2
+            if below>=0 and entries[below].value==v and y2-entries[below].index<=max_distance:
+                d_below = y2-entries[below].index
+            if d_above==NO_DISTANCE and d_below==NO_DISTANCE:
+                break
+            if d_above<=d_below:
+                #distance = y2-y1
+                distances[l-d_above] += 1
+                above += 1
+            else:
+                distances[l+d_below] += 1
+                below -= 1
+            hits += 1
+            matches += 1
+    return matches
 
-MIN_LINE_COUNT = 2
 
 def h(v) -> str:
     return hex(v)[2:].rstrip("L")
@@ -49,6 +133,15 @@ cdef class ScrollData:
     cdef uint16_t *distances
     cdef uint64_t *a1        #checksums of reference picture
     cdef uint64_t *a2        #checksums of latest picture
+    #the same for each band of each line: (line * bands + band)
+    cdef uint64_t *b1
+    cdef uint64_t *b2
+    #and for each column:
+    cdef uint64_t *c1
+    cdef uint64_t *c2
+    cdef uint16_t *hdistances
+    cdef uint16_t bands
+    cdef uint16_t max_distance
     cdef uint8_t matched
     cdef int16_t x
     cdef int16_t y
@@ -60,6 +153,8 @@ cdef class ScrollData:
         self.y = y
         self.width = width
         self.height = height
+        self.bands = 1
+        self.max_distance = 1000
 
     def __repr__(self):
         return "ScrollDistances(%ix%i)" % (self.width, self.height)
@@ -79,12 +174,27 @@ cdef class ScrollData:
         for i,v in enumerate(arr):
             self.a2[i] = <uint64_t> abs(v)
 
+    cdef void shift_checksums(self) noexcept nogil:
+        #this is a new picture, shift the latest checksums into the reference ones:
+        if self.a1:
+            free(self.a1)
+        self.a1 = self.a2
+        self.a2 = NULL
+        if self.b1:
+            free(self.b1)
+        self.b1 = self.b2
+        self.b2 = NULL
+        if self.c1:
+            free(self.c1)
+        self.c1 = self.c2
+        self.c2 = NULL
+
     def update(self, pixels, int16_t x, int16_t y, uint16_t width, uint16_t height,
                uint32_t rowstride, uint8_t bpp=4) -> None:
         """
             Add a new image to compare with,
-            checksum its rows into a2,
-            and push existing values (if we had any) into a1.
+            checksum its rows into a2 (and its bands into b2, its columns into c2),
+            and push existing values (if we had any) into a1 (b1, c1).
         """
         if DEBUG:
             log("%s.update%s a1=%#x, a2=%#x, distances=%#x, current size: %ix%i", self, (repr_ellipsized(pixels), x, y, width, height, rowstride, bpp), <uintptr_t> self.a1, <uintptr_t> self.a2, <uintptr_t> self.distances, self.width, self.height)
@@ -99,23 +209,41 @@ cdef class ScrollData:
                 self.free()
             self.width = width
             self.height = height
-        #this is a new picture, shift a2 into a1 if we have it:
-        if self.a1:
-            free(self.a1)
-            self.a1 = NULL
-        if self.a2:
-            self.a1 = self.a2
-            self.a2 = NULL
+        self.shift_checksums()
+        cdef uint16_t bands = 1
+        if width>=2*BAND_WIDTH:
+            bands = width//BAND_WIDTH
+        if bands!=self.bands:
+            #band checksums would not match:
+            free(self.b1)
+            self.b1 = NULL
+            self.bands = bands
         cdef size_t row_len = width*bpp
-        #allocate new checksum array:
-        assert self.a2==NULL
-        cdef size_t asize = height*(sizeof(uint64_t))
-        self.a2 = <uint64_t*> memalign(asize)
+        #allocate new checksum arrays:
+        self.a2 = <uint64_t*> memalign(height*sizeof(uint64_t))
         assert self.a2!=NULL, "checksum memory allocation failed"
+        if bands>1:
+            self.b2 = <uint64_t*> memalign(height*bands*sizeof(uint64_t))
+            assert self.b2!=NULL, "band checksum memory allocation failed"
+        if HORIZONTAL:
+            self.c2 = <uint64_t*> memalign(width*sizeof(uint64_t))
+            assert self.c2!=NULL, "column checksum memory allocation failed"
         #checksum each line of the pixel array:
         cdef Py_ssize_t min_buf_len = rowstride*height
         cdef uint64_t *a2 = self.a2
-        cdef uint16_t i
+        cdef uint64_t *b2 = self.b2
+        cdef uint64_t *c2 = self.c2
+        cdef uint16_t i, b, k, px
+        cdef size_t band_len = BAND_WIDTH*bpp
+        cdef uint32_t *row32
+        cdef uint32_t v
+        cdef uint32_t prime = PRIME32
+        #the column checksums use 32-bit arithmetic so the loop can be vectorized,
+        #we only need runs of matching columns so collisions are not a concern:
+        cdef uint32_t *cols = NULL
+        if c2!=NULL:
+            cols = <uint32_t*> memalign(width*sizeof(uint32_t))
+            assert cols!=NULL, "column checksum memory allocation failed"
         cdef uint8_t *buf
         with buffer_context(pixels) as bc:
             buf = <uint8_t*> (<uintptr_t> int(bc))
@@ -123,9 +251,39 @@ cdef class ScrollData:
                     len(bc), width, height, rowstride, min_buf_len)
             assert row_len<=rowstride, "invalid row length: %ix%i=%i but rowstride is %i" % (width, bpp, width*bpp, rowstride)
             with nogil:
+                if cols!=NULL:
+                    for px in range(width):
+                        cols[px] = PRIME32
                 for i in range(height):
-                    a2[i] = xxh3(buf, row_len)
+                    if b2!=NULL:
+                        #the last band also gets the remaining pixels:
+                        for b in range(bands-1):
+                            b2[b] = xxh3(buf+b*band_len, band_len)
+                        b2[bands-1] = xxh3(buf+(bands-1)*band_len, row_len-(bands-1)*band_len)
+                        #the line checksum is derived from the band checksums:
+                        a2[i] = xxh3(<void*> b2, bands*sizeof(uint64_t))
+                        b2 += bands
+                    else:
+                        a2[i] = xxh3(buf, row_len)
+                    if cols!=NULL:
+                        #this loop is independent for each column,
+                        #so the compiler can vectorize it:
+                        if bpp==4:
+                            row32 = <uint32_t*> buf
+                            for px in range(width):
+                                cols[px] = (cols[px] ^ row32[px]) * prime
+                        else:
+                            for px in range(width):
+                                v = 0
+                                for k in range(bpp):
+                                    v = (v << 8) | buf[px*bpp+k]
+                                cols[px] = (cols[px] ^ v) * prime
                     buf += rowstride
+                if cols!=NULL:
+                    #zero is used for invalid values:
+                    for px in range(width):
+                        c2[px] = cols[px] or 1
+                    free(cols)
 
 
     def calculate(self, uint16_t max_distance=1000) -> None:
@@ -133,10 +291,46 @@ cdef class ScrollData:
             Find all the scroll distances
             that would move lines from a1 to a2.
             The same lines may be accounted for multiple times.
-            The result is stored in the "distances" array.
+            The result is stored in the "distances" array,
+            and the horizontal distances are stored in the "hdistances" array.
         """
         if DEBUG:
             log("calculate(%i) a1=%#x, a2=%#x, distances=%#x", max_distance, <uintptr_t> self.a1, <uintptr_t> self.a2, <uintptr_t> self.distances)
+        if self.a1==NULL or self.a2==NULL:
+            return
+        self.max_distance = max_distance
+        cdef uint16_t l = self.height
+        cdef uint16_t w = self.width
+        if self.distances==NULL:
+            self.distances = <uint16_t*> memalign(2*l*sizeof(uint16_t))
+            assert self.distances!=NULL, "distance memory allocation failed"
+        cdef hash_entry *entries = <hash_entry*> malloc(max(l, w)*sizeof(hash_entry))
+        assert entries!=NULL, "hash index memory allocation failed"
+        cdef uint32_t matches = 0
+        cdef uint32_t hmatches = 0
+        with nogil:
+            memset(self.distances, 0, 2*l*sizeof(uint16_t))
+            matches = hash_distances(self.a1, self.a2, l, 1, max_distance, self.distances, entries)
+            if self.c1!=NULL and self.c2!=NULL:
+                if self.hdistances==NULL:
+                    self.hdistances = <uint16_t*> memalign(2*w*sizeof(uint16_t))
+                if self.hdistances!=NULL:
+                    memset(self.hdistances, 0, 2*w*sizeof(uint16_t))
+                    hmatches = hash_distances(self.c1, self.c2, w, 1, w, self.hdistances, entries)
+        free(entries)
+        if DEBUG:
+            log("ScrollDistance: height=%i, calculate:", l)
+            log(" a1=%s", da(self.a1, l))
+            log(" a2=%s", da(self.a2, l))
+            log(" %i matches, distances=%s", matches, dd(self.distances, l*2))
+            log(" %i horizontal matches", hmatches)
+
+    #only used by the unit tests, to compare with the hash index:
+    def calculate_scan(self, uint16_t max_distance=1000) -> None:
+        """
+            Find the scroll distances by comparing each line
+            with all the lines within `max_distance`.
+        """
         if self.a1==NULL or self.a2==NULL:
             return
         cdef uint64_t *a1 = self.a1
@@ -148,7 +342,6 @@ cdef class ScrollData:
         if self.distances==NULL:
             self.distances = <uint16_t*> memalign(2*l*sizeof(uint16_t))
             assert self.distances!=NULL, "distance memory allocation failed"
-        cdef uint32_t matches = 0
         with nogil:
             memset(self.distances, 0, 2*l*sizeof(uint16_t))
             for y2 in range(l):
@@ -169,12 +362,16 @@ cdef class ScrollData:
                     if a1[y1]==a2v:
                         #distance = y1-y2
                         self.distances[l-(y1-y2)] += 1
-                        matches += 1
-        if DEBUG:
-            log("ScrollDistance: height=%i, calculate:", l)
-            log(" a1=%s", da(self.a1, l))
-            log(" a2=%s", da(self.a2, l))
-            log(" %i matches, distances=%s", matches, dd(self.distances, l*2))
+
+    def get_distances(self) -> Dict[int, int]:
+        """
+            Returns the hit count for each distance,
+            only used by the unit tests.
+        """
+        if self.distances==NULL:
+            return {}
+        cdef uint16_t l = self.height
+        return dict((i-l, self.distances[i]) for i in range(2*l) if self.distances[i])
 
     def get_scroll_values(self, uint16_t min_hits=2) -> Tuple[Dict, Dict]:
         """
@@ -182,9 +379,42 @@ cdef class ScrollData:
             * scrolls dictionary contains scroll definitions
             * non-scrolls dictionary is everything else (that will need to be repainted)
         """
-        DEF MAX_MATCHES = 20
         if self.a1==NULL or self.a2==NULL:
             return None
+        cdef uint16_t l = self.height
+        cdef size_t asize = l*sizeof(uint8_t)
+        #use a temporary buffer to track the lines we have already dealt with:
+        cdef uint8_t *line_state = <uint8_t*> malloc(asize)
+        assert line_state!=NULL, "state map memory allocation failed"
+        memset(line_state, 0, asize)
+        cdef uint16_t i, start = 0, count = 0
+        try:
+            scrolls = self.match_scrolls(line_state, min_hits)
+            #same for the unmatched lines:
+            #all the lines in tmp which have not been set by match_distance()
+            line_defs = {}
+            for i in range(l):
+                if line_state[i]==0:
+                    if count==0:
+                        start = i
+                    count += 1
+                elif count>0:
+                    line_defs[start] = count
+                    count = 0
+            if count>0:
+                line_defs[start] = count
+        finally:
+            free(line_state)
+        return scrolls, line_defs
+
+    cdef match_scrolls(self, uint8_t *line_state, uint16_t min_hits):
+        """
+            Returns a dict with the scroll distance as key,
+            and the list of matching lines as value:
+            {line-start : count, ..}
+            The matching lines are marked in `line_state`.
+        """
+        DEF MAX_MATCHES = 20
         cdef uint16_t m_arr[MAX_MATCHES]    #number of hits
         cdef int16_t s_arr[MAX_MATCHES]     #scroll distance
         cdef int16_t i
@@ -193,13 +423,8 @@ cdef class ScrollData:
         cdef int16_t matches
         cdef uint16_t* distances = self.distances
         cdef uint16_t l = self.height
-        cdef size_t asize = l*sizeof(uint8_t)
-        #use a temporary buffer to track the lines we have already dealt with:
-        cdef uint8_t *line_state = <uint8_t*> malloc(asize)
-        assert line_state!=NULL, "state map memory allocation failed"
         #find the best values (highest match count):
         with nogil:
-            memset(line_state, 0, asize)
             memset(m_arr, 0, MAX_MATCHES*sizeof(uint16_t))
             memset(s_arr, 0, MAX_MATCHES*sizeof(int16_t))
             for i in range(2*l):
@@ -227,36 +452,16 @@ cdef class ScrollData:
                 scroll_hits.setdefault(m_arr[i], []).append(s_arr[i])
         if DEBUG:
             log("scroll hits=%s", dict(reversed(sorted(scroll_hits.items()))))
-        #return a dict with the scroll distance as key,
-        #and the list of matching lines as value:
-        # {line-start : count, ..}
-        cdef uint16_t start = 0, count = 0
-        try:
-            scrolls = {}
-            #starting with the highest matches
-            for i in reversed(sorted(scroll_hits.keys())):
-                v = scroll_hits[i]
-                for scroll in v:
-                    #find matching lines:
-                    line_defs = self.match_distance(line_state, scroll, MIN_LINE_COUNT)
-                    if line_defs:
-                        scrolls[scroll] = line_defs
-            #same for the unmatched lines:
-            #all the lines in tmp which have not been set by match_distance()
-            line_defs = {}
-            for i in range(l):
-                if line_state[i]==0:
-                    if count==0:
-                        start = i
-                    count += 1
-                elif count>0:
-                    line_defs[start] = count
-                    count = 0
-            if count>0:
-                line_defs[start] = count
-        finally:
-            free(line_state)
-        return scrolls, line_defs
+        scrolls = {}
+        #starting with the highest matches
+        for i in reversed(sorted(scroll_hits.keys())):
+            v = scroll_hits[i]
+            for scroll in v:
+                #find matching lines:
+                line_defs = self.match_distance(line_state, scroll, MIN_LINE_COUNT)
+                if line_defs:
+                    scrolls[scroll] = line_defs
+        return scrolls
 
     cdef match_distance(self, uint8_t *line_state, int16_t distance, const uint8_t min_line_count):
         """
@@ -306,6 +511,216 @@ cdef class ScrollData:
         #    log("match_distance(%i)=%s", distance, line_defs)
         return line_defs
 
+    def get_scroll_areas(self, uint16_t min_hits=2) -> Tuple[List, List]:
+        """
+            Like `get_scroll_values` but for rectangles rather than whole lines,
+            so we can also find areas that scroll independently (split panes)
+            and horizontal scrolling.
+            Returns the list of scrolls as (x, y, w, h, xdelta, ydelta),
+            and the list of rectangles that need to be repainted as (x, y, w, h),
+            all relative to the scroll area.
+        """
+        if self.a1==NULL or self.a2==NULL:
+            return None
+        cdef uint16_t l = self.height
+        cdef uint16_t bands = self.bands if (self.b1!=NULL and self.b2!=NULL) else 1
+        #for each line and band of the new picture, are the pixels accounted for?
+        cdef uint8_t *covered = <uint8_t*> calloc(l*bands, sizeof(uint8_t))
+        assert covered!=NULL, "coverage memory allocation failed"
+        cdef uint8_t *line_state = <uint8_t*> calloc(l, sizeof(uint8_t))
+        cdef uint16_t i, b
+        cdef uint32_t done = 0
+        try:
+            assert line_state!=NULL, "state map memory allocation failed"
+            scrolls = []
+            for scroll, line_defs in self.match_scrolls(line_state, min_hits).items():
+                if scroll:
+                    for line, count in line_defs.items():
+                        scrolls.append((0, line, self.width, count, 0, scroll))
+            for i in range(l):
+                if line_state[i]:
+                    memset(covered+i*bands, 1, bands)
+                    done += 1
+            if self.c1!=NULL and self.c2!=NULL and self.hdistances!=NULL:
+                hscrolls = self.match_horizontal(done*self.width, min_hits)
+                if hscrolls is not None:
+                    return hscrolls
+            #only look for split panes if whole lines don't account for most of the area:
+            if bands>1 and (l-done)*4>l:
+                scrolls += self.match_bands(covered, min_hits)
+            return scrolls, self.uncovered_areas(covered, bands)
+        finally:
+            free(line_state)
+            free(covered)
+
+    cdef list match_bands(self, uint8_t *covered, uint16_t min_hits):
+        """
+            Finds the best scroll distance for each band,
+            then the lines that match for groups of adjacent bands using the same distance.
+        """
+        cdef uint16_t l = self.height
+        cdef uint16_t bands = self.bands
+        cdef uint64_t *b1 = self.b1
+        cdef uint64_t *b2 = self.b2
+        cdef int32_t *band_distance = <int32_t*> malloc(bands*sizeof(int32_t))
+        cdef uint16_t *distances = <uint16_t*> malloc(2*l*sizeof(uint16_t))
+        cdef hash_entry *entries = <hash_entry*> malloc(l*sizeof(hash_entry))
+        cdef uint16_t b, i, best
+        cdef uint16_t bstart, bend, band
+        cdef int32_t d, i1, i2, rstart, rend, start, count
+        cdef uint8_t match
+        scrolls = []
+        try:
+            assert band_distance!=NULL and distances!=NULL and entries!=NULL, "band memory allocation failed"
+            with nogil:
+                for b in range(bands):
+                    band_distance[b] = NO_DISTANCE
+                    for i in range(l):
+                        if not covered[i*bands+b]:
+                            break
+                    else:
+                        #this band is already accounted for
+                        continue
+                    memset(distances, 0, 2*l*sizeof(uint16_t))
+                    hash_distances(b1+b, b2+b, l, bands, self.max_distance, distances, entries)
+                    best = min_hits
+                    for i in range(2*l):
+                        if distances[i]>best:
+                            best = distances[i]
+                            band_distance[b] = i-l
+            bstart = 0
+            while bstart<bands:
+                d = band_distance[bstart]
+                bend = bstart+1
+                while bend<bands and band_distance[bend]==d:
+                    bend += 1
+                if d!=NO_DISTANCE:
+                    x = bstart*BAND_WIDTH
+                    w = (self.width if bend==bands else bend*BAND_WIDTH)-x
+                    rstart = max(0, -d)
+                    rend = min(l, l-d)
+                    count = 0
+                    start = 0
+                    for i1 in range(rstart, rend+1):
+                        match = 0
+                        if i1<rend:
+                            i2 = i1+d
+                            match = 1
+                            for band in range(bstart, bend):
+                                if covered[i2*bands+band] or b2[i2*bands+band]==0 or b1[i1*bands+band]!=b2[i2*bands+band]:
+                                    match = 0
+                                    break
+                        if match:
+                            if count==0:
+                                start = i1
+                            count += 1
+                        elif count>0:
+                            if count>MIN_LINE_COUNT:
+                                for i2 in range(start+d, start+d+count):
+                                    memset(covered+i2*bands+bstart, 1, bend-bstart)
+                                if d!=0:
+                                    scrolls.append((x, start, w, count, 0, d))
+                            count = 0
+                bstart = bend
+        finally:
+            free(entries)
+            free(distances)
+            free(band_distance)
+        if DEBUG:
+            log("match_bands(..)=%s", scrolls)
+        return scrolls
+
+    cdef object match_horizontal(self, uint32_t vertical_pixels, uint16_t min_hits):
+        """
+            Finds the best horizontal scroll distance,
+            and returns the scrolls and the areas to repaint
+            if the matching columns cover more pixels than the vertical scrolls.
+        """
+        cdef uint16_t w = self.width
+        cdef uint16_t h = self.height
+        cdef uint64_t *c1 = self.c1
+        cdef uint64_t *c2 = self.c2
+        cdef uint16_t *hdistances = self.hdistances
+        cdef int32_t i, d = 0, best = min_hits
+        for i in range(2*w):
+            if hdistances[i]>best and i!=w:
+                best = hdistances[i]
+                d = i-w
+        if d==0:
+            return None
+        cdef uint8_t *col_state = <uint8_t*> calloc(w, sizeof(uint8_t))
+        assert col_state!=NULL, "column state memory allocation failed"
+        cdef int32_t x1, x2, start = 0, count = 0, dist
+        cdef uint32_t matched = 0
+        scrolls = []
+        try:
+            #unchanged columns first, then the scrolled ones:
+            for dist in (0, d):
+                count = 0
+                for x1 in range(max(0, -dist), min(w, w-dist)+1):
+                    x2 = x1+dist
+                    if x1<min(w, w-dist) and not col_state[x2] and c2[x2]!=0 and c2[x2]==c1[x1]:
+                        if count==0:
+                            start = x1
+                        count += 1
+                    elif count>0:
+                        if count>MIN_LINE_COUNT:
+                            memset(col_state+start+dist, 1, count)
+                            matched += count
+                            if dist:
+                                scrolls.append((start, 0, count, h, dist, 0))
+                        count = 0
+            if not scrolls or matched*h<=vertical_pixels:
+                return None
+            areas = []
+            count = 0
+            for x2 in range(w+1):
+                if x2<w and not col_state[x2]:
+                    if count==0:
+                        start = x2
+                    count += 1
+                elif count>0:
+                    areas.append((start, 0, count, h))
+                    count = 0
+        finally:
+            free(col_state)
+        if DEBUG:
+            log("match_horizontal(%i, %i)=%s, %s", vertical_pixels, min_hits, scrolls, areas)
+        return scrolls, areas
+
+    cdef list uncovered_areas(self, uint8_t *covered, uint16_t bands):
+        """
+            Converts the coverage map into a list of rectangles,
+            merging the lines that have the same uncovered bands.
+        """
+        areas = []
+        pending = {}
+        cdef uint16_t l = self.height
+        cdef uint16_t i, b, start
+        cdef uint16_t x, w
+        for i in range(l+1):
+            spans = set()
+            if i<l:
+                b = 0
+                while b<bands:
+                    if covered[i*bands+b]:
+                        b += 1
+                        continue
+                    start = b
+                    while b<bands and not covered[i*bands+b]:
+                        b += 1
+                    x = start*BAND_WIDTH if bands>1 else 0
+                    w = (self.width if b==bands else b*BAND_WIDTH)-x
+                    spans.add((x, w))
+            for span in tuple(pending.keys()):
+                if span not in spans:
+                    y = pending.pop(span)
+                    areas.append((span[0], y, span[1], i-y))
+            for span in spans:
+                pending.setdefault(span, i)
+        areas.sort(key=lambda r: (r[1], r[0]))
+        return areas
+
 
     def invalidate(self, int16_t x, int16_t y, uint16_t w, uint16_t h) -> None:
         if self.a2==NULL:
@@ -322,9 +737,14 @@ cdef class ScrollData:
         assert inter.y>=rect.y and inter.y+inter.height<=rect.y+rect.height
         #the array indexes are relative to rect.y:
         cdef int start_y = inter.y-rect.y
+        cdef int start_x = inter.x-rect.x
         cdef int i
         for i in range(start_y, start_y+inter.height):
             self.a2[i] = 0
+        if self.b2!=NULL:
+            memset(self.b2+start_y*self.bands, 0, inter.height*self.bands*sizeof(uint64_t))
+        if self.c2!=NULL:
+            memset(self.c2+start_x, 0, inter.width*sizeof(uint64_t))
         cdef uint16_t nonzero = 0
         for i in range(self.height):
             if self.a2[i]!=0:
@@ -356,6 +776,10 @@ cdef class ScrollData:
         if ptr:
             self.distances = NULL
             free(ptr)
+        ptr = <void*> self.hdistances
+        if ptr:
+            self.hdistances = NULL
+            free(ptr)
         ptr = <void*> self.a1
         if ptr:
             self.a1 = NULL
@@ -364,3 +788,19 @@ cdef class ScrollData:
         if ptr:
             self.a2 = NULL
             free(ptr)
+        ptr = <void*> self.b1
+        if ptr:
+            self.b1 = NULL
+            free(ptr)
+        ptr = <void*> self.b2
+        if ptr:
+            self.b2 = NULL
+            free(ptr)
+        ptr = <void*> self.c1
+        if ptr:
+            self.c1 = NULL
+            free(ptr)
+        ptr = <void*> self.c2
+        if ptr:
+            self.c2 = NULL
+            free(ptr)
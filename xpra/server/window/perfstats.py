@@ -16,9 +16,9 @@ from xpra.util.env import envint
 from xpra.server.cystats import (
     logp,
     calculate_time_weighted_average,
-    calculate_size_weighted_average,
-    calculate_timesize_weighted_average,
     calculate_for_average,
+    DecayingAverage,
+    SizeWeightedAverage,
 )
 
 from xpra.log import Logger
@@ -33,6 +33,25 @@ NRECS: int = 100
 TARGET_LATENCY_TOLERANCE = envint("XPRA_TARGET_LATENCY_TOLERANCE", 20) / 1000.0
 
 
+def linear_fit(xs: tuple, ys: tuple) -> tuple[float, float]:
+    """
+    Least squares fit of `y = a + b * x`, returns `(a, b)`,
+    or an empty tuple if the slope is not positive.
+    """
+    n = len(xs)
+    if n < 2:
+        return ()
+    mx = sum(xs) / n
+    my = sum(ys) / n
+    var = sum((x - mx) ** 2 for x in xs)
+    if var <= 0:
+        return ()
+    b = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var
+    if b <= 0:
+        return ()
+    return my - b * mx, b
+
+
 class WindowPerformanceStatistics:
     """
     Statistics which belong to a specific WindowSource
@@ -51,11 +70,15 @@ class WindowPerformanceStatistics:
         # records how long it took the client to decode frames:
         # (ack_time, no of pixels, decoding_time*1000*1000)
         self.client_decode_time: Deque[tuple[float, int, int]] = deque(maxlen=NRECS)
+        # the same records, accumulated as decoding speed and as the inverse of the decoding time:
+        self.decode_speed_average = SizeWeightedAverage()
+        self.decode_time_average = SizeWeightedAverage()
         # encoding: (time, coding, pixels, bpp, compressed_size, encoding_time)
         self.encoding_stats: Deque[tuple[float, str, int, int, int, float]] = deque(maxlen=NRECS)
         # records how long it took for a damage request to be sent
         # last NRECS: (sent_time, no of pixels, actual batch delay, damage_latency)
         self.damage_in_latency: Deque[tuple[float, int, float, float]] = deque(maxlen=NRECS)
+        self.damage_in_latency_average = DecayingAverage()
         # records how long it took for a damage request to be processed
         # last NRECS: (processed_time, no of pixels, actual batch delay, damage_latency)
         self.damage_out_latency: Deque[tuple[float, int, float, float]] = deque(maxlen=NRECS)
@@ -93,24 +116,30 @@ class WindowPerformanceStatistics:
         # this should be a last resort..
         self.damage_ack_pending = {}
 
+    def record_damage_in_latency(self, now: float, pixels: int, batch_delay: float, latency: float) -> None:
+        self.damage_in_latency.append((now, pixels, batch_delay, latency))
+        self.damage_in_latency_average.add(latency, 1, now)
+
+    def record_decode_time(self, now: float, pixels: int, decode_time: int) -> None:
+        if decode_time <= 0:
+            return
+        self.client_decode_time.append((now, pixels, decode_time))
+        # the elapsed time recorded is in microseconds:
+        self.decode_speed_average.record(now, pixels, pixels * 1000 * 1000 / decode_time)
+        self.decode_time_average.record(now, pixels, 1 / decode_time)
+
     def update_averages(self) -> None:
         # damage "in" latency: (the time it takes for damage requests to be processed only)
-        dil = tuple(self.damage_in_latency)
-        if dil:
-            data = tuple((when, latency) for when, _, _, latency in dil)
-            self.avg_damage_in_latency, self.recent_damage_in_latency = calculate_time_weighted_average(data)
+        if self.damage_in_latency_average:
+            self.avg_damage_in_latency, self.recent_damage_in_latency = self.damage_in_latency_average.get()
         # damage "out" latency: (the time it takes for damage requests to be processed and sent out)
         dol = tuple(self.damage_out_latency)
         if dol:
             data = tuple((when, latency) for when, _, _, latency in dol)
             self.avg_damage_out_latency, self.recent_damage_out_latency = calculate_time_weighted_average(data)
         # client decode speed:
-        cdt = tuple(self.client_decode_time)
-        if cdt:
-            # the elapsed time recorded is in microseconds:
-            decode_speed = tuple(
-                (event_time, size, int(size * 1000 * 1000 / elapsed)) for event_time, size, elapsed in cdt)
-            r = calculate_size_weighted_average(decode_speed)
+        if self.decode_speed_average:
+            r = self.decode_speed_average.get()
             self.avg_decode_speed = int(r[0])
             self.recent_decode_speed = int(r[1])
         # network send speed:
@@ -208,6 +237,7 @@ class WindowPerformanceStatistics:
                     einfo["pixels_encoded_per_second"] = int(total_pixels / total_time)
 
             add_compression_stats(estats)
+            info["packet-cost"] = self.get_packet_cost()
             encodings_used = tuple(x[1] for x in estats)
             for encoding in encodings_used:
                 enc_stats = tuple(x for x in estats if x[1] == encoding)
@@ -234,9 +264,8 @@ class WindowPerformanceStatistics:
             Then we add the average decoding latency.
             """
         decoding_latency = 0.010
-        cdt = tuple(self.client_decode_time)
-        if cdt:
-            decoding_latency = calculate_timesize_weighted_average(cdt)[0] / 1000.0
+        if self.decode_time_average:
+            decoding_latency = self.decode_time_average.get()[0] / 1000.0
         min_latency = max(abs_min, min_client_latency or abs_min) * 1.2
         avg_latency = max(min_latency, avg_client_latency or abs_min)
         max_latency = min(avg_latency, 4.0 * min_latency + 0.100)
@@ -286,6 +315,29 @@ class WindowPerformanceStatistics:
             count += 1
         return pixels, count
 
+    def get_packet_cost(self, coding: str = "", min_samples: int = 10) -> int:
+        """
+        Estimates the fixed cost of sending one more packet, as a number of pixels,
+        by fitting `cost = fixed + per_pixel * pixels` to the recent encoding statistics,
+        both for the encoding time and for the compressed size.
+        Returns -1 if we don't have enough data.
+        """
+        estats = tuple(self.encoding_stats)
+        if coding:
+            coding_stats = tuple(x for x in estats if x[1] == coding)
+            if len(coding_stats) >= min_samples:
+                estats = coding_stats
+        if len(estats) < min_samples:
+            return -1
+        pixels = tuple(x[2] for x in estats)
+        cost = -1
+        for values in (tuple(x[5] for x in estats), tuple(x[4] for x in estats)):
+            fit = linear_fit(pixels, values)
+            if fit:
+                fixed, per_pixel = fit
+                cost = max(cost, int(max(0.0, fixed) / per_pixel))
+        return cost
+
     def get_bitrate(self, max_elapsed: float = 1) -> int:
         cutoff = monotonic() - max_elapsed
         recs = tuple((v[0], v[4]) for v in tuple(self.encoding_stats) if v[0] >= cutoff)
@@ -2163,19 +2163,23 @@ class WindowVideoSource(WindowSource):
             scroll_data.calculate(max_distance)
             # marker telling us not to invalidate the scroll data from here on:
             options["scroll"] = True
+            areas = scroll_data.get_scroll_areas()
+            if not areas:
+                return False
             if min_percent > 0:
                 max_zones = 20
-                scroll, count = scroll_data.get_best_match()
+                # the pixels we don't need to repaint:
+                repaint = sum(rw*rh for _, _, rw, rh in areas[1])
+                match_pct = 100 - int(100*repaint/(w*h))
                 end = monotonic()
-                match_pct = int(100*count/h)
-                scrolllog("best scroll guess took %ims, matches %i%% of %i lines: %s",
-                          (end-start)*1000, match_pct, h, scroll)
+                scrolllog("scroll detection took %ims, matches %i%% of %ix%i: %s",
+                          (end-start)*1000, match_pct, w, h, areas[0])
             else:
                 max_zones = 50
                 match_pct = min_percent
             # if enough scrolling is detected, use scroll encoding for this frame:
             if match_pct >= min_percent:
-                self.encode_scrolling(scroll_data, image, options, match_pct, max_zones)
+                self.encode_scrolling(areas, image, options, match_pct, max_zones)
                 return True
         except (RuntimeError, ValueError):
             scrolllog("do_scroll_encode(%s, %s)", image, options, exc_info=True)
@@ -2186,7 +2190,7 @@ class WindowVideoSource(WindowSource):
             self.do_free_scroll_data()
         return False
 
-    def encode_scrolling(self, scroll_data, image: ImageWrapper, options: typedict,
+    def encode_scrolling(self, areas: tuple[list, list], image: ImageWrapper, options: typedict,
                          match_pct: int, max_zones: int = 20) -> None:
         # generate all the packets for this screen update
         # using 'scroll' encoding and picture encodings for the other regions
@@ -2200,35 +2204,30 @@ class WindowVideoSource(WindowSource):
         y = image.get_target_y()
         w = image.get_width()
         h = image.get_height()
-        raw_scroll, non_scroll = {}, {0: h}
+        raw_scroll, non_scroll = [], [(0, 0, w, h)]
         if x+w > ww or y+h > wh:
             # window may have been resized
             pass
         else:
-            v = scroll_data.get_scroll_values()
-            if v:
-                raw_scroll, non_scroll = v
-                if len(raw_scroll) >= max_zones or len(non_scroll) >= max_zones:
-                    # avoid fragmentation, which is too costly
-                    # (too many packets, too many loops through the encoder code)
-                    scrolllog("too many items: %i scrolls, %i non-scrolls - sending just one image instead",
-                              len(raw_scroll), len(non_scroll))
-                    raw_scroll = {}
-                    non_scroll = {0: h}
+            raw_scroll, non_scroll = areas
+            if len(raw_scroll) >= max_zones or len(non_scroll) >= max_zones:
+                # avoid fragmentation, which is too costly
+                # (too many packets, too many loops through the encoder code)
+                scrolllog("too many items: %i scrolls, %i non-scrolls - sending just one image instead",
+                          len(raw_scroll), len(non_scroll))
+                raw_scroll = []
+                non_scroll = [(0, 0, w, h)]
         scrolllog(" will send scroll data=%s, non-scroll=%s", raw_scroll, non_scroll)
         flush = len(non_scroll)
         # convert to a screen rectangle list for the client:
         scrolls: list[tuple[int, int, int, int, int, int]] = []
-        for scroll, line_defs in raw_scroll.items():
-            if scroll == 0:
-                continue
-            for line, count in line_defs.items():
-                if y+line+scroll < 0:
-                    raise RuntimeError(f"cannot scroll rectangle by {scroll} lines from {y}+{line}")
-                if y+line+scroll > wh:
-                    raise RuntimeError(f"cannot scroll rectangle {count} high "
-                                       f"by {scroll} lines from {y}+{line} (window height is {wh})")
-                scrolls.append((x, y+line, w, count, 0, scroll))
+        for sx, sy, sw, sh, dx, dy in raw_scroll:
+            if x+sx+dx < 0 or y+sy+dy < 0:
+                raise RuntimeError(f"cannot scroll rectangle by {dx},{dy} from {x}+{sx},{y}+{sy}")
+            if x+sx+dx+sw > ww or y+sy+dy+sh > wh:
+                raise RuntimeError(f"cannot scroll rectangle {sw}x{sh} by {dx},{dy} from {x}+{sx},{y}+{sy}"
+                                   f" (window size is {ww}x{wh})")
+            scrolls.append((x+sx, y+sy, sw, sh, dx, dy))
         del raw_scroll
         damage_time = options.floatget("damage-time")
         process_damage_time = options.floatget("process-damage-time")
@@ -2259,12 +2258,12 @@ class WindowVideoSource(WindowSource):
                 options["quality"] = quality
             nsstart = monotonic()
             sel_options = dict(options)
-            for sy, sh in non_scroll.items():
+            for sx, sy, sw, sh in non_scroll:
                 substart = monotonic()
-                sub = image.get_sub_image(0, sy, w, sh)
-                encoding = self.get_best_nonvideo_encoding(w, sh, sel_options)
+                sub = image.get_sub_image(sx, sy, sw, sh)
+                encoding = self.get_best_nonvideo_encoding(sw, sh, sel_options)
                 if not encoding:
-                    raise RuntimeError(f"no nonvideo encoding found for {w}x{sh} screen update")
+                    raise RuntimeError(f"no nonvideo encoding found for {sw}x{sh} screen update")
                 encode_fn = self._encoders[encoding]
                 ret = encode_fn(encoding, sub, options)
                 self.free_image_wrapper(sub)
@@ -2281,7 +2280,7 @@ class WindowVideoSource(WindowSource):
                 #    # hard-coded for BGRA!
                 #    from xpra.os_util import memoryview_to_bytes
                 #    from PIL import Image
-                #    im = Image.frombuffer("RGBA", (w, sh), memoryview_to_bytes(sub.get_pixels()),
+                #    im = Image.frombuffer("RGBA", (sw, sh), memoryview_to_bytes(sub.get_pixels()),
                 #                          "raw", "BGRA", sub.get_rowstride(), 1)
                 #    filename = "./scroll-%i-%i.png" % (self._sequence, len(non_scroll)-flush)
                 #    im.save(filename, "png")
@@ -2289,10 +2288,10 @@ class WindowVideoSource(WindowSource):
                 packet = self.make_draw_packet(sub.get_target_x(), sub.get_target_y(), outw, outh,
                                                coding, data, outstride, client_options, options)
                 self.queue_damage_packet(packet, damage_time, process_damage_time)
-                psize = w*sh*4
+                psize = sw*sh*4
                 csize = len(data)
                 compresslog(COMPRESS_FMT,
-                            (monotonic()-substart)*1000.0, w, sh, x+0, y+sy, self.wid, coding,
+                            (monotonic()-substart)*1000.0, sw, sh, x+sx, y+sy, self.wid, coding,
                             100.0*csize/psize, ceil(psize/1024), ceil(csize/1024),
                             self._damage_packet_sequence, client_options, options)
             scrolllog("non-scroll (quality=%i, speed=%i) took %ims for %i rectangles",
@@ -18,7 +18,9 @@ except ImportError:
 from xpra.os_util import gi_import
 from xpra.util.io import load_binary_file
 from xpra.net import compression
+from xpra.server.window.iconcache import icon_cache, content_hash
 from xpra.util.str_fn import csv, memoryview_to_bytes
+from xpra.util.objects import LRUCache
 from xpra.util.env import envint, envbool
 from xpra.log import Logger
 
@@ -42,9 +44,10 @@ class WindowIconSource:
 
     fallback_window_icon: bool | tuple[int, int, str, bytes] = False
 
-    def __init__(self, window_icon_encodings, icons_encoding_options):
+    def __init__(self, window_icon_encodings, icons_encoding_options, client_icons: LRUCache | None = None):
         self.window_icon_encodings = window_icon_encodings
         self.icons_encoding_options = icons_encoding_options  # icon caps
+        self.client_icons = client_icons  # mirrors the icon cache of the client, shared by all its windows
 
         self.has_png = PNG_ICONS and ("png" in self.window_icon_encodings)
         self.has_default = DEFAULT_ICONS and ("default" in self.window_icon_encodings)
@@ -236,6 +239,40 @@ class WindowIconSource:
             w, h, pixel_format, len(pixel_data), self.wid)
         if pixel_format not in ("BGRA", "RGBA", "png"):
             raise RuntimeError(f"invalid window icon format {pixel_format}")
+        # the same icon is often used by many windows and sent to many clients,
+        # so we only encode it once for each size constraint:
+        key = content_hash(pixel_data, w, h, pixel_format, self.window_icon_size, self.window_icon_max_size)
+        cached = None if SAVE_WINDOW_ICONS else icon_cache.get(key)
+        if cached:
+            log("using cached window icon %s", key)
+            w, h, pixel_data = cached
+        else:
+            icon = self.encode_window_icon(w, h, pixel_format, pixel_data)
+            if not icon:
+                return
+            w, h, pixel_data = icon
+            icon_cache.set(key, w, h, pixel_data)
+        wrapper = compression.Compressed("png", pixel_data)
+        packet = ("window-icon", self.wid, w, h, wrapper.datatype, wrapper)
+        client_icons = self.client_icons
+        if client_icons is None:
+            log("queuing window icon update: %s", packet)
+            self.queue_packet(packet, wait_for_more=True)
+            return
+        # the mirror is shared by all the windows of this client, which may use different encode threads,
+        # and it must be updated in the same order as the client will receive the packets:
+        with client_icons.lock:
+            if key in client_icons:
+                # the client still has this icon in its cache:
+                client_icons.get(key)
+                packet = ("window-icon", self.wid, w, h, "cached", key)
+            else:
+                client_icons.set(key, True)
+                packet += (key, )
+            log("queuing window icon update: %s", packet)
+            self.queue_packet(packet, wait_for_more=True)
+
+    def encode_window_icon(self, w: int, h: int, pixel_format: str, pixel_data) -> tuple[int, int, bytes] | None:
         if pixel_format == "BGRA":
             # BGRA data is always unpremultiplied
             # (that's what we get from NetWMIcons)
@@ -247,7 +284,7 @@ class WindowIconSource:
         # or if we must downscale it (bigger than what the client is willing to deal with),
         # or if we want to save window icons
         must_scale = w > max_w or h > max_h
-        log("compress_and_send_window_icon: %sx%s (max-size=%s, standard-size=%s), pixel_format=%s",
+        log("encode_window_icon: %sx%s (max-size=%s, standard-size=%s), pixel_format=%s",
             w, h, self.window_icon_max_size, self.window_icon_size, pixel_format)
         must_convert = pixel_format != "png"
         log(" must convert=%s, must scale=%s", must_convert, must_scale)
@@ -256,7 +293,7 @@ class WindowIconSource:
         if must_scale or must_convert or SAVE_WINDOW_ICONS:
             if Image is None:
                 log("cannot scale or convert window icon without python-pillow")
-                return
+                return None
             # we're going to need a PIL Image:
             if pixel_format == "png":
                 image = Image.open(BytesIO(pixel_data))
@@ -290,10 +327,7 @@ class WindowIconSource:
             pixel_data = output.getvalue()
             output.close()
             w, h = image.size
-        wrapper = compression.Compressed("png", pixel_data)
-        packet = ("window-icon", self.wid, w, h, wrapper.datatype, wrapper)
-        log("queuing window icon update: %s", packet)
-        self.queue_packet(packet, wait_for_more=True)
+        return w, h, memoryview_to_bytes(pixel_data)
 
     @staticmethod
     def choose_icon(icons, max_w=1024, max_h=1024):
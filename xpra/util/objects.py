@@ -104,6 +104,48 @@ class MutableInteger:
         return self.counter - int(other)
 
 
+class LRUCache:
+    """
+    A dictionary holding at most `size` items,
+    evicting the least recently used ones first.
+    The eviction order only depends on the sequence of `get` and `set` calls,
+    so two peers making the same calls end up holding the same keys.
+    Callers sharing the cache between threads must hold `lock`.
+    """
+    __slots__ = ("size", "items", "lock")
+
+    def __init__(self, size: int):
+        from collections import OrderedDict
+        from threading import Lock
+        self.size: int = size
+        self.items: OrderedDict = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key, default=None):
+        if key not in self.items:
+            return default
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def set(self, key, value) -> None:
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+    def clear(self) -> None:
+        self.items.clear()
+
+    def __contains__(self, key) -> bool:
+        return key in self.items
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __repr__(self) -> str:
+        return f"LRUCache({len(self.items)}/{self.size})"
+
+
 # noinspection PyPep8Naming
 class typedict(dict):
     __slots__ = ("warn",)  # no __dict__ - that would be redundant
@@ -223,3 +223,74 @@ def merge_all(rectangles) -> rectangle:
         if y2>ry2:
             ry2 = y2
     return rectangle(rx, ry, rx2-rx, ry2-ry)
+
+
+DEF MAX_MERGE_PASSES = 4
+
+
+def merge_regions(rectangles, const long packet_cost, const int neighbours=16) -> list:
+    """
+    Merges rectangles with their neighbours
+    whenever the extra pixels of the bounding box cost less than the packet we save.
+    The cost of sending a region is its pixel count plus `packet_cost`.
+    The rectangles are sorted vertically and each one is only compared
+    with the next `neighbours` ones, so this scales to thousands of rectangles.
+    """
+    cdef int n = len(rectangles)
+    if n <= 1:
+        return list(rectangles)
+    cdef list rects = sorted(rectangles, key=lambda r: (r.y, r.x))
+    cdef int[:] x1 = array_of(n)
+    cdef int[:] y1 = array_of(n)
+    cdef int[:] x2 = array_of(n)
+    cdef int[:] y2 = array_of(n)
+    cdef char[:] alive = bytearray(b"\1" * n)
+    cdef rectangle r
+    cdef int i, j, count, bx1, by1, bx2, by2
+    for i in range(n):
+        r = rects[i]
+        x1[i] = r.x
+        y1[i] = r.y
+        x2[i] = r.x + r.width
+        y2[i] = r.y + r.height
+    cdef long long added
+    cdef int passes = 0
+    cdef int changed = 1
+    while changed and passes < MAX_MERGE_PASSES:
+        changed = 0
+        passes += 1
+        for i in range(n):
+            if not alive[i]:
+                continue
+            count = 0
+            j = i + 1
+            while j < n and count < neighbours:
+                if not alive[j]:
+                    j += 1
+                    continue
+                count += 1
+                # since the rectangles are sorted, `y1[i]` is the top of the bounding box:
+                bx1 = MIN(x1[i], x1[j])
+                by1 = y1[i]
+                bx2 = MAX(x2[i], x2[j])
+                by2 = MAX(y2[i], y2[j])
+                added = <long long> (bx2 - bx1) * (by2 - by1)
+                added -= <long long> (x2[i] - x1[i]) * (y2[i] - y1[i])
+                added -= <long long> (x2[j] - x1[j]) * (y2[j] - y1[j])
+                if added <= packet_cost:
+                    x1[i] = bx1
+                    x2[i] = bx2
+                    y2[i] = by2
+                    alive[j] = 0
+                    changed = 1
+                    # the bounding box grew, look at its neighbours again:
+                    count = 0
+                    j = i + 1
+                    continue
+                j += 1
+    return [rectangle(x1[i], y1[i], x2[i] - x1[i], y2[i] - y1[i]) for i in range(n) if alive[i]]
+
+
+cdef object array_of(int n):
+    from array import array
+    return array("i", bytes(n * sizeof(int)))
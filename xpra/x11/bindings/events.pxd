@@ -8,3 +8,4 @@ from xpra.x11.bindings.xlib cimport Display, XEvent
 
 cdef object parse_xevent(Display *d, XEvent *e)
 cdef void init_x11_events(Display *display)
+cdef int get_DamageNotify() noexcept
@@ -169,6 +169,11 @@ cdef int CursorNotify = -1
 cdef int XKBNotify = -1
 cdef int ShapeNotify = -1
 cdef int XFSelectionNotify = -1
+cdef int DamageNotify = -1
+
+
+cdef int get_DamageNotify() noexcept:
+    return DamageNotify
 
 
 cdef int get_XKB_event_base(Display *xdisplay) noexcept:
@@ -446,6 +451,7 @@ cdef object parse_xevent(Display *d, XEvent *e):
         pyev.y = damage_e.area.y
         pyev.width = damage_e.area.width
         pyev.height = damage_e.area.height
+        pyev.rectangles = ((pyev.x, pyev.y, pyev.width, pyev.height), )
     elif etype == MapRequest:
         pyev.window = e.xmaprequest.window
     elif etype == ConfigureRequest:
@@ -32,8 +32,9 @@ from xpra.x11.bindings.xlib cimport (
     XAllocIconSize, XIconSize, XSetIconSizes,
     XQueryTree,
     XKillClient,
+    XFlush,
 )
-from libc.stdint cimport uintptr_t
+from libc.stdint cimport uintptr_t, uint8_t, uint32_t, int32_t
 from libc.stdlib cimport free, malloc        # pylint: disable=syntax-error
 from libc.string cimport memset
 
@@ -360,6 +361,56 @@ cdef extern from "X11/extensions/Xdamage.h":
     void XDamageSubtract(Display *, Damage, XserverRegion repair, XserverRegion parts)
 
 
+###################################
+# XCB, used for pipelining requests
+###################################
+
+cdef extern from "xcb/xcb.h":
+    ctypedef struct xcb_connection_t:
+        pass
+    ctypedef struct xcb_generic_error_t:
+        uint8_t error_code
+    ctypedef struct xcb_get_property_cookie_t:
+        unsigned int sequence
+    ctypedef struct xcb_get_property_reply_t:
+        uint8_t format
+        uint32_t type
+        uint32_t bytes_after
+        uint32_t value_len
+    xcb_get_property_cookie_t xcb_get_property(xcb_connection_t *c, uint8_t _delete, uint32_t window,
+                                               uint32_t property, uint32_t type,
+                                               uint32_t long_offset, uint32_t long_length)
+    xcb_get_property_reply_t *xcb_get_property_reply(xcb_connection_t *c, xcb_get_property_cookie_t cookie,
+                                                     xcb_generic_error_t **e)
+    void *xcb_get_property_value(const xcb_get_property_reply_t *R)
+    int xcb_get_property_value_length(const xcb_get_property_reply_t *R)
+
+
+cdef extern from "X11/Xlib-xcb.h":
+    xcb_connection_t *XGetXCBConnection(Display *dpy)
+
+
+cdef object xcb_property_data(xcb_get_property_reply_t *reply):
+    # return the data in the same format as XGetWindowProperty,
+    # which uses a (sign extended) long for each 32-bit item:
+    cdef int length = xcb_get_property_value_length(reply)
+    cdef const char *value = <const char *> xcb_get_property_value(reply)
+    if reply.format != 32:
+        return value[:length]
+    cdef unsigned int nitems = length // 4
+    cdef const int32_t *items = <const int32_t *> value
+    cdef long *buf = <long *> malloc(nitems * sizeof(long) + 1)
+    if buf == NULL:
+        raise MemoryError(f"failed to allocate {nitems} items")
+    cdef unsigned int i
+    for i in range(nitems):
+        buf[i] = items[i]
+    try:
+        return (<const char *> buf)[:nitems * sizeof(long)]
+    finally:
+        free(buf)
+
+
 cdef inline long cast_to_long(i):
     if i < 0:
         return <long>i
@@ -1160,6 +1211,55 @@ cdef class X11WindowBindingsInstance(X11CoreBindingsInstance):
         XFree(prop)
         return data
 
+    def XGetWindowProperties(self, Window xwindow, properties: Dict[str, int]) -> Dict[str, Any]:
+        """
+        Sends the requests for all the `properties` (name: buffer size)
+        before waiting for any of the replies, so this only costs a single round trip.
+        Returns the type atom and raw data of each property, or None if it is missing.
+        The properties that do not fit in their buffer size are not included.
+        """
+        self.context_check("XGetWindowProperties")
+        names = tuple(properties.keys())
+        atoms = tuple(self.str_to_atom(name) for name in names)
+        cdef unsigned int count = len(names)
+        if not count:
+            return {}
+        cdef xcb_get_property_cookie_t *cookies = <xcb_get_property_cookie_t *> malloc(count * sizeof(xcb_get_property_cookie_t))
+        if cookies == NULL:
+            raise MemoryError(f"failed to allocate {count} property cookies")
+        cdef xcb_connection_t *xcb = XGetXCBConnection(self.display)
+        # the server must see the pending Xlib requests first:
+        XFlush(self.display)
+        cdef unsigned int i
+        for i in range(count):
+            cookies[i] = xcb_get_property(xcb, False, xwindow, atoms[i], AnyPropertyType,
+                                          0, properties[names[i]] // 4)
+        cdef xcb_get_property_reply_t *reply
+        cdef xcb_generic_error_t *error
+        cdef uint8_t error_code = 0
+        results = {}
+        try:
+            for i in range(count):
+                error = NULL
+                reply = xcb_get_property_reply(xcb, cookies[i], &error)
+                if error != NULL:
+                    error_code = error_code or error.error_code
+                    free(error)
+                if reply == NULL:
+                    continue
+                try:
+                    if reply.type == XNone:
+                        results[names[i]] = None
+                    elif not reply.bytes_after:
+                        results[names[i]] = (reply.type, xcb_property_data(reply))
+                finally:
+                    free(reply)
+        finally:
+            free(cookies)
+        if error_code:
+            raise XError(error_code)
+        return results
+
     def GetWindowPropertyType(self, Window xwindow, property, incr=False) -> Tuple[bytes, int]:
         #as above, but for any property type
         #and returns the type found
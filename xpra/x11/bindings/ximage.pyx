@@ -5,9 +5,12 @@
 # later version. See the file COPYING for details.
 
 from time import monotonic
-from typing import List, Tuple
+from typing import Any, Dict, List, Tuple
+from functools import partial
+from threading import current_thread, main_thread, Lock
 
 from xpra.x11.bindings.display_source import get_display_name   # @UnresolvedImport
+from xpra.util.env import envint
 from xpra.log import Logger
 
 
@@ -31,6 +34,11 @@ log = Logger("x11", "bindings", "ximage")
 xshmdebug = Logger("x11", "bindings", "ximage", "xshm", "verbose")
 ximagedebug = Logger("x11", "bindings", "ximage", "verbose")
 
+#number of shared memory segments each XShmWrapper can rotate through,
+#so the images we hand out are never overwritten and don't need to be copied
+#(1 re-uses the same segment, the images must then be frozen before use in other threads)
+XSHM_POOL_SIZE = max(1, envint("XPRA_XSHM_POOL_SIZE", 3))
+
 
 cdef inline unsigned int roundup(unsigned int n, unsigned int m) noexcept:
     return (n + m - 1) & ~(m - 1)
@@ -506,44 +514,44 @@ cdef class XImageWrapper:
         return True
 
 
-cdef class XShmWrapper:
+#segments released from a non-UI thread after their XShmWrapper was closed,
+#they will be freed from the UI thread:
+pending_segments = []
+# protects the segment pools and their reference counts,
+# since images can be freed from any thread:
+segments_lock = Lock()
+
+
+cdef void free_pending_segments():
+    cdef XShmSegment segment
+    while pending_segments:
+        segment = pending_segments.pop()
+        segment.free()
+
+
+cdef class XShmSegment:
     cdef Display *display
-    cdef Visual *visual
-    cdef Window window
-    cdef unsigned int width
-    cdef unsigned int height
-    cdef unsigned int depth
     cdef XShmSegmentInfo shminfo
     cdef XImage *image
     cdef unsigned int ref_count
-    cdef Bool got_image
-    cdef Bool closed
-
-    cdef void init(self, Display *display, Window xwindow, Visual *visual, unsigned int width, unsigned int height, unsigned int depth):
-        self.display = display
-        self.window = xwindow
-        self.visual = visual
-        self.width = width
-        self.height = height
-        self.depth = depth
 
     def __repr__(self):
-        return "XShmWrapper(%#x - %ix%i)" % (self.window, self.width, self.height)
+        return "XShmSegment(%#x - %i)" % (self.shminfo.shmid, self.ref_count)
 
-    def setup(self):
+    cdef object setup(self, Display *display, Visual *visual, unsigned int width, unsigned int height, unsigned int depth):
         #returns:
         # (init_ok, may_retry_this_window, XShm_global_failure)
+        self.display = display
         self.ref_count = 0
-        self.closed = False
         self.shminfo.shmaddr = <char *> -1
 
-        self.image = XShmCreateImage(self.display, self.visual, self.depth,
+        self.image = XShmCreateImage(display, visual, depth,
                           ZPixmap, NULL, &self.shminfo,
-                          self.width, self.height)
-        xshmdebug("XShmWrapper.setup() XShmCreateImage(%ix%i-%i) %s", self.width, self.height, self.depth, self.image!=NULL)
+                          width, height)
+        xshmdebug("XShmSegment.setup() XShmCreateImage(%ix%i-%i) %s", width, height, depth, self.image!=NULL)
         if self.image==NULL:
-            xshmlog.error("XShmWrapper.setup() XShmCreateImage(%ix%i-%i) failed!", self.width, self.height, self.depth)
-            self.cleanup()
+            xshmlog.error("XShmSegment.setup() XShmCreateImage(%ix%i-%i) failed!", width, height, depth)
+            self.free()
             #if we cannot create an XShm XImage, we may try again
             #(it could be dimensions are too big?)
             return False, True, False
@@ -552,41 +560,152 @@ cdef class XShmWrapper:
         #  even on the last line, without reading past the end of the buffer)
         cdef size_t size = self.image.bytes_per_line * (self.image.height + 1)
         self.shminfo.shmid = shmget(IPC_PRIVATE, size, IPC_CREAT | 0o777)
-        xshmdebug("XShmWrapper.setup() shmget(PRIVATE, %i bytes, %#x) shmid=%#x", size, IPC_CREAT | 0777, self.shminfo.shmid)
+        xshmdebug("XShmSegment.setup() shmget(PRIVATE, %i bytes, %#x) shmid=%#x", size, IPC_CREAT | 0777, self.shminfo.shmid)
         if self.shminfo.shmid < 0:
-            xshmlog.error("XShmWrapper.setup() shmget(PRIVATE, %i bytes, %#x) failed, bytes_per_line=%i, width=%i, height=%i", size, IPC_CREAT | 0777, self.image.bytes_per_line, self.width, self.height)
-            self.cleanup()
+            xshmlog.error("XShmSegment.setup() shmget(PRIVATE, %i bytes, %#x) failed, bytes_per_line=%i, width=%i, height=%i", size, IPC_CREAT | 0777, self.image.bytes_per_line, width, height)
+            self.free()
             #only try again if we get EINVAL,
             #the other error codes probably mean this is never going to work..
             return False, errno==EINVAL, errno!=EINVAL
         # Attach:
         self.image.data = <char *> shmat(self.shminfo.shmid, NULL, 0)
         self.shminfo.shmaddr = self.image.data
-        xshmdebug("XShmWrapper.setup() shmat(%s, NULL, 0) %s", self.shminfo.shmid, self.shminfo.shmaddr != <char *> -1)
+        xshmdebug("XShmSegment.setup() shmat(%s, NULL, 0) %s", self.shminfo.shmid, self.shminfo.shmaddr != <char *> -1)
         if self.shminfo.shmaddr == <char *> -1:
-            xshmlog.error("XShmWrapper.setup() shmat(%s, NULL, 0) failed!", self.shminfo.shmid)
-            self.cleanup()
+            xshmlog.error("XShmSegment.setup() shmat(%s, NULL, 0) failed!", self.shminfo.shmid)
+            self.free()
             #we may try again with this window, or any other window:
             #(as this really shouldn't happen at all)
             return False, True, False
 
         # set as read/write, and attach to the display:
         self.shminfo.readOnly = False
-        cdef Bool a = XShmAttach(self.display, &self.shminfo)
-        xshmdebug("XShmWrapper.setup() XShmAttach(..) %s", bool(a))
+        cdef Bool a = XShmAttach(display, &self.shminfo)
+        xshmdebug("XShmSegment.setup() XShmAttach(..) %s", bool(a))
         if not a:
-            xshmlog.error("XShmWrapper.setup() XShmAttach(..) failed!")
-            self.cleanup()
+            xshmlog.error("XShmSegment.setup() XShmAttach(..) failed!")
+            self.free()
             #we may try again with this window, or any other window:
             #(as this really shouldn't happen at all)
             return False, True, False
         return True, True, False
 
+    cdef void free(self):
+        assert self.ref_count==0, "XShmSegment %s cannot be freed: still has a ref count of %i" % (self, self.ref_count)
+        has_shm = self.shminfo.shmaddr!=<char *> -1
+        xshmdebug("XShmSegment.free() has_shm=%s, image=%#x, shmid=%#x", has_shm, <uintptr_t> self.image, self.shminfo.shmid)
+        if has_shm:
+            XShmDetach(self.display, &self.shminfo)
+        has_image = self.image!=NULL
+        if has_image:
+            XDestroyImage(self.image)
+            self.image = NULL
+        if has_shm:
+            shmctl(self.shminfo.shmid, IPC_RMID, NULL)
+            shmdt(self.shminfo.shmaddr)
+            self.shminfo.shmaddr = <char *> -1
+            self.shminfo.shmid = -1
+        if has_shm or has_image:
+            call_context_check("XShmSegment.free")
+
+
+cdef class XShmWrapper:
+    cdef Display *display
+    cdef Visual *visual
+    cdef Window window
+    cdef unsigned int width
+    cdef unsigned int height
+    cdef unsigned int depth
+    cdef object segments
+    cdef XShmSegment current
+    cdef unsigned int ref_count
+    cdef Bool got_image
+    cdef Bool closed
+    cdef unsigned long captures
+    cdef unsigned long reused
+    cdef unsigned long rotations
+    cdef unsigned long exhausted
+
+    cdef void init(self, Display *display, Window xwindow, Visual *visual, unsigned int width, unsigned int height, unsigned int depth):
+        self.display = display
+        self.window = xwindow
+        self.visual = visual
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.segments = []
+
+    def __repr__(self):
+        return "XShmWrapper(%#x - %ix%i)" % (self.window, self.width, self.height)
+
+    def setup(self):
+        #returns:
+        # (init_ok, may_retry_this_window, XShm_global_failure)
+        self.ref_count = 0
+        self.closed = False
+        free_pending_segments()
+        cdef XShmSegment segment = XShmSegment()
+        r = segment.setup(self.display, self.visual, self.width, self.height, self.depth)
+        if r[0]:
+            self.segments.append(segment)
+            self.current = segment
+        else:
+            self.cleanup()
+        return r
+
     def get_size(self) -> Tuple[int, int]:
         return self.width, self.height
 
+    cdef XShmSegment get_free_segment(self):
+        #without a pool, we just overwrite the same segment:
+        cdef XShmSegment segment = self.current
+        if XSHM_POOL_SIZE==1 or segment.ref_count==0:
+            return segment
+        #the current segment is still being used, try the others:
+        for segment in self.segments:
+            if segment.ref_count==0:
+                self.rotations += 1
+                return segment
+        if len(self.segments)>=XSHM_POOL_SIZE:
+            return None
+        segment = XShmSegment()
+        if not segment.setup(self.display, self.visual, self.width, self.height, self.depth)[0]:
+            return None
+        self.segments.append(segment)
+        self.rotations += 1
+        xshmdebug("XShmWrapper.get_free_segment() allocated %s, pool size=%i", segment, len(self.segments))
+        return segment
+
+    cdef XShmSegment acquire_segment(self, Drawable drawable):
+        #returns the segment holding the pixels of the drawable, with an extra reference,
+        #or None if all the segments are in use or if the capture failed
+        cdef XShmSegment segment
+        if not self.got_image:
+            with segments_lock:
+                segment = self.get_free_segment()
+            if segment is None:
+                #every segment is still referenced by an image we have handed out,
+                #the caller can fallback to a regular XGetImage:
+                self.exhausted += 1
+                xshmlog("XShmWrapper.acquire_segment(%#x) all %i segments are in use", drawable, len(self.segments))
+                return None
+            #only this thread acquires segments, so this one remains unused while we capture into it:
+            if not XShmGetImage(self.display, drawable, segment.image, 0, 0, 0xFFFFFFFF):
+                xshmlog("XShmWrapper.acquire_segment(%#x) XShmGetImage failed!", drawable)
+                return None
+            self.current = segment
+            self.got_image = True
+            self.captures += 1
+        else:
+            self.reused += 1
+        segment = self.current
+        with segments_lock:
+            segment.ref_count += 1
+            self.ref_count += 1
+        return segment
+
     def get_image(self, Drawable drawable, int x, int y, int w, int h):
-        assert self.image!=NULL, "cannot retrieve image wrapper: XImage is NULL!"
+        assert self.current is not None, "cannot retrieve image wrapper: no XShm segment!"
         if self.closed:
             return None
         cdef int maxw = self.width
@@ -613,15 +732,18 @@ cdef class XShmWrapper:
         if y+h>maxh:
             h = maxh-y
             assert h>0
-        if not self.got_image:
-            if not XShmGetImage(self.display, drawable, self.image, 0, 0, 0xFFFFFFFF):
-                xshmlog("XShmWrapper.get_image(%#x, %i, %i, %i, %i) XShmGetImage failed!", drawable, x, y, w, h)
-                return None
-            self.got_image = True
-        self.ref_count += 1
+        free_pending_segments()
+        cdef XShmSegment segment
+        segment = self.acquire_segment(drawable)
+        if segment is None:
+            return None
         cdef XShmImageWrapper imageWrapper = XShmImageWrapper(x, y, w, h)
-        imageWrapper.set_image(self.image)
-        imageWrapper.set_free_callback(self.free_image_callback)
+        imageWrapper.set_image(segment.image)
+        imageWrapper.set_free_callback(partial(self.free_image_callback, segment))
+        if XSHM_POOL_SIZE>1:
+            #this segment will not be overwritten until the image is freed,
+            #so the pixels can be used from any thread without a copy:
+            imageWrapper.thread_safe = 1
         if self.depth==8:
             imageWrapper.set_palette(self.read_palette())
         xshmdebug("XShmWrapper.get_image(%#x, %i, %i, %i, %i)=%s (ref_count=%i)", drawable, x, y, w, h, imageWrapper, self.ref_count)
@@ -664,6 +786,27 @@ cdef class XShmWrapper:
         #force next get_image call to get a new image from the server
         self.got_image = False
 
+    def get_info(self) -> Dict[str, Any]:
+        cdef XShmSegment segment
+        cdef unsigned int in_use = 0
+        with segments_lock:
+            for segment in self.segments:
+                if segment.ref_count>0:
+                    in_use += 1
+        return {
+            "size"      : (self.width, self.height),
+            "images"    : self.ref_count,
+            "captures"  : self.captures,
+            "reused"    : self.reused,
+            "pool"      : {
+                "size"      : len(self.segments),
+                "max"       : XSHM_POOL_SIZE,
+                "in-use"    : in_use,
+                "rotations" : self.rotations,
+                "exhausted" : self.exhausted,
+            },
+        }
+
     def __dealloc__(self):
         xshmdebug("XShmWrapper.__dealloc__() ref_count=%i", self.ref_count)
         self.cleanup()
@@ -671,38 +814,41 @@ cdef class XShmWrapper:
     def cleanup(self) -> None:
         #ok, we want to free resources... problem is,
         #we may have handed out some XShmImageWrappers
-        #and they will point to our Image XShm area.
+        #and they will point to our Image XShm segments.
         #so we have to wait until *they* are freed,
         #and rely on them telling us via the free_image_callback.
         xshmdebug("XShmWrapper.cleanup() ref_count=%i", self.ref_count)
         self.closed = True
-        if self.ref_count==0:
-            self.free()
-
-    def free_image_callback(self) -> None:
-        self.ref_count -= 1
-        xshmdebug("XShmWrapper.free_image_callback() closed=%s, new ref_count=%i", self.closed, self.ref_count)
-        if self.closed and self.ref_count==0:
-            self.free()
+        self.free()
+
+    def free_image_callback(self, XShmSegment segment) -> None:
+        #this can run in any thread, concurrently with `free()`:
+        with segments_lock:
+            segment.ref_count -= 1
+            self.ref_count -= 1
+            release = self.closed and segment.ref_count==0 and segment in self.segments
+            if release:
+                self.segments.remove(segment)
+        xshmdebug("XShmWrapper.free_image_callback(%s) closed=%s, new ref_count=%i", segment, self.closed, self.ref_count)
+        if release:
+            #X11 calls are only allowed from the UI thread:
+            if current_thread() is main_thread():
+                segment.free()
+            else:
+                pending_segments.append(segment)
 
     cdef void free(self):
-        assert self.ref_count==0, "XShmWrapper %s cannot be freed: still has a ref count of %i" % (self, self.ref_count)
         assert self.closed, "XShmWrapper %s cannot be freed: it is not closed yet" % self
-        has_shm = self.shminfo.shmaddr!=<char *> -1
-        xshmdebug("XShmWrapper.free() has_shm=%s, image=%#x, shmid=%#x", has_shm, <uintptr_t> self.image, self.shminfo.shmid)
-        if has_shm:
-            XShmDetach(self.display, &self.shminfo)
-        has_image = self.image!=NULL
-        if has_image:
-            XDestroyImage(self.image)
-            self.image = NULL
-        if has_shm:
-            shmctl(self.shminfo.shmid, IPC_RMID, NULL)
-            shmdt(self.shminfo.shmaddr)
-            self.shminfo.shmaddr = <char *> -1
-            self.shminfo.shmid = -1
-        if has_shm or has_image:
-            call_context_check("XShmWrapper.free")
+        cdef XShmSegment segment
+        unused = []
+        if self.segments:
+            with segments_lock:
+                unused = [segment for segment in self.segments if segment.ref_count==0]
+                for segment in unused:
+                    self.segments.remove(segment)
+        for segment in unused:
+            segment.free()
+        free_pending_segments()
 
 
 cdef class XShmImageWrapper(XImageWrapper):
@@ -734,7 +880,17 @@ cdef class XShmImageWrapper(XImageWrapper):
         #we just force a restride, which will allocate a new pixel buffer:
         cdef unsigned int newstride = roundup(self.width*len(self.pixel_format), 4)
         self.timestamp = int(monotonic()*1000)
-        return self.restride(newstride)
+        if not self.restride(newstride):
+            return False
+        #we have our own copy of the pixels now,
+        #so the segment can be re-used without waiting for this image to be freed:
+        self.image = NULL
+        self.thread_safe = 1
+        cb = self.free_callback
+        if cb:
+            self.free_callback = None
+            cb()
+        return True
 
     def free(self) -> None:
         #ensure we never try to XDestroyImage:
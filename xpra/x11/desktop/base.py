@@ -205,7 +205,8 @@ class DesktopServerBase(DesktopServerBaseClass):
 
     def _contents_changed(self, window, event) -> None:
         log("contents changed on %s: %s", window, event)
-        self.refresh_window_area(window, event.x, event.y, event.width, event.height)
+        for x, y, w, h in event.rectangles:
+            self.refresh_window_area(window, x, y, w, h)
 
     def _set_window_state(self, proto, wid: int, window, new_window_state) -> list[str]:
         if not new_window_state:
@@ -20,7 +20,7 @@ GObject = gi_import("GObject")
 MIN_SIZE = 640, 350
 MAX_SIZE = 8192, 8192
 
-MonitorDamageNotify = namedtuple("MonitorDamageNotify", "x,y,width,height")
+MonitorDamageNotify = namedtuple("MonitorDamageNotify", "x,y,width,height,rectangles")
 
 
 class MonitorDesktopModel(DesktopModelBase):
@@ -83,13 +83,20 @@ class MonitorDesktopModel(DesktopModelBase):
     def do_x11_damage_event(self, event) -> None:
         # ie: <X11:DamageNotify {'send_event': '0', 'serial': '0x4da', 'delivered_to': '0x56e', 'window': '0x56e',
         #                       'damage': '2097157', 'x': '313', 'y': '174', 'width': '6', 'height': '13'}>)
-        damaged_area = rectangle(event.x, event.y, event.width, event.height)
         x, y, width, height = self.monitor_geometry
-        monitor_damaged_area = damaged_area.intersection(x, y, width, height)
-        if monitor_damaged_area:
-            # use an event relative to this monitor's coordinates:
-            mod_event = MonitorDamageNotify(monitor_damaged_area.x - x, monitor_damaged_area.y - y,
-                                            monitor_damaged_area.width, monitor_damaged_area.height)
+        rectangles = []
+        for rx, ry, rw, rh in event.rectangles:
+            monitor_damaged_area = rectangle(rx, ry, rw, rh).intersection(x, y, width, height)
+            if monitor_damaged_area:
+                # relative to this monitor's coordinates:
+                rectangles.append((monitor_damaged_area.x - x, monitor_damaged_area.y - y,
+                                   monitor_damaged_area.width, monitor_damaged_area.height))
+        if rectangles:
+            x1 = min(r[0] for r in rectangles)
+            y1 = min(r[1] for r in rectangles)
+            x2 = max(r[0] + r[2] for r in rectangles)
+            y2 = max(r[1] + r[3] for r in rectangles)
+            mod_event = MonitorDamageNotify(x1, y1, x2 - x1, y2 - y1, tuple(rectangles))
             self.emit("client-contents-changed", mod_event)
 
     def get_image(self, x: int, y: int, width: int, height: int):
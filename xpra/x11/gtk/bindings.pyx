@@ -10,28 +10,34 @@ from typing import Dict, Set
 
 from xpra.os_util import gi_import
 from xpra.util.str_fn import strtobytes, csv
+from xpra.util.env import envint, envbool
 
 from xpra.log import Logger
 log = Logger("x11", "bindings", "gtk")
 
 GObject = gi_import("GObject")
+GLib = gi_import("GLib")
 GdkX11= gi_import("GdkX11")
 Gdk = gi_import("Gdk")
 Gtk = gi_import("Gtk")
 
 
 from xpra.x11.bindings.xlib cimport (
-    Display, Window, Visual, Atom,
+    Display, Window, Visual, Atom, XID, Bool, XRectangle,
     XEvent, XGetErrorText, XGetAtomName, XFree,
 )
-from xpra.x11.bindings.events cimport parse_xevent, init_x11_events
+from xpra.x11.bindings.events cimport parse_xevent, init_x11_events, get_DamageNotify
 from xpra.x11.bindings.events import get_x_event_signals, get_x_event_type_name
 
 from libc.stdint cimport uintptr_t
 from xpra.gtk.bindings.gobject cimport wrap, unwrap
 
 
-from xpra.x11.common import REPR_FUNCTIONS
+from xpra.x11.common import REPR_FUNCTIONS, X11Event
+
+# merge the damage events received within this delay (in milliseconds):
+DAMAGE_COALESCE = envbool("XPRA_X11_DAMAGE_COALESCE", True)
+DAMAGE_COALESCE_DELAY = envint("XPRA_X11_DAMAGE_COALESCE_DELAY", 2)
 def get_window_xid(window) -> str:
     return hex(window.get_xid())
 REPR_FUNCTIONS[GdkX11.X11Window] = get_window_xid
@@ -247,6 +253,8 @@ def remove_event_receiver(xid: int, receiver:callable) -> None:
     receivers.discard(receiver)
     if not receivers:
         event_receivers_map.pop(xid)
+        pending_damage.pop(xid, None)
+        damage_accumulators.pop(xid, None)
 
 #only used for debugging:
 def get_event_receivers(xid: int) -> Set[Callable]:
@@ -254,6 +262,8 @@ def get_event_receivers(xid: int) -> Set[Callable]:
 
 def cleanup_all_event_receivers() -> None:
     event_receivers_map.clear()
+    damage_accumulators.clear()
+    pending_damage.clear()
 
 
 #sometimes we may want to debug routing for certain X11 event types
@@ -371,6 +381,182 @@ cdef void _route_event(int etype, event, signal, parent_signal):
         _maybe_send_event(DEBUG, handlers, parent_signal, event, "catchall-parent-signal")
 
 
+cdef extern from "X11/extensions/Xdamage.h":
+    ctypedef XID Damage
+    ctypedef struct XDamageNotifyEvent:
+        Damage damage
+        int level
+        Bool more
+        XRectangle area
+
+
+DEF MAX_DAMAGE_RECTS = 16
+
+ctypedef struct damage_rect:
+    int x
+    int y
+    int width
+    int height
+
+
+cdef inline unsigned long rect_area(damage_rect *r) noexcept:
+    return (<unsigned long> r.width) * r.height
+
+
+cdef inline bint rect_contains(damage_rect *r, damage_rect *o) noexcept:
+    return r.x <= o.x and r.y <= o.y and r.x+r.width >= o.x+o.width and r.y+r.height >= o.y+o.height
+
+
+cdef inline void rect_union(damage_rect *r, damage_rect *o, damage_rect *u) noexcept:
+    cdef int x2 = max(r.x+r.width, o.x+o.width)
+    cdef int y2 = max(r.y+r.height, o.y+o.height)
+    u.x = min(r.x, o.x)
+    u.y = min(r.y, o.y)
+    u.width = x2-u.x
+    u.height = y2-u.y
+
+
+cdef class DamageAccumulator:
+    """
+    Accumulates the damage rectangles of a drawable until they are flushed,
+    the rectangles contained in others are dropped and when there are too many,
+    the new rectangle is merged with the one that grows the least.
+    """
+    cdef readonly Damage damage
+    cdef readonly unsigned long serial
+    cdef damage_rect rects[MAX_DAMAGE_RECTS]
+    cdef unsigned int count
+    cdef readonly unsigned long events
+    cdef readonly unsigned long batches
+    cdef readonly unsigned long delivered
+
+    cpdef void add(self, Damage damage, unsigned long serial, int x, int y, int width, int height) noexcept:
+        cdef damage_rect new_rect
+        new_rect.x = x
+        new_rect.y = y
+        new_rect.width = width
+        new_rect.height = height
+        self.damage = damage
+        self.serial = serial
+        self.events += 1
+        cdef unsigned int i, j = 0
+        for i in range(self.count):
+            if rect_contains(&self.rects[i], &new_rect):
+                return
+        # remove the rectangles that the new one covers:
+        for i in range(self.count):
+            if not rect_contains(&new_rect, &self.rects[i]):
+                if i != j:
+                    self.rects[j] = self.rects[i]
+                j += 1
+        self.count = j
+        if self.count < MAX_DAMAGE_RECTS:
+            self.rects[self.count] = new_rect
+            self.count += 1
+            return
+        # merge it with the rectangle that grows the least:
+        cdef damage_rect merged
+        cdef unsigned long growth, best_growth = 0
+        cdef unsigned int best = 0
+        for i in range(self.count):
+            rect_union(&self.rects[i], &new_rect, &merged)
+            growth = rect_area(&merged) - rect_area(&self.rects[i])
+            if i == 0 or growth < best_growth:
+                best = i
+                best_growth = growth
+        rect_union(&self.rects[best], &new_rect, &self.rects[best])
+
+    cpdef object take(self):
+        if self.count == 0:
+            return None
+        cdef damage_rect bbox = self.rects[0]
+        cdef damage_rect r
+        rectangles = []
+        cdef unsigned int i
+        for i in range(self.count):
+            r = self.rects[i]
+            rectangles.append((r.x, r.y, r.width, r.height))
+            rect_union(&bbox, &self.rects[i], &bbox)
+        self.batches += 1
+        self.delivered += self.count
+        self.count = 0
+        event = X11Event("DamageNotify")
+        event.type = get_DamageNotify()
+        event.send_event = False
+        event.serial = self.serial
+        event.damage = self.damage
+        event.x = bbox.x
+        event.y = bbox.y
+        event.width = bbox.width
+        event.height = bbox.height
+        event.rectangles = tuple(rectangles)
+        return event
+
+    def get_info(self) -> Dict[str, int]:
+        return {
+            "events": self.events,
+            "batches": self.batches,
+            "rectangles": self.delivered,
+            "merged": self.events - self.delivered - self.count,
+            "pending": self.count,
+        }
+
+
+damage_accumulators : Dict[int, DamageAccumulator] = {}
+pending_damage : Dict[int, DamageAccumulator] = {}
+damage_flush_timer = 0
+
+
+def get_damage_info(xid: int) -> Dict[str, int]:
+    acc = damage_accumulators.get(xid)
+    if acc is None:
+        return {}
+    return acc.get_info()
+
+
+cdef bint queue_damage(XEvent *e):
+    cdef Window xid = e.xany.window
+    if xid not in event_receivers_map:
+        # nothing would remove the accumulator,
+        # let the regular event routing deal with this event:
+        return False
+    cdef XDamageNotifyEvent *damage_e = <XDamageNotifyEvent*> e
+    cdef DamageAccumulator acc = damage_accumulators.get(xid)
+    if acc is None:
+        acc = DamageAccumulator()
+        damage_accumulators[xid] = acc
+    acc.add(damage_e.damage, e.xany.serial,
+            damage_e.area.x, damage_e.area.y, damage_e.area.width, damage_e.area.height)
+    pending_damage[xid] = acc
+    global damage_flush_timer
+    if not damage_flush_timer:
+        # an idle callback could be starved by a steady stream of X11 events:
+        damage_flush_timer = GLib.timeout_add(DAMAGE_COALESCE_DELAY, flush_damage)
+    return True
+
+
+cdef void deliver_damage(Window xid, DamageAccumulator acc):
+    event = acc.take()
+    if event is None:
+        return
+    event.delivered_to = event.window = xid
+    signal, parent_signal = get_x_event_signals(event.type)
+    _route_event(event.type, event, signal, parent_signal)
+
+
+def flush_damage() -> bool:
+    global damage_flush_timer
+    damage_flush_timer = 0
+    pending = tuple(pending_damage.items())
+    pending_damage.clear()
+    for xid, acc in pending:
+        try:
+            deliver_damage(xid, acc)
+        except Exception:
+            log.warn("Unhandled exception delivering damage for window %#x:", xid, exc_info=True)
+    return False
+
+
 cdef GdkFilterReturn x_event_filter(GdkXEvent * e_gdk,
                                     GdkEvent * gdk_event,
                                     void * userdata) except GDK_FILTER_CONTINUE with gil:
@@ -381,6 +567,18 @@ cdef GdkFilterReturn x_event_filter(GdkXEvent * e_gdk,
 
     cdef Display *display = get_xdisplay()
     cdef XEvent * e = <XEvent*>e_gdk
+    cdef DamageAccumulator acc
+    if DAMAGE_COALESCE:
+        try:
+            if e.type == get_DamageNotify() and not e.xany.send_event and queue_damage(e):
+                return GDK_FILTER_CONTINUE  # @UndefinedVariable
+            if pending_damage:
+                # deliver the damage before any other event for the same window:
+                acc = pending_damage.pop(e.xany.window, None)
+                if acc is not None:
+                    deliver_damage(e.xany.window, acc)
+        except Exception:
+            log.warn("Unhandled exception in x_event_filter damage handling:", exc_info=True)
     try:
         pyev = parse_xevent(display, e)
     except Exception:
@@ -425,4 +623,9 @@ def cleanup_x11_filter() -> bool:
     _INIT_X11_FILTER_DONE -= 1
     if _INIT_X11_FILTER_DONE==0:
         gdk_window_remove_filter(<GdkWindow*>0, x_event_filter, NULL)
+        global damage_flush_timer
+        if damage_flush_timer:
+            GLib.source_remove(damage_flush_timer)
+            damage_flush_timer = 0
+        pending_damage.clear()
     return _INIT_X11_FILTER_DONE==0
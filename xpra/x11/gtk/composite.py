@@ -125,8 +125,11 @@ class CompositeHelper(WindowDamageHandler, GObject.GObject):
             self._listening_to = listening
 
     def do_x11_damage_event(self, event) -> None:
-        event.x += self._border_width
-        event.y += self._border_width
+        bw = self._border_width
+        if bw:
+            event.x += bw
+            event.y += bw
+            event.rectangles = tuple((x + bw, y + bw, w, h) for x, y, w, h in event.rectangles)
         self.emit("contents-changed", event)
 
 
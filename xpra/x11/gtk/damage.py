@@ -4,7 +4,7 @@
 # Xpra is released under the terms of the GNU GPL v2, or, at your option, any
 # later version. See the file COPYING for details.
 
-from typing import Final
+from typing import Any, Final
 
 from xpra.util.env import envbool
 from xpra.gtk.gobject import one_arg_signal
@@ -148,6 +148,10 @@ class WindowDamageHandler:
                 WindowDamageHandler.XShmEnabled = False
         return self._xshm_handle
 
+    def get_xshm_info(self) -> dict[str, Any]:
+        sh = self._xshm_handle
+        return sh.get_info() if sh else {}
+
     def _set_pixmap(self) -> None:
         self._contents_handle = XImage.get_xwindow_pixmap_wrapper(self.xid)
 
@@ -90,21 +90,55 @@ def prop_type_get(xid: int, key: str):
         return None
 
 
-# May return None.
-def prop_get(xid: int, key: str, etype, ignore_errors: bool = False, raise_xerrors: bool = False):
-    # ie: 0x4000, "_NET_WM_PID", "u32"
+def get_prop_request(etype) -> tuple[str, int]:
+    # ie: "u32" -> "CARDINAL", 65536
     if isinstance(etype, (list, tuple)):
         scalar_type = etype[0]
     else:
         scalar_type = etype  # ie: "u32"
     type_atom = PROP_TYPES[scalar_type][1]  # ie: "CARDINAL"
     buffer_size = PROP_SIZES.get(scalar_type, 65536)
+    return type_atom, buffer_size
+
+
+# May return None.
+def prop_get(xid: int, key: str, etype, ignore_errors: bool = False, raise_xerrors: bool = False):
+    # ie: 0x4000, "_NET_WM_PID", "u32"
+    type_atom, buffer_size = get_prop_request(etype)
     data = raw_prop_get(xid, key, type_atom, buffer_size, ignore_errors, raise_xerrors)
     if data is None:
         return None
     return do_prop_decode(key, etype, data, ignore_errors)
 
 
+def raw_props_get(xid: int, properties: dict[str, int]) -> dict[str, tuple[int, bytes] | None]:
+    """
+    Fetches all the `properties` (name: buffer size) using a single round trip,
+    the values can be decoded using `cached_prop_get`.
+    """
+    if not isinstance(xid, int):
+        raise TypeError(f"xid must be an int, not a {type(xid)}")
+    with XSyncContext():
+        return X11WindowBindings().XGetWindowProperties(xid, properties)
+
+
+def cached_prop_get(key: str, etype, value: tuple[int, bytes] | None, ignore_errors: bool = False):
+    """
+    Same as `prop_get`, but using a value returned by `raw_props_get`.
+    """
+    if value is None:
+        if not ignore_errors:
+            log("Missing property %s", key)
+        return None
+    type_atom = get_prop_request(etype)[0]
+    actual_type, data = value
+    if actual_type != _get_xatom(type_atom):
+        if not ignore_errors:
+            log.info(f"Wrong property type for {key} ({type_atom})")
+        return None
+    return do_prop_decode(key, etype, data, ignore_errors)
+
+
 def raw_prop_get(xid: int, key: str, type_atom: str, buffer_size: int = 65536,
                  ignore_errors: bool = False, raise_xerrors: bool = False):
     if not isinstance(xid, int):
@@ -24,7 +24,10 @@ from xpra.x11.bindings.res import ResBindings
 from xpra.x11.bindings.send_wm import send_wm_delete_window
 from xpra.x11.models.model_stub import WindowModelStub
 from xpra.x11.gtk.composite import CompositeHelper
-from xpra.x11.gtk.prop import prop_get, prop_set, prop_del, prop_type_get, PYTHON_TYPES
+from xpra.x11.gtk.prop import (
+    prop_get, prop_set, prop_del, prop_type_get, raw_props_get, cached_prop_get, get_prop_request,
+    PYTHON_TYPES,
+)
 from xpra.x11.gtk.bindings import add_event_receiver, remove_event_receiver, get_pywindow
 from xpra.log import Logger
 
@@ -54,6 +57,15 @@ OPAQUE_REGION = envbool("XPRA_OPAQUE_REGION", True)
 DELETE_DESTROY = envbool("XPRA_DELETE_DESTROY", False)
 DELETE_KILL_PID = envbool("XPRA_DELETE_KILL_PID", True)
 DELETE_XKILL = envbool("XPRA_DELETE_XKILL", True)
+# fetch X11 properties in batches and cache their values until the next PropertyNotify:
+X11_PROPERTY_CACHE = envbool("XPRA_X11_PROPERTY_CACHE", True)
+
+# these properties are read using specific Xlib functions:
+XLIB_PROPERTIES = ("WM_PROTOCOLS", "WM_CLASS", "WM_HINTS", "WM_NORMAL_HINTS")
+# properties that may not fit in the default buffer size:
+X11_PROPERTY_SIZES: dict[str, int] = {
+    "_NET_WM_ICON": get_prop_request("icons")[1],
+}
 
 CurrentTime: Final[int] = constants["CurrentTime"]
 
@@ -303,6 +315,8 @@ class CoreX11WindowModel(WindowModelStub):
         self._damage_forward_handle = None
         self._setup_done = False
         self._kill_count = 0
+        # raw values of the X11 properties, see `prop_get`:
+        self._x11_property_cache: dict[str, tuple[int, bytes] | None] = {}
 
     def __repr__(self) -> str:  # pylint: disable=arguments-differ
         try:
@@ -332,7 +346,13 @@ class CoreX11WindowModel(WindowModelStub):
                 if geom is None:
                     raise Unmanageable(f"window {self.xid:x} disappeared already")
                 self._internal_set_property("geometry", geom[:4])
-                self._read_initial_X11_properties()
+                try:
+                    self._fetch_initial_X11_properties()
+                    self._read_initial_X11_properties()
+                finally:
+                    # we are not receiving PropertyNotify events yet,
+                    # so the values cannot be kept:
+                    self._x11_property_cache.clear()
         except XError as e:
             log("failed to manage %#x", self.xid, exc_info=True)
             raise Unmanageable(e) from e
@@ -393,6 +413,7 @@ class CoreX11WindowModel(WindowModelStub):
             self._MODELTYPE, wm_exiting, self._damage_forward_handle, self._composite)
         remove_event_receiver(self.xid, self)
         self.managed_disconnect()
+        self._x11_property_cache.clear()
         if self._composite:
             if self._damage_forward_handle:
                 self._composite.disconnect(self._damage_forward_handle)
@@ -422,6 +443,10 @@ class CoreX11WindowModel(WindowModelStub):
         c = self._composite
         return bool(c) and c.has_xshm()
 
+    def get_xshm_info(self) -> dict[str, Any]:
+        c = self._composite
+        return c.get_xshm_info() if c else {}
+
     def get_image(self, x: int, y: int, width: int, height: int) -> ImageWrapper:
         return self._composite.get_image(x, y, width, height)
 
@@ -440,6 +465,18 @@ class CoreX11WindowModel(WindowModelStub):
         can_focus = "WM_TAKE_FOCUS" in self.get_property("protocols")
         self._updateprop("can-focus", can_focus)
 
+    def _fetch_initial_X11_properties(self) -> None:
+        """
+        Fetch all the properties that `_read_initial_X11_properties` will need
+        at once, instead of doing a round trip to the X11 server for each one of them.
+        """
+        if not X11_PROPERTY_CACHE:
+            return
+        names = [x for x in self._initial_x11_properties + ["_NET_WM_STATE"] if x not in XLIB_PROPERTIES]
+        properties = {name: X11_PROPERTY_SIZES.get(name, 65536) for name in names}
+        self._x11_property_cache.update(raw_props_get(self.xid, properties))
+        metalog("fetched initial X11 properties: %s", tuple(self._x11_property_cache.keys()))
+
     def _read_initial_X11_properties(self) -> None:
         """ This is called within an XSync context,
             so that X11 calls can raise XErrors,
@@ -579,15 +616,32 @@ class CoreX11WindowModel(WindowModelStub):
             Get an X11 property from the client window,
             using the automatic type conversion code from prop.py
             Ignores property errors during setup_client.
+            Once the window is set up, the values are cached until we get
+            a `PropertyNotify` event for the property.
         """
         if ignore_errors is None and (not self._setup_done or not self._managed):
             ignore_errors = True
+        cache = self._x11_property_cache
+        if key not in cache and X11_PROPERTY_CACHE and self._setup_done and self._managed:
+            buffer_size = get_prop_request(ptype)[1]
+            try:
+                cache.update(raw_props_get(self.xid, {key: buffer_size}))
+            except XError:
+                log("prop_get%s", (key, ptype, ignore_errors, raise_xerrors), exc_info=True)
+                if raise_xerrors:
+                    raise
+                log.info(f"Missing window {self.xid:x} or wrong property type {key}")
+                return None
+        if key in cache:
+            return cached_prop_get(key, ptype, cache[key], bool(ignore_errors))
         return prop_get(self.xid, key, ptype, ignore_errors=bool(ignore_errors), raise_xerrors=raise_xerrors)
 
     def prop_del(self, key: str) -> None:
+        self._x11_property_cache.pop(key, None)
         prop_del(self.xid, key)
 
     def prop_set(self, key: str, ptype, value) -> None:
+        self._x11_property_cache.pop(key, None)
         prop_set(self.xid, key, ptype, value)
 
     def root_prop_get(self, key: str, ptype, ignore_errors=True) -> object:
@@ -599,6 +653,7 @@ class CoreX11WindowModel(WindowModelStub):
     def do_x11_property_notify_event(self, event) -> None:
         # X11: PropertyNotify
         assert event.window == self.xid
+        self._x11_property_cache.pop(str(event.atom), None)
         self._handle_property_change(str(event.atom))
 
     def _handle_property_change(self, name: str) -> None:
@@ -17,7 +17,7 @@ X11Window = X11WindowBindings()
 
 
 class TrayGeometryChanged:  # pylint: disable=too-few-public-methods
-    __slots__ = ("x", "y", "width", "height")
+    __slots__ = ("x", "y", "width", "height", "rectangles")
 
 
 class SystemTrayWindowModel(CoreX11WindowModel):
@@ -58,6 +58,7 @@ class SystemTrayWindowModel(CoreX11WindowModel):
         event = TrayGeometryChanged()
         event.x = event.y = 0
         event.width, event.height = self.get_dimensions()
+        event.rectangles = ((0, 0, event.width, event.height), )
         self.emit("client-contents-changed", event)
 
 
@@ -22,7 +22,9 @@ from xpra.x11.server.server_uuid import save_uuid, get_uuid, save_mode
 from xpra.x11.vfb_util import parse_resolutions
 from xpra.x11.gtk.prop import prop_get, prop_set, prop_del
 from xpra.x11.gtk.display_source import close_gdk_display_source
-from xpra.x11.gtk.bindings import init_x11_filter, cleanup_x11_filter, cleanup_all_event_receivers
+from xpra.x11.gtk.bindings import (
+    init_x11_filter, cleanup_x11_filter, cleanup_all_event_receivers, get_damage_info,
+)
 from xpra.common import MAX_WINDOW_SIZE, FULL_INFO, NotificationID
 from xpra.util.str_fn import bytestostr
 from xpra.util.objects import typedict
@@ -439,6 +441,11 @@ class X11ServerCore(GTKServerBase):
     def get_window_info(self, window) -> dict[str, Any]:
         info = super().get_window_info(window)
         info["XShm"] = window.uses_xshm()
+        if info["XShm"]:
+            info["xshm"] = window.get_xshm_info()
+        damage = get_damage_info(getattr(window, "xid", 0))
+        if damage:
+            info["damage"] = damage
         info["geometry"] = window.get_geometry()
         return info
 
@@ -9,6 +9,7 @@ from time import monotonic_ns
 from collections.abc import Callable
 from typing import Any
 
+from xpra.os_util import gi_import
 from xpra.x11.server.core import X11ServerCore
 from xpra.net.compression import Compressed
 from xpra.util.system import is_Wayland, get_loaded_kernel_modules
@@ -19,6 +20,9 @@ from xpra.server.shadow.root_window_model import RootWindowModel
 from xpra.server.shadow.gtk_shadow_server_base import GTKShadowServerBase
 from xpra.server.shadow.gtk_root_window_model import GTKImageCapture
 from xpra.server.shadow.shadow_server_base import ShadowServerBase, try_setup_capture
+from xpra.server.shadow.damage import ShadowDamage
+from xpra.gtk.gobject import one_arg_signal
+from xpra.x11.gtk.bindings import add_event_receiver, remove_event_receiver
 from xpra.x11.server.server_uuid import del_mode, del_uuid
 from xpra.x11.gtk.prop import prop_get
 from xpra.x11.bindings.window import X11WindowBindings
@@ -26,9 +30,14 @@ from xpra.gtk.util import get_default_root_window, get_root_size
 from xpra.gtk.error import xsync, xlog
 from xpra.log import Logger
 
+GObject = gi_import("GObject")
+
 log = Logger("x11", "shadow")
 
 XSHM: bool = envbool("XPRA_SHADOW_XSHM", True)
+XDAMAGE: bool = envbool("XPRA_SHADOW_XDAMAGE", True)
+# smaller areas are captured using XGetImage rather than a full screen XShm capture:
+XIMAGE_PIXELS: int = envint("XPRA_SHADOW_XIMAGE_PIXELS", 256 * 256)
 POLL_CURSOR: int = envint("XPRA_SHADOW_POLL_CURSOR", 20)
 NVFBC: bool = envbool("XPRA_SHADOW_NVFBC", True)
 GSTREAMER: bool = envbool("XPRA_SHADOW_GSTREAMER", False)
@@ -232,6 +241,15 @@ class XImageCapture:
 
     def get_image(self, x: int, y: int, width: int, height: int):
         log("XImageCapture.get_image%s for %#x", (x, y, width, height), self.xwindow)
+        if width * height <= XIMAGE_PIXELS:
+            # cheaper than capturing the whole screen with XShm:
+            try:
+                with xsync:
+                    return self.XImage.get_ximage(self.xwindow, x, y, width, height)
+            except Exception as e:
+                log("XImageCapture.get_image%s", (x, y, width, height), exc_info=True)
+                self._err(e)
+                return None
         if self.xshm is None:
             log("no xshm, cannot get image")
             return None
@@ -240,6 +258,9 @@ class XImageCapture:
             with xsync:
                 log("X11 shadow get_image, xshm=%s", self.xshm)
                 image = self.xshm.get_image(self.xwindow, x, y, width, height)
+                if image is None:
+                    # all the XShm segments are still in use by the encoders:
+                    image = self.XImage.get_ximage(self.xwindow, x, y, width, height)
                 return image
         except Exception as e:
             self._err(e)
@@ -249,6 +270,57 @@ class XImageCapture:
             log("X11 shadow captured %s pixels at %i MPixels/s using %s",
                 width * height, (width * height / (end - start)), ["GTK", "XSHM"][XSHM])
 
+    def get_info(self) -> dict[str, Any]:
+        xshm = self.xshm
+        return xshm.get_info() if xshm else {}
+
+
+class RootDamage(GObject.GObject):
+    """
+    Tracks the areas of the root window that have changed using XDamage.
+    """
+    __gsignals__ = {
+        "x11-damage-event": one_arg_signal,
+    }
+
+    def __init__(self, xid: int):
+        super().__init__()
+        self.xid = xid
+        self.damage = ShadowDamage()
+        self.window_bindings = X11WindowBindings()
+        self.window_bindings.ensure_XDamage_support()
+        with xsync:
+            self.damage_handle = self.window_bindings.XDamageCreate(xid)
+        add_event_receiver(xid, self)
+        log("RootDamage(%#x) damage handle=%#x", xid, self.damage_handle)
+
+    def __repr__(self):
+        return f"RootDamage({self.xid:x})"
+
+    def do_x11_damage_event(self, event) -> None:
+        for x, y, w, h in event.rectangles:
+            self.damage.damage(x, y, w, h)
+
+    def take(self) -> list | None:
+        # the damage events we receive after this call will be for the next refresh:
+        with xlog:
+            self.window_bindings.XDamageSubtract(self.damage_handle)
+        return self.damage.take()
+
+    def get_info(self) -> dict[str, Any]:
+        return self.damage.get_info()
+
+    def cleanup(self) -> None:
+        remove_event_receiver(self.xid, self)
+        dh = self.damage_handle
+        if dh:
+            self.damage_handle = 0
+            with xlog:
+                self.window_bindings.XDamageDestroy(dh)
+
+
+GObject.type_register(RootDamage)
+
 
 def setup_nvfbc_capture(window):
     if not NVFBC:
@@ -347,6 +419,7 @@ class ShadowX11Server(GTKShadowServerBase, X11ServerCore):
         self.session_type = "X11"
         self.modify_keymap = False
         self.backend = attrs.get("backend", "x11")
+        self.root_damage: RootDamage | None = None
 
     def get_server_mode(self) -> str:
         return "X11 shadow"
@@ -367,6 +440,7 @@ class ShadowX11Server(GTKShadowServerBase, X11ServerCore):
             ShadowServerBase.set_keymap(self, server_source, force)
 
     def cleanup(self) -> None:
+        self.cleanup_root_damage()
         GTKShadowServerBase.cleanup(self)
         X11ServerCore.cleanup(self)
         for fn in (del_mode, del_uuid):
@@ -384,6 +458,38 @@ class ShadowX11Server(GTKShadowServerBase, X11ServerCore):
     def get_root_window_model_class(self) -> type:
         return X11ShadowModel
 
+    def get_damaged_areas(self) -> list | None:
+        global XDAMAGE
+        if not XDAMAGE or not self.capture or self.capture.get_type() not in ("XImageCapture", "GTK"):
+            # other capture backends have their own change detection:
+            return None
+        if not self.root_damage:
+            try:
+                self.root_damage = RootDamage(self.root.get_xid())
+            except Exception as e:
+                log("RootDamage(%s)", self.root, exc_info=True)
+                log.warn("Warning: unable to track screen updates using XDamage")
+                log.warn(" %s", e)
+                log.warn(" the whole screen will be refreshed every time")
+                XDAMAGE = False
+                return None
+        return self.root_damage.take()
+
+    def cleanup_root_damage(self) -> None:
+        rd = self.root_damage
+        if rd:
+            self.root_damage = None
+            rd.cleanup()
+
+    def no_windows(self) -> None:
+        super().no_windows()
+        # start again from a full refresh when clients reconnect:
+        self.cleanup_root_damage()
+
+    def recreate_window_models(self) -> None:
+        self.cleanup_root_damage()
+        super().recreate_window_models()
+
     def makeDynamicWindowModels(self):
         assert self.window_matches
         rwmc = self.get_root_window_model_class()
@@ -452,6 +558,12 @@ class ShadowX11Server(GTKShadowServerBase, X11ServerCore):
         merge_dicts(info, ShadowServerBase.get_info(self, proto))
         info.setdefault("features", {})["shadow"] = True
         info.setdefault("server", {})["type"] = "Python/bindings/x11-shadow"
+        rd = self.root_damage
+        if rd:
+            info.setdefault("shadow", {})["damage"] = rd.get_info()
+        capture = self.capture
+        if isinstance(capture, XImageCapture):
+            info.setdefault("shadow", {})["xshm"] = capture.get_info()
         return info
 
     def do_make_screenshot_packet(self) -> tuple[str, int, int, str, int, Compressed]: